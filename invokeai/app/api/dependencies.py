@@ -21,10 +21,17 @@ from invokeai.version.invokeai_version import __version__
 
 from ..services.default_graphs import create_system_graphs
 from ..services.latent_storage import DiskLatentsStorage, ForwardCacheLatentsStorage
-from ..services.graph import GraphExecutionState, LibraryGraph
+from ..services.graph import (
+    GRAPH_EXECUTION_STATE_SEARCH_KEYS,
+    GRAPH_EXECUTION_STATE_SEARCH_PATH,
+    GraphExecutionState,
+    LibraryGraph,
+)
 from ..services.image_file_storage import DiskImageFileStorage
+from ..services.invocation_cache import MemoryInvocationCache
 from ..services.invocation_queue import MemoryInvocationQueue
 from ..services.invocation_services import InvocationServices
+from ..services.invocation_stats import InvocationStatsService
 from ..services.invoker import Invoker
 from ..services.processor import DefaultInvocationProcessor
 from ..services.sqlite import SqliteItemStorage
@@ -71,7 +78,10 @@ class ApiDependencies:
         db_location.parent.mkdir(parents=True, exist_ok=True)
 
         graph_execution_manager = SqliteItemStorage[GraphExecutionState](
-            filename=db_location, table_name="graph_executions"
+            filename=db_location,
+            table_name="graph_executions",
+            search_keys=GRAPH_EXECUTION_STATE_SEARCH_KEYS,
+            search_path=GRAPH_EXECUTION_STATE_SEARCH_PATH,
         )
 
         urls = LocalUrlService()
@@ -115,17 +125,21 @@ class ApiDependencies:
             )
         )
 
+        model_manager = ModelManagerService(config, logger)
+
         services = InvocationServices(
-            model_manager=ModelManagerService(config, logger),
+            model_manager=model_manager,
             events=events,
             latents=latents,
             images=images,
+            invocation_cache=MemoryInvocationCache(max_size=config.node_cache_size),
             boards=boards,
             board_images=board_images,
             queue=MemoryInvocationQueue(),
             graph_library=SqliteItemStorage[LibraryGraph](filename=db_location, table_name="graphs"),
             graph_execution_manager=graph_execution_manager,
             processor=DefaultInvocationProcessor(),
+            performance_statistics=InvocationStatsService(model_manager.get_cache_stats),
             configuration=config,
             logger=logger,
         )
@@ -1,4 +1,7 @@
+from typing import List
+
 from fastapi import Body, HTTPException, Path, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.routing import APIRouter
 from invokeai.app.services.board_record_storage import BoardRecord, BoardChanges
 from invokeai.app.services.image_record_storage import OffsetPaginatedResults
@@ -52,3 +55,44 @@ async def remove_board_image(
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to update board")
+
+
+@board_images_router.post(
+    "/batch",
+    operation_id="add_images_to_board",
+    responses={
+        201: {"description": "The images were added to the board successfully"},
+    },
+    status_code=201,
+)
+async def add_images_to_board(
+    board_id: str = Body(description="The id of the board to add to"),
+    image_names: List[str] = Body(description="The names of the images to add"),
+) -> List[str]:
+    """Adds many images to a board, moving them from the boards they are on"""
+    try:
+        await run_in_threadpool(
+            ApiDependencies.invoker.services.board_images.add_images_to_board, board_id, image_names
+        )
+        return image_names
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to add to board")
+
+
+@board_images_router.delete(
+    "/batch",
+    operation_id="remove_images_from_board",
+    responses={
+        201: {"description": "The images were removed from their boards successfully"},
+    },
+    status_code=201,
+)
+async def remove_images_from_board(
+    image_names: List[str] = Body(description="The names of the images to remove", embed=True),
+) -> List[str]:
+    """Removes many images from their boards"""
+    try:
+        await run_in_threadpool(ApiDependencies.invoker.services.board_images.remove_images_from_board, image_names)
+        return image_names
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to update board")
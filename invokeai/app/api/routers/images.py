@@ -1,13 +1,14 @@
-import io
-from typing import Optional
+import hashlib
+import os
+from typing import Any, Callable, Coroutine, Iterator, List, Optional, Tuple
 
-from fastapi import Body, HTTPException, Path, Query, Request, Response, UploadFile
-from fastapi.responses import FileResponse
-from fastapi.routing import APIRouter
-from PIL import Image
+from fastapi import Body, File, HTTPException, Path, Query, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.routing import APIRoute, APIRouter
 
 from invokeai.app.invocations.metadata import ImageMetadata
-from invokeai.app.models.image import ImageCategory, ResourceOrigin
+from invokeai.app.models.image import ImageCategory, InvalidImageException, ResourceOrigin
 from invokeai.app.services.image_record_storage import OffsetPaginatedResults
 from invokeai.app.services.item_storage import PaginatedResults
 from invokeai.app.services.models.image_record import (
@@ -15,13 +16,173 @@ from invokeai.app.services.models.image_record import (
     ImageRecordChanges,
     ImageUrlsDTO,
 )
+from invokeai.app.util.zipstream import stream_zip
 
 from ..dependencies import ApiDependencies
 
-images_router = APIRouter(prefix="/v1/images", tags=["images"])
-
 # images are immutable; set a high max-age
 IMAGE_MAX_AGE = 31536000
+IMAGE_CACHE_CONTROL = f"public, max-age={IMAGE_MAX_AGE}, immutable"
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+# the most images a batch upload may hold
+MAX_BATCH_UPLOAD_FILES = 100
+# how many files each upload route takes, by operation id
+UPLOAD_FILE_LIMITS = {"upload_image": 1, "upload_images": MAX_BATCH_UPLOAD_FILES}
+# room for the multipart boundaries and part headers around the files
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def get_max_upload_size() -> int:
+    return ApiDependencies.invoker.services.configuration.max_upload_size * 1024 * 1024
+
+
+class UploadLimitRoute(APIRoute):
+    """
+    Turns down uploads by their Content-Length before the body is read. The route handler and its
+    dependencies only run once the whole multipart body has been received and spooled.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        max_files = UPLOAD_FILE_LIMITS.get(self.operation_id)
+        if max_files is None:
+            return handler
+
+        async def upload_limit_handler(request: Request) -> Response:
+            content_length = request.headers.get("content-length")
+            if content_length is None or not content_length.isdigit():
+                raise HTTPException(status_code=411, detail="Uploads must have a Content-Length")
+            if int(content_length) > get_max_upload_size() * max_files + MULTIPART_OVERHEAD:
+                raise HTTPException(status_code=413, detail="Upload too large")
+            return await handler(request)
+
+        return upload_limit_handler
+
+
+images_router = APIRouter(prefix="/v1/images", tags=["images"], route_class=UploadLimitRoute)
+
+
+def get_etag(path: str, stat: os.stat_result) -> str:
+    """A strong ETag of an image or thumbnail file, from its name and modification time"""
+    key = f"{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    return f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """The first and last byte of a single byte range, or None to send the whole file"""
+    if range_header is None or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[len("bytes=") :].strip().partition("-")
+    try:
+        if start == "":
+            # the last bytes of the file, none of them if the length is 0
+            length = int(end)
+            first, last = max(size - length, 0) if length > 0 else size, size - 1
+        else:
+            first, last = int(start), int(end) if end else size - 1
+    except ValueError:
+        return None
+    if first >= size or last < first:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return first, min(last, size - 1)
+
+
+def read_file_range(path: str, first: int, last: int) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        file.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = file.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def image_file_response(request: Request, path: str, media_type: str, filename: Optional[str] = None) -> Response:
+    """Serves an image or thumbnail file, answering conditional and range requests"""
+    stat = os.stat(path)
+    etag = get_etag(path, stat)
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        byte_range = parse_range(request.headers.get("range"), stat.st_size)
+
+    if byte_range is None:
+        response = FileResponse(
+            path,
+            media_type=media_type,
+            filename=filename,
+            stat_result=stat,
+            content_disposition_type="inline",
+        )
+        for name, value in headers.items():
+            response.headers[name] = value
+        return response
+
+    first, last = byte_range
+    headers["Content-Range"] = f"bytes {first}-{last}/{stat.st_size}"
+    headers["Content-Length"] = str(last - first + 1)
+    return StreamingResponse(
+        read_file_range(path, first, last), status_code=206, media_type=media_type, headers=headers
+    )
+
+
+def check_upload_size(files: List[UploadFile]) -> None:
+    """Rejects uploads that are not images or over the size limit, before reading any of them. The
+    request as a whole was checked by its Content-Length already, see UploadLimitRoute."""
+    max_size = get_max_upload_size()
+    if len(files) > MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(status_code=413, detail=f"More than {MAX_BATCH_UPLOAD_FILES} images")
+
+    for file in files:
+        if not file.content_type.startswith("image"):
+            raise HTTPException(status_code=415, detail=f"Not an image: {file.filename}")
+        # starlette spools uploads to a temporary file, which the images are read from in chunks
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(0)
+        if size > max_size:
+            raise HTTPException(status_code=413, detail=f"Upload too large: {file.filename}")
+
+
+async def create_uploaded_image(
+    file: UploadFile,
+    image_category: ImageCategory,
+    is_intermediate: bool,
+    board_id: Optional[str],
+    session_id: Optional[str],
+    crop_visible: bool,
+) -> ImageDTO:
+    """Validates, decodes and stores an upload in a worker thread, so that the event loop is not blocked"""
+    try:
+        return await run_in_threadpool(
+            ApiDependencies.invoker.services.images.create_from_file,
+            file=file.file,
+            image_origin=ResourceOrigin.EXTERNAL,
+            image_category=image_category,
+            session_id=session_id,
+            board_id=board_id,
+            is_intermediate=is_intermediate,
+            crop_visible=crop_visible,
+        )
+    except InvalidImageException:
+        raise HTTPException(status_code=415, detail=f"Failed to read image: {file.filename}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to create image")
 
 
 @images_router.post(
@@ -29,6 +190,8 @@ IMAGE_MAX_AGE = 31536000
     operation_id="upload_image",
     responses={
         201: {"description": "The image was uploaded successfully"},
+        411: {"description": "The upload has no Content-Length"},
+        413: {"description": "The image is too large"},
         415: {"description": "Image upload failed"},
     },
     status_code=201,
@@ -45,36 +208,44 @@ async def upload_image(
     crop_visible: Optional[bool] = Query(default=False, description="Whether to crop the image"),
 ) -> ImageDTO:
     """Uploads an image"""
-    if not file.content_type.startswith("image"):
-        raise HTTPException(status_code=415, detail="Not an image")
-
-    contents = await file.read()
+    check_upload_size([file])
 
-    try:
-        pil_image = Image.open(io.BytesIO(contents))
-        if crop_visible:
-            bbox = pil_image.getbbox()
-            pil_image = pil_image.crop(bbox)
-    except:
-        # Error opening the image
-        raise HTTPException(status_code=415, detail="Failed to read image")
+    image_dto = await create_uploaded_image(
+        file, image_category, is_intermediate, board_id, session_id, bool(crop_visible)
+    )
+    response.status_code = 201
+    response.headers["Location"] = image_dto.image_url
+    return image_dto
 
-    try:
-        image_dto = ApiDependencies.invoker.services.images.create(
-            image=pil_image,
-            image_origin=ResourceOrigin.EXTERNAL,
-            image_category=image_category,
-            session_id=session_id,
-            board_id=board_id,
-            is_intermediate=is_intermediate,
-        )
 
-        response.status_code = 201
-        response.headers["Location"] = image_dto.image_url
+@images_router.post(
+    "/batch",
+    operation_id="upload_images",
+    responses={
+        201: {"description": "The images were uploaded successfully"},
+        411: {"description": "The upload has no Content-Length"},
+        413: {"description": "An image is too large"},
+        415: {"description": "An image upload failed"},
+    },
+    status_code=201,
+    response_model=List[ImageDTO],
+)
+async def upload_images(
+    files: List[UploadFile] = File(description="The images to upload"),
+    image_category: ImageCategory = Query(description="The category of the images"),
+    is_intermediate: bool = Query(description="Whether these are intermediate images"),
+    board_id: Optional[str] = Query(default=None, description="The board to add the images to, if any"),
+    session_id: Optional[str] = Query(default=None, description="The session ID associated with this upload, if any"),
+    crop_visible: Optional[bool] = Query(default=False, description="Whether to crop the images"),
+) -> List[ImageDTO]:
+    """Uploads several images. They are all checked for their type and size first, then created in order.
+    If one of them can't be read, the images before it are still created."""
+    check_upload_size(files)
 
-        return image_dto
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Failed to create image")
+    return [
+        await create_uploaded_image(file, image_category, is_intermediate, board_id, session_id, bool(crop_visible))
+        for file in files
+    ]
 
 
 @images_router.delete("/{image_name}", operation_id="delete_image")
@@ -90,6 +261,68 @@ async def delete_image(
         pass
 
 
+@images_router.post(
+    "/delete",
+    operation_id="delete_images",
+    response_model=List[str],
+)
+async def delete_images(
+    image_names: List[str] = Body(description="The names of the images to delete", embed=True),
+) -> List[str]:
+    """Deletes many images, returning the names of the deleted images"""
+
+    try:
+        await run_in_threadpool(ApiDependencies.invoker.services.images.delete_many, image_names)
+        return image_names
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to delete images")
+
+
+@images_router.post(
+    "/restore",
+    operation_id="restore_images",
+    response_model=List[str],
+)
+async def restore_images(
+    image_names: List[str] = Body(description="The names of the deleted images to restore", embed=True),
+) -> List[str]:
+    """Restores deleted images that have not been purged yet, returning the names of the restored images"""
+
+    try:
+        return await run_in_threadpool(ApiDependencies.invoker.services.images.restore_many, image_names)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to restore images")
+
+
+@images_router.post(
+    "/download",
+    operation_id="download_images",
+    response_class=StreamingResponse,
+    responses={
+        200: {"description": "A zip archive of the images", "content": {"application/zip": {}}},
+        404: {"description": "An image was not found"},
+    },
+)
+async def download_images(
+    image_names: List[str] = Body(description="The names of the images to download", embed=True),
+) -> StreamingResponse:
+    """Downloads many images as a zip archive, which is written as it is sent"""
+
+    services = ApiDependencies.invoker.services
+    files = []
+    for image_name in dict.fromkeys(image_names):
+        path = services.images.get_path(image_name)
+        if not services.images.validate_path(path):
+            raise HTTPException(status_code=404, detail=f"Image {image_name} not found")
+        files.append((image_name, path))
+
+    return StreamingResponse(
+        stream_zip(files),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="images.zip"'},
+    )
+
+
 @images_router.post("/clear-intermediates", operation_id="clear_intermediates")
 async def clear_intermediates() -> int:
     """Clears all intermediates"""
@@ -102,6 +335,24 @@ async def clear_intermediates() -> int:
         pass
 
 
+@images_router.patch(
+    "/",
+    operation_id="update_images",
+    response_model=List[str],
+)
+async def update_images(
+    image_names: List[str] = Body(description="The names of the images to update"),
+    image_changes: ImageRecordChanges = Body(description="The changes to apply to the images"),
+) -> List[str]:
+    """Applies the same changes to many images, e.g. to star or unstar them, returning their names"""
+
+    try:
+        await run_in_threadpool(ApiDependencies.invoker.services.images.update_many, image_names, image_changes)
+        return image_names
+    except Exception as e:
+        raise HTTPException(status_code=400, detail="Failed to update images")
+
+
 @images_router.patch(
     "/{image_name}",
     operation_id="update_image",
@@ -160,12 +411,15 @@ async def get_image_metadata(
             "description": "Return the full-resolution image",
             "content": {"image/png": {}},
         },
+        206: {"description": "Return part of the full-resolution image"},
+        304: {"description": "The image is unchanged"},
         404: {"description": "Image not found"},
     },
 )
 async def get_image_full(
+    request: Request,
     image_name: str = Path(description="The name of full-resolution image file to get"),
-) -> FileResponse:
+) -> Response:
     """Gets a full-resolution image file"""
 
     try:
@@ -174,14 +428,9 @@ async def get_image_full(
         if not ApiDependencies.invoker.services.images.validate_path(path):
             raise HTTPException(status_code=404)
 
-        response = FileResponse(
-            path,
-            media_type="image/png",
-            filename=image_name,
-            content_disposition_type="inline",
-        )
-        response.headers["Cache-Control"] = f"max-age={IMAGE_MAX_AGE}"
-        return response
+        return image_file_response(request, path, media_type="image/png", filename=image_name)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=404)
 
@@ -195,22 +444,34 @@ async def get_image_full(
             "description": "Return the image thumbnail",
             "content": {"image/webp": {}},
         },
+        206: {"description": "Return part of the image thumbnail"},
+        304: {"description": "The thumbnail is unchanged"},
         404: {"description": "Image not found"},
     },
 )
 async def get_image_thumbnail(
+    request: Request,
     image_name: str = Path(description="The name of thumbnail image file to get"),
-) -> FileResponse:
+    size: Optional[int] = Query(
+        default=None, ge=16, le=2048, description="The size of the box the thumbnail fits in, if not the default"
+    ),
+) -> Response:
     """Gets a thumbnail image file"""
 
     try:
-        path = ApiDependencies.invoker.services.images.get_path(image_name, thumbnail=True)
+        if size is None:
+            path = ApiDependencies.invoker.services.images.get_path(image_name, thumbnail=True)
+        else:
+            # thumbnails of other sizes are made on first use, and kept in a bounded cache
+            path = await run_in_threadpool(
+                ApiDependencies.invoker.services.images.get_sized_thumbnail_path, image_name, size
+            )
         if not ApiDependencies.invoker.services.images.validate_path(path):
             raise HTTPException(status_code=404)
 
-        response = FileResponse(path, media_type="image/webp", content_disposition_type="inline")
-        response.headers["Cache-Control"] = f"max-age={IMAGE_MAX_AGE}"
-        return response
+        return image_file_response(request, path, media_type="image/webp")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=404)
 
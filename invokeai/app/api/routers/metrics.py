@@ -0,0 +1,152 @@
+from typing import Dict, List, Tuple, Union
+
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRouter
+
+from invokeai.app.invocations.compel import conditioning_cache_stats
+
+from ..dependencies import ApiDependencies
+
+metrics_router = APIRouter(prefix="/v1", tags=["metrics"])
+
+Labels = Dict[str, str]
+
+
+class PrometheusText:
+    """Builds a Prometheus text exposition, one metric family at a time"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def add(self, name: str, metric_type: str, description: str, samples: List[Tuple[Labels, Union[int, float]]]):
+        self.__add_family(name, metric_type, description)
+        for labels, value in samples:
+            self.__add_sample(name, labels, value)
+
+    def add_summary(self, name: str, description: str, samples: List[Tuple[Labels, int, float]]):
+        """Adds a summary without quantiles, from the number of observations and their sum"""
+        self.__add_family(name, "summary", description)
+        for labels, count, total in samples:
+            self.__add_sample(f"{name}_count", labels, count)
+            self.__add_sample(f"{name}_sum", labels, total)
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+    def __add_family(self, name: str, metric_type: str, description: str):
+        self.lines.append(f"# HELP invokeai_{name} {description}")
+        self.lines.append(f"# TYPE invokeai_{name} {metric_type}")
+
+    def __add_sample(self, name: str, labels: Labels, value: Union[int, float]):
+        label_text = ",".join(f'{k}="{self.__escape(v)}"' for k, v in labels.items())
+        self.lines.append(f"invokeai_{name}{{{label_text}}} {value}" if labels else f"invokeai_{name} {value}")
+
+    @staticmethod
+    def __escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+@metrics_router.get(
+    "/metrics",
+    operation_id="get_metrics",
+    response_class=PlainTextResponse,
+)
+async def get_metrics() -> PlainTextResponse:
+    """Gets the node, queue and cache statistics in the Prometheus text format"""
+    services = ApiDependencies.invoker.services
+    metrics = PrometheusText()
+
+    node_stats = services.performance_statistics.get_node_stats()
+    nodes = [({"node_type": node_type}, stats) for node_type, stats in sorted(node_stats.items())]
+    metrics.add_summary(
+        "node_duration_seconds",
+        "Wall time of the invocations of each node type",
+        [(labels, stats.invocations, stats.seconds) for labels, stats in nodes],
+    )
+    metrics.add(
+        "node_max_duration_seconds",
+        "gauge",
+        "Longest invocation of each node type",
+        [(labels, stats.max_seconds) for labels, stats in nodes],
+    )
+    metrics.add(
+        "node_model_load_seconds_total",
+        "counter",
+        "Time the invocations of each node type spent loading models from disk",
+        [(labels, stats.model_load_seconds) for labels, stats in nodes],
+    )
+    metrics.add(
+        "node_peak_rss_bytes",
+        "gauge",
+        "Highest process RSS seen at the end of an invocation of each node type",
+        [(labels, stats.peak_rss_bytes) for labels, stats in nodes],
+    )
+    metrics.add(
+        "node_peak_vram_bytes",
+        "gauge",
+        "Highest CUDA memory allocated during an invocation of each node type",
+        [(labels, stats.peak_vram_bytes) for labels, stats in nodes],
+    )
+    metrics.add(
+        "node_vram_allocated_bytes_total",
+        "counter",
+        "CUDA memory left allocated by the invocations of each node type that grew it",
+        [(labels, stats.vram_allocated_bytes) for labels, stats in nodes],
+    )
+    metrics.add(
+        "node_vram_freed_bytes_total",
+        "counter",
+        "CUDA memory freed by the invocations of each node type that shrank it",
+        [(labels, stats.vram_freed_bytes) for labels, stats in nodes],
+    )
+
+    queue_wait = services.performance_statistics.get_queue_wait_stats()
+    metrics.add_summary(
+        "queue_wait_seconds", "Time invocations waited in the queue", [({}, queue_wait.count, queue_wait.seconds)]
+    )
+    session_save = services.performance_statistics.get_session_save_stats()
+    metrics.add_summary(
+        "session_save_seconds", "Time spent saving session state", [({}, session_save.count, session_save.seconds)]
+    )
+
+    cache_stats = services.model_manager.get_cache_stats()
+    metrics.add_summary(
+        "model_load_seconds", "Loads of models from disk", [({}, cache_stats.loads, cache_stats.load_seconds)]
+    )
+    metrics.add_summary(
+        "model_move_to_gpu_seconds",
+        "Moves of models into VRAM",
+        [({}, cache_stats.moves_to_gpu, cache_stats.move_to_gpu_seconds)],
+    )
+    metrics.add_summary(
+        "model_offload_seconds",
+        "Offloads of models out of VRAM",
+        [({}, cache_stats.offloads, cache_stats.offload_seconds)],
+    )
+
+    prefetch_stats = services.model_manager.get_prefetch_stats()
+    metrics.add("model_prefetch_hits_total", "counter", "Prefetched models that were used", [({}, prefetch_stats.hits)])
+    metrics.add(
+        "model_prefetch_wasted_total",
+        "counter",
+        "Prefetched models evicted before they were used",
+        [({}, prefetch_stats.wasted)],
+    )
+    metrics.add("model_prefetch_bytes_total", "counter", "Size of the prefetched models", [({}, prefetch_stats.bytes)])
+
+    invocation_cache_stats = services.invocation_cache.get_stats()
+    metrics.add(
+        "node_cache_requests_total",
+        "counter",
+        "Lookups in the node output cache",
+        [({"result": "hit"}, invocation_cache_stats.hits), ({"result": "miss"}, invocation_cache_stats.misses)],
+    )
+    metrics.add("node_cache_size", "gauge", "Outputs in the node output cache", [({}, invocation_cache_stats.size)])
+    metrics.add(
+        "conditioning_cache_requests_total",
+        "counter",
+        "Lookups in the prompt conditioning cache",
+        [({"result": "hit"}, conditioning_cache_stats.hits), ({"result": "miss"}, conditioning_cache_stats.misses)],
+    )
+
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
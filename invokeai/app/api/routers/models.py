@@ -355,6 +355,7 @@ async def merge_models(
         description="Save the merged model to the designated directory (with 'merged_model_name' appended)",
         default=None,
     ),
+    fp16: Optional[bool] = Body(description="Save the merged weights in half precision", default=False),
 ) -> MergeModelResponse:
     """Convert a checkpoint model into a diffusers model"""
     logger = ApiDependencies.invoker.services.logger
@@ -369,6 +370,7 @@ async def merge_models(
             interp=interp,
             force=force,
             merge_dest_directory=dest,
+            fp16=fp16,
         )
         model_raw = ApiDependencies.invoker.services.model_manager.list_model(
             result.name,
@@ -46,12 +46,16 @@ async def list_sessions(
     page: int = Query(default=0, description="The page of results to get"),
     per_page: int = Query(default=10, description="The number of results per page"),
     query: str = Query(default="", description="The query string to search for"),
+    cursor: Optional[str] = Query(default=None, description="The next_cursor of the previous page, instead of a page"),
 ) -> PaginatedResults[GraphExecutionState]:
     """Gets a list of sessions, optionally searching"""
-    if query == "":
-        result = ApiDependencies.invoker.services.graph_execution_manager.list(page, per_page)
-    else:
-        result = ApiDependencies.invoker.services.graph_execution_manager.search(query, page, per_page)
+    try:
+        if query == "":
+            result = ApiDependencies.invoker.services.graph_execution_manager.list(page, per_page, cursor)
+        else:
+            result = ApiDependencies.invoker.services.graph_execution_manager.search(query, page, per_page, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
@@ -1,7 +1,9 @@
 # Copyright (c) 2022-2023 Kyle Schouviller (https://github.com/kyle0654) and the InvokeAI Team
 import asyncio
+import hashlib
+import json
+import os
 import sys
-from inspect import signature
 
 import logging
 import uvicorn
@@ -36,9 +38,9 @@ import invokeai.frontend.web as web_dir
 import mimetypes
 
 from .api.dependencies import ApiDependencies
-from .api.routers import sessions, models, images, boards, board_images, app_info
+from .api.routers import sessions, models, images, boards, board_images, app_info, metrics
 from .api.sockets import SocketIO
-from .invocations.baseinvocation import BaseInvocation
+from .invocations.baseinvocation import BaseInvocation, BaseInvocationOutput
 
 
 import torch
@@ -105,12 +107,49 @@ app.include_router(board_images.board_images_router, prefix="/api")
 
 app.include_router(app_info.app_router, prefix="/api")
 
+app.include_router(metrics.metrics_router, prefix="/api")
+
+
+def get_openapi_cache_path() -> Path:
+    """
+    The OpenAPI document only changes when the installed version, the invocations or the routes
+    change, so it is cached on disk under a key derived from them. The routers' request and
+    response models live in the service and backend modules, so every loaded invokeai module is
+    part of the key, along with the invocation classes from elsewhere (nodes from a plugin).
+    """
+    classes = BaseInvocation.get_invocations() + BaseInvocationOutput.get_all_subclasses_tuple()
+    modules = sorted(
+        {c.__module__ for c in classes}
+        | {r.endpoint.__module__ for r in app.routes if hasattr(r, "endpoint")}
+        | {name for name in list(sys.modules) if name.startswith("invokeai.")}
+    )
+    fingerprint = hashlib.sha256()
+    for c in classes:
+        fingerprint.update(f"{c.__module__}.{c.__qualname__}\n".encode("utf-8"))
+    for route in app.routes:
+        methods = sorted(getattr(route, "methods", None) or [])
+        fingerprint.update(f"{getattr(route, 'path', '')}:{methods}\n".encode("utf-8"))
+    for module in modules:
+        module_file = getattr(sys.modules.get(module), "__file__", None)
+        if module_file:
+            fingerprint.update(f"{module}:{os.path.getmtime(module_file)}\n".encode("utf-8"))
+    return app_config.root_path / ".cache" / f"openapi-{__version__}-{fingerprint.hexdigest()[:16]}.json"
+
 
 # Build a custom OpenAPI to include all outputs
 # TODO: can outputs be included on metadata of invocation schemas somehow?
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
+
+    cache_path = get_openapi_cache_path()
+    if cache_path.exists():
+        try:
+            app.openapi_schema = json.loads(cache_path.read_text())
+            return app.openapi_schema
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable OpenAPI cache {cache_path}: {e}")
+
     openapi_schema = get_openapi(
         title=app.title,
         description="An API for invoking AI image operations",
@@ -123,8 +162,7 @@ def custom_openapi():
     output_types = set()
     output_type_titles = dict()
     for invoker in all_invocations:
-        output_type = signature(invoker.invoke).return_annotation
-        output_types.add(output_type)
+        output_types.add(invoker.get_output_type())
 
     output_schemas = schema(output_types, ref_prefix="#/components/schemas/")
     for schema_key, output_schema in output_schemas["definitions"].items():
@@ -137,7 +175,7 @@ def custom_openapi():
     # Add a reference to the output type to additionalProperties of the invoker schema
     for invoker in all_invocations:
         invoker_name = invoker.__name__
-        output_type = signature(invoker.invoke).return_annotation
+        output_type = invoker.get_output_type()
         output_type_title = output_type_titles[output_type.__name__]
         invoker_schema = openapi_schema["components"]["schemas"][invoker_name]
         outputs_ref = {"$ref": f"#/components/schemas/{output_type_title}"}
@@ -161,6 +199,12 @@ def custom_openapi():
             enum=list(v.value for v in model_config_format_enum),
         )
 
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(openapi_schema))
+    except OSError as e:
+        logger.warning(f"Unable to write OpenAPI cache {cache_path}: {e}")
+
     app.openapi_schema = openapi_schema
     return app.openapi_schema
 
@@ -2,10 +2,21 @@
 
 from abc import ABC, abstractmethod
 import argparse
-from typing import Any, Callable, Iterable, Literal, Union, get_args, get_origin, get_type_hints
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
 from pydantic import BaseModel, Field
 import networkx as nx
-import matplotlib.pyplot as plt
 
 import invokeai.backend.util.logging as logger
 from ..invocations.baseinvocation import BaseInvocation
@@ -142,25 +153,29 @@ class BaseCommand(ABC, BaseModel):
     # All commands must include a type name like this:
     # type: Literal['your_command_name'] = 'your_command_name'
 
+    # commands register themselves when they are defined
+    _commands: ClassVar[List[type]] = list()
+    _commands_map: ClassVar[Optional[dict]] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        BaseCommand._commands.append(cls)
+        BaseCommand._commands_map = None
+
     @classmethod
     def get_all_subclasses(cls):
-        subclasses = []
-        toprocess = [cls]
-        while len(toprocess) > 0:
-            next = toprocess.pop(0)
-            next_subclasses = next.__subclasses__()
-            subclasses.extend(next_subclasses)
-            toprocess.extend(next_subclasses)
-        return subclasses
+        return list(BaseCommand._commands)
 
     @classmethod
     def get_commands(cls):
-        return tuple(BaseCommand.get_all_subclasses())
+        return tuple(BaseCommand._commands)
 
     @classmethod
     def get_commands_map(cls):
         # Get the type strings out of the literals and into a dictionary
-        return dict(map(lambda t: (get_args(get_type_hints(t)["type"])[0], t), BaseCommand.get_all_subclasses()))
+        if BaseCommand._commands_map is None:
+            BaseCommand._commands_map = {get_args(get_type_hints(t)["type"])[0]: t for t in BaseCommand._commands}
+        return BaseCommand._commands_map
 
     @abstractmethod
     def run(self, context: CliContext) -> None:
@@ -266,6 +281,8 @@ class DrawGraphCommand(BaseCommand):
         nxgraph = session.graph.nx_graph_flat()
 
         # Draw the networkx graph
+        import matplotlib.pyplot as plt
+
         plt.figure(figsize=(20, 20))
         pos = nx.spectral_layout(nxgraph)
         nx.draw_networkx_nodes(nxgraph, pos, node_size=1000)
@@ -285,6 +302,8 @@ class DrawExecutionGraphCommand(BaseCommand):
         nxgraph = session.execution_graph.nx_graph_flat()
 
         # Draw the networkx graph
+        import matplotlib.pyplot as plt
+
         plt.figure(figsize=(20, 20))
         pos = nx.spectral_layout(nxgraph)
         nx.draw_networkx_nodes(nxgraph, pos, node_size=1000)
@@ -45,6 +45,8 @@ from .cli.completer import set_autocompleter
 from .invocations.baseinvocation import BaseInvocation
 from .services.events import EventServiceBase
 from .services.graph import (
+    GRAPH_EXECUTION_STATE_SEARCH_KEYS,
+    GRAPH_EXECUTION_STATE_SEARCH_PATH,
     Edge,
     EdgeConnection,
     GraphExecutionState,
@@ -53,8 +55,10 @@ from .services.graph import (
     are_connection_types_compatible,
 )
 from .services.image_file_storage import DiskImageFileStorage
+from .services.invocation_cache import MemoryInvocationCache
 from .services.invocation_queue import MemoryInvocationQueue
 from .services.invocation_services import InvocationServices
+from .services.invocation_stats import InvocationStatsService
 from .services.invoker import Invoker
 from .services.model_manager_service import ModelManagerService
 from .services.processor import DefaultInvocationProcessor
@@ -257,7 +261,10 @@ def invoke_cli():
     logger.info(f'InvokeAI database location is "{db_location}"')
 
     graph_execution_manager = SqliteItemStorage[GraphExecutionState](
-        filename=db_location, table_name="graph_executions"
+        filename=db_location,
+        table_name="graph_executions",
+        search_keys=GRAPH_EXECUTION_STATE_SEARCH_KEYS,
+        search_path=GRAPH_EXECUTION_STATE_SEARCH_PATH,
     )
 
     urls = LocalUrlService()
@@ -305,12 +312,14 @@ def invoke_cli():
         events=events,
         latents=ForwardCacheLatentsStorage(DiskLatentsStorage(f"{output_folder}/latents")),
         images=images,
+        invocation_cache=MemoryInvocationCache(max_size=config.node_cache_size),
         boards=boards,
         board_images=board_images,
         queue=MemoryInvocationQueue(),
         graph_library=SqliteItemStorage[LibraryGraph](filename=db_location, table_name="graphs"),
         graph_execution_manager=graph_execution_manager,
         processor=DefaultInvocationProcessor(),
+        performance_statistics=InvocationStatsService(model_manager.get_cache_stats),
         logger=logger,
         configuration=config,
     )
@@ -4,7 +4,19 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from inspect import signature
-from typing import TYPE_CHECKING, Dict, List, Literal, TypedDict, get_args, get_type_hints
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Hashable,
+    List,
+    Literal,
+    TypedDict,
+    get_args,
+    get_type_hints,
+)
 
 from pydantic import BaseConfig, BaseModel, Field
 
@@ -12,6 +24,20 @@ if TYPE_CHECKING:
     from ..services.invocation_services import InvocationServices
 
 
+# Invocation and output classes register themselves here when they are defined, so that
+# lookups don't have to walk the subclass tree. Anything derived from the registered
+# classes is memoized in _registry_cache, which is reset whenever a new class registers.
+_invocation_classes: List[type] = list()
+_invocation_output_classes: List[type] = list()
+_registry_cache: Dict[Hashable, Any] = dict()
+
+
+def _cached(key: Hashable, factory: Callable[[], Any]) -> Any:
+    if key not in _registry_cache:
+        _registry_cache[key] = factory()
+    return _registry_cache[key]
+
+
 class InvocationContext:
     services: InvocationServices
     graph_execution_state_id: str
@@ -27,16 +53,14 @@ class BaseInvocationOutput(BaseModel):
     # All outputs must include a type name like this:
     # type: Literal['your_output_name']
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _invocation_output_classes.append(cls)
+        _registry_cache.clear()
+
     @classmethod
     def get_all_subclasses_tuple(cls):
-        subclasses = []
-        toprocess = [cls]
-        while len(toprocess) > 0:
-            next = toprocess.pop(0)
-            next_subclasses = next.__subclasses__()
-            subclasses.extend(next_subclasses)
-            toprocess.extend(next_subclasses)
-        return tuple(subclasses)
+        return _cached("outputs", lambda: tuple(_invocation_output_classes))
 
 
 class BaseInvocation(ABC, BaseModel):
@@ -47,34 +71,35 @@ class BaseInvocation(ABC, BaseModel):
     # All invocations must include a type name like this:
     # type: Literal['your_output_name']
 
+    # Whether the outputs of this invocation may be reused when it is invoked again with the
+    # same inputs. Only invocations that are deterministic and free of side effects opt in.
+    cacheable: ClassVar[bool] = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _invocation_classes.append(cls)
+        _registry_cache.clear()
+
     @classmethod
     def get_all_subclasses(cls):
-        subclasses = []
-        toprocess = [cls]
-        while len(toprocess) > 0:
-            next = toprocess.pop(0)
-            next_subclasses = next.__subclasses__()
-            subclasses.extend(next_subclasses)
-            toprocess.extend(next_subclasses)
-        return subclasses
+        return list(_invocation_classes)
 
     @classmethod
     def get_invocations(cls):
-        return tuple(BaseInvocation.get_all_subclasses())
+        return _cached("invocations", lambda: tuple(_invocation_classes))
 
     @classmethod
     def get_invocations_map(cls):
         # Get the type strings out of the literals and into a dictionary
-        return dict(
-            map(
-                lambda t: (get_args(get_type_hints(t)["type"])[0], t),
-                BaseInvocation.get_all_subclasses(),
-            )
-        )
+        return _cached("invocations_map", lambda: {t.get_type(): t for t in _invocation_classes})
+
+    @classmethod
+    def get_type(cls) -> str:
+        return _cached(("type", cls), lambda: get_args(get_type_hints(cls)["type"])[0])
 
     @classmethod
     def get_output_type(cls):
-        return signature(cls.invoke).return_annotation
+        return _cached(("output_type", cls), lambda: signature(cls.invoke).return_annotation)
 
     @abstractmethod
     def invoke(self, context: InvocationContext) -> BaseInvocationOutput:
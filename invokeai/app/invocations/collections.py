@@ -45,6 +45,7 @@ class RangeInvocation(BaseInvocation):
     """Creates a range of numbers from start to stop with step"""
 
     type: Literal["range"] = "range"
+    cacheable = True
 
     # Inputs
     start: int = Field(default=0, description="The start of the range")
@@ -70,6 +71,7 @@ class RangeOfSizeInvocation(BaseInvocation):
     """Creates a range from start to start + size with step"""
 
     type: Literal["range_of_size"] = "range_of_size"
+    cacheable = True
 
     # Inputs
     start: int = Field(default=0, description="The start of the range")
@@ -89,6 +91,7 @@ class RandomRangeInvocation(BaseInvocation):
     """Creates a collection of random numbers"""
 
     type: Literal["random_range"] = "random_range"
+    cacheable = True
 
     # Inputs
     low: int = Field(default=0, description="The inclusive low value")
@@ -1,5 +1,7 @@
-from typing import Literal, Optional, Union, List, Annotated
+from typing import Literal, Optional, Union, List, Annotated, Dict, Tuple, cast
 from pydantic import BaseModel, Field
+import hashlib
+import json
 import re
 import torch
 from compel import Compel, ReturnedEmbeddingsType
@@ -46,6 +48,92 @@ class ConditioningFieldData:
     # unconditioned: Optional[torch.Tensor]
 
 
+# bump when the layout of the stored conditioning data changes
+CONDITIONING_CACHE_VERSION = 2
+
+TI_TRIGGER_PATTERN = r"<[a-zA-Z0-9., _-]+>"
+
+
+@dataclass
+class ConditioningCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+conditioning_cache_stats = ConditioningCacheStats()
+
+
+def get_clip_model_hashes(context: InvocationContext, clip: ClipField, prompt: str) -> Optional[Dict[str, str]]:
+    """
+    Content hashes of the models a prompt is encoded with: the tokenizer, the text encoder,
+    the LoRAs and the textual inversions that the prompt's triggers resolve to. Triggers that
+    don't resolve are left out, they stay plain text. Returns None while any of the hashes
+    is still being computed.
+    """
+    model_manager = context.services.model_manager
+    hashes: Dict[str, Optional[str]] = {
+        "tokenizer": model_manager.get_model_hash(**clip.tokenizer.dict()),
+        "text_encoder": model_manager.get_model_hash(**clip.text_encoder.dict()),
+    }
+    for lora in clip.loras:
+        hashes[f"lora:{lora.model_name}"] = model_manager.get_model_hash(**lora.dict(exclude={"weight"}))
+    for trigger in re.findall(TI_TRIGGER_PATTERN, prompt):
+        name = trigger[1:-1]
+        try:
+            hashes[f"ti:{name}"] = model_manager.get_model_hash(
+                model_name=name,
+                base_model=clip.text_encoder.base_model,
+                model_type=ModelType.TextualInversion,
+            )
+        except ModelNotFoundException:
+            continue
+
+    if None in hashes.values():
+        return None
+    return cast(Dict[str, str], hashes)
+
+
+def get_conditioning_cache_name(
+    context: InvocationContext, invocation: BaseInvocation, prompts: List[Tuple[ClipField, str]]
+) -> str:
+    """
+    Content address of the conditioning produced by a prompt invocation. The invocation's
+    fields cover the prompt text, the models by name, the LoRA weights and the number of
+    skipped clip layers. The content hashes of the models and of the textual inversions the
+    prompts resolve to are added, so that installing or replacing any of them changes the
+    address. Identical prompts share one entry across sessions.
+
+    Until all of the hashes are known, the conditioning is stored for this session only.
+    :param prompts: the clip models and the prompts they encode
+    """
+    model_hashes = [get_clip_model_hashes(context, clip, prompt) for clip, prompt in prompts]
+    if None in model_hashes:
+        return f"{context.graph_execution_state_id}_{invocation.id}_conditioning"
+
+    fields = invocation.json(exclude={"id", "is_intermediate"}, sort_keys=True)
+    key = json.dumps({"fields": fields, "models": model_hashes}, sort_keys=True)
+    digest = hashlib.sha256(f"{CONDITIONING_CACHE_VERSION}:{key}".encode("utf-8")).hexdigest()
+    return f"conditioning_{digest}"
+
+
+def is_conditioning_cached(context: InvocationContext, conditioning_name: str) -> bool:
+    cached = context.services.latents.exists(conditioning_name)
+    if cached:
+        conditioning_cache_stats.hits += 1
+    else:
+        conditioning_cache_stats.misses += 1
+    context.services.logger.debug(
+        f"Conditioning cache {'hit' if cached else 'miss'} for {conditioning_name} "
+        f"(hit rate {conditioning_cache_stats.hit_rate:.0%})"
+    )
+    return cached
+
+
 # class ConditioningAlgo(str, Enum):
 #    Compose = "compose"
 #    ComposeEx = "compose_ex"
@@ -66,6 +154,7 @@ class CompelInvocation(BaseInvocation):
     """Parse prompt using compel package to conditioning."""
 
     type: Literal["compel"] = "compel"
+    cacheable = True
 
     prompt: str = Field(default="", description="Prompt")
     clip: ClipField = Field(None, description="Clip to use")
@@ -78,6 +167,10 @@ class CompelInvocation(BaseInvocation):
 
     @torch.no_grad()
     def invoke(self, context: InvocationContext) -> CompelOutput:
+        conditioning_name = get_conditioning_cache_name(context, self, [(self.clip, self.prompt)])
+        if is_conditioning_cached(context, conditioning_name):
+            return CompelOutput(conditioning=ConditioningField(conditioning_name=conditioning_name))
+
         tokenizer_info = context.services.model_manager.get_model(
             **self.clip.tokenizer.dict(),
             context=context,
@@ -97,7 +190,7 @@ class CompelInvocation(BaseInvocation):
         # loras = [(context.services.model_manager.get_model(**lora.dict(exclude={"weight"})).context.model, lora.weight) for lora in self.clip.loras]
 
         ti_list = []
-        for trigger in re.findall(r"<[a-zA-Z0-9., _-]+>", self.prompt):
+        for trigger in re.findall(TI_TRIGGER_PATTERN, self.prompt):
             name = trigger[1:-1]
             try:
                 ti_list.append(
@@ -154,7 +247,6 @@ class CompelInvocation(BaseInvocation):
             ]
         )
 
-        conditioning_name = f"{context.graph_execution_state_id}_{self.id}_conditioning"
         context.services.latents.save(conditioning_name, conditioning_data)
 
         return CompelOutput(
@@ -185,7 +277,7 @@ class SDXLPromptInvocationBase:
         # loras = [(context.services.model_manager.get_model(**lora.dict(exclude={"weight"})).context.model, lora.weight) for lora in self.clip.loras]
 
         ti_list = []
-        for trigger in re.findall(r"<[a-zA-Z0-9., _-]+>", prompt):
+        for trigger in re.findall(TI_TRIGGER_PATTERN, prompt):
             name = trigger[1:-1]
             try:
                 ti_list.append(
@@ -259,7 +351,7 @@ class SDXLPromptInvocationBase:
         # loras = [(context.services.model_manager.get_model(**lora.dict(exclude={"weight"})).context.model, lora.weight) for lora in self.clip.loras]
 
         ti_list = []
-        for trigger in re.findall(r"<[a-zA-Z0-9., _-]+>", prompt):
+        for trigger in re.findall(TI_TRIGGER_PATTERN, prompt):
             name = trigger[1:-1]
             try:
                 ti_list.append(
@@ -329,6 +421,7 @@ class SDXLCompelPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
     """Parse prompt using compel package to conditioning."""
 
     type: Literal["sdxl_compel_prompt"] = "sdxl_compel_prompt"
+    cacheable = True
 
     prompt: str = Field(default="", description="Prompt")
     style: str = Field(default="", description="Style prompt")
@@ -349,6 +442,12 @@ class SDXLCompelPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
 
     @torch.no_grad()
     def invoke(self, context: InvocationContext) -> CompelOutput:
+        conditioning_name = get_conditioning_cache_name(
+            context, self, [(self.clip, self.prompt), (self.clip2, self.style if self.style.strip() else self.prompt)]
+        )
+        if is_conditioning_cached(context, conditioning_name):
+            return CompelOutput(conditioning=ConditioningField(conditioning_name=conditioning_name))
+
         c1, c1_pooled, ec1 = self.run_clip_compel(context, self.clip, self.prompt, False)
         if self.style.strip() == "":
             c2, c2_pooled, ec2 = self.run_clip_compel(context, self.clip2, self.prompt, True)
@@ -372,7 +471,6 @@ class SDXLCompelPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
             ]
         )
 
-        conditioning_name = f"{context.graph_execution_state_id}_{self.id}_conditioning"
         context.services.latents.save(conditioning_name, conditioning_data)
 
         return CompelOutput(
@@ -386,6 +484,7 @@ class SDXLRefinerCompelPromptInvocation(BaseInvocation, SDXLPromptInvocationBase
     """Parse prompt using compel package to conditioning."""
 
     type: Literal["sdxl_refiner_compel_prompt"] = "sdxl_refiner_compel_prompt"
+    cacheable = True
 
     style: str = Field(default="", description="Style prompt")  # TODO: ?
     original_width: int = Field(1024, description="")
@@ -407,6 +506,10 @@ class SDXLRefinerCompelPromptInvocation(BaseInvocation, SDXLPromptInvocationBase
 
     @torch.no_grad()
     def invoke(self, context: InvocationContext) -> CompelOutput:
+        conditioning_name = get_conditioning_cache_name(context, self, [(self.clip2, self.style)])
+        if is_conditioning_cached(context, conditioning_name):
+            return CompelOutput(conditioning=ConditioningField(conditioning_name=conditioning_name))
+
         c2, c2_pooled, ec2 = self.run_clip_compel(context, self.clip2, self.style, True)
 
         original_size = (self.original_height, self.original_width)
@@ -425,7 +528,6 @@ class SDXLRefinerCompelPromptInvocation(BaseInvocation, SDXLPromptInvocationBase
             ]
         )
 
-        conditioning_name = f"{context.graph_execution_state_id}_{self.id}_conditioning"
         context.services.latents.save(conditioning_name, conditioning_data)
 
         return CompelOutput(
@@ -439,6 +541,7 @@ class SDXLRawPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
     """Pass unmodified prompt to conditioning without compel processing."""
 
     type: Literal["sdxl_raw_prompt"] = "sdxl_raw_prompt"
+    cacheable = True
 
     prompt: str = Field(default="", description="Prompt")
     style: str = Field(default="", description="Style prompt")
@@ -459,6 +562,12 @@ class SDXLRawPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
 
     @torch.no_grad()
     def invoke(self, context: InvocationContext) -> CompelOutput:
+        conditioning_name = get_conditioning_cache_name(
+            context, self, [(self.clip, self.prompt), (self.clip2, self.style if self.style.strip() else self.prompt)]
+        )
+        if is_conditioning_cached(context, conditioning_name):
+            return CompelOutput(conditioning=ConditioningField(conditioning_name=conditioning_name))
+
         c1, c1_pooled, ec1 = self.run_clip_raw(context, self.clip, self.prompt, False)
         if self.style.strip() == "":
             c2, c2_pooled, ec2 = self.run_clip_raw(context, self.clip2, self.prompt, True)
@@ -482,7 +591,6 @@ class SDXLRawPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
             ]
         )
 
-        conditioning_name = f"{context.graph_execution_state_id}_{self.id}_conditioning"
         context.services.latents.save(conditioning_name, conditioning_data)
 
         return CompelOutput(
@@ -496,6 +604,7 @@ class SDXLRefinerRawPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
     """Parse prompt using compel package to conditioning."""
 
     type: Literal["sdxl_refiner_raw_prompt"] = "sdxl_refiner_raw_prompt"
+    cacheable = True
 
     style: str = Field(default="", description="Style prompt")  # TODO: ?
     original_width: int = Field(1024, description="")
@@ -517,6 +626,10 @@ class SDXLRefinerRawPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
 
     @torch.no_grad()
     def invoke(self, context: InvocationContext) -> CompelOutput:
+        conditioning_name = get_conditioning_cache_name(context, self, [(self.clip2, self.style)])
+        if is_conditioning_cached(context, conditioning_name):
+            return CompelOutput(conditioning=ConditioningField(conditioning_name=conditioning_name))
+
         c2, c2_pooled, ec2 = self.run_clip_raw(context, self.clip2, self.style, True)
 
         original_size = (self.original_height, self.original_width)
@@ -535,7 +648,6 @@ class SDXLRefinerRawPromptInvocation(BaseInvocation, SDXLPromptInvocationBase):
             ]
         )
 
-        conditioning_name = f"{context.graph_execution_state_id}_{self.id}_conditioning"
         context.services.latents.save(conditioning_name, conditioning_data)
 
         return CompelOutput(
@@ -556,6 +668,7 @@ class ClipSkipInvocation(BaseInvocation):
     """Skip layers in clip text_encoder model."""
 
     type: Literal["clip_skip"] = "clip_skip"
+    cacheable = True
 
     clip: ClipField = Field(None, description="Clip to use")
     skipped_layers: int = Field(0, description="Number of layers to skip in text_encoder")
@@ -2,33 +2,17 @@
 # initial implementation by Gregg Helt, 2023
 # heavily leverages controlnet_aux package: https://github.com/patrickvonplaten/controlnet_aux
 from builtins import bool, float
+from functools import lru_cache
 from typing import Dict, List, Literal, Optional, Union
 
-import cv2
 import numpy as np
-from controlnet_aux import (
-    CannyDetector,
-    ContentShuffleDetector,
-    HEDdetector,
-    LeresDetector,
-    LineartAnimeDetector,
-    LineartDetector,
-    MediapipeFaceDetector,
-    MidasDetector,
-    MLSDdetector,
-    NormalBaeDetector,
-    OpenposeDetector,
-    PidiNetDetector,
-    SamDetector,
-    ZoeDetector,
-)
-from controlnet_aux.util import HWC3, ade_palette
 from PIL import Image
 from pydantic import BaseModel, Field, validator
 
 from ...backend.model_management import BaseModelType, ModelType
 from ..models.image import ImageCategory, ImageField, ResourceOrigin
 from .baseinvocation import BaseInvocation, BaseInvocationOutput, InvocationConfig, InvocationContext
+from .model import ModelInfo
 from ..models.image import ImageOutput, PILInvocationConfig
 
 CONTROLNET_DEFAULT_MODELS = [
@@ -162,6 +146,7 @@ class ControlNetInvocation(BaseInvocation):
 
     # fmt: off
     type: Literal["controlnet"] = "controlnet"
+    cacheable = True
     # Inputs
     image: ImageField = Field(default=None, description="The control image")
     control_model: ControlNetModelField = Field(default="lllyasviel/sd-controlnet-canny",
@@ -190,6 +175,18 @@ class ControlNetInvocation(BaseInvocation):
             },
         }
 
+    def get_required_models(self) -> List[ModelInfo]:
+        # the default is a bare repo id, which isn't a configured model
+        if not isinstance(self.control_model, ControlNetModelField):
+            return []
+        return [
+            ModelInfo(
+                model_name=self.control_model.model_name,
+                base_model=self.control_model.base_model,
+                model_type=ModelType.ControlNet,
+            )
+        ]
+
     def invoke(self, context: InvocationContext) -> ControlOutput:
         return ControlOutput(
             control=ControlField(
@@ -209,6 +206,7 @@ class ImageProcessorInvocation(BaseInvocation, PILInvocationConfig):
 
     # fmt: off
     type: Literal["image_processor"] = "image_processor"
+    cacheable = True
     # Inputs
     image: ImageField = Field(default=None, description="The image to process")
     # fmt: on
@@ -271,6 +269,8 @@ class CannyImageProcessorInvocation(ImageProcessorInvocation, PILInvocationConfi
         }
 
     def run_processor(self, image):
+        from controlnet_aux import CannyDetector
+
         canny_processor = CannyDetector()
         processed_image = canny_processor(image, self.low_threshold, self.high_threshold)
         return processed_image
@@ -295,6 +295,8 @@ class HedImageProcessorInvocation(ImageProcessorInvocation, PILInvocationConfig)
         }
 
     def run_processor(self, image):
+        from controlnet_aux import HEDdetector
+
         hed_processor = HEDdetector.from_pretrained("lllyasviel/Annotators")
         processed_image = hed_processor(
             image,
@@ -324,6 +326,8 @@ class LineartImageProcessorInvocation(ImageProcessorInvocation, PILInvocationCon
         }
 
     def run_processor(self, image):
+        from controlnet_aux import LineartDetector
+
         lineart_processor = LineartDetector.from_pretrained("lllyasviel/Annotators")
         processed_image = lineart_processor(
             image, detect_resolution=self.detect_resolution, image_resolution=self.image_resolution, coarse=self.coarse
@@ -350,6 +354,8 @@ class LineartAnimeImageProcessorInvocation(ImageProcessorInvocation, PILInvocati
         }
 
     def run_processor(self, image):
+        from controlnet_aux import LineartAnimeDetector
+
         processor = LineartAnimeDetector.from_pretrained("lllyasviel/Annotators")
         processed_image = processor(
             image,
@@ -376,6 +382,8 @@ class OpenposeImageProcessorInvocation(ImageProcessorInvocation, PILInvocationCo
         }
 
     def run_processor(self, image):
+        from controlnet_aux import OpenposeDetector
+
         openpose_processor = OpenposeDetector.from_pretrained("lllyasviel/Annotators")
         processed_image = openpose_processor(
             image,
@@ -404,6 +412,8 @@ class MidasDepthImageProcessorInvocation(ImageProcessorInvocation, PILInvocation
         }
 
     def run_processor(self, image):
+        from controlnet_aux import MidasDetector
+
         midas_processor = MidasDetector.from_pretrained("lllyasviel/Annotators")
         processed_image = midas_processor(
             image,
@@ -431,6 +441,8 @@ class NormalbaeImageProcessorInvocation(ImageProcessorInvocation, PILInvocationC
         }
 
     def run_processor(self, image):
+        from controlnet_aux import NormalBaeDetector
+
         normalbae_processor = NormalBaeDetector.from_pretrained("lllyasviel/Annotators")
         processed_image = normalbae_processor(
             image, detect_resolution=self.detect_resolution, image_resolution=self.image_resolution
@@ -456,6 +468,8 @@ class MlsdImageProcessorInvocation(ImageProcessorInvocation, PILInvocationConfig
         }
 
     def run_processor(self, image):
+        from controlnet_aux import MLSDdetector
+
         mlsd_processor = MLSDdetector.from_pretrained("lllyasviel/Annotators")
         processed_image = mlsd_processor(
             image,
@@ -485,6 +499,8 @@ class PidiImageProcessorInvocation(ImageProcessorInvocation, PILInvocationConfig
         }
 
     def run_processor(self, image):
+        from controlnet_aux import PidiNetDetector
+
         pidi_processor = PidiNetDetector.from_pretrained("lllyasviel/Annotators")
         processed_image = pidi_processor(
             image,
@@ -518,6 +534,8 @@ class ContentShuffleImageProcessorInvocation(ImageProcessorInvocation, PILInvoca
         }
 
     def run_processor(self, image):
+        from controlnet_aux import ContentShuffleDetector
+
         content_shuffle_processor = ContentShuffleDetector()
         processed_image = content_shuffle_processor(
             image,
@@ -544,6 +562,8 @@ class ZoeDepthImageProcessorInvocation(ImageProcessorInvocation, PILInvocationCo
         }
 
     def run_processor(self, image):
+        from controlnet_aux import ZoeDetector
+
         zoe_depth_processor = ZoeDetector.from_pretrained("lllyasviel/Annotators")
         processed_image = zoe_depth_processor(image)
         return processed_image
@@ -565,6 +585,8 @@ class MediapipeFaceProcessorInvocation(ImageProcessorInvocation, PILInvocationCo
         }
 
     def run_processor(self, image):
+        from controlnet_aux import MediapipeFaceDetector
+
         # MediaPipeFaceDetector throws an error if image has alpha channel
         #     so convert to RGB if needed
         if image.mode == "RGBA":
@@ -593,6 +615,8 @@ class LeresImageProcessorInvocation(ImageProcessorInvocation, PILInvocationConfi
         }
 
     def run_processor(self, image):
+        from controlnet_aux import LeresDetector
+
         leres_processor = LeresDetector.from_pretrained("lllyasviel/Annotators")
         processed_image = leres_processor(
             image,
@@ -628,6 +652,9 @@ class TileResamplerProcessorInvocation(ImageProcessorInvocation, PILInvocationCo
         res=512,  # never used?
         down_sampling_rate=1.0,
     ):
+        import cv2
+        from controlnet_aux.util import HWC3
+
         np_img = HWC3(np_img)
         if down_sampling_rate < 1.1:
             return np_img
@@ -665,7 +692,7 @@ class SegmentAnythingProcessorInvocation(ImageProcessorInvocation, PILInvocation
 
     def run_processor(self, image):
         # segment_anything_processor = SamDetector.from_pretrained("ybelkada/segment-anything", subfolder="checkpoints")
-        segment_anything_processor = SamDetectorReproducibleColors.from_pretrained(
+        segment_anything_processor = get_sam_detector_reproducible_colors().from_pretrained(
             "ybelkada/segment-anything", subfolder="checkpoints"
         )
         np_img = np.array(image, dtype=np.uint8)
@@ -673,23 +700,31 @@ class SegmentAnythingProcessorInvocation(ImageProcessorInvocation, PILInvocation
         return processed_image
 
 
-class SamDetectorReproducibleColors(SamDetector):
-    # overriding SamDetector.show_anns() method to use reproducible colors for segmentation image
-    #     base class show_anns() method randomizes colors,
-    #     which seems to also lead to non-reproducible image generation
-    # so using ADE20k color palette instead
-    def show_anns(self, anns: List[Dict]):
-        if len(anns) == 0:
-            return
-        sorted_anns = sorted(anns, key=(lambda x: x["area"]), reverse=True)
-        h, w = anns[0]["segmentation"].shape
-        final_img = Image.fromarray(np.zeros((h, w, 3), dtype=np.uint8), mode="RGB")
-        palette = ade_palette()
-        for i, ann in enumerate(sorted_anns):
-            m = ann["segmentation"]
-            img = np.empty((m.shape[0], m.shape[1], 3), dtype=np.uint8)
-            # doing modulo just in case number of annotated regions exceeds number of colors in palette
-            ann_color = palette[i % len(palette)]
-            img[:, :] = ann_color
-            final_img.paste(Image.fromarray(img, mode="RGB"), (0, 0), Image.fromarray(np.uint8(m * 255)))
-        return np.array(final_img, dtype=np.uint8)
+@lru_cache(maxsize=None)
+def get_sam_detector_reproducible_colors():
+    # controlnet_aux is only imported once a processor actually runs
+    from controlnet_aux import SamDetector
+    from controlnet_aux.util import ade_palette
+
+    class SamDetectorReproducibleColors(SamDetector):
+        # overriding SamDetector.show_anns() method to use reproducible colors for segmentation image
+        #     base class show_anns() method randomizes colors,
+        #     which seems to also lead to non-reproducible image generation
+        # so using ADE20k color palette instead
+        def show_anns(self, anns: List[Dict]):
+            if len(anns) == 0:
+                return
+            sorted_anns = sorted(anns, key=(lambda x: x["area"]), reverse=True)
+            h, w = anns[0]["segmentation"].shape
+            final_img = Image.fromarray(np.zeros((h, w, 3), dtype=np.uint8), mode="RGB")
+            palette = ade_palette()
+            for i, ann in enumerate(sorted_anns):
+                m = ann["segmentation"]
+                img = np.empty((m.shape[0], m.shape[1], 3), dtype=np.uint8)
+                # doing modulo just in case number of annotated regions exceeds number of colors in palette
+                ann_color = palette[i % len(palette)]
+                img[:, :] = ann_color
+                final_img.paste(Image.fromarray(img, mode="RGB"), (0, 0), Image.fromarray(np.uint8(m * 255)))
+            return np.array(final_img, dtype=np.uint8)
+
+    return SamDetectorReproducibleColors
@@ -2,7 +2,6 @@
 
 from typing import Literal
 
-import cv2 as cv
 import numpy
 from PIL import Image, ImageOps
 from pydantic import BaseModel, Field
@@ -44,6 +43,8 @@ class CvInpaintInvocation(BaseInvocation, CvInvocationConfig):
         image = context.services.images.get_pil_image(self.image.image_name)
         mask = context.services.images.get_pil_image(self.mask.image_name)
 
+        import cv2 as cv
+
         # Convert to cv image/mask
         # TODO: consider making these utility functions
         cv_image = cv.cvtColor(numpy.array(image.convert("RGB")), cv.COLOR_RGB2BGR)
@@ -1,14 +1,16 @@
 # Copyright (c) 2023 Kyle Schouviller (https://github.com/kyle0654)
 
+import dataclasses
 from contextlib import ExitStack
-from typing import List, Literal, Optional, Union
+from typing import Dict, Hashable, List, Literal, Optional, Tuple, Union
 
 import einops
+import PIL.Image
 import torch
 from diffusers import ControlNetModel
 from diffusers.image_processor import VaeImageProcessor
 from diffusers.schedulers import SchedulerMixin as Scheduler
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, root_validator, validator
 
 from invokeai.app.invocations.metadata import CoreMetadata
 from invokeai.app.util.step_callback import stable_diffusion_step_callback
@@ -21,10 +23,13 @@ from ...backend.stable_diffusion.diffusers_pipeline import (
     ControlNetData,
     StableDiffusionGeneratorPipeline,
     image_resized_to_grid_as_tensor,
+    trim_to_multiple_of,
 )
 from ...backend.stable_diffusion.diffusion.shared_invokeai_diffusion import PostprocessingSettings
-from ...backend.stable_diffusion.schedulers import SCHEDULER_MAP
+from ...backend.stable_diffusion.schedulers import SCHEDULER_MAP, SchedulerCache
+from ...backend.stable_diffusion.tiled_vae import tiled_decode, tiled_encode
 from ...backend.util.devices import choose_torch_device, torch_dtype, choose_precision
+from ..models.exceptions import CanceledException
 from ..models.image import ImageCategory, ImageField, ResourceOrigin
 from .baseinvocation import BaseInvocation, BaseInvocationOutput, InvocationConfig, InvocationContext
 from .compel import ConditioningField
@@ -44,13 +49,29 @@ from diffusers.models.attention_processor import (
 DEFAULT_PRECISION = choose_precision(choose_torch_device())
 
 
+class NoiseDescriptor(BaseModel):
+    """Seeded noise, generated where it is used rather than stored"""
+
+    seed: int = Field(description="The seed of the noise")
+    channels: int = Field(default=4, description="The number of channels of the noise")
+    height: int = Field(description="The height of the noise in latent pixels")
+    width: int = Field(description="The width of the noise in latent pixels")
+    dtype: Literal["float16", "bfloat16", "float32"] = Field(default="float32", description="The dtype of the noise")
+    use_cpu: bool = Field(default=True, description="Generate the noise with the CPU generator of torch")
+
+
 class LatentsField(BaseModel):
-    """A latents field used for passing latents between invocations"""
+    """A latents field used for passing latents between invocations. It either names latents in the latents
+    storage or describes noise, which is not stored but generated where it is used; see get_latents()."""
 
-    latents_name: Optional[str] = Field(default=None, description="The name of the latents")
+    latents_name: Optional[str] = Field(default=None, description="The name of the latents, if they are stored")
+    noise: Optional[NoiseDescriptor] = Field(default=None, description="The noise these latents are, if they are noise")
 
-    class Config:
-        schema_extra = {"required": ["latents_name"]}
+    @root_validator
+    def check_latents_name_or_noise(cls, values):
+        if (values.get("latents_name") is None) == (values.get("noise") is None):
+            raise ValueError("Latents need either a latents_name or a noise descriptor")
+        return values
 
 
 class LatentsOutput(BaseInvocationOutput):
@@ -63,32 +84,134 @@ class LatentsOutput(BaseInvocationOutput):
     latents: LatentsField          = Field(default=None, description="The output latents")
     width:                     int = Field(description="The width of the latents in pixels")
     height:                    int = Field(description="The height of the latents in pixels")
+    latents_collection: List[LatentsField] = Field(default_factory=list, description="All output latents, one per noise when a batch was denoised")
     # fmt: on
 
 
-def build_latents_output(latents_name: str, latents: torch.Tensor):
+def build_latents_output(latents_name: str, latents: torch.Tensor, latents_collection: Optional[List[str]] = None):
     return LatentsOutput(
         latents=LatentsField(latents_name=latents_name),
         width=latents.size()[3] * 8,
         height=latents.size()[2] * 8,
+        latents_collection=[LatentsField(latents_name=name) for name in latents_collection or []],
     )
 
 
+def get_latents(context: InvocationContext, field: LatentsField) -> torch.Tensor:
+    """Loads the latents of a field. Noise described by the field is generated, on the torch device."""
+    if field.noise is not None:
+        from .noise import get_noise_from_descriptor
+
+        return get_noise_from_descriptor(field.noise, choose_torch_device())
+    return context.services.latents.get(field.latents_name)
+
+
+def _get_noise_fields(noise: Union[LatentsField, List[LatentsField], None]) -> List[LatentsField]:
+    return noise if isinstance(noise, list) else [] if noise is None else [noise]
+
+
+def get_noise_size(
+    context: InvocationContext, noise: Union[LatentsField, List[LatentsField], None]
+) -> Tuple[int, int, int]:
+    """The channels, height and width of the first noise input, without generating it."""
+    fields = _get_noise_fields(noise)
+    if len(fields) == 0:
+        raise ValueError("Noise or latents are required to generate noise from seeds")
+    if fields[0].noise is not None:
+        return fields[0].noise.channels, fields[0].noise.height, fields[0].noise.width
+    _, channels, height, width = context.services.latents.get(fields[0].latents_name).shape
+    return channels, height, width
+
+
+def get_noise_batch(
+    context: InvocationContext,
+    noise: Union[LatentsField, List[LatentsField], None],
+    seeds: Optional[List[int]] = None,
+    like: Optional[torch.Tensor] = None,
+) -> torch.Tensor:
+    """Stacks the noise for a batch of variations into a single tensor, on the torch device.
+
+    If seeds are given, noise is generated from each of them instead, at the size of `like`
+    or of the first noise input.
+    """
+    from .noise import get_seeded_noise
+
+    fields = _get_noise_fields(noise)
+    device = choose_torch_device()
+
+    if seeds:
+        if like is not None:
+            _, channels, height, width = like.shape
+        else:
+            channels, height, width = get_noise_size(context, noise)
+        # the noise is generated like the noise it replaces, so a seed gives the same noise as on its own
+        descriptor = fields[0].noise if len(fields) > 0 else None
+        if descriptor is not None:
+            return get_seeded_noise(
+                seeds,
+                channels,
+                height,
+                width,
+                device=device,
+                dtype=getattr(torch, descriptor.dtype),
+                use_cpu=descriptor.use_cpu,
+            )
+        return get_seeded_noise(seeds, channels, height, width, device=device, dtype=torch_dtype(device))
+
+    if len(fields) == 0:
+        raise ValueError("No noise provided")
+    return torch.cat([get_latents(context, field).to(device) for field in fields])
+
+
+def save_latents_batch(context: InvocationContext, node_id: str, latents: torch.Tensor) -> LatentsOutput:
+    """Saves each item of a batch of latents separately. The first one is also the node's `latents` output."""
+    name = f"{context.graph_execution_state_id}__{node_id}"
+    if latents.shape[0] == 1:
+        context.services.latents.save(name, latents)
+        return build_latents_output(latents_name=name, latents=latents, latents_collection=[name])
+
+    names = list()
+    for i, item in enumerate(latents.split(1)):
+        item_name = name if i == 0 else f"{name}__{i}"
+        # clone, so that saving a slice does not write the storage of the whole batch
+        context.services.latents.save(item_name, item.clone())
+        names.append(item_name)
+    return build_latents_output(latents_name=names[0], latents=latents, latents_collection=names)
+
+
 SAMPLER_NAME_VALUES = Literal[tuple(list(SCHEDULER_MAP.keys()))]
 
+scheduler_cache = SchedulerCache()
+# the scheduler configs of the models, by scheduler submodel and its content hash, so that a model
+# replaced under the same name gets its own config
+scheduler_configs: Dict[Tuple, dict] = dict()
+
 
 def get_scheduler(
     context: InvocationContext,
     scheduler_info: ModelInfo,
     scheduler_name: str,
+    steps: Optional[int] = None,
+    device: Optional[torch.device] = None,
 ) -> Scheduler:
+    """
+    Returns a new scheduler for the model. If steps are given, its timesteps are already set for
+    that many steps on the device (on the CPU for CPU-only schedulers).
+    """
     scheduler_class, scheduler_extra_config = SCHEDULER_MAP.get(scheduler_name, SCHEDULER_MAP["ddim"])
-    orig_scheduler_info = context.services.model_manager.get_model(
-        **scheduler_info.dict(),
-        context=context,
-    )
-    with orig_scheduler_info as orig_scheduler:
-        scheduler_config = orig_scheduler.config
+    model_hash = context.services.model_manager.get_model_hash(**scheduler_info.dict())
+    config_key = (*scheduler_info.dict().values(), model_hash)
+    scheduler_config = scheduler_configs.get(config_key)
+    if scheduler_config is None:
+        orig_scheduler_info = context.services.model_manager.get_model(
+            **scheduler_info.dict(),
+            context=context,
+        )
+        with orig_scheduler_info as orig_scheduler:
+            scheduler_config = dict(orig_scheduler.config)
+        # the hash is unknown while it is still being computed, the config is only cached once it is
+        if model_hash is not None:
+            scheduler_configs[config_key] = scheduler_config
 
     if "_backup" in scheduler_config:
         scheduler_config = scheduler_config["_backup"]
@@ -97,7 +220,9 @@ def get_scheduler(
         **scheduler_extra_config,
         "_backup": scheduler_config,
     }
-    scheduler = scheduler_class.from_config(scheduler_config)
+    if steps is not None and scheduler_config.get("cpu_only", False):
+        device = torch.device("cpu")
+    scheduler = scheduler_cache.get(scheduler_class, scheduler_config, steps=steps, device=device)
 
     # hack copied over from generate.py
     if not hasattr(scheduler, "uses_inpainting_model"):
@@ -115,7 +240,8 @@ class TextToLatentsInvocation(BaseInvocation):
     # fmt: off
     positive_conditioning: Optional[ConditioningField] = Field(description="Positive conditioning for generation")
     negative_conditioning: Optional[ConditioningField] = Field(description="Negative conditioning for generation")
-    noise: Optional[LatentsField] = Field(description="The noise to use")
+    noise: Union[LatentsField, list[LatentsField]] = Field(default=None, description="The noise to use, a collection of noise denoises a batch of variations")
+    seeds: Optional[list[int]] = Field(default=None, description="Seeds to generate the noise from instead, one variation per seed")
     steps:       int = Field(default=10, gt=0, description="The number of steps to use to generate the image")
     cfg_scale: Union[float, List[float]] = Field(default=7.5, ge=1, description="The Classifier-Free Guidance, higher values may result in a result closer to the prompt", )
     scheduler: SAMPLER_NAME_VALUES = Field(default="euler", description="The scheduler to use" )
@@ -309,10 +435,154 @@ class TextToLatentsInvocation(BaseInvocation):
                 # MultiControlNetModel has been refactored out, just need list[ControlNetData]
         return control_data
 
+    def get_coalesce_key(self, context: InvocationContext) -> Optional[Hashable]:
+        """Invocations with equal keys can be denoised together in one batch by `invoke_coalesced`.
+        Returns None if this invocation must run on its own."""
+        if self.control is not None or isinstance(self.cfg_scale, list):
+            return None
+
+        positive_cond_data = context.services.latents.get(self.positive_conditioning.conditioning_name)
+        negative_cond_data = context.services.latents.get(self.negative_conditioning.conditioning_name)
+        extra_conditioning_info = positive_cond_data.conditionings[0].extra_conditioning
+        if extra_conditioning_info is not None and extra_conditioning_info.wants_cross_attention_control:
+            return None
+
+        return (
+            self.type,
+            self.unet.json(sort_keys=True),
+            self.scheduler,
+            self.steps,
+            get_noise_size(context, self.noise),
+            tuple(positive_cond_data.conditionings[0].embeds.shape[1:]),
+            tuple(negative_cond_data.conditionings[0].embeds.shape[1:]),
+        )
+
+    @classmethod
+    @torch.no_grad()
+    def invoke_coalesced(
+        cls, requests: List[Tuple["TextToLatentsInvocation", InvocationContext]]
+    ) -> List[LatentsOutput]:
+        """Denoises the noise of several invocations with equal coalesce keys in shared batches.
+        Each invocation gets its own slice of the results and of the progress events."""
+        first, first_context = requests[0]
+        with SilenceWarnings():
+            noises = [get_noise_batch(context, invocation.noise, invocation.seeds) for invocation, context in requests]
+            counts = [noise.shape[0] for noise in noises]
+            offsets = [sum(counts[:i]) for i in range(len(counts))]
+
+            source_node_ids = list()
+            for invocation, context in requests:
+                graph_execution_state = context.services.graph_execution_manager.get(context.graph_execution_state_id)
+                source_node_ids.append(graph_execution_state.prepared_source_mapping[invocation.id])
+
+            def _lora_loader():
+                for lora in first.unet.loras:
+                    lora_info = first_context.services.model_manager.get_model(
+                        **lora.dict(exclude={"weight"}),
+                        context=first_context,
+                    )
+                    yield (lora_info.context.model, lora.weight)
+                    del lora_info
+                return
+
+            unet_info = first_context.services.model_manager.get_model(
+                **first.unet.unet.dict(),
+                context=first_context,
+            )
+            with ModelPatcher.apply_lora_unet(unet_info.context.model, _lora_loader()), unet_info as unet:
+                noise = torch.cat(noises).to(device=unet.device, dtype=unet.dtype)
+
+                scheduler = get_scheduler(
+                    context=first_context,
+                    scheduler_info=first.unet.scheduler,
+                    scheduler_name=first.scheduler,
+                    steps=first.steps,
+                    device=unet.device,
+                )
+
+                pipeline = first.create_pipeline(unet, scheduler)
+
+                # one conditioning per noise, so that any slice of the batch lines up with its own prompts
+                all_conditioning_data = [
+                    invocation.get_conditioning_data(context, scheduler, unet) for invocation, context in requests
+                ]
+                text_embeddings = torch.cat(
+                    [c.text_embeddings.expand(n, -1, -1) for c, n in zip(all_conditioning_data, counts)]
+                )
+                unconditioned_embeddings = torch.cat(
+                    [c.unconditioned_embeddings.expand(n, -1, -1) for c, n in zip(all_conditioning_data, counts)]
+                )
+                guidance_scales = torch.tensor(
+                    [c.guidance_scale for c, n in zip(all_conditioning_data, counts) for _ in range(n)],
+                    device=unet.device,
+                    dtype=unet.dtype,
+                ).reshape(-1, 1, 1, 1)
+
+                results = list()
+                batch_size = first_context.services.configuration.denoise_batch_size
+                for start in range(0, noise.shape[0], batch_size):
+                    end = min(start + batch_size, noise.shape[0])
+                    noise_batch = noise[start:end]
+                    guidance_scale = guidance_scales[start:end]
+                    if bool((guidance_scale == guidance_scale[0]).all()):
+                        guidance_scale = float(guidance_scale[0])
+                    conditioning_data = dataclasses.replace(
+                        all_conditioning_data[0],
+                        unconditioned_embeddings=unconditioned_embeddings[start:end],
+                        text_embeddings=text_embeddings[start:end],
+                        guidance_scale=guidance_scale,
+                        extra=None,
+                    )
+
+                    def step_callback(state: PipelineIntermediateState, start=start, end=end):
+                        dispatched = canceled = 0
+                        for (invocation, context), source_node_id, offset, count in zip(
+                            requests, source_node_ids, offsets, counts
+                        ):
+                            lo, hi = max(offset, start), min(offset + count, end)
+                            if lo >= hi:
+                                continue  # none of this request's noise is in the batch
+                            dispatched += 1
+                            try:
+                                invocation.dispatch_progress(
+                                    context,
+                                    source_node_id,
+                                    dataclasses.replace(
+                                        state,
+                                        latents=state.latents[lo - start : hi - start],
+                                        predicted_original=None
+                                        if state.predicted_original is None
+                                        else state.predicted_original[lo - start : hi - start],
+                                    ),
+                                )
+                            except CanceledException:
+                                canceled += 1
+                        # keep going as long as any session still wants its results
+                        if canceled == dispatched:
+                            raise CanceledException
+
+                    result_latents, result_attention_map_saver = pipeline.latents_from_embeddings(
+                        latents=torch.zeros_like(noise_batch, dtype=torch_dtype(unet.device)),
+                        noise=noise_batch,
+                        num_inference_steps=first.steps,
+                        conditioning_data=conditioning_data,
+                        control_data=None,
+                        callback=step_callback,
+                    )
+                    results.append(result_latents.to("cpu"))
+
+            result_latents = torch.cat(results)
+            torch.cuda.empty_cache()
+
+            return [
+                save_latents_batch(context, invocation.id, latents)
+                for (invocation, context), latents in zip(requests, result_latents.split(counts))
+            ]
+
     @torch.no_grad()
     def invoke(self, context: InvocationContext) -> LatentsOutput:
         with SilenceWarnings():
-            noise = context.services.latents.get(self.noise.latents_name)
+            noise = get_noise_batch(context, self.noise, self.seeds)
 
             # Get the source node id (we are invoking the prepared node)
             graph_execution_state = context.services.graph_execution_manager.get(context.graph_execution_state_id)
@@ -344,6 +614,8 @@ class TextToLatentsInvocation(BaseInvocation):
                     context=context,
                     scheduler_info=self.unet.scheduler,
                     scheduler_name=self.scheduler,
+                    steps=self.steps,
+                    device=unet.device,
                 )
 
                 pipeline = self.create_pipeline(unet, scheduler)
@@ -360,22 +632,23 @@ class TextToLatentsInvocation(BaseInvocation):
                 )
 
                 # TODO: Verify the noise is the right size
-                result_latents, result_attention_map_saver = pipeline.latents_from_embeddings(
-                    latents=torch.zeros_like(noise, dtype=torch_dtype(unet.device)),
-                    noise=noise,
-                    num_inference_steps=self.steps,
-                    conditioning_data=conditioning_data,
-                    control_data=control_data,  # list[ControlNetData]
-                    callback=step_callback,
-                )
+                results = list()
+                for noise_batch in noise.split(context.services.configuration.denoise_batch_size):
+                    result_latents, result_attention_map_saver = pipeline.latents_from_embeddings(
+                        latents=torch.zeros_like(noise_batch, dtype=torch_dtype(unet.device)),
+                        noise=noise_batch,
+                        num_inference_steps=self.steps,
+                        conditioning_data=conditioning_data,
+                        control_data=control_data,  # list[ControlNetData]
+                        callback=step_callback,
+                    )
+                    # https://discuss.huggingface.co/t/memory-usage-by-later-pipeline-stages/23699
+                    results.append(result_latents.to("cpu"))
 
-            # https://discuss.huggingface.co/t/memory-usage-by-later-pipeline-stages/23699
-            result_latents = result_latents.to("cpu")
+            result_latents = torch.cat(results)
             torch.cuda.empty_cache()
 
-            name = f"{context.graph_execution_state_id}__{self.id}"
-            context.services.latents.save(name, result_latents)
-            return build_latents_output(latents_name=name, latents=result_latents)
+            return save_latents_batch(context, self.id, result_latents)
 
 
 class LatentsToLatentsInvocation(TextToLatentsInvocation):
@@ -401,11 +674,17 @@ class LatentsToLatentsInvocation(TextToLatentsInvocation):
             },
         }
 
+    def get_coalesce_key(self, context: InvocationContext) -> Optional[Hashable]:
+        # TODO: coalesce these as well, the initial latents and their timesteps would have to be batched too
+        return None
+
     @torch.no_grad()
     def invoke(self, context: InvocationContext) -> LatentsOutput:
         with SilenceWarnings():  # this quenches NSFW nag from diffusers
-            noise = context.services.latents.get(self.noise.latents_name)
-            latent = context.services.latents.get(self.latents.latents_name)
+            latent = get_latents(context, self.latents)
+            noise = get_noise_batch(context, self.noise, self.seeds, like=latent)
+            if latent.shape[0] != noise.shape[0]:
+                latent = latent.expand(noise.shape[0], -1, -1, -1)
 
             # Get the source node id (we are invoking the prepared node)
             graph_execution_state = context.services.graph_execution_manager.get(context.graph_execution_state_id)
@@ -438,6 +717,8 @@ class LatentsToLatentsInvocation(TextToLatentsInvocation):
                     context=context,
                     scheduler_info=self.unet.scheduler,
                     scheduler_name=self.scheduler,
+                    steps=self.steps,
+                    device=unet.device,
                 )
 
                 pipeline = self.create_pipeline(unet, scheduler)
@@ -458,29 +739,32 @@ class LatentsToLatentsInvocation(TextToLatentsInvocation):
                     latent if self.strength < 1.0 else torch.zeros_like(latent, device=unet.device, dtype=latent.dtype)
                 )
 
-                timesteps, _ = pipeline.get_img2img_timesteps(
-                    self.steps,
-                    self.strength,
-                    device=unet.device,
-                )
+                results = list()
+                batch_size = context.services.configuration.denoise_batch_size
+                for latents_batch, noise_batch in zip(initial_latents.split(batch_size), noise.split(batch_size)):
+                    # also resets the scheduler, multistep schedulers keep state between steps
+                    timesteps, _ = pipeline.get_img2img_timesteps(
+                        self.steps,
+                        self.strength,
+                        device=unet.device,
+                    )
 
-                result_latents, result_attention_map_saver = pipeline.latents_from_embeddings(
-                    latents=initial_latents,
-                    timesteps=timesteps,
-                    noise=noise,
-                    num_inference_steps=self.steps,
-                    conditioning_data=conditioning_data,
-                    control_data=control_data,  # list[ControlNetData]
-                    callback=step_callback,
-                )
+                    result_latents, result_attention_map_saver = pipeline.latents_from_embeddings(
+                        latents=latents_batch,
+                        timesteps=timesteps,
+                        noise=noise_batch,
+                        num_inference_steps=self.steps,
+                        conditioning_data=conditioning_data,
+                        control_data=control_data,  # list[ControlNetData]
+                        callback=step_callback,
+                    )
+                    # https://discuss.huggingface.co/t/memory-usage-by-later-pipeline-stages/23699
+                    results.append(result_latents.to("cpu"))
 
-            # https://discuss.huggingface.co/t/memory-usage-by-later-pipeline-stages/23699
-            result_latents = result_latents.to("cpu")
+            result_latents = torch.cat(results)
             torch.cuda.empty_cache()
 
-            name = f"{context.graph_execution_state_id}__{self.id}"
-            context.services.latents.save(name, result_latents)
-        return build_latents_output(latents_name=name, latents=result_latents)
+        return save_latents_batch(context, self.id, result_latents)
 
 
 # Latent to image
@@ -509,7 +793,7 @@ class LatentsToImageInvocation(BaseInvocation):
 
     @torch.no_grad()
     def invoke(self, context: InvocationContext) -> ImageOutput:
-        latents = context.services.latents.get(self.latents.latents_name)
+        latents = get_latents(context, self.latents)
 
         vae_info = context.services.model_manager.get_model(
             **self.vae.vae.dict(),
@@ -543,23 +827,25 @@ class LatentsToImageInvocation(BaseInvocation):
                 vae.to(dtype=torch.float16)
                 latents = latents.half()
 
-            if self.tiled or context.services.configuration.tiled_decode:
-                vae.enable_tiling()
-            else:
-                vae.disable_tiling()
-
-            # clear memory as vae decode can request a lot
-            torch.cuda.empty_cache()
+            vae.disable_tiling()
+            tiled = self.tiled or context.services.configuration.tiled_decode
+            if not tiled:
+                # clear memory as vae decode can request a lot
+                torch.cuda.empty_cache()
 
             with torch.inference_mode():
                 # copied from diffusers pipeline
                 latents = latents / vae.config.scaling_factor
-                image = vae.decode(latents, return_dict=False)[0]
-                image = (image / 2 + 0.5).clamp(0, 1)  # denormalize
-                # we always cast to float32 as this does not cause significant overhead and is compatible with bfloat16
-                np_image = image.cpu().permute(0, 2, 3, 1).float().numpy()
+                if tiled:
+                    image = tiled_decode(vae, latents)
+                else:
+                    image = vae.decode(latents, return_dict=False)[0]
+                    image = (image / 2 + 0.5).clamp(0, 1)  # denormalize
+                    # we always cast to float32 as this does not cause significant overhead
+                    # and is compatible with bfloat16
+                    np_image = image.cpu().permute(0, 2, 3, 1).float().numpy()
 
-                image = VaeImageProcessor.numpy_to_pil(np_image)[0]
+                    image = VaeImageProcessor.numpy_to_pil(np_image)[0]
 
         torch.cuda.empty_cache()
 
@@ -587,6 +873,7 @@ class ResizeLatentsInvocation(BaseInvocation):
     """Resizes latents to explicit width/height (in pixels). Provided dimensions are floor-divided by 8."""
 
     type: Literal["lresize"] = "lresize"
+    cacheable = True
 
     # Inputs
     latents: Optional[LatentsField] = Field(description="The latents to resize")
@@ -603,7 +890,7 @@ class ResizeLatentsInvocation(BaseInvocation):
         }
 
     def invoke(self, context: InvocationContext) -> LatentsOutput:
-        latents = context.services.latents.get(self.latents.latents_name)
+        latents = get_latents(context, self.latents)
 
         # TODO:
         device = choose_torch_device()
@@ -629,6 +916,7 @@ class ScaleLatentsInvocation(BaseInvocation):
     """Scales latents by a given factor."""
 
     type: Literal["lscale"] = "lscale"
+    cacheable = True
 
     # Inputs
     latents: Optional[LatentsField] = Field(description="The latents to scale")
@@ -644,7 +932,7 @@ class ScaleLatentsInvocation(BaseInvocation):
         }
 
     def invoke(self, context: InvocationContext) -> LatentsOutput:
-        latents = context.services.latents.get(self.latents.latents_name)
+        latents = get_latents(context, self.latents)
 
         # TODO:
         device = choose_torch_device()
@@ -697,9 +985,14 @@ class ImageToLatentsInvocation(BaseInvocation):
             context=context,
         )
 
-        image_tensor = image_resized_to_grid_as_tensor(image.convert("RGB"))
-        if image_tensor.dim() == 3:
-            image_tensor = einops.rearrange(image_tensor, "c h w -> 1 c h w")
+        if self.tiled:
+            # tiles are converted to tensors as they are encoded
+            image = image.convert("RGB")
+            image = image.resize(trim_to_multiple_of(*image.size), PIL.Image.LANCZOS)
+        else:
+            image_tensor = image_resized_to_grid_as_tensor(image.convert("RGB"))
+            if image_tensor.dim() == 3:
+                image_tensor = einops.rearrange(image_tensor, "c h w -> 1 c h w")
 
         with vae_info as vae:
             orig_dtype = vae.dtype
@@ -728,16 +1021,17 @@ class ImageToLatentsInvocation(BaseInvocation):
                 vae.to(dtype=torch.float16)
                 # latents = latents.half()
 
-            if self.tiled:
-                vae.enable_tiling()
-            else:
-                vae.disable_tiling()
+            vae.disable_tiling()
 
             # non_noised_latents_from_image
-            image_tensor = image_tensor.to(device=vae.device, dtype=vae.dtype)
             with torch.inference_mode():
-                image_tensor_dist = vae.encode(image_tensor).latent_dist
-                latents = image_tensor_dist.sample().to(dtype=vae.dtype)  # FIXME: uses torch.randn. make reproducible!
+                if self.tiled:
+                    latents = tiled_encode(vae, image).to(dtype=vae.dtype)
+                else:
+                    image_tensor = image_tensor.to(device=vae.device, dtype=vae.dtype)
+                    image_tensor_dist = vae.encode(image_tensor).latent_dist
+                    # FIXME: uses torch.randn. make reproducible!
+                    latents = image_tensor_dist.sample().to(dtype=vae.dtype)
 
             latents = vae.config.scaling_factor * latents
             latents = latents.to(dtype=orig_dtype)
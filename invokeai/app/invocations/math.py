@@ -48,6 +48,7 @@ class AddInvocation(BaseInvocation, MathInvocationConfig):
 
     # fmt: off
     type: Literal["add"] = "add"
+    cacheable = True
     a: int = Field(default=0, description="The first number")
     b: int = Field(default=0, description="The second number")
     # fmt: on
@@ -66,6 +67,7 @@ class SubtractInvocation(BaseInvocation, MathInvocationConfig):
 
     # fmt: off
     type: Literal["sub"] = "sub"
+    cacheable = True
     a: int = Field(default=0, description="The first number")
     b: int = Field(default=0, description="The second number")
     # fmt: on
@@ -84,6 +86,7 @@ class MultiplyInvocation(BaseInvocation, MathInvocationConfig):
 
     # fmt: off
     type: Literal["mul"] = "mul"
+    cacheable = True
     a: int = Field(default=0, description="The first number")
     b: int = Field(default=0, description="The second number")
     # fmt: on
@@ -102,6 +105,7 @@ class DivideInvocation(BaseInvocation, MathInvocationConfig):
 
     # fmt: off
     type: Literal["div"] = "div"
+    cacheable = True
     a: int = Field(default=0, description="The first number")
     b: int = Field(default=0, description="The second number")
     # fmt: on
@@ -66,6 +66,7 @@ class MainModelLoaderInvocation(BaseInvocation):
     """Loads a main model, outputting its submodels."""
 
     type: Literal["main_model_loader"] = "main_model_loader"
+    cacheable = True
 
     model: MainModelField = Field(description="The model to load")
     # TODO: precision?
@@ -80,6 +81,18 @@ class MainModelLoaderInvocation(BaseInvocation):
             },
         }
 
+    def get_required_models(self) -> List[ModelInfo]:
+        """The submodels the session will load, in the order they are used; see ModelPrefetcher"""
+        return [
+            ModelInfo(
+                model_name=self.model.model_name,
+                base_model=self.model.base_model,
+                model_type=ModelType.Main,
+                submodel=submodel,
+            )
+            for submodel in [SubModelType.Tokenizer, SubModelType.TextEncoder, SubModelType.UNet, SubModelType.Vae]
+        ]
+
     def invoke(self, context: InvocationContext) -> ModelLoaderOutput:
         base_model = self.model.base_model
         model_name = self.model.model_name
@@ -196,6 +209,7 @@ class LoraLoaderInvocation(BaseInvocation):
     """Apply selected lora to unet and text_encoder."""
 
     type: Literal["lora_loader"] = "lora_loader"
+    cacheable = True
 
     lora: Union[LoRAModelField, None] = Field(default=None, description="Lora model name")
     weight: float = Field(default=0.75, description="With what weight to apply lora")
@@ -212,6 +226,11 @@ class LoraLoaderInvocation(BaseInvocation):
             },
         }
 
+    def get_required_models(self) -> List[ModelInfo]:
+        if self.lora is None:
+            return []
+        return [ModelInfo(model_name=self.lora.model_name, base_model=self.lora.base_model, model_type=ModelType.Lora)]
+
     def invoke(self, context: InvocationContext) -> LoraLoaderOutput:
         if self.lora is None:
             raise Exception("No LoRA provided")
@@ -282,6 +301,7 @@ class VaeLoaderInvocation(BaseInvocation):
     """Loads a VAE model, outputting a VaeLoaderOutput"""
 
     type: Literal["vae_loader"] = "vae_loader"
+    cacheable = True
 
     vae_model: VAEModelField = Field(description="The VAE to load")
 
@@ -295,6 +315,15 @@ class VaeLoaderInvocation(BaseInvocation):
             },
         }
 
+    def get_required_models(self) -> List[ModelInfo]:
+        return [
+            ModelInfo(
+                model_name=self.vae_model.model_name,
+                base_model=self.vae_model.base_model,
+                model_type=ModelType.Vae,
+            )
+        ]
+
     def invoke(self, context: InvocationContext) -> VaeLoaderOutput:
         base_model = self.vae_model.base_model
         model_name = self.vae_model.model_name
@@ -1,11 +1,11 @@
 # Copyright (c) 2023 Kyle Schouviller (https://github.com/kyle0654) & the InvokeAI Team
 
 import math
-from typing import Literal
+from typing import List, Literal, Sequence
 
 from pydantic import Field, validator
 import torch
-from invokeai.app.invocations.latent import LatentsField
+from invokeai.app.invocations.latent import LatentsField, NoiseDescriptor
 
 from invokeai.app.util.misc import SEED_MAX, get_random_seed
 from ...backend.util.devices import choose_torch_device, torch_dtype
@@ -21,6 +21,78 @@ Utilities
 """
 
 
+def _hash32(x: torch.Tensor) -> torch.Tensor:
+    """The lowbias32 integer hash of 32 bit values held in int64 tensors"""
+    x = x ^ (x >> 16)
+    x = (x * 0x7FEB352D) & 0xFFFFFFFF
+    x = x ^ (x >> 15)
+    x = (x * 0x846CA68B) & 0xFFFFFFFF
+    return x ^ (x >> 16)
+
+
+def counter_randn(seeds: Sequence[int], shape: Sequence[int], device: torch.device) -> torch.Tensor:
+    """
+    Standard normal noise of the shape for each of the seeds, stacked. Every value is a hash of the
+    seed and of its index, so the noise is generated in one go on any device and is the same on all
+    of them, up to float rounding.
+    """
+    count = math.prod(shape)
+    seed_values = torch.tensor(seeds, dtype=torch.int64, device=device)[:, None]
+    keys = _hash32((seed_values & 0xFFFFFFFF) ^ _hash32(seed_values >> 32))
+    counters = torch.arange(2 * count, dtype=torch.int64, device=device)[None, :]
+    bits = _hash32((_hash32(counters ^ keys) + keys) & 0xFFFFFFFF)
+
+    # Box-Muller on 24 bit uniform values in (0, 1), which float32 holds exactly
+    uniform = ((bits >> 8).to(torch.float32) + 0.5) / 2**24
+    radius = torch.sqrt(-2.0 * torch.log(uniform[:, :count]))
+    noise = radius * torch.cos(2.0 * math.pi * uniform[:, count:])
+    return noise.reshape(len(seeds), *shape)
+
+
+def get_seeded_noise(
+    seeds: List[int],
+    channels: int,
+    height: int,
+    width: int,
+    device: torch.device,
+    dtype: torch.dtype,
+    use_cpu: bool = True,
+) -> torch.Tensor:
+    """
+    Noise for each of the seeds, stacked, in latent pixels. With use_cpu, each seed's noise comes
+    from the CPU generator of torch as it always has; otherwise all of it is generated on the device.
+    """
+    # limit noise to only the diffusion image channels, not the mask channels
+    shape = [min(channels, 4), height, width]
+    if not use_cpu:
+        return counter_randn(seeds, shape, device).to(dtype)
+
+    noise = torch.cat(
+        [
+            torch.randn(
+                [1, *shape],
+                dtype=dtype,
+                device="cpu",
+                generator=torch.Generator(device="cpu").manual_seed(seed),
+            )
+            for seed in seeds
+        ]
+    )
+    return noise.to(device)
+
+
+def get_noise_from_descriptor(descriptor: NoiseDescriptor, device: torch.device) -> torch.Tensor:
+    return get_seeded_noise(
+        [descriptor.seed],
+        descriptor.channels,
+        descriptor.height,
+        descriptor.width,
+        device=device,
+        dtype=getattr(torch, descriptor.dtype),
+        use_cpu=descriptor.use_cpu,
+    )
+
+
 def get_noise(
     width: int,
     height: int,
@@ -31,26 +103,16 @@ def get_noise(
     use_cpu: bool = True,
     perlin: float = 0.0,
 ):
-    """Generate noise for a given image size."""
-    noise_device_type = "cpu" if use_cpu else device.type
-
-    # limit noise to only the diffusion image channels, not the mask channels
-    input_channels = min(latent_channels, 4)
-    generator = torch.Generator(device=noise_device_type).manual_seed(seed)
-
-    noise_tensor = torch.randn(
-        [
-            1,
-            input_channels,
-            height // downsampling_factor,
-            width // downsampling_factor,
-        ],
+    """Generate noise for a given image size, on the CPU."""
+    return get_seeded_noise(
+        [seed],
+        latent_channels,
+        height // downsampling_factor,
+        width // downsampling_factor,
+        device=torch.device("cpu"),
         dtype=torch_dtype(device),
-        device=noise_device_type,
-        generator=generator,
-    ).to("cpu")
-
-    return noise_tensor
+        use_cpu=use_cpu,
+    )
 
 
 """
@@ -65,17 +127,17 @@ class NoiseOutput(BaseInvocationOutput):
     type:  Literal["noise_output"] = "noise_output"
 
     # Inputs
-    noise: LatentsField            = Field(default=None, description="The output noise")
+    noise: LatentsField            = Field(default=None, description="The output noise, described rather than stored")
     width:                     int = Field(description="The width of the noise in pixels")
     height:                    int = Field(description="The height of the noise in pixels")
     # fmt: on
 
 
-def build_noise_output(latents_name: str, latents: torch.Tensor):
+def build_noise_output(noise: NoiseDescriptor):
     return NoiseOutput(
-        noise=LatentsField(latents_name=latents_name),
-        width=latents.size()[3] * 8,
-        height=latents.size()[2] * 8,
+        noise=LatentsField(noise=noise),
+        width=noise.width * 8,
+        height=noise.height * 8,
     )
 
 
@@ -83,6 +145,7 @@ class NoiseInvocation(BaseInvocation):
     """Generates latent noise."""
 
     type: Literal["noise"] = "noise"
+    cacheable = True
 
     # Inputs
     seed: int = Field(
@@ -123,13 +186,12 @@ class NoiseInvocation(BaseInvocation):
         return v % (SEED_MAX + 1)
 
     def invoke(self, context: InvocationContext) -> NoiseOutput:
-        noise = get_noise(
-            width=self.width,
-            height=self.height,
-            device=choose_torch_device(),
+        # only described here, the nodes using the noise generate it
+        noise = NoiseDescriptor(
             seed=self.seed,
+            height=self.height // 8,
+            width=self.width // 8,
+            dtype=str(torch_dtype(choose_torch_device())).replace("torch.", ""),
             use_cpu=self.use_cpu,
         )
-        name = f"{context.graph_execution_state_id}__{self.id}"
-        context.services.latents.save(name, noise)
-        return build_noise_output(latents_name=name, latents=noise)
+        return build_noise_output(noise)
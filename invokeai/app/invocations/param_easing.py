@@ -3,12 +3,9 @@ from typing import Literal, Optional, Any
 
 # from PIL.Image import Image
 import PIL.Image
-from matplotlib.ticker import MaxNLocator
-from matplotlib.figure import Figure
 
 from pydantic import BaseModel, Field
 import numpy as np
-import matplotlib.pyplot as plt
 
 from easing_functions import (
     LinearInOut,
@@ -58,6 +55,7 @@ class FloatLinearRangeInvocation(BaseInvocation):
     """Creates a range"""
 
     type: Literal["float_range"] = "float_range"
+    cacheable = True
 
     # Inputs
     start: float = Field(default=5, description="The first value of the range")
@@ -116,6 +114,7 @@ class StepParamEasingInvocation(BaseInvocation):
     """Experimental per-step parameter easing for denoising steps"""
 
     type: Literal["step_param_easing"] = "step_param_easing"
+    cacheable = True
 
     # Inputs
     # fmt: off
@@ -240,6 +239,9 @@ class StepParamEasingInvocation(BaseInvocation):
         param_list = prelist + easing_list + postlist
 
         if self.show_easing_plot:
+            import matplotlib.pyplot as plt
+            from matplotlib.ticker import MaxNLocator
+
             plt.figure()
             plt.xlabel("Step")
             plt.ylabel("Param Value")
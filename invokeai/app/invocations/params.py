@@ -15,6 +15,7 @@ class ParamIntInvocation(BaseInvocation):
 
     # fmt: off
     type: Literal["param_int"] = "param_int"
+    cacheable = True
     a: int = Field(default=0, description="The integer value")
     # fmt: on
 
@@ -32,6 +33,7 @@ class ParamFloatInvocation(BaseInvocation):
 
     # fmt: off
     type: Literal["param_float"] = "param_float"
+    cacheable = True
     param: float = Field(default=0.0, description="The float value")
     # fmt: on
 
@@ -55,6 +57,7 @@ class ParamStringInvocation(BaseInvocation):
     """A string parameter"""
 
     type: Literal["param_string"] = "param_string"
+    cacheable = True
     text: str = Field(default="", description="The string value")
 
     class Config(InvocationConfig):
@@ -5,7 +5,6 @@ import numpy as np
 from pydantic import Field, validator
 
 from .baseinvocation import BaseInvocation, BaseInvocationOutput, InvocationConfig, InvocationContext
-from dynamicprompts.generators import RandomPromptGenerator, CombinatorialPromptGenerator
 
 
 class PromptOutput(BaseInvocationOutput):
@@ -54,6 +53,8 @@ class DynamicPromptInvocation(BaseInvocation):
         }
 
     def invoke(self, context: InvocationContext) -> PromptCollectionOutput:
+        from dynamicprompts.generators import RandomPromptGenerator, CombinatorialPromptGenerator
+
         if self.combinatorial:
             generator = CombinatorialPromptGenerator()
             prompts = generator.generate(self.prompt, max_prompts=self.max_prompts)
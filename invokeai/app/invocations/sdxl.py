@@ -11,7 +11,15 @@ from .baseinvocation import BaseInvocation, BaseInvocationOutput, InvocationConf
 
 from .model import UNetField, ClipField, VaeField, MainModelField, ModelInfo
 from .compel import ConditioningField
-from .latent import LatentsField, SAMPLER_NAME_VALUES, LatentsOutput, get_scheduler, build_latents_output
+from .latent import (
+    LatentsField,
+    SAMPLER_NAME_VALUES,
+    LatentsOutput,
+    get_latents,
+    get_noise_batch,
+    get_scheduler,
+    save_latents_batch,
+)
 
 
 class SDXLModelLoaderOutput(BaseInvocationOutput):
@@ -43,6 +51,7 @@ class SDXLModelLoaderInvocation(BaseInvocation):
     """Loads an sdxl base model, outputting its submodels."""
 
     type: Literal["sdxl_model_loader"] = "sdxl_model_loader"
+    cacheable = True
 
     model: MainModelField = Field(description="The model to load")
     # TODO: precision?
@@ -57,6 +66,24 @@ class SDXLModelLoaderInvocation(BaseInvocation):
             },
         }
 
+    def get_required_models(self) -> List[ModelInfo]:
+        return [
+            ModelInfo(
+                model_name=self.model.model_name,
+                base_model=self.model.base_model,
+                model_type=ModelType.Main,
+                submodel=submodel,
+            )
+            for submodel in [
+                SubModelType.Tokenizer,
+                SubModelType.TextEncoder,
+                SubModelType.Tokenizer2,
+                SubModelType.TextEncoder2,
+                SubModelType.UNet,
+                SubModelType.Vae,
+            ]
+        ]
+
     def invoke(self, context: InvocationContext) -> SDXLModelLoaderOutput:
         base_model = self.model.base_model
         model_name = self.model.model_name
@@ -133,6 +160,7 @@ class SDXLRefinerModelLoaderInvocation(BaseInvocation):
     """Loads an sdxl refiner model, outputting its submodels."""
 
     type: Literal["sdxl_refiner_model_loader"] = "sdxl_refiner_model_loader"
+    cacheable = True
 
     model: MainModelField = Field(description="The model to load")
     # TODO: precision?
@@ -147,6 +175,22 @@ class SDXLRefinerModelLoaderInvocation(BaseInvocation):
             },
         }
 
+    def get_required_models(self) -> List[ModelInfo]:
+        return [
+            ModelInfo(
+                model_name=self.model.model_name,
+                base_model=self.model.base_model,
+                model_type=ModelType.Main,
+                submodel=submodel,
+            )
+            for submodel in [
+                SubModelType.Tokenizer2,
+                SubModelType.TextEncoder2,
+                SubModelType.UNet,
+                SubModelType.Vae,
+            ]
+        ]
+
     def invoke(self, context: InvocationContext) -> SDXLRefinerModelLoaderOutput:
         base_model = self.model.base_model
         model_name = self.model.model_name
@@ -213,7 +257,8 @@ class SDXLTextToLatentsInvocation(BaseInvocation):
     # fmt: off
     positive_conditioning: Optional[ConditioningField] = Field(description="Positive conditioning for generation")
     negative_conditioning: Optional[ConditioningField] = Field(description="Negative conditioning for generation")
-    noise: Optional[LatentsField] = Field(description="The noise to use")
+    noise: Union[LatentsField, list[LatentsField]] = Field(default=None, description="The noise to use, a collection of noise denoises a batch of variations")
+    seeds: Optional[list[int]] = Field(default=None, description="Seeds to generate the noise from instead, one variation per seed")
     steps:       int = Field(default=10, gt=0, description="The number of steps to use to generate the image")
     cfg_scale: Union[float, List[float]] = Field(default=7.5, ge=1, description="The Classifier-Free Guidance, higher values may result in a result closer to the prompt", )
     scheduler: SAMPLER_NAME_VALUES = Field(default="euler", description="The scheduler to use" )
@@ -273,7 +318,7 @@ class SDXLTextToLatentsInvocation(BaseInvocation):
     def invoke(self, context: InvocationContext) -> LatentsOutput:
         graph_execution_state = context.services.graph_execution_manager.get(context.graph_execution_state_id)
         source_node_id = graph_execution_state.prepared_source_mapping[self.id]
-        latents = context.services.latents.get(self.noise.latents_name)
+        noise = get_noise_batch(context, self.noise, self.seeds)
 
         positive_cond_data = context.services.latents.get(self.positive_conditioning.conditioning_name)
         prompt_embeds = positive_cond_data.conditionings[0].embeds
@@ -285,21 +330,21 @@ class SDXLTextToLatentsInvocation(BaseInvocation):
         negative_pooled_prompt_embeds = negative_cond_data.conditionings[0].pooled_embeds
         add_neg_time_ids = negative_cond_data.conditionings[0].add_time_ids
 
+        num_inference_steps = self.steps
         scheduler = get_scheduler(
             context=context,
             scheduler_info=self.unet.scheduler,
             scheduler_name=self.scheduler,
+            steps=num_inference_steps,
         )
-
-        num_inference_steps = self.steps
-        scheduler.set_timesteps(num_inference_steps)
         timesteps = scheduler.timesteps
 
-        latents = latents * scheduler.init_noise_sigma
+        noisy_latents = noise * scheduler.init_noise_sigma
 
         unet_info = context.services.model_manager.get_model(**self.unet.unet.dict(), context=context)
         do_classifier_free_guidance = True
         cross_attention_kwargs = None
+        results = list()
         with unet_info as unet:
             extra_step_kwargs = dict()
             if "eta" in set(inspect.signature(scheduler.step).parameters.keys()):
@@ -326,46 +371,57 @@ class SDXLTextToLatentsInvocation(BaseInvocation):
                 prompt_embeds = prompt_embeds.to(device=unet.device, dtype=unet.dtype)
                 add_text_embeds = add_text_embeds.to(device=unet.device, dtype=unet.dtype)
                 add_time_ids = add_time_ids.to(device=unet.device, dtype=unet.dtype)
-                latents = latents.to(device=unet.device, dtype=unet.dtype)
-
-                with tqdm(total=num_inference_steps) as progress_bar:
-                    for i, t in enumerate(timesteps):
-                        # expand the latents if we are doing classifier free guidance
-                        latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
-
-                        latent_model_input = scheduler.scale_model_input(latent_model_input, t)
-
-                        # predict the noise residual
-                        added_cond_kwargs = {"text_embeds": add_text_embeds, "time_ids": add_time_ids}
-                        noise_pred = unet(
-                            latent_model_input,
-                            t,
-                            encoder_hidden_states=prompt_embeds,
-                            cross_attention_kwargs=cross_attention_kwargs,
-                            added_cond_kwargs=added_cond_kwargs,
-                            return_dict=False,
-                        )[0]
-
-                        # perform guidance
-                        if do_classifier_free_guidance:
-                            noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                            noise_pred = noise_pred_uncond + self.cfg_scale * (noise_pred_text - noise_pred_uncond)
-                            # del noise_pred_uncond
-                            # del noise_pred_text
 
-                        # if do_classifier_free_guidance and guidance_rescale > 0.0:
-                        #    # Based on 3.4. in https://arxiv.org/pdf/2305.08891.pdf
-                        #    noise_pred = rescale_noise_cfg(noise_pred, noise_pred_text, guidance_rescale=guidance_rescale)
-
-                        # compute the previous noisy sample x_t -> x_t-1
-                        latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
-
-                        # call the callback, if provided
-                        if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0):
-                            progress_bar.update()
-                            self.dispatch_progress(context, source_node_id, latents, i, num_inference_steps)
-                            # if callback is not None and i % callback_steps == 0:
-                            #    callback(i, t, latents)
+                for latents in noisy_latents.split(context.services.configuration.denoise_batch_size):
+                    # multistep schedulers keep state between steps, start every micro-batch afresh
+                    scheduler.set_timesteps(self.steps)
+                    latents = latents.to(device=unet.device, dtype=unet.dtype)
+                    # one [uncond, cond] pair of conditionings for each of the latents
+                    batch_prompt_embeds = prompt_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_text_embeds = add_text_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_time_ids = add_time_ids.repeat_interleave(latents.shape[0], dim=0)
+
+                    with tqdm(total=num_inference_steps) as progress_bar:
+                        for i, t in enumerate(timesteps):
+                            # expand the latents if we are doing classifier free guidance
+                            latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
+
+                            latent_model_input = scheduler.scale_model_input(latent_model_input, t)
+
+                            # predict the noise residual
+                            added_cond_kwargs = {"text_embeds": batch_text_embeds, "time_ids": batch_time_ids}
+                            noise_pred = unet(
+                                latent_model_input,
+                                t,
+                                encoder_hidden_states=batch_prompt_embeds,
+                                cross_attention_kwargs=cross_attention_kwargs,
+                                added_cond_kwargs=added_cond_kwargs,
+                                return_dict=False,
+                            )[0]
+
+                            # perform guidance
+                            if do_classifier_free_guidance:
+                                noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+                                noise_pred = noise_pred_uncond + self.cfg_scale * (noise_pred_text - noise_pred_uncond)
+                                # del noise_pred_uncond
+                                # del noise_pred_text
+
+                            # if do_classifier_free_guidance and guidance_rescale > 0.0:
+                            #    # Based on 3.4. in https://arxiv.org/pdf/2305.08891.pdf
+                            #    noise_pred = rescale_noise_cfg(noise_pred, noise_pred_text, guidance_rescale=guidance_rescale)
+
+                            # compute the previous noisy sample x_t -> x_t-1
+                            latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
+
+                            # call the callback, if provided
+                            if i == len(timesteps) - 1 or (
+                                (i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0
+                            ):
+                                progress_bar.update()
+                                self.dispatch_progress(context, source_node_id, latents, i, num_inference_steps)
+                                # if callback is not None and i % callback_steps == 0:
+                                #    callback(i, t, latents)
+                    results.append(latents.to("cpu"))
             else:
                 negative_pooled_prompt_embeds = negative_pooled_prompt_embeds.to(device=unet.device, dtype=unet.dtype)
                 negative_prompt_embeds = negative_prompt_embeds.to(device=unet.device, dtype=unet.dtype)
@@ -373,77 +429,97 @@ class SDXLTextToLatentsInvocation(BaseInvocation):
                 pooled_prompt_embeds = pooled_prompt_embeds.to(device=unet.device, dtype=unet.dtype)
                 prompt_embeds = prompt_embeds.to(device=unet.device, dtype=unet.dtype)
                 add_time_ids = add_time_ids.to(device=unet.device, dtype=unet.dtype)
-                latents = latents.to(device=unet.device, dtype=unet.dtype)
-
-                with tqdm(total=num_inference_steps) as progress_bar:
-                    for i, t in enumerate(timesteps):
-                        # expand the latents if we are doing classifier free guidance
-                        # latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
-
-                        latent_model_input = scheduler.scale_model_input(latents, t)
-
-                        # import gc
-                        # gc.collect()
-                        # torch.cuda.empty_cache()
-
-                        # predict the noise residual
-
-                        added_cond_kwargs = {"text_embeds": negative_pooled_prompt_embeds, "time_ids": add_neg_time_ids}
-                        noise_pred_uncond = unet(
-                            latent_model_input,
-                            t,
-                            encoder_hidden_states=negative_prompt_embeds,
-                            cross_attention_kwargs=cross_attention_kwargs,
-                            added_cond_kwargs=added_cond_kwargs,
-                            return_dict=False,
-                        )[0]
-
-                        added_cond_kwargs = {"text_embeds": pooled_prompt_embeds, "time_ids": add_time_ids}
-                        noise_pred_text = unet(
-                            latent_model_input,
-                            t,
-                            encoder_hidden_states=prompt_embeds,
-                            cross_attention_kwargs=cross_attention_kwargs,
-                            added_cond_kwargs=added_cond_kwargs,
-                            return_dict=False,
-                        )[0]
-
-                        # perform guidance
-                        noise_pred = noise_pred_uncond + self.cfg_scale * (noise_pred_text - noise_pred_uncond)
-
-                        # del noise_pred_text
-                        # del noise_pred_uncond
-                        # import gc
-                        # gc.collect()
-                        # torch.cuda.empty_cache()
-
-                        # if do_classifier_free_guidance and guidance_rescale > 0.0:
-                        #    # Based on 3.4. in https://arxiv.org/pdf/2305.08891.pdf
-                        #    noise_pred = rescale_noise_cfg(noise_pred, noise_pred_text, guidance_rescale=guidance_rescale)
-
-                        # compute the previous noisy sample x_t -> x_t-1
-                        latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
-
-                        # del noise_pred
-                        # import gc
-                        # gc.collect()
-                        # torch.cuda.empty_cache()
-
-                        # call the callback, if provided
-                        if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0):
-                            progress_bar.update()
-                            self.dispatch_progress(context, source_node_id, latents, i, num_inference_steps)
-                            # if callback is not None and i % callback_steps == 0:
-                            #    callback(i, t, latents)
+
+                for latents in noisy_latents.split(context.services.configuration.denoise_batch_size):
+                    # multistep schedulers keep state between steps, start every micro-batch afresh
+                    scheduler.set_timesteps(self.steps)
+                    latents = latents.to(device=unet.device, dtype=unet.dtype)
+                    # the conditionings are shared by all of the latents
+                    batch_negative_prompt_embeds = negative_prompt_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_negative_pooled_prompt_embeds = negative_pooled_prompt_embeds.repeat_interleave(
+                        latents.shape[0], dim=0
+                    )
+                    batch_add_neg_time_ids = add_neg_time_ids.repeat_interleave(latents.shape[0], dim=0)
+                    batch_prompt_embeds = prompt_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_pooled_prompt_embeds = pooled_prompt_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_add_time_ids = add_time_ids.repeat_interleave(latents.shape[0], dim=0)
+
+                    with tqdm(total=num_inference_steps) as progress_bar:
+                        for i, t in enumerate(timesteps):
+                            # expand the latents if we are doing classifier free guidance
+                            # latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
+
+                            latent_model_input = scheduler.scale_model_input(latents, t)
+
+                            # import gc
+                            # gc.collect()
+                            # torch.cuda.empty_cache()
+
+                            # predict the noise residual
+
+                            added_cond_kwargs = {
+                                "text_embeds": batch_negative_pooled_prompt_embeds,
+                                "time_ids": batch_add_neg_time_ids,
+                            }
+                            noise_pred_uncond = unet(
+                                latent_model_input,
+                                t,
+                                encoder_hidden_states=batch_negative_prompt_embeds,
+                                cross_attention_kwargs=cross_attention_kwargs,
+                                added_cond_kwargs=added_cond_kwargs,
+                                return_dict=False,
+                            )[0]
+
+                            added_cond_kwargs = {
+                                "text_embeds": batch_pooled_prompt_embeds,
+                                "time_ids": batch_add_time_ids,
+                            }
+                            noise_pred_text = unet(
+                                latent_model_input,
+                                t,
+                                encoder_hidden_states=batch_prompt_embeds,
+                                cross_attention_kwargs=cross_attention_kwargs,
+                                added_cond_kwargs=added_cond_kwargs,
+                                return_dict=False,
+                            )[0]
+
+                            # perform guidance
+                            noise_pred = noise_pred_uncond + self.cfg_scale * (noise_pred_text - noise_pred_uncond)
+
+                            # del noise_pred_text
+                            # del noise_pred_uncond
+                            # import gc
+                            # gc.collect()
+                            # torch.cuda.empty_cache()
+
+                            # if do_classifier_free_guidance and guidance_rescale > 0.0:
+                            #    # Based on 3.4. in https://arxiv.org/pdf/2305.08891.pdf
+                            #    noise_pred = rescale_noise_cfg(noise_pred, noise_pred_text, guidance_rescale=guidance_rescale)
+
+                            # compute the previous noisy sample x_t -> x_t-1
+                            latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
+
+                            # del noise_pred
+                            # import gc
+                            # gc.collect()
+                            # torch.cuda.empty_cache()
+
+                            # call the callback, if provided
+                            if i == len(timesteps) - 1 or (
+                                (i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0
+                            ):
+                                progress_bar.update()
+                                self.dispatch_progress(context, source_node_id, latents, i, num_inference_steps)
+                                # if callback is not None and i % callback_steps == 0:
+                                #    callback(i, t, latents)
+                    results.append(latents.to("cpu"))
 
         #################
 
-        latents = latents.to("cpu")
+        latents = torch.cat(results)
         torch.cuda.empty_cache()
 
-        name = f"{context.graph_execution_state_id}__{self.id}"
-        context.services.latents.save(name, latents)
-        return build_latents_output(latents_name=name, latents=latents)
+        return save_latents_batch(context, self.id, latents)
 
 
 class SDXLLatentsToLatentsInvocation(BaseInvocation):
@@ -455,7 +531,8 @@ class SDXLLatentsToLatentsInvocation(BaseInvocation):
     # fmt: off
     positive_conditioning: Optional[ConditioningField] = Field(description="Positive conditioning for generation")
     negative_conditioning: Optional[ConditioningField] = Field(description="Negative conditioning for generation")
-    noise: Optional[LatentsField] = Field(description="The noise to use")
+    noise: Union[LatentsField, list[LatentsField]] = Field(default=None, description="The noise to use, a collection of noise denoises a batch of variations")
+    seeds: Optional[list[int]] = Field(default=None, description="Seeds to generate the noise from instead, one variation per seed")
     steps:       int = Field(default=10, gt=0, description="The number of steps to use to generate the image")
     cfg_scale: Union[float, List[float]] = Field(default=7.5, ge=1, description="The Classifier-Free Guidance, higher values may result in a result closer to the prompt", )
     scheduler: SAMPLER_NAME_VALUES = Field(default="euler", description="The scheduler to use" )
@@ -519,7 +596,7 @@ class SDXLLatentsToLatentsInvocation(BaseInvocation):
     def invoke(self, context: InvocationContext) -> LatentsOutput:
         graph_execution_state = context.services.graph_execution_manager.get(context.graph_execution_state_id)
         source_node_id = graph_execution_state.prepared_source_mapping[self.id]
-        latents = context.services.latents.get(self.latents.latents_name)
+        latents = get_latents(context, self.latents)
 
         positive_cond_data = context.services.latents.get(self.positive_conditioning.conditioning_name)
         prompt_embeds = positive_cond_data.conditionings[0].embeds
@@ -531,24 +608,24 @@ class SDXLLatentsToLatentsInvocation(BaseInvocation):
         negative_pooled_prompt_embeds = negative_cond_data.conditionings[0].pooled_embeds
         add_neg_time_ids = negative_cond_data.conditionings[0].add_time_ids
 
+        # apply denoising_start
+        num_inference_steps = self.steps
         scheduler = get_scheduler(
             context=context,
             scheduler_info=self.unet.scheduler,
             scheduler_name=self.scheduler,
+            steps=num_inference_steps,
         )
 
-        # apply denoising_start
-        num_inference_steps = self.steps
-        scheduler.set_timesteps(num_inference_steps)
-
         t_start = int(round(self.denoising_start * num_inference_steps))
         timesteps = scheduler.timesteps[t_start * scheduler.order :]
         num_inference_steps = num_inference_steps - t_start
 
-        # apply noise(if provided)
-        if self.noise is not None and timesteps.shape[0] > 0:
-            noise = context.services.latents.get(self.noise.latents_name)
-            latents = scheduler.add_noise(latents, noise, timesteps[:1])
+        # apply noise(if provided), one variation of the latents per noise
+        noisy_latents = latents
+        if (self.noise is not None or self.seeds) and timesteps.shape[0] > 0:
+            noise = get_noise_batch(context, self.noise, self.seeds, like=latents)
+            noisy_latents = scheduler.add_noise(latents.expand_as(noise), noise, timesteps[:1])
             del noise
 
         unet_info = context.services.model_manager.get_model(
@@ -557,6 +634,7 @@ class SDXLLatentsToLatentsInvocation(BaseInvocation):
         )
         do_classifier_free_guidance = True
         cross_attention_kwargs = None
+        results = list()
         with unet_info as unet:
             # apply scheduler extra args
             extra_step_kwargs = dict()
@@ -584,46 +662,57 @@ class SDXLLatentsToLatentsInvocation(BaseInvocation):
                 prompt_embeds = prompt_embeds.to(device=unet.device, dtype=unet.dtype)
                 add_text_embeds = add_text_embeds.to(device=unet.device, dtype=unet.dtype)
                 add_time_ids = add_time_ids.to(device=unet.device, dtype=unet.dtype)
-                latents = latents.to(device=unet.device, dtype=unet.dtype)
-
-                with tqdm(total=num_inference_steps) as progress_bar:
-                    for i, t in enumerate(timesteps):
-                        # expand the latents if we are doing classifier free guidance
-                        latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
-
-                        latent_model_input = scheduler.scale_model_input(latent_model_input, t)
-
-                        # predict the noise residual
-                        added_cond_kwargs = {"text_embeds": add_text_embeds, "time_ids": add_time_ids}
-                        noise_pred = unet(
-                            latent_model_input,
-                            t,
-                            encoder_hidden_states=prompt_embeds,
-                            cross_attention_kwargs=cross_attention_kwargs,
-                            added_cond_kwargs=added_cond_kwargs,
-                            return_dict=False,
-                        )[0]
-
-                        # perform guidance
-                        if do_classifier_free_guidance:
-                            noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                            noise_pred = noise_pred_uncond + self.cfg_scale * (noise_pred_text - noise_pred_uncond)
-                            # del noise_pred_uncond
-                            # del noise_pred_text
 
-                        # if do_classifier_free_guidance and guidance_rescale > 0.0:
-                        #    # Based on 3.4. in https://arxiv.org/pdf/2305.08891.pdf
-                        #    noise_pred = rescale_noise_cfg(noise_pred, noise_pred_text, guidance_rescale=guidance_rescale)
-
-                        # compute the previous noisy sample x_t -> x_t-1
-                        latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
-
-                        # call the callback, if provided
-                        if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0):
-                            progress_bar.update()
-                            self.dispatch_progress(context, source_node_id, latents, i, num_inference_steps)
-                            # if callback is not None and i % callback_steps == 0:
-                            #    callback(i, t, latents)
+                for latents in noisy_latents.split(context.services.configuration.denoise_batch_size):
+                    # multistep schedulers keep state between steps, start every micro-batch afresh
+                    scheduler.set_timesteps(self.steps)
+                    latents = latents.to(device=unet.device, dtype=unet.dtype)
+                    # one [uncond, cond] pair of conditionings for each of the latents
+                    batch_prompt_embeds = prompt_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_text_embeds = add_text_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_time_ids = add_time_ids.repeat_interleave(latents.shape[0], dim=0)
+
+                    with tqdm(total=num_inference_steps) as progress_bar:
+                        for i, t in enumerate(timesteps):
+                            # expand the latents if we are doing classifier free guidance
+                            latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
+
+                            latent_model_input = scheduler.scale_model_input(latent_model_input, t)
+
+                            # predict the noise residual
+                            added_cond_kwargs = {"text_embeds": batch_text_embeds, "time_ids": batch_time_ids}
+                            noise_pred = unet(
+                                latent_model_input,
+                                t,
+                                encoder_hidden_states=batch_prompt_embeds,
+                                cross_attention_kwargs=cross_attention_kwargs,
+                                added_cond_kwargs=added_cond_kwargs,
+                                return_dict=False,
+                            )[0]
+
+                            # perform guidance
+                            if do_classifier_free_guidance:
+                                noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
+                                noise_pred = noise_pred_uncond + self.cfg_scale * (noise_pred_text - noise_pred_uncond)
+                                # del noise_pred_uncond
+                                # del noise_pred_text
+
+                            # if do_classifier_free_guidance and guidance_rescale > 0.0:
+                            #    # Based on 3.4. in https://arxiv.org/pdf/2305.08891.pdf
+                            #    noise_pred = rescale_noise_cfg(noise_pred, noise_pred_text, guidance_rescale=guidance_rescale)
+
+                            # compute the previous noisy sample x_t -> x_t-1
+                            latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
+
+                            # call the callback, if provided
+                            if i == len(timesteps) - 1 or (
+                                (i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0
+                            ):
+                                progress_bar.update()
+                                self.dispatch_progress(context, source_node_id, latents, i, num_inference_steps)
+                                # if callback is not None and i % callback_steps == 0:
+                                #    callback(i, t, latents)
+                    results.append(latents.to("cpu"))
             else:
                 negative_pooled_prompt_embeds = negative_pooled_prompt_embeds.to(device=unet.device, dtype=unet.dtype)
                 negative_prompt_embeds = negative_prompt_embeds.to(device=unet.device, dtype=unet.dtype)
@@ -631,74 +720,93 @@ class SDXLLatentsToLatentsInvocation(BaseInvocation):
                 pooled_prompt_embeds = pooled_prompt_embeds.to(device=unet.device, dtype=unet.dtype)
                 prompt_embeds = prompt_embeds.to(device=unet.device, dtype=unet.dtype)
                 add_time_ids = add_time_ids.to(device=unet.device, dtype=unet.dtype)
-                latents = latents.to(device=unet.device, dtype=unet.dtype)
-
-                with tqdm(total=num_inference_steps) as progress_bar:
-                    for i, t in enumerate(timesteps):
-                        # expand the latents if we are doing classifier free guidance
-                        # latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
-
-                        latent_model_input = scheduler.scale_model_input(latents, t)
-
-                        # import gc
-                        # gc.collect()
-                        # torch.cuda.empty_cache()
-
-                        # predict the noise residual
-
-                        added_cond_kwargs = {"text_embeds": negative_pooled_prompt_embeds, "time_ids": add_time_ids}
-                        noise_pred_uncond = unet(
-                            latent_model_input,
-                            t,
-                            encoder_hidden_states=negative_prompt_embeds,
-                            cross_attention_kwargs=cross_attention_kwargs,
-                            added_cond_kwargs=added_cond_kwargs,
-                            return_dict=False,
-                        )[0]
-
-                        added_cond_kwargs = {"text_embeds": pooled_prompt_embeds, "time_ids": add_time_ids}
-                        noise_pred_text = unet(
-                            latent_model_input,
-                            t,
-                            encoder_hidden_states=prompt_embeds,
-                            cross_attention_kwargs=cross_attention_kwargs,
-                            added_cond_kwargs=added_cond_kwargs,
-                            return_dict=False,
-                        )[0]
-
-                        # perform guidance
-                        noise_pred = noise_pred_uncond + self.cfg_scale * (noise_pred_text - noise_pred_uncond)
-
-                        # del noise_pred_text
-                        # del noise_pred_uncond
-                        # import gc
-                        # gc.collect()
-                        # torch.cuda.empty_cache()
-
-                        # if do_classifier_free_guidance and guidance_rescale > 0.0:
-                        #    # Based on 3.4. in https://arxiv.org/pdf/2305.08891.pdf
-                        #    noise_pred = rescale_noise_cfg(noise_pred, noise_pred_text, guidance_rescale=guidance_rescale)
-
-                        # compute the previous noisy sample x_t -> x_t-1
-                        latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
-
-                        # del noise_pred
-                        # import gc
-                        # gc.collect()
-                        # torch.cuda.empty_cache()
-
-                        # call the callback, if provided
-                        if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0):
-                            progress_bar.update()
-                            self.dispatch_progress(context, source_node_id, latents, i, num_inference_steps)
-                            # if callback is not None and i % callback_steps == 0:
-                            #    callback(i, t, latents)
+
+                for latents in noisy_latents.split(context.services.configuration.denoise_batch_size):
+                    # multistep schedulers keep state between steps, start every micro-batch afresh
+                    scheduler.set_timesteps(self.steps)
+                    latents = latents.to(device=unet.device, dtype=unet.dtype)
+                    # the conditionings are shared by all of the latents
+                    batch_negative_prompt_embeds = negative_prompt_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_negative_pooled_prompt_embeds = negative_pooled_prompt_embeds.repeat_interleave(
+                        latents.shape[0], dim=0
+                    )
+                    batch_prompt_embeds = prompt_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_pooled_prompt_embeds = pooled_prompt_embeds.repeat_interleave(latents.shape[0], dim=0)
+                    batch_add_time_ids = add_time_ids.repeat_interleave(latents.shape[0], dim=0)
+
+                    with tqdm(total=num_inference_steps) as progress_bar:
+                        for i, t in enumerate(timesteps):
+                            # expand the latents if we are doing classifier free guidance
+                            # latent_model_input = torch.cat([latents] * 2) if do_classifier_free_guidance else latents
+
+                            latent_model_input = scheduler.scale_model_input(latents, t)
+
+                            # import gc
+                            # gc.collect()
+                            # torch.cuda.empty_cache()
+
+                            # predict the noise residual
+
+                            added_cond_kwargs = {
+                                "text_embeds": batch_negative_pooled_prompt_embeds,
+                                "time_ids": batch_add_time_ids,
+                            }
+                            noise_pred_uncond = unet(
+                                latent_model_input,
+                                t,
+                                encoder_hidden_states=batch_negative_prompt_embeds,
+                                cross_attention_kwargs=cross_attention_kwargs,
+                                added_cond_kwargs=added_cond_kwargs,
+                                return_dict=False,
+                            )[0]
+
+                            added_cond_kwargs = {
+                                "text_embeds": batch_pooled_prompt_embeds,
+                                "time_ids": batch_add_time_ids,
+                            }
+                            noise_pred_text = unet(
+                                latent_model_input,
+                                t,
+                                encoder_hidden_states=batch_prompt_embeds,
+                                cross_attention_kwargs=cross_attention_kwargs,
+                                added_cond_kwargs=added_cond_kwargs,
+                                return_dict=False,
+                            )[0]
+
+                            # perform guidance
+                            noise_pred = noise_pred_uncond + self.cfg_scale * (noise_pred_text - noise_pred_uncond)
+
+                            # del noise_pred_text
+                            # del noise_pred_uncond
+                            # import gc
+                            # gc.collect()
+                            # torch.cuda.empty_cache()
+
+                            # if do_classifier_free_guidance and guidance_rescale > 0.0:
+                            #    # Based on 3.4. in https://arxiv.org/pdf/2305.08891.pdf
+                            #    noise_pred = rescale_noise_cfg(noise_pred, noise_pred_text, guidance_rescale=guidance_rescale)
+
+                            # compute the previous noisy sample x_t -> x_t-1
+                            latents = scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
+
+                            # del noise_pred
+                            # import gc
+                            # gc.collect()
+                            # torch.cuda.empty_cache()
+
+                            # call the callback, if provided
+                            if i == len(timesteps) - 1 or (
+                                (i + 1) > num_warmup_steps and (i + 1) % scheduler.order == 0
+                            ):
+                                progress_bar.update()
+                                self.dispatch_progress(context, source_node_id, latents, i, num_inference_steps)
+                                # if callback is not None and i % callback_steps == 0:
+                                #    callback(i, t, latents)
+                    results.append(latents.to("cpu"))
 
         #################
 
-        latents = latents.to("cpu")
+        latents = torch.cat(results)
         torch.cuda.empty_cache()
 
-        name = f"{context.graph_execution_state_id}__{self.id}"
-        context.services.latents.save(name, latents)
-        return build_latents_output(latents_name=name, latents=latents)
+        return save_latents_batch(context, self.id, latents)
@@ -2,12 +2,9 @@
 from pathlib import Path
 from typing import Literal, Union
 
-import cv2 as cv
 import numpy as np
-from basicsr.archs.rrdbnet_arch import RRDBNet
 from PIL import Image
 from pydantic import Field
-from realesrgan import RealESRGANer
 
 from invokeai.app.models.image import ImageCategory, ImageField, ResourceOrigin
 
@@ -37,6 +34,11 @@ class ESRGANInvocation(BaseInvocation):
         }
 
     def invoke(self, context: InvocationContext) -> ImageOutput:
+        # realesrgan and basicsr are heavy to import, so only pull them in when actually upscaling
+        import cv2 as cv
+        from basicsr.archs.rrdbnet_arch import RRDBNet
+        from realesrgan import RealESRGANer
+
         image = context.services.images.get_pil_image(self.image.image_name)
         models_path = context.services.configuration.models_path
 
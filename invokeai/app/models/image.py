@@ -136,3 +136,13 @@ class InvalidImageCategoryException(ValueError):
 
     def __init__(self, message="Invalid image category."):
         super().__init__(message)
+
+
+class InvalidImageException(ValueError):
+    """Raised when an image file cannot be read.
+
+    Subclasses `ValueError`.
+    """
+
+    def __init__(self, message="Invalid image."):
+        super().__init__(message)
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 import sqlite3
 import threading
 from typing import Optional, cast
@@ -10,6 +11,14 @@ from invokeai.app.services.models.image_record import (
 )
 
 
+@dataclass
+class BoardImageSummary:
+    """The cover image and image count of a board."""
+
+    cover_image_name: Optional[str] = None
+    image_count: int = 0
+
+
 class BoardImageRecordStorageBase(ABC):
     """Abstract base class for the one-to-many board-image relationship record storage."""
 
@@ -31,6 +40,23 @@ class BoardImageRecordStorageBase(ABC):
         """Removes an image from a board."""
         pass
 
+    @abstractmethod
+    def add_images_to_board(
+        self,
+        board_id: str,
+        image_names: list[str],
+    ) -> None:
+        """Adds many images to a board, moving them from their current boards, in one transaction."""
+        pass
+
+    @abstractmethod
+    def remove_images_from_board(
+        self,
+        image_names: list[str],
+    ) -> None:
+        """Removes many images from whichever boards they are on, in one transaction."""
+        pass
+
     @abstractmethod
     def get_all_board_image_names_for_board(
         self,
@@ -55,6 +81,15 @@ class BoardImageRecordStorageBase(ABC):
         """Gets the number of images for a board."""
         pass
 
+    @abstractmethod
+    def get_board_summaries(
+        self,
+        board_ids: Optional[list[str]] = None,
+    ) -> dict[str, BoardImageSummary]:
+        """Gets the cover image and image count of many boards in one query, or of every board if no ids are given.
+        Boards without images are left out."""
+        pass
+
 
 class SqliteBoardImageRecordStorage(BoardImageRecordStorageBase):
     _filename: str
@@ -130,6 +165,111 @@ class SqliteBoardImageRecordStorage(BoardImageRecordStorageBase):
             """
         )
 
+        self._cursor.execute(
+            """--sql
+            SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'board_image_counts';
+            """
+        )
+        has_image_counts = self._cursor.fetchone() is not None
+
+        # Create the `board_image_counts` table, kept up to date by the triggers below, so that
+        # counting the images of every board doesn't have to scan `board_images`.
+        self._cursor.execute(
+            """--sql
+            CREATE TABLE IF NOT EXISTS board_image_counts (
+                board_id TEXT NOT NULL PRIMARY KEY,
+                image_count INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (board_id) REFERENCES boards (board_id) ON DELETE CASCADE
+            );
+            """
+        )
+
+        # Deleted images are not counted, see SqliteImageRecordStorage.delete_many(). The count triggers
+        # are recreated, because earlier versions counted every image.
+        for trigger in ("insert", "delete", "update"):
+            self._cursor.execute(f"DROP TRIGGER IF EXISTS tg_board_images_count_{trigger};")
+
+        self._cursor.execute(
+            """--sql
+            CREATE TRIGGER tg_board_images_count_insert
+            AFTER INSERT
+            ON board_images FOR EACH ROW
+            WHEN NOT EXISTS (SELECT 1 FROM images WHERE image_name = new.image_name AND deleted_at IS NOT NULL)
+            BEGIN
+                INSERT INTO board_image_counts (board_id, image_count) VALUES (new.board_id, 1)
+                    ON CONFLICT (board_id) DO UPDATE SET image_count = image_count + 1;
+            END;
+            """
+        )
+
+        self._cursor.execute(
+            """--sql
+            CREATE TRIGGER tg_board_images_count_delete
+            AFTER DELETE
+            ON board_images FOR EACH ROW
+            WHEN NOT EXISTS (SELECT 1 FROM images WHERE image_name = old.image_name AND deleted_at IS NOT NULL)
+            BEGIN
+                UPDATE board_image_counts SET image_count = image_count - 1
+                    WHERE board_id = old.board_id;
+            END;
+            """
+        )
+
+        # Images are moved between boards by updating their `board_id`.
+        self._cursor.execute(
+            """--sql
+            CREATE TRIGGER tg_board_images_count_update
+            AFTER UPDATE OF board_id
+            ON board_images FOR EACH ROW
+            WHEN old.board_id != new.board_id
+                AND NOT EXISTS (SELECT 1 FROM images WHERE image_name = new.image_name AND deleted_at IS NOT NULL)
+            BEGIN
+                UPDATE board_image_counts SET image_count = image_count - 1
+                    WHERE board_id = old.board_id;
+                INSERT INTO board_image_counts (board_id, image_count) VALUES (new.board_id, 1)
+                    ON CONFLICT (board_id) DO UPDATE SET image_count = image_count + 1;
+            END;
+            """
+        )
+
+        # Deleting an image takes it out of its board's count, restoring it puts it back.
+        self._cursor.execute(
+            """--sql
+            CREATE TRIGGER IF NOT EXISTS tg_images_board_count_delete
+            AFTER UPDATE OF deleted_at
+            ON images FOR EACH ROW WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL
+            BEGIN
+                UPDATE board_image_counts SET image_count = image_count - 1
+                    WHERE board_id = (SELECT board_id FROM board_images WHERE image_name = new.image_name);
+            END;
+            """
+        )
+
+        self._cursor.execute(
+            """--sql
+            CREATE TRIGGER IF NOT EXISTS tg_images_board_count_restore
+            AFTER UPDATE OF deleted_at
+            ON images FOR EACH ROW WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL
+            BEGIN
+                INSERT INTO board_image_counts (board_id, image_count)
+                    SELECT board_id, 1 FROM board_images WHERE image_name = new.image_name
+                    ON CONFLICT (board_id) DO UPDATE SET image_count = image_count + 1;
+            END;
+            """
+        )
+
+        # Count the images of databases that predate the table.
+        if not has_image_counts:
+            self._cursor.execute(
+                """--sql
+                INSERT INTO board_image_counts (board_id, image_count)
+                SELECT board_images.board_id, COUNT(*)
+                FROM board_images
+                JOIN images ON images.image_name = board_images.image_name AND images.deleted_at IS NULL
+                GROUP BY board_images.board_id;
+                """
+            )
+
     def add_image_to_board(
         self,
         board_id: str,
@@ -173,6 +313,50 @@ class SqliteBoardImageRecordStorage(BoardImageRecordStorageBase):
         finally:
             self._lock.release()
 
+    def add_images_to_board(
+        self,
+        board_id: str,
+        image_names: list[str],
+    ) -> None:
+        try:
+            self._lock.acquire()
+            self._cursor.executemany(
+                """--sql
+                INSERT INTO board_images (board_id, image_name)
+                VALUES (?, ?)
+                ON CONFLICT (image_name) DO UPDATE SET board_id = ?;
+                """,
+                [(board_id, image_name, board_id) for image_name in image_names],
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            self._conn.rollback()
+            raise e
+        finally:
+            self._lock.release()
+
+    def remove_images_from_board(
+        self,
+        image_names: list[str],
+    ) -> None:
+        try:
+            placeholders = ",".join("?" for _ in image_names)
+
+            self._lock.acquire()
+            self._cursor.execute(
+                f"""--sql
+                DELETE FROM board_images
+                WHERE image_name IN ({placeholders});
+                """,
+                image_names,
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            self._conn.rollback()
+            raise e
+        finally:
+            self._lock.release()
+
     def get_images_for_board(
         self,
         board_id: str,
@@ -187,7 +371,7 @@ class SqliteBoardImageRecordStorage(BoardImageRecordStorageBase):
                 SELECT images.*
                 FROM board_images
                 INNER JOIN images ON board_images.image_name = images.image_name
-                WHERE board_images.board_id = ?
+                WHERE board_images.board_id = ? AND images.deleted_at IS NULL
                 ORDER BY board_images.updated_at DESC;
                 """,
                 (board_id,),
@@ -197,7 +381,7 @@ class SqliteBoardImageRecordStorage(BoardImageRecordStorageBase):
 
             self._cursor.execute(
                 """--sql
-                SELECT COUNT(*) FROM images WHERE 1=1;
+                SELECT COUNT(*) FROM images WHERE deleted_at IS NULL;
                 """
             )
             count = cast(int, self._cursor.fetchone()[0])
@@ -214,9 +398,10 @@ class SqliteBoardImageRecordStorage(BoardImageRecordStorageBase):
             self._lock.acquire()
             self._cursor.execute(
                 """--sql
-                SELECT image_name
+                SELECT board_images.image_name
                 FROM board_images
-                WHERE board_id = ?;
+                JOIN images ON images.image_name = board_images.image_name
+                WHERE board_images.board_id = ? AND images.deleted_at IS NULL;
                 """,
                 (board_id,),
             )
@@ -258,12 +443,61 @@ class SqliteBoardImageRecordStorage(BoardImageRecordStorageBase):
             self._lock.acquire()
             self._cursor.execute(
                 """--sql
-                SELECT COUNT(*) FROM board_images WHERE board_id = ?;
+                SELECT image_count FROM board_image_counts WHERE board_id = ?;
                 """,
                 (board_id,),
             )
-            count = cast(int, self._cursor.fetchone()[0])
-            return count
+            result = self._cursor.fetchone()
+            return cast(int, result[0]) if result is not None else 0
+        except sqlite3.Error as e:
+            self._conn.rollback()
+            raise e
+        finally:
+            self._lock.release()
+
+    def get_board_summaries(
+        self,
+        board_ids: Optional[list[str]] = None,
+    ) -> dict[str, BoardImageSummary]:
+        if board_ids is not None and len(board_ids) == 0:
+            return dict()
+
+        if board_ids is None:
+            covers_filter = counts_filter = ""
+            params: tuple = ()
+        else:
+            placeholders = ", ".join("?" * len(board_ids))
+            covers_filter = f"WHERE board_images.board_id IN ({placeholders})"
+            counts_filter = f"WHERE counts.board_id IN ({placeholders})"
+            params = tuple(board_ids) * 2
+
+        try:
+            self._lock.acquire()
+            # The cover image is the most recent image of the board.
+            self._cursor.execute(
+                f"""--sql
+                WITH covers AS (
+                    SELECT board_images.board_id, images.image_name,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY board_images.board_id ORDER BY images.created_at DESC
+                        ) AS recency
+                    FROM board_images
+                    JOIN images ON images.image_name = board_images.image_name AND images.deleted_at IS NULL
+                    {covers_filter}
+                )
+                SELECT counts.board_id, counts.image_count, covers.image_name AS cover_image_name
+                FROM board_image_counts AS counts
+                LEFT JOIN covers ON covers.board_id = counts.board_id AND covers.recency = 1
+                {counts_filter};
+                """,
+                params,
+            )
+            result = cast(list[sqlite3.Row], self._cursor.fetchall())
+            return {
+                r["board_id"]: BoardImageSummary(cover_image_name=r["cover_image_name"], image_count=r["image_count"])
+                for r in result
+                if r["image_count"] > 0
+            }
         except sqlite3.Error as e:
             self._conn.rollback()
             raise e
@@ -37,6 +37,23 @@ class BoardImagesServiceABC(ABC):
         """Removes an image from a board."""
         pass
 
+    @abstractmethod
+    def add_images_to_board(
+        self,
+        board_id: str,
+        image_names: list[str],
+    ) -> None:
+        """Adds many images to a board, moving them from their current boards."""
+        pass
+
+    @abstractmethod
+    def remove_images_from_board(
+        self,
+        image_names: list[str],
+    ) -> None:
+        """Removes many images from their boards."""
+        pass
+
     @abstractmethod
     def get_all_board_image_names_for_board(
         self,
@@ -98,6 +115,19 @@ class BoardImagesService(BoardImagesServiceABC):
     ) -> None:
         self._services.board_image_records.remove_image_from_board(board_id, image_name)
 
+    def add_images_to_board(
+        self,
+        board_id: str,
+        image_names: list[str],
+    ) -> None:
+        self._services.board_image_records.add_images_to_board(board_id, image_names)
+
+    def remove_images_from_board(
+        self,
+        image_names: list[str],
+    ) -> None:
+        self._services.board_image_records.remove_images_from_board(image_names)
+
     def get_all_board_image_names_for_board(
         self,
         board_id: str,
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 
 from logging import Logger
-from invokeai.app.services.board_image_record_storage import BoardImageRecordStorageBase
+from invokeai.app.services.board_image_record_storage import BoardImageRecordStorageBase, BoardImageSummary
 from invokeai.app.services.board_images import board_record_to_dto
 
 from invokeai.app.services.board_record_storage import (
@@ -12,7 +12,7 @@ from invokeai.app.services.image_record_storage import (
     ImageRecordStorageBase,
     OffsetPaginatedResults,
 )
-from invokeai.app.services.models.board_record import BoardDTO
+from invokeai.app.services.models.board_record import BoardDTO, BoardRecord
 from invokeai.app.services.urls import UrlServiceBase
 
 
@@ -108,13 +108,7 @@ class BoardService(BoardServiceABC):
 
     def get_dto(self, board_id: str) -> BoardDTO:
         board_record = self._services.board_records.get(board_id)
-        cover_image = self._services.image_records.get_most_recent_image_for_board(board_record.board_id)
-        if cover_image:
-            cover_image_name = cover_image.image_name
-        else:
-            cover_image_name = None
-        image_count = self._services.board_image_records.get_image_count_for_board(board_id)
-        return board_record_to_dto(board_record, cover_image_name, image_count)
+        return self._to_dtos([board_record])[0]
 
     def update(
         self,
@@ -122,44 +116,26 @@ class BoardService(BoardServiceABC):
         changes: BoardChanges,
     ) -> BoardDTO:
         board_record = self._services.board_records.update(board_id, changes)
-        cover_image = self._services.image_records.get_most_recent_image_for_board(board_record.board_id)
-        if cover_image:
-            cover_image_name = cover_image.image_name
-        else:
-            cover_image_name = None
-
-        image_count = self._services.board_image_records.get_image_count_for_board(board_id)
-        return board_record_to_dto(board_record, cover_image_name, image_count)
+        return self._to_dtos([board_record])[0]
 
     def delete(self, board_id: str) -> None:
         self._services.board_records.delete(board_id)
 
     def get_many(self, offset: int = 0, limit: int = 10) -> OffsetPaginatedResults[BoardDTO]:
         board_records = self._services.board_records.get_many(offset, limit)
-        board_dtos = []
-        for r in board_records.items:
-            cover_image = self._services.image_records.get_most_recent_image_for_board(r.board_id)
-            if cover_image:
-                cover_image_name = cover_image.image_name
-            else:
-                cover_image_name = None
-
-            image_count = self._services.board_image_records.get_image_count_for_board(r.board_id)
-            board_dtos.append(board_record_to_dto(r, cover_image_name, image_count))
-
-        return OffsetPaginatedResults[BoardDTO](items=board_dtos, offset=offset, limit=limit, total=len(board_dtos))
+        board_dtos = self._to_dtos(board_records.items)
+        return OffsetPaginatedResults[BoardDTO](items=board_dtos, offset=offset, limit=limit, total=board_records.total)
 
     def get_all(self) -> list[BoardDTO]:
         board_records = self._services.board_records.get_all()
+        return self._to_dtos(board_records, all_boards=True)
+
+    def _to_dtos(self, board_records: list[BoardRecord], all_boards: bool = False) -> list[BoardDTO]:
+        """Adds the cover image and image count to the board records, looking them up in a single query."""
+        board_ids = None if all_boards else [r.board_id for r in board_records]
+        summaries = self._services.board_image_records.get_board_summaries(board_ids)
         board_dtos = []
         for r in board_records:
-            cover_image = self._services.image_records.get_most_recent_image_for_board(r.board_id)
-            if cover_image:
-                cover_image_name = cover_image.image_name
-            else:
-                cover_image_name = None
-
-            image_count = self._services.board_image_records.get_image_count_for_board(r.board_id)
-            board_dtos.append(board_record_to_dto(r, cover_image_name, image_count))
-
+            summary = summaries.get(r.board_id, BoardImageSummary())
+            board_dtos.append(board_record_to_dto(r, summary.cover_image_name, summary.image_count))
         return board_dtos
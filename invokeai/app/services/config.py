@@ -384,6 +384,7 @@ class InvokeAIAppConfig(InvokeAISettings):
     allow_credentials   : bool = Field(default=True, description="Allow CORS credentials", category='Web Server')
     allow_methods       : List[str] = Field(default=["*"], description="Methods allowed for CORS", category='Web Server')
     allow_headers       : List[str] = Field(default=["*"], description="Headers allowed for CORS", category='Web Server')
+    max_upload_size     : int = Field(default=100, gt=0, description="Maximum size of an uploaded image, in megabytes", category='Web Server')
 
     esrgan              : bool = Field(default=True, description="Enable/disable upscaling code", category='Features')
     internet_available  : bool = Field(default=True, description="If true, attempt to download models on the fly; otherwise only use local models", category='Features')
@@ -402,6 +403,15 @@ class InvokeAIAppConfig(InvokeAISettings):
     sequential_guidance : bool = Field(default=False, description="Whether to calculate guidance in serial instead of in parallel, lowering memory requirements", category='Memory/Performance')
     xformers_enabled    : bool = Field(default=True, description="Enable/disable memory-efficient attention", category='Memory/Performance')
     tiled_decode        : bool = Field(default=False, description="Whether to enable tiled VAE decode (reduces memory consumption with some performance penalty)", category='Memory/Performance')
+    denoise_batch_size  : int = Field(default=4, gt=0, description="Maximum number of latents to denoise at once when a node is given a batch of noise", category='Memory/Performance')
+    denoise_coalesce_window : float = Field(default=0.0, ge=0, description="Seconds to wait for compatible denoise requests from other sessions to run together in a single batch (0 disables coalescing)", category='Memory/Performance')
+    denoise_coalesce_size : int = Field(default=4, gt=0, description="Maximum number of denoise requests to coalesce into a single batch", category='Memory/Performance')
+    model_prefetch      : bool = Field(default=True, description="Load the models of queued sessions into RAM ahead of time, when they fit without evicting other models", category='Memory/Performance')
+    node_cache_size     : int = Field(default=0, ge=0, description="How many node outputs to keep for reuse when a node is invoked again with identical inputs (0 disables the cache)", category='Memory/Performance')
+    session_stats_event : bool = Field(default=False, description="Send clients a summary of the time and memory used by the nodes of each session when it completes", category='Memory/Performance')
+    image_retention     : float = Field(default=24.0, ge=0, description="Hours that deleted images can be restored before their files and records are purged", category='Memory/Performance')
+    image_purge_batch_size : int = Field(default=100, gt=0, description="Maximum number of deleted images to purge at once", category='Memory/Performance')
+    image_purge_interval : float = Field(default=1.0, gt=0, description="Seconds to pause between batches of purged images", category='Memory/Performance')
 
     root                : Path = Field(default=_find_root(), description='InvokeAI runtime root directory', category='Paths')
     autoimport_dir      : Path = Field(default='autoimport', description='Path to a directory of models files to be imported on startup.', category='Paths')
@@ -108,6 +108,16 @@ class EventServiceBase:
             ),
         )
 
+    def emit_session_stats(self, graph_execution_state_id: str, stats: dict) -> None:
+        """Emitted after a session has completed, with the timings and memory use of its nodes"""
+        self.__emit_session_event(
+            event_name="session_stats",
+            payload=dict(
+                graph_execution_state_id=graph_execution_state_id,
+                stats=stats,
+            ),
+        )
+
     def emit_model_load_started(
         self,
         graph_execution_state_id: str,
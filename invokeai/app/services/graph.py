@@ -3,6 +3,8 @@
 import copy
 import itertools
 import uuid
+from collections import Counter
+from functools import lru_cache
 from typing import (
     Annotated,
     Any,
@@ -15,7 +17,7 @@ from typing import (
 )
 
 import networkx as nx
-from pydantic import BaseModel, root_validator, validator
+from pydantic import BaseModel, PrivateAttr, root_validator, validator
 from pydantic.fields import Field
 
 from ..invocations import *
@@ -49,16 +51,22 @@ class Edge(BaseModel):
     destination: EdgeConnection = Field(description="The connection for the edge's to node and field")
 
 
+@lru_cache(maxsize=None)
+def _get_type_hints(t: type) -> dict[str, Any]:
+    # type hints of invocations and outputs never change once defined
+    return get_type_hints(t)
+
+
 def get_output_field(node: BaseInvocation, field: str) -> Any:
     node_type = type(node)
-    node_outputs = get_type_hints(node_type.get_output_type())
+    node_outputs = _get_type_hints(node_type.get_output_type())
     node_output_field = node_outputs.get(field) or None
     return node_output_field
 
 
 def get_input_field(node: BaseInvocation, field: str) -> Any:
     node_type = type(node)
-    node_inputs = get_type_hints(node_type)
+    node_inputs = _get_type_hints(node_type)
     node_input_field = node_inputs.get(field) or None
     return node_input_field
 
@@ -91,6 +99,14 @@ def is_list_or_contains_list(t):
 
 
 def are_connection_types_compatible(from_type: Any, to_type: Any) -> bool:
+    try:
+        return _are_connection_types_compatible_cached(from_type, to_type)
+    except TypeError:
+        # unhashable type annotation, can't be memoized
+        return _are_connection_types_compatible(from_type, to_type)
+
+
+def _are_connection_types_compatible(from_type: Any, to_type: Any) -> bool:
     if not from_type:
         return False
     if not to_type:
@@ -123,6 +139,9 @@ def are_connection_types_compatible(from_type: Any, to_type: Any) -> bool:
     return True
 
 
+_are_connection_types_compatible_cached = lru_cache(maxsize=None)(_are_connection_types_compatible)
+
+
 def are_connections_compatible(
     from_node: BaseInvocation, from_field: str, to_node: BaseInvocation, to_field: str
 ) -> bool:
@@ -256,6 +275,23 @@ class Graph(BaseModel):
         default_factory=list,
     )
 
+    _index: Optional["_GraphIndex"] = PrivateAttr(default=None)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in ("nodes", "edges"):
+            self._index = None
+
+    def _get_index(self) -> "_GraphIndex":
+        """Returns the adjacency index of this graph, rebuilding it if it was dropped or a subgraph changed"""
+        if self._index is None or not self._index.is_current(self):
+            self._index = _GraphIndex(self)
+        return self._index
+
+    def _get_current_index(self) -> Optional["_GraphIndex"]:
+        """Returns the adjacency index if it can be updated incrementally"""
+        return self._index if self._index is not None and self._index.is_current(self) else None
+
     def add_node(self, node: BaseInvocation) -> None:
         """Adds a node to a graph
 
@@ -265,8 +301,14 @@ class Graph(BaseModel):
         if node.id in self.nodes:
             raise NodeAlreadyInGraphError()
 
+        index = self._get_current_index()
         self.nodes[node.id] = node
 
+        if index is not None and not isinstance(node, GraphInvocation):
+            index.add_node(node)
+        else:
+            self._index = None
+
     def _get_graph_and_node(self, node_path: str) -> tuple["Graph", str]:
         """Returns the graph and node id for a node path."""
         # Materialized graphs may have nodes at the top level
@@ -302,6 +344,7 @@ class Graph(BaseModel):
                 edge_graph.delete_edge(edge)
 
             del graph.nodes[node_id]
+            graph._index = None
 
         except NodeNotFoundError:
             pass  # Ignore, not doesn't exist (should this throw?)
@@ -313,19 +356,25 @@ class Graph(BaseModel):
         """
 
         self._validate_edge(edge)
-        if edge not in self.edges:
+        index = self._get_index()
+        if not index.has_edge(edge):
             self.edges.append(edge)
+            index.add_edge(edge)
         else:
             raise InvalidEdgeError()
 
     def delete_edge(self, edge: Edge) -> None:
         """Deletes an edge from a graph"""
 
+        index = self._get_current_index()
         try:
             self.edges.remove(edge)
         except KeyError:
             pass
 
+        if index is not None:
+            index.remove_edge(edge)
+
     def is_valid(self) -> bool:
         """Validates the graph."""
 
@@ -339,8 +388,9 @@ class Graph(BaseModel):
         if not all((self.has_node(node_id) for node_id in node_ids)):
             return False
 
-        # Validate there are no cycles
-        g = self.nx_graph_flat()
+        # Validate there are no cycles, against a fresh index: the nodes and edges may have been edited directly
+        self._index = _GraphIndex(self)
+        g = self._index.flat_graph
         if not nx.is_directed_acyclic_graph(g):
             return False
 
@@ -392,9 +442,7 @@ class Graph(BaseModel):
             )
 
         # Validate that no cycles would be created
-        g = self.nx_graph_flat()
-        g.add_edge(edge.source.node_id, edge.destination.node_id)
-        if not nx.is_directed_acyclic_graph(g):
+        if self._get_index().creates_cycle(edge.source.node_id, edge.destination.node_id):
             raise InvalidEdgeError(
                 f"Edge creates a cycle in the graph: {edge.source.node_id} -> {edge.destination.node_id}"
             )
@@ -470,6 +518,7 @@ class Graph(BaseModel):
 
         # Set the new node in the graph
         graph.nodes[new_node.id] = new_node
+        graph._index = None
         if new_node.id != node.id:
             input_edges = self._get_input_edges_and_graphs(node_path)
             output_edges = self._get_output_edges_and_graphs(node_path)
@@ -535,7 +584,7 @@ class Graph(BaseModel):
         edges = list()
 
         # Return any input edges that appear in this graph
-        edges.extend([(self, prefix, e) for e in self.edges if e.destination.node_id == node_path])
+        edges.extend([(self, prefix, e) for e in self._get_index().input_edges.get(node_path, [])])
 
         node_id = node_path if "." not in node_path else node_path[: node_path.index(".")]
         node = self.nodes[node_id]
@@ -577,7 +626,7 @@ class Graph(BaseModel):
         edges = list()
 
         # Return any input edges that appear in this graph
-        edges.extend([(self, prefix, e) for e in self.edges if e.source.node_id == node_path])
+        edges.extend([(self, prefix, e) for e in self._get_index().output_edges.get(node_path, [])])
 
         node_id = node_path if "." not in node_path else node_path[: node_path.index(".")]
         node = self.nodes[node_id]
@@ -713,6 +762,110 @@ class Graph(BaseModel):
         return g
 
 
+class _GraphIndex:
+    """
+    Adjacency index for a single Graph: the edges into and out of each node path, the
+    set of edges, and the flattened networkx graph (including subgraphs) used for cycle
+    checks. Graph's own mutators keep it up to date or drop it, and it is rebuilt when it
+    was dropped or a subgraph's index changed. Editing the node or edge collections in
+    place bypasses it, only is_valid() rebuilds it regardless.
+    """
+
+    def __init__(self, graph: Graph):
+        self.version = 0
+        self.input_edges: dict[str, list[Edge]] = dict()
+        self.output_edges: dict[str, list[Edge]] = dict()
+        self.edge_keys: set[tuple[str, str, str, str]] = set()
+        self.connection_counts: Counter[tuple[str, str]] = Counter()
+        for edge in graph.edges:
+            self._add(edge)
+
+        self.flat_graph = graph.nx_graph_flat()
+        self.subgraph_indexes = {
+            n.id: n.graph._get_index() for n in graph.nodes.values() if isinstance(n, GraphInvocation)
+        }
+        self.subgraph_versions = {k: v.version for k, v in self.subgraph_indexes.items()}
+
+    @staticmethod
+    def _edge_key(edge: Edge) -> tuple[str, str, str, str]:
+        return (edge.source.node_id, edge.source.field, edge.destination.node_id, edge.destination.field)
+
+    def is_current(self, graph: Graph) -> bool:
+        for node_id, subgraph_index in self.subgraph_indexes.items():
+            node = graph.nodes.get(node_id)
+            if not isinstance(node, GraphInvocation) or node.graph._get_index() is not subgraph_index:
+                return False
+            if subgraph_index.version != self.subgraph_versions[node_id]:
+                return False
+
+        return True
+
+    def _add(self, edge: Edge) -> None:
+        self.input_edges.setdefault(edge.destination.node_id, []).append(edge)
+        self.output_edges.setdefault(edge.source.node_id, []).append(edge)
+        self.edge_keys.add(self._edge_key(edge))
+        self.connection_counts[(edge.source.node_id, edge.destination.node_id)] += 1
+
+    def _updated(self) -> None:
+        self.version += 1
+
+    def has_edge(self, edge: Edge) -> bool:
+        return self._edge_key(edge) in self.edge_keys
+
+    def add_node(self, node: BaseInvocation) -> None:
+        if not isinstance(node, IterateInvocation):
+            self.flat_graph.add_node(node.id)
+        self._updated()
+
+    def add_edge(self, edge: Edge) -> None:
+        self._add(edge)
+        self.flat_graph.add_edge(edge.source.node_id, edge.destination.node_id)
+        self._updated()
+
+    def remove_edge(self, edge: Edge) -> None:
+        key = self._edge_key(edge)
+        if key not in self.edge_keys:
+            return
+
+        self.edge_keys.remove(key)
+        self.input_edges[edge.destination.node_id] = [
+            e for e in self.input_edges[edge.destination.node_id] if self._edge_key(e) != key
+        ]
+        self.output_edges[edge.source.node_id] = [
+            e for e in self.output_edges[edge.source.node_id] if self._edge_key(e) != key
+        ]
+
+        connection = (edge.source.node_id, edge.destination.node_id)
+        self.connection_counts[connection] -= 1
+        if self.connection_counts[connection] <= 0:
+            del self.connection_counts[connection]
+            self.flat_graph.remove_edge(*connection)
+        self._updated()
+
+    def creates_cycle(self, from_node_path: str, to_node_path: str) -> bool:
+        """Whether adding a connection between the two node paths would create a cycle"""
+        if from_node_path == to_node_path:
+            return True
+        if from_node_path not in self.flat_graph or to_node_path not in self.flat_graph:
+            return False
+        return nx.has_path(self.flat_graph, to_node_path, from_node_path)
+
+
+# the keys of the node types, prompts and model names sessions are searched by
+GRAPH_EXECUTION_STATE_SEARCH_KEYS = [
+    "type",
+    "prompt",
+    "style",
+    "positive_prompt",
+    "negative_prompt",
+    "positive_style_prompt",
+    "negative_style_prompt",
+    "model_name",
+]
+# only the graph as it was submitted is searched, it doesn't change while the session runs
+GRAPH_EXECUTION_STATE_SEARCH_PATH = "$.graph"
+
+
 class GraphExecutionState(BaseModel):
     """Tracks the state of a graph execution"""
 
@@ -1025,7 +1178,7 @@ class GraphExecutionState(BaseModel):
         return self.execution_graph.nodes[next_node]
 
     def _prepare_inputs(self, node: BaseInvocation):
-        input_edges = [e for e in self.execution_graph.edges if e.destination.node_id == node.id]
+        input_edges = self.execution_graph._get_index().input_edges.get(node.id, [])
         if isinstance(node, CollectInvocation):
             output_collection = [
                 getattr(self.results[edge.source.node_id], edge.source.field)
@@ -1,9 +1,13 @@
 # Copyright (c) 2022 Kyle Schouviller (https://github.com/kyle0654) and the InvokeAI Team
 import json
+import os
+import shutil
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from pathlib import Path
 from queue import Queue
-from typing import Dict, Optional, Union
+from threading import Lock
+from typing import BinaryIO, Dict, Optional, Union
 
 from PIL import Image, PngImagePlugin
 from PIL.Image import Image as PILImageType
@@ -11,6 +15,9 @@ from send2trash import send2trash
 
 from invokeai.app.util.thumbnails import get_thumbnail_name, make_thumbnail
 
+# bytes of thumbnails of other sizes than the one saved with each image kept on disk
+DEFAULT_SIZED_THUMBNAILS_CACHE_SIZE = 256 * 1024 * 1024
+
 
 # TODO: Should these excpetions subclass existing python exceptions?
 class ImageFileNotFoundException(Exception):
@@ -66,11 +73,26 @@ class ImageFileStorageBase(ABC):
         """Saves an image and a 256x256 WEBP thumbnail. Returns a tuple of the image name, thumbnail name, and created timestamp."""
         pass
 
+    @abstractmethod
+    def save_file(self, file: BinaryIO, image_name: str, thumbnail_size: int = 256) -> None:
+        """Saves a PNG file as is, and a 256x256 WEBP thumbnail of it."""
+        pass
+
+    @abstractmethod
+    def get_sized_thumbnail_path(self, image_name: str, size: int) -> str:
+        """Gets the path to a WEBP thumbnail of an image that fits in size x size, making it if needed."""
+        pass
+
     @abstractmethod
     def delete(self, image_name: str) -> None:
         """Deletes an image and its thumbnail (if one exists)."""
         pass
 
+    @abstractmethod
+    def delete_many(self, image_names: list[str]) -> None:
+        """Deletes many images and their thumbnails."""
+        pass
+
 
 class DiskImageFileStorage(ImageFileStorageBase):
     """Stores images on disk"""
@@ -79,14 +101,27 @@ class DiskImageFileStorage(ImageFileStorageBase):
     __cache_ids: Queue  # TODO: this is an incredibly naive cache
     __cache: Dict[Path, PILImageType]
     __max_cache_size: int
+    # sizes in bytes of the thumbnails of other sizes, least recently used first
+    __sized_thumbnails: Optional[OrderedDict[Path, int]]
+    __sized_thumbnails_bytes: int
+    __sized_thumbnails_lock: Lock
 
-    def __init__(self, output_folder: Union[str, Path]):
+    def __init__(
+        self,
+        output_folder: Union[str, Path],
+        max_sized_thumbnails_size: int = DEFAULT_SIZED_THUMBNAILS_CACHE_SIZE,
+    ):
         self.__cache = dict()
         self.__cache_ids = Queue()
         self.__max_cache_size = 10  # TODO: get this from config
+        self.__max_sized_thumbnails_size = max_sized_thumbnails_size
+        self.__sized_thumbnails = None
+        self.__sized_thumbnails_bytes = 0
+        self.__sized_thumbnails_lock = Lock()
 
         self.__output_folder: Path = output_folder if isinstance(output_folder, Path) else Path(output_folder)
         self.__thumbnails_folder = self.__output_folder / "thumbnails"
+        self.__sized_thumbnails_folder = self.__thumbnails_folder / "sizes"
 
         # Validate required output folders at launch
         self.__validate_storage_folders()
@@ -135,22 +170,79 @@ class DiskImageFileStorage(ImageFileStorageBase):
         except Exception as e:
             raise ImageFileSaveException from e
 
-    def delete(self, image_name: str) -> None:
+    def save_file(self, file: BinaryIO, image_name: str, thumbnail_size: int = 256) -> None:
         try:
+            self.__validate_storage_folders()
             image_path = self.get_path(image_name)
 
-            if image_path.exists():
-                send2trash(image_path)
-            if image_path in self.__cache:
-                del self.__cache[image_path]
-
+            with open(image_path, "wb") as image_file:
+                shutil.copyfileobj(file, image_file)
             thumbnail_name = get_thumbnail_name(image_name)
-            thumbnail_path = self.get_path(thumbnail_name, True)
+            thumbnail_path = self.get_path(thumbnail_name, thumbnail=True)
+            with Image.open(image_path) as image:
+                thumbnail_image = make_thumbnail(image, thumbnail_size)
+            thumbnail_image.save(thumbnail_path)
 
-            if thumbnail_path.exists():
-                send2trash(thumbnail_path)
-            if thumbnail_path in self.__cache:
-                del self.__cache[thumbnail_path]
+            self.__set_cache(thumbnail_path, thumbnail_image)
+        except Exception as e:
+            raise ImageFileSaveException from e
+
+    def get_sized_thumbnail_path(self, image_name: str, size: int) -> Path:
+        thumbnail_path = self.__sized_thumbnails_folder / str(size) / get_thumbnail_name(image_name)
+        with self.__sized_thumbnails_lock:
+            sized_thumbnails = self.__get_sized_thumbnails()
+            if thumbnail_path in sized_thumbnails:
+                sized_thumbnails.move_to_end(thumbnail_path)
+                return thumbnail_path
+
+        image_path = self.get_path(image_name)
+        if not image_path.exists():
+            raise ImageFileNotFoundException
+
+        try:
+            thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+            with Image.open(image_path) as image:
+                thumbnail_image = make_thumbnail(image, size)
+            # requests for the same thumbnail may make it at the same time
+            tmp_path = thumbnail_path.with_suffix(f".{os.getpid()}.{id(thumbnail_image)}.tmp")
+            thumbnail_image.save(tmp_path, "WEBP")
+            os.replace(tmp_path, thumbnail_path)
+        except Exception as e:
+            raise ImageFileSaveException from e
+
+        with self.__sized_thumbnails_lock:
+            self.__remove_sized_thumbnail(thumbnail_path, unlink=False)
+            size_bytes = thumbnail_path.stat().st_size
+            self.__get_sized_thumbnails()[thumbnail_path] = size_bytes
+            self.__sized_thumbnails_bytes += size_bytes
+            self.__evict_sized_thumbnails()
+        return thumbnail_path
+
+    def delete(self, image_name: str) -> None:
+        self.delete_many([image_name])
+
+    def delete_many(self, image_names: list[str]) -> None:
+        try:
+            paths: list[Path] = []
+            thumbnail_names: list[str] = []
+            for image_name in image_names:
+                thumbnail_name = get_thumbnail_name(image_name)
+                thumbnail_names.append(thumbnail_name)
+                for path in (self.get_path(image_name), self.get_path(thumbnail_name, True)):
+                    if path.exists():
+                        paths.append(path)
+                    if path in self.__cache:
+                        del self.__cache[path]
+
+            # one call, trashing is slow per file on some platforms
+            if paths:
+                send2trash([str(path) for path in paths])
+
+            # the thumbnails of other sizes can be made again, they are just removed
+            with self.__sized_thumbnails_lock:
+                for size_folder in self.__sized_thumbnails_folder.iterdir():
+                    for thumbnail_name in thumbnail_names:
+                        self.__remove_sized_thumbnail(size_folder / thumbnail_name)
         except Exception as e:
             raise ImageFileDeleteException from e
 
@@ -171,10 +263,31 @@ class DiskImageFileStorage(ImageFileStorageBase):
 
     def __validate_storage_folders(self) -> None:
         """Checks if the required output folders exist and create them if they don't"""
-        folders: list[Path] = [self.__output_folder, self.__thumbnails_folder]
+        folders: list[Path] = [self.__output_folder, self.__thumbnails_folder, self.__sized_thumbnails_folder]
         for folder in folders:
             folder.mkdir(parents=True, exist_ok=True)
 
+    def __get_sized_thumbnails(self) -> OrderedDict[Path, int]:
+        """The thumbnails of other sizes, read from disk the first time, oldest first"""
+        if self.__sized_thumbnails is None:
+            paths = list(self.__sized_thumbnails_folder.glob("*/*.webp"))
+            stats = {path: path.stat() for path in paths}
+            paths.sort(key=lambda path: stats[path].st_mtime)
+            self.__sized_thumbnails = OrderedDict((path, stats[path].st_size) for path in paths)
+            self.__sized_thumbnails_bytes = sum(self.__sized_thumbnails.values())
+        return self.__sized_thumbnails
+
+    def __remove_sized_thumbnail(self, path: Path, unlink: bool = True) -> None:
+        self.__sized_thumbnails_bytes -= self.__get_sized_thumbnails().pop(path, 0)
+        if unlink:
+            path.unlink(missing_ok=True)
+
+    def __evict_sized_thumbnails(self) -> None:
+        """Removes the least recently used thumbnails of other sizes until they fit in the cache, except the last one"""
+        sized_thumbnails = self.__get_sized_thumbnails()
+        while self.__sized_thumbnails_bytes > self.__max_sized_thumbnails_size and len(sized_thumbnails) > 1:
+            self.__remove_sized_thumbnail(next(iter(sized_thumbnails)))
+
     def __get_cache(self, image_name: Path) -> Optional[PILImageType]:
         return None if image_name not in self.__cache else self.__cache[image_name]
 
@@ -0,0 +1,48 @@
+# Copyright (c) 2023 the InvokeAI Team
+
+from __future__ import annotations
+
+from threading import Event, Thread
+from typing import TYPE_CHECKING
+
+import invokeai.backend.util.logging as logger
+
+if TYPE_CHECKING:
+    from invokeai.app.services.images import ImageServiceABC
+
+# seconds to wait for deleted images to come of age once there are none left to purge
+PURGE_IDLE_INTERVAL = 60.0
+
+
+class ImagePurger:
+    """Removes the files and records of deleted images in a background thread, once they have been deleted
+    for longer than the retention period. Until then, deleted images can be restored.
+
+    Images are purged in batches with a pause in between, so that clearing many images at once doesn't
+    hold the database lock or the disk for long stretches while sessions run.
+    """
+
+    def __init__(self, images: ImageServiceABC, retention: float, batch_size: int, interval: float):
+        self.__images = images
+        self.__retention = retention
+        self.__batch_size = batch_size
+        self.__interval = interval
+        self.__stop_event = Event()
+        self.__thread = Thread(name="image_purger", target=self.__process, daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop_event.set()
+
+    def __process(self):
+        while not self.__stop_event.is_set():
+            try:
+                count = self.__images.purge_deleted(self.__retention, self.__batch_size)
+            except Exception as e:
+                logger.error(f"Image purge failed: {e}")
+                count = 0
+
+            if count > 0:
+                logger.debug(f"Purged {count} deleted images")
+            # a full batch means there may be more to purge right away
+            self.__stop_event.wait(self.__interval if count >= self.__batch_size else PURGE_IDLE_INTERVAL)
@@ -64,6 +64,7 @@ IMAGE_DTO_COLS = ", ".join(
                 "session_id",
                 "node_id",
                 "is_intermediate",
+                "starred",
                 "created_at",
                 "updated_at",
                 "deleted_at",
@@ -97,6 +98,15 @@ class ImageRecordStorageBase(ABC):
         """Updates an image record."""
         pass
 
+    @abstractmethod
+    def update_many(
+        self,
+        image_names: list[str],
+        changes: ImageRecordChanges,
+    ) -> None:
+        """Applies the same changes to many image records, in one transaction."""
+        pass
+
     @abstractmethod
     def get_many(
         self,
@@ -110,21 +120,37 @@ class ImageRecordStorageBase(ABC):
         """Gets a page of image records."""
         pass
 
-    # TODO: The database has a nullable `deleted_at` column, currently unused.
-    # Should we implement soft deletes? Would need coordination with ImageFileStorage.
+    # Deletes are soft: they set `deleted_at`, which hides the records from every read, and the
+    # records can be restored until they are purged along with their files.
     @abstractmethod
     def delete(self, image_name: str) -> None:
-        """Deletes an image record."""
+        """Marks an image record as deleted."""
         pass
 
     @abstractmethod
     def delete_many(self, image_names: list[str]) -> None:
-        """Deletes many image records."""
+        """Marks many image records as deleted."""
+        pass
+
+    @abstractmethod
+    def delete_intermediates(self) -> int:
+        """Marks all intermediate image records as deleted, returning how many were."""
+        pass
+
+    @abstractmethod
+    def restore_many(self, image_names: list[str]) -> list[str]:
+        """Restores deleted image records that are not yet purged, returning the names of the restored images."""
+        pass
+
+    @abstractmethod
+    def get_deleted(self, older_than: float, limit: int) -> list[str]:
+        """Gets the names of up to `limit` images deleted at least `older_than` seconds ago, oldest first."""
         pass
 
     @abstractmethod
-    def delete_intermediates(self) -> list[str]:
-        """Deletes all intermediate image records, returning a list of deleted image names."""
+    def purge(self, image_names: list[str]) -> list[str]:
+        """Removes deleted image records for good, returning the names of the purged images. Records that
+        are not deleted, because they were restored in the meantime, are left alone."""
         pass
 
     @abstractmethod
@@ -191,15 +217,26 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
                 node_id TEXT,
                 metadata TEXT,
                 is_intermediate BOOLEAN DEFAULT FALSE,
+                starred BOOLEAN DEFAULT FALSE,
                 created_at DATETIME NOT NULL DEFAULT(STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW')),
                 -- Updated via trigger
                 updated_at DATETIME NOT NULL DEFAULT(STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW')),
-                -- Soft delete, currently unused
+                -- Soft delete, see `purge()`
                 deleted_at DATETIME
             );
             """
         )
 
+        # Add the `starred` column to tables created before it existed.
+        self._cursor.execute("PRAGMA table_info(images);")
+        columns = [column[1] for column in self._cursor.fetchall()]
+        if "starred" not in columns:
+            self._cursor.execute(
+                """--sql
+                ALTER TABLE images ADD COLUMN starred BOOLEAN DEFAULT FALSE;
+                """
+            )
+
         # Create the `images` table indices.
         self._cursor.execute(
             """--sql
@@ -221,6 +258,11 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
             CREATE INDEX IF NOT EXISTS idx_images_created_at ON images(created_at);
             """
         )
+        self._cursor.execute(
+            """--sql
+            CREATE INDEX IF NOT EXISTS idx_images_deleted_at ON images(deleted_at);
+            """
+        )
 
         # Add trigger for `updated_at`.
         self._cursor.execute(
@@ -242,7 +284,7 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
             self._cursor.execute(
                 f"""--sql
                 SELECT {IMAGE_DTO_COLS} FROM images
-                WHERE image_name = ?;
+                WHERE image_name = ? AND deleted_at IS NULL;
                 """,
                 (image_name,),
             )
@@ -266,7 +308,7 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
             self._cursor.execute(
                 f"""--sql
                 SELECT images.metadata FROM images
-                WHERE image_name = ?;
+                WHERE image_name = ? AND deleted_at IS NULL;
                 """,
                 (image_name,),
             )
@@ -286,41 +328,43 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
         image_name: str,
         changes: ImageRecordChanges,
     ) -> None:
+        self.update_many([image_name], changes)
+
+    def update_many(
+        self,
+        image_names: list[str],
+        changes: ImageRecordChanges,
+    ) -> None:
+        # Only the columns that may be changed, see ImageRecordChanges
+        assignments: list[str] = []
+        params: list = []
+        if changes.image_category is not None:
+            assignments.append("image_category = ?")
+            params.append(changes.image_category)
+        if changes.session_id is not None:
+            assignments.append("session_id = ?")
+            params.append(changes.session_id)
+        if changes.is_intermediate is not None:
+            assignments.append("is_intermediate = ?")
+            params.append(changes.is_intermediate)
+        if changes.starred is not None:
+            assignments.append("starred = ?")
+            params.append(changes.starred)
+        if not assignments or not image_names:
+            return
+
         try:
-            self._lock.acquire()
-            # Change the category of the image
-            if changes.image_category is not None:
-                self._cursor.execute(
-                    f"""--sql
-                    UPDATE images
-                    SET image_category = ?
-                    WHERE image_name = ?;
-                    """,
-                    (changes.image_category, image_name),
-                )
-
-            # Change the session associated with the image
-            if changes.session_id is not None:
-                self._cursor.execute(
-                    f"""--sql
-                    UPDATE images
-                    SET session_id = ?
-                    WHERE image_name = ?;
-                    """,
-                    (changes.session_id, image_name),
-                )
-
-            # Change the image's `is_intermediate`` flag
-            if changes.is_intermediate is not None:
-                self._cursor.execute(
-                    f"""--sql
-                    UPDATE images
-                    SET is_intermediate = ?
-                    WHERE image_name = ?;
-                    """,
-                    (changes.is_intermediate, image_name),
-                )
+            placeholders = ",".join("?" for _ in image_names)
 
+            self._lock.acquire()
+            self._cursor.execute(
+                f"""--sql
+                UPDATE images
+                SET {", ".join(assignments)}
+                WHERE image_name IN ({placeholders}) AND deleted_at IS NULL;
+                """,
+                params + list(image_names),
+            )
             self._conn.commit()
         except sqlite3.Error as e:
             self._conn.rollback()
@@ -345,14 +389,14 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
             SELECT COUNT(*)
             FROM images
             LEFT JOIN board_images ON board_images.image_name = images.image_name
-            WHERE 1=1
+            WHERE images.deleted_at IS NULL
             """
 
             images_query = f"""--sql
             SELECT {IMAGE_DTO_COLS}
             FROM images
             LEFT JOIN board_images ON board_images.image_name = images.image_name
-            WHERE 1=1
+            WHERE images.deleted_at IS NULL
             """
 
             query_conditions = ""
@@ -429,14 +473,20 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
         return OffsetPaginatedResults(items=images, offset=offset, limit=limit, total=count)
 
     def delete(self, image_name: str) -> None:
+        self.delete_many([image_name])
+
+    def delete_many(self, image_names: list[str]) -> None:
         try:
+            placeholders = ",".join("?" for _ in image_names)
+
             self._lock.acquire()
             self._cursor.execute(
-                """--sql
-                DELETE FROM images
-                WHERE image_name = ?;
+                f"""--sql
+                UPDATE images
+                SET deleted_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW')
+                WHERE image_name IN ({placeholders}) AND deleted_at IS NULL;
                 """,
-                (image_name,),
+                image_names,
             )
             self._conn.commit()
         except sqlite3.Error as e:
@@ -445,44 +495,107 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
         finally:
             self._lock.release()
 
-    def delete_many(self, image_names: list[str]) -> None:
+    def delete_intermediates(self) -> int:
         try:
-            placeholders = ",".join("?" for _ in image_names)
-
             self._lock.acquire()
+            self._cursor.execute(
+                """--sql
+                UPDATE images
+                SET deleted_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW')
+                WHERE is_intermediate = TRUE AND deleted_at IS NULL;
+                """
+            )
+            count = self._cursor.rowcount
+            self._conn.commit()
+            return count
+        except sqlite3.Error as e:
+            self._conn.rollback()
+            raise ImageRecordDeleteException from e
+        finally:
+            self._lock.release()
 
-            # Construct the SQLite query with the placeholders
-            query = f"DELETE FROM images WHERE image_name IN ({placeholders})"
-
-            # Execute the query with the list of IDs as parameters
-            self._cursor.execute(query, image_names)
+    def restore_many(self, image_names: list[str]) -> list[str]:
+        try:
+            placeholders = ",".join("?" for _ in image_names)
 
+            self._lock.acquire()
+            self._cursor.execute(
+                f"""--sql
+                SELECT image_name FROM images
+                WHERE image_name IN ({placeholders}) AND deleted_at IS NOT NULL;
+                """,
+                image_names,
+            )
+            restored = [r[0] for r in self._cursor.fetchall()]
+            self._cursor.execute(
+                f"""--sql
+                UPDATE images
+                SET deleted_at = NULL
+                WHERE image_name IN ({placeholders}) AND deleted_at IS NOT NULL;
+                """,
+                image_names,
+            )
             self._conn.commit()
+            return restored
         except sqlite3.Error as e:
             self._conn.rollback()
-            raise ImageRecordDeleteException from e
+            raise ImageRecordSaveException from e
         finally:
             self._lock.release()
 
-    def delete_intermediates(self) -> list[str]:
+    def get_deleted(self, older_than: float, limit: int) -> list[str]:
         try:
             self._lock.acquire()
             self._cursor.execute(
                 """--sql
                 SELECT image_name FROM images
-                WHERE is_intermediate = TRUE;
-                """
+                WHERE deleted_at IS NOT NULL AND deleted_at <= STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW', ?)
+                ORDER BY deleted_at
+                LIMIT ?;
+                """,
+                (f"-{older_than} seconds", limit),
             )
-            result = cast(list[sqlite3.Row], self._cursor.fetchall())
-            image_names = list(map(lambda r: r[0], result))
+            return [r[0] for r in self._cursor.fetchall()]
+        except sqlite3.Error as e:
+            self._conn.rollback()
+            raise ImageRecordNotFoundException from e
+        finally:
+            self._lock.release()
+
+    def purge(self, image_names: list[str]) -> list[str]:
+        try:
+            placeholders = ",".join("?" for _ in image_names)
+
+            self._lock.acquire()
             self._cursor.execute(
-                """--sql
+                f"""--sql
+                SELECT image_name FROM images
+                WHERE image_name IN ({placeholders}) AND deleted_at IS NOT NULL;
+                """,
+                image_names,
+            )
+            purged = [r[0] for r in self._cursor.fetchall()]
+            # The board images go first, so that the board image count triggers still see the image
+            # as deleted and don't count it out a second time.
+            self._cursor.execute(
+                f"""--sql
+                DELETE FROM board_images
+                WHERE image_name IN (
+                    SELECT image_name FROM images
+                    WHERE image_name IN ({placeholders}) AND deleted_at IS NOT NULL
+                );
+                """,
+                image_names,
+            )
+            self._cursor.execute(
+                f"""--sql
                 DELETE FROM images
-                WHERE is_intermediate = TRUE;
-                """
+                WHERE image_name IN ({placeholders}) AND deleted_at IS NOT NULL;
+                """,
+                image_names,
             )
             self._conn.commit()
-            return image_names
+            return purged
         except sqlite3.Error as e:
             self._conn.rollback()
             raise ImageRecordDeleteException from e
@@ -559,7 +672,7 @@ class SqliteImageRecordStorage(ImageRecordStorageBase):
                 SELECT images.*
                 FROM images
                 JOIN board_images ON images.image_name = board_images.image_name
-                WHERE board_images.board_id = ?
+                WHERE board_images.board_id = ? AND images.deleted_at IS NULL
                 ORDER BY images.created_at DESC
                 LIMIT 1;
                 """,
@@ -1,14 +1,16 @@
 import json
 from abc import ABC, abstractmethod
 from logging import Logger
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, BinaryIO, Callable, Optional, Tuple
 
+from PIL import Image
 from PIL.Image import Image as PILImageType
 
 from invokeai.app.invocations.metadata import ImageMetadata
 from invokeai.app.models.image import (
     ImageCategory,
     InvalidImageCategoryException,
+    InvalidImageException,
     InvalidOriginException,
     ResourceOrigin,
 )
@@ -19,6 +21,7 @@ from invokeai.app.services.image_file_storage import (
     ImageFileSaveException,
     ImageFileStorageBase,
 )
+from invokeai.app.services.image_purger import ImagePurger
 from invokeai.app.services.image_record_storage import (
     ImageRecordDeleteException,
     ImageRecordNotFoundException,
@@ -39,6 +42,7 @@ from invokeai.app.util.metadata import get_metadata_graph_from_raw_session
 
 if TYPE_CHECKING:
     from invokeai.app.services.graph import GraphExecutionState
+    from invokeai.app.services.invoker import Invoker
 
 
 class ImageServiceABC(ABC):
@@ -59,6 +63,20 @@ class ImageServiceABC(ABC):
         """Creates an image, storing the file and its metadata."""
         pass
 
+    @abstractmethod
+    def create_from_file(
+        self,
+        file: BinaryIO,
+        image_origin: ResourceOrigin,
+        image_category: ImageCategory,
+        session_id: Optional[str] = None,
+        board_id: Optional[str] = None,
+        is_intermediate: bool = False,
+        crop_visible: bool = False,
+    ) -> ImageDTO:
+        """Creates an image from an image file. Raises InvalidImageException if the file is not a valid image."""
+        pass
+
     @abstractmethod
     def update(
         self,
@@ -68,6 +86,15 @@ class ImageServiceABC(ABC):
         """Updates an image."""
         pass
 
+    @abstractmethod
+    def update_many(
+        self,
+        image_names: list[str],
+        changes: ImageRecordChanges,
+    ) -> None:
+        """Applies the same changes to many images."""
+        pass
+
     @abstractmethod
     def get_pil_image(self, image_name: str) -> PILImageType:
         """Gets an image as a PIL image."""
@@ -93,6 +120,11 @@ class ImageServiceABC(ABC):
         """Gets an image's path."""
         pass
 
+    @abstractmethod
+    def get_sized_thumbnail_path(self, image_name: str, size: int) -> str:
+        """Gets the path of a thumbnail of an image that fits in size x size, making it if needed."""
+        pass
+
     @abstractmethod
     def validate_path(self, path: str) -> bool:
         """Validates an image's path."""
@@ -118,7 +150,12 @@ class ImageServiceABC(ABC):
 
     @abstractmethod
     def delete(self, image_name: str):
-        """Deletes an image."""
+        """Deletes an image. It can be restored until it is purged."""
+        pass
+
+    @abstractmethod
+    def delete_many(self, image_names: list[str]):
+        """Deletes many images. They can be restored until they are purged."""
         pass
 
     @abstractmethod
@@ -131,6 +168,17 @@ class ImageServiceABC(ABC):
         """Deletes all images on a board."""
         pass
 
+    @abstractmethod
+    def restore_many(self, image_names: list[str]) -> list[str]:
+        """Restores deleted images that are not yet purged, returning the names of the restored images."""
+        pass
+
+    @abstractmethod
+    def purge_deleted(self, older_than: float, limit: int) -> int:
+        """Removes the files and records of up to `limit` images deleted at least `older_than` seconds ago,
+        returning how many were removed."""
+        pass
+
 
 class ImageServiceDependencies:
     """Service dependencies for the ImageService."""
@@ -164,9 +212,26 @@ class ImageServiceDependencies:
 
 class ImageService(ImageServiceABC):
     _services: ImageServiceDependencies
+    _purger: Optional[ImagePurger]
 
     def __init__(self, services: ImageServiceDependencies):
         self._services = services
+        self._purger = None
+
+    def start(self, invoker: "Invoker") -> None:
+        configuration = invoker.services.configuration
+        if configuration is None:
+            return
+        self._purger = ImagePurger(
+            self,
+            retention=configuration.image_retention * 3600,
+            batch_size=configuration.image_purge_batch_size,
+            interval=configuration.image_purge_interval,
+        )
+
+    def stop(self, *args, **kwargs) -> None:
+        if self._purger is not None:
+            self._purger.stop()
 
     def create(
         self,
@@ -179,6 +244,92 @@ class ImageService(ImageServiceABC):
         is_intermediate: bool = False,
         metadata: Optional[dict] = None,
     ) -> ImageDTO:
+        graph = self._get_session_graph(session_id)
+        return self._create(
+            image.size,
+            lambda image_name: self._services.image_files.save(
+                image_name=image_name, image=image, metadata=metadata, graph=graph
+            ),
+            image_origin=image_origin,
+            image_category=image_category,
+            node_id=node_id,
+            session_id=session_id,
+            board_id=board_id,
+            is_intermediate=is_intermediate,
+            metadata=metadata,
+        )
+
+    def create_from_file(
+        self,
+        file: BinaryIO,
+        image_origin: ResourceOrigin,
+        image_category: ImageCategory,
+        session_id: Optional[str] = None,
+        board_id: Optional[str] = None,
+        is_intermediate: bool = False,
+        crop_visible: bool = False,
+    ) -> ImageDTO:
+        graph = self._get_session_graph(session_id)
+        try:
+            image = Image.open(file)
+            # a PNG that needs no cropping or metadata is stored as is, without encoding it again. It is
+            # still decoded in full, verify() alone lets corrupt image data through to the thumbnail.
+            store_as_is = image.format == "PNG" and not crop_visible and graph is None
+            image.load()
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+            raise InvalidImageException from e
+
+        if not store_as_is:
+            if crop_visible:
+                image = image.crop(image.getbbox())
+            return self.create(
+                image=image,
+                image_origin=image_origin,
+                image_category=image_category,
+                session_id=session_id,
+                board_id=board_id,
+                is_intermediate=is_intermediate,
+            )
+
+        def save_file(image_name: str) -> None:
+            file.seek(0)
+            self._services.image_files.save_file(file, image_name)
+
+        return self._create(
+            image.size,
+            save_file,
+            image_origin=image_origin,
+            image_category=image_category,
+            session_id=session_id,
+            board_id=board_id,
+            is_intermediate=is_intermediate,
+        )
+
+    def _get_session_graph(self, session_id: Optional[str]) -> Optional[dict]:
+        if session_id is None:
+            return None
+        session_raw = self._services.graph_execution_manager.get_raw(session_id)
+        if session_raw is None:
+            return None
+        try:
+            return get_metadata_graph_from_raw_session(session_raw)
+        except Exception as e:
+            self._services.logger.warn(f"Failed to parse session graph: {e}")
+            return None
+
+    def _create(
+        self,
+        size: Tuple[int, int],
+        save_file: Callable[[str], None],
+        image_origin: ResourceOrigin,
+        image_category: ImageCategory,
+        node_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        board_id: Optional[str] = None,
+        is_intermediate: bool = False,
+        metadata: Optional[dict] = None,
+    ) -> ImageDTO:
+        """Saves the record of a new image, and then its file with save_file(image_name)"""
         if image_origin not in ResourceOrigin:
             raise InvalidOriginException
 
@@ -187,18 +338,7 @@ class ImageService(ImageServiceABC):
 
         image_name = self._services.names.create_image_name()
 
-        graph = None
-
-        if session_id is not None:
-            session_raw = self._services.graph_execution_manager.get_raw(session_id)
-            if session_raw is not None:
-                try:
-                    graph = get_metadata_graph_from_raw_session(session_raw)
-                except Exception as e:
-                    self._services.logger.warn(f"Failed to parse session graph: {e}")
-                    graph = None
-
-        (width, height) = image.size
+        (width, height) = size
 
         try:
             # TODO: Consider using a transaction here to ensure consistency between storage and database
@@ -216,9 +356,14 @@ class ImageService(ImageServiceABC):
                 metadata=metadata,
                 session_id=session_id,
             )
-            if board_id is not None:
-                self._services.board_image_records.add_image_to_board(board_id=board_id, image_name=image_name)
-            self._services.image_files.save(image_name=image_name, image=image, metadata=metadata, graph=graph)
+            try:
+                if board_id is not None:
+                    self._services.board_image_records.add_image_to_board(board_id=board_id, image_name=image_name)
+                save_file(image_name)
+            except Exception:
+                # don't leave a record behind without its file
+                self._discard(image_name)
+                raise
             image_dto = self.get_dto(image_name)
 
             return image_dto
@@ -232,6 +377,15 @@ class ImageService(ImageServiceABC):
             self._services.logger.error(f"Problem saving image record and file: {str(e)}")
             raise e
 
+    def _discard(self, image_name: str) -> None:
+        """Removes the record and whatever was saved of the files of an image that failed to be created"""
+        try:
+            self._services.image_records.delete(image_name)
+            self._services.image_records.purge([image_name])
+            self._services.image_files.delete(image_name)
+        except Exception as e:
+            self._services.logger.error(f"Failed to clean up image {image_name}: {str(e)}")
+
     def update(
         self,
         image_name: str,
@@ -247,6 +401,20 @@ class ImageService(ImageServiceABC):
             self._services.logger.error("Problem updating image record")
             raise e
 
+    def update_many(
+        self,
+        image_names: list[str],
+        changes: ImageRecordChanges,
+    ) -> None:
+        try:
+            self._services.image_records.update_many(image_names, changes)
+        except ImageRecordSaveException:
+            self._services.logger.error("Failed to update image records")
+            raise
+        except Exception as e:
+            self._services.logger.error("Problem updating image records")
+            raise e
+
     def get_pil_image(self, image_name: str) -> PILImageType:
         try:
             return self._services.image_files.get(image_name)
@@ -319,6 +487,16 @@ class ImageService(ImageServiceABC):
             self._services.logger.error("Problem getting image path")
             raise e
 
+    def get_sized_thumbnail_path(self, image_name: str, size: int) -> str:
+        try:
+            return self._services.image_files.get_sized_thumbnail_path(image_name, size)
+        except ImageFileNotFoundException:
+            self._services.logger.error("Failed to get image file")
+            raise
+        except Exception as e:
+            self._services.logger.error("Problem making image thumbnail")
+            raise e
+
     def validate_path(self, path: str) -> bool:
         try:
             return self._services.image_files.validate_path(path)
@@ -375,48 +553,68 @@ class ImageService(ImageServiceABC):
             raise e
 
     def delete(self, image_name: str):
+        self.delete_many([image_name])
+
+    def delete_many(self, image_names: list[str]):
         try:
-            self._services.image_files.delete(image_name)
-            self._services.image_records.delete(image_name)
+            # only marks the records; the files go when the purger gets to them
+            self._services.image_records.delete_many(image_names)
         except ImageRecordDeleteException:
-            self._services.logger.error(f"Failed to delete image record")
-            raise
-        except ImageFileDeleteException:
-            self._services.logger.error(f"Failed to delete image file")
+            self._services.logger.error(f"Failed to delete image records")
             raise
         except Exception as e:
-            self._services.logger.error("Problem deleting image record and file")
+            self._services.logger.error("Problem deleting image records")
             raise e
 
     def delete_images_on_board(self, board_id: str):
         try:
             image_names = self._services.board_image_records.get_all_board_image_names_for_board(board_id)
-            for image_name in image_names:
-                self._services.image_files.delete(image_name)
             self._services.image_records.delete_many(image_names)
         except ImageRecordDeleteException:
             self._services.logger.error(f"Failed to delete image records")
             raise
-        except ImageFileDeleteException:
-            self._services.logger.error(f"Failed to delete image files")
-            raise
         except Exception as e:
-            self._services.logger.error("Problem deleting image records and files")
+            self._services.logger.error("Problem deleting image records")
             raise e
 
     def delete_intermediates(self) -> int:
         try:
-            image_names = self._services.image_records.delete_intermediates()
-            count = len(image_names)
-            for image_name in image_names:
-                self._services.image_files.delete(image_name)
-            return count
+            return self._services.image_records.delete_intermediates()
         except ImageRecordDeleteException:
             self._services.logger.error(f"Failed to delete image records")
             raise
+        except Exception as e:
+            self._services.logger.error("Problem deleting image records")
+            raise e
+
+    def restore_many(self, image_names: list[str]) -> list[str]:
+        try:
+            return self._services.image_records.restore_many(image_names)
+        except ImageRecordSaveException:
+            self._services.logger.error("Failed to restore image records")
+            raise
+        except Exception as e:
+            self._services.logger.error("Problem restoring image records")
+            raise e
+
+    def purge_deleted(self, older_than: float, limit: int) -> int:
+        try:
+            image_names = self._services.image_records.get_deleted(older_than, limit)
+            if not image_names:
+                return 0
+            # The records go first, in one transaction with checking that they are still deleted: an image
+            # restored since get_deleted() keeps its record and its files. A failure to delete the files
+            # leaves them behind, but never a record without its file.
+            purged = self._services.image_records.purge(image_names)
+            if purged:
+                self._services.image_files.delete_many(purged)
+            return len(purged)
+        except ImageRecordDeleteException:
+            self._services.logger.error(f"Failed to purge image records")
+            raise
         except ImageFileDeleteException:
-            self._services.logger.error(f"Failed to delete image files")
+            self._services.logger.error(f"Failed to purge image files")
             raise
         except Exception as e:
-            self._services.logger.error("Problem deleting image records and files")
+            self._services.logger.error("Problem purging image records and files")
             raise e
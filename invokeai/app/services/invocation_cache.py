@@ -0,0 +1,169 @@
+# Copyright (c) 2023 Kyle Schouviller (https://github.com/kyle0654) and the InvokeAI Team
+
+from __future__ import annotations
+
+import hashlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Tuple
+
+if TYPE_CHECKING:
+    from invokeai.app.invocations.baseinvocation import BaseInvocation, BaseInvocationOutput
+    from invokeai.app.services.invocation_services import InvocationServices
+
+# Bump this whenever the meaning of a cached output changes, so that stale keys stop matching
+INVOCATION_CACHE_VERSION = 1
+
+
+@dataclass
+class InvocationCacheStats:
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+    max_size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class InvocationCacheBase(ABC):
+    """Memoizes the outputs of deterministic invocations across sessions.
+
+    Outputs are keyed on the node type and its resolved inputs. Latents, conditioning and
+    images referenced by an output are not copied; an entry whose references have since
+    been deleted is treated as a miss.
+    """
+
+    @abstractmethod
+    def get(self, key: str, services: InvocationServices) -> Optional[BaseInvocationOutput]:
+        """Retrieves the output stored under the key, or None if there is no usable output"""
+        pass
+
+    @abstractmethod
+    def save(self, key: str, output: BaseInvocationOutput) -> None:
+        """Stores an output under the key"""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drops all stored outputs"""
+        pass
+
+    @abstractmethod
+    def get_stats(self) -> InvocationCacheStats:
+        """Returns hit/miss counters for the cache"""
+        pass
+
+    @property
+    @abstractmethod
+    def enabled(self) -> bool:
+        pass
+
+    @staticmethod
+    def create_key(invocation: BaseInvocation) -> Optional[str]:
+        """Creates the cache key for an invocation, or None if the invocation may not be cached.
+
+        The node id is excluded so that identical nodes in different sessions share a key.
+        """
+        if not invocation.cacheable:
+            return None
+        try:
+            canonical = invocation.json(exclude={"id"}, sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha256(f"{INVOCATION_CACHE_VERSION}:{canonical}".encode("utf-8")).hexdigest()
+
+
+def _iter_references(value: Any) -> Iterator[Tuple[str, str]]:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k in ("image_name", "latents_name", "conditioning_name") and isinstance(v, str):
+                yield k, v
+            else:
+                yield from _iter_references(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _iter_references(v)
+
+
+def references_images(output: BaseInvocationOutput) -> bool:
+    """Whether the output points to one or more images"""
+    return any(k == "image_name" for k, _ in _iter_references(output.dict()))
+
+
+def references_exist(output: BaseInvocationOutput, services: InvocationServices) -> bool:
+    """Whether every image, latents and conditioning tensor the output points to still exists"""
+    for kind, name in _iter_references(output.dict()):
+        if kind == "image_name":
+            if not services.images.validate_path(services.images.get_path(name)):
+                return False
+        elif not services.latents.exists(name):
+            return False
+    return True
+
+
+class MemoryInvocationCache(InvocationCacheBase):
+    """An in-memory LRU cache of invocation outputs. A max_size of 0 disables the cache."""
+
+    __cache: OrderedDict[str, BaseInvocationOutput]
+    __max_size: int
+    __lock: Lock
+    __hits: int
+    __misses: int
+
+    def __init__(self, max_size: int = 0):
+        self.__cache = OrderedDict()
+        self.__max_size = max_size
+        self.__lock = Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.__max_size > 0
+
+    def get(self, key: str, services: InvocationServices) -> Optional[BaseInvocationOutput]:
+        with self.__lock:
+            output = self.__cache.get(key)
+            if output is not None:
+                self.__cache.move_to_end(key)
+
+        if output is not None and not references_exist(output, services):
+            with self.__lock:
+                self.__cache.pop(key, None)
+            output = None
+
+        with self.__lock:
+            if output is None:
+                self.__misses += 1
+            else:
+                self.__hits += 1
+
+        # hand out a copy, callers are free to modify the outputs they get
+        return None if output is None else output.copy(deep=True)
+
+    def save(self, key: str, output: BaseInvocationOutput) -> None:
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__cache[key] = output.copy(deep=True)
+            self.__cache.move_to_end(key)
+            while len(self.__cache) > self.__max_size:
+                self.__cache.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__cache.clear()
+
+    def get_stats(self) -> InvocationCacheStats:
+        with self.__lock:
+            return InvocationCacheStats(
+                hits=self.__hits,
+                misses=self.__misses,
+                size=len(self.__cache),
+                max_size=self.__max_size,
+            )
@@ -5,7 +5,7 @@ from abc import ABC, abstractmethod
 from queue import Queue
 
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 
 class InvocationQueueItem(BaseModel):
@@ -19,13 +19,19 @@ class InvocationQueueABC(ABC):
     """Abstract base class for all invocation queues"""
 
     @abstractmethod
-    def get(self) -> InvocationQueueItem:
+    def get(self, timeout: Optional[float] = None) -> InvocationQueueItem:
+        """Gets the next item, waiting for one if needed. Raises queue.Empty if none arrives within the timeout."""
         pass
 
     @abstractmethod
     def put(self, item: Optional[InvocationQueueItem]) -> None:
         pass
 
+    @abstractmethod
+    def peek(self) -> List[InvocationQueueItem]:
+        """Returns the items waiting in the queue, in order, without taking them off it."""
+        pass
+
     @abstractmethod
     def cancel(self, graph_execution_state_id: str) -> None:
         pass
@@ -43,26 +49,38 @@ class MemoryInvocationQueue(InvocationQueueABC):
         self.__queue = Queue()
         self.__cancellations = dict()
 
-    def get(self) -> InvocationQueueItem:
-        item = self.__queue.get()
+    def get(self, timeout: Optional[float] = None) -> InvocationQueueItem:
+        deadline = None if timeout is None else time.time() + timeout
+        item = self.__get(deadline)
 
         while (
             isinstance(item, InvocationQueueItem)
             and item.graph_execution_state_id in self.__cancellations
             and self.__cancellations[item.graph_execution_state_id] > item.timestamp
         ):
-            item = self.__queue.get()
+            item = self.__get(deadline)
 
         # Clear old items
-        for graph_execution_state_id in list(self.__cancellations.keys()):
-            if self.__cancellations[graph_execution_state_id] < item.timestamp:
-                del self.__cancellations[graph_execution_state_id]
+        if isinstance(item, InvocationQueueItem):
+            for graph_execution_state_id in list(self.__cancellations.keys()):
+                if self.__cancellations[graph_execution_state_id] < item.timestamp:
+                    del self.__cancellations[graph_execution_state_id]
 
         return item
 
+    def __get(self, deadline: Optional[float]) -> Optional[InvocationQueueItem]:
+        if deadline is None:
+            return self.__queue.get()
+        return self.__queue.get(timeout=max(deadline - time.time(), 0))
+
     def put(self, item: Optional[InvocationQueueItem]) -> None:
         self.__queue.put(item)
 
+    def peek(self) -> List[InvocationQueueItem]:
+        with self.__queue.mutex:
+            items = list(self.__queue.queue)
+        return [item for item in items if item is not None and not self.is_canceled(item.graph_execution_state_id)]
+
     def cancel(self, graph_execution_state_id: str) -> None:
         if graph_execution_state_id not in self.__cancellations:
             self.__cancellations[graph_execution_state_id] = time.time()
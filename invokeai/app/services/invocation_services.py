@@ -10,7 +10,9 @@ if TYPE_CHECKING:
     from invokeai.app.services.model_manager_service import ModelManagerServiceBase
     from invokeai.app.services.events import EventServiceBase
     from invokeai.app.services.latent_storage import LatentsStorageBase
+    from invokeai.app.services.invocation_cache import InvocationCacheBase
     from invokeai.app.services.invocation_queue import InvocationQueueABC
+    from invokeai.app.services.invocation_stats import InvocationStatsServiceBase
     from invokeai.app.services.item_storage import ItemStorageABC
     from invokeai.app.services.config import InvokeAIAppConfig
     from invokeai.app.services.graph import GraphExecutionState, LibraryGraph
@@ -28,9 +30,11 @@ class InvocationServices:
     graph_execution_manager: "ItemStorageABC"["GraphExecutionState"]
     graph_library: "ItemStorageABC"["LibraryGraph"]
     images: "ImageServiceABC"
+    invocation_cache: "InvocationCacheBase"
     latents: "LatentsStorageBase"
     logger: "Logger"
     model_manager: "ModelManagerServiceBase"
+    performance_statistics: "InvocationStatsServiceBase"
     processor: "InvocationProcessorABC"
     queue: "InvocationQueueABC"
 
@@ -43,9 +47,11 @@ class InvocationServices:
         graph_execution_manager: "ItemStorageABC"["GraphExecutionState"],
         graph_library: "ItemStorageABC"["LibraryGraph"],
         images: "ImageServiceABC",
+        invocation_cache: "InvocationCacheBase",
         latents: "LatentsStorageBase",
         logger: "Logger",
         model_manager: "ModelManagerServiceBase",
+        performance_statistics: "InvocationStatsServiceBase",
         processor: "InvocationProcessorABC",
         queue: "InvocationQueueABC",
     ):
@@ -57,8 +63,10 @@ class InvocationServices:
         self.graph_execution_manager = graph_execution_manager
         self.graph_library = graph_library
         self.images = images
+        self.invocation_cache = invocation_cache
         self.latents = latents
         self.logger = logger
         self.model_manager = model_manager
+        self.performance_statistics = performance_statistics
         self.processor = processor
         self.queue = queue
@@ -0,0 +1,203 @@
+# Copyright (c) 2023 the InvokeAI Team
+
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, ContextManager, Dict, Iterator, List, Optional
+
+import psutil
+import torch
+
+if TYPE_CHECKING:
+    from invokeai.backend.model_management import ModelCacheStats
+
+# per-session statistics are dropped after this many sessions, most of them never complete
+MAX_TRACKED_SESSIONS = 100
+
+
+@dataclass
+class NodeExecutionStats:
+    """Statistics of the invocations of one node type"""
+
+    invocations: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    # seconds of the node spent loading models from disk
+    model_load_seconds: float = 0.0
+    # the process RSS is sampled when a node completes
+    peak_rss_bytes: int = 0
+    # only recorded when CUDA is available
+    peak_vram_bytes: int = 0
+    # the growth and the shrinking of the CUDA memory allocated over an invocation, kept apart so both only add up
+    vram_allocated_bytes: int = 0
+    vram_freed_bytes: int = 0
+
+
+@dataclass
+class TimingStats:
+    count: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class SessionStats:
+    """Statistics of one session"""
+
+    nodes: Dict[str, NodeExecutionStats] = field(default_factory=dict)
+    queue_wait: TimingStats = field(default_factory=TimingStats)
+    session_save: TimingStats = field(default_factory=TimingStats)
+
+
+class InvocationStatsServiceBase(ABC):
+    """Aggregates the wall time and memory use of invocations, per session and per node type.
+
+    Recording a node costs a few timer and memory counter reads, cheap enough to always keep on.
+    """
+
+    @abstractmethod
+    def collect_stats(self, node_type: str, graph_execution_state_ids: List[str]) -> ContextManager[None]:
+        """Measures a run of a node type, shared evenly among the sessions it was invoked for"""
+        pass
+
+    @abstractmethod
+    def record_queue_wait(self, graph_execution_state_id: str, seconds: float) -> None:
+        """Records how long an invocation waited in the queue"""
+        pass
+
+    @abstractmethod
+    def record_session_save(self, graph_execution_state_id: str, seconds: float) -> None:
+        """Records how long saving the session state took"""
+        pass
+
+    @abstractmethod
+    def get_node_stats(self) -> Dict[str, NodeExecutionStats]:
+        """Returns the statistics of every node type invoked since startup"""
+        pass
+
+    @abstractmethod
+    def get_queue_wait_stats(self) -> TimingStats:
+        pass
+
+    @abstractmethod
+    def get_session_save_stats(self) -> TimingStats:
+        pass
+
+    @abstractmethod
+    def pop_session_stats(self, graph_execution_state_id: str) -> Optional[SessionStats]:
+        """Returns and forgets the statistics of a session, or None if there are none"""
+        pass
+
+
+class InvocationStatsService(InvocationStatsServiceBase):
+    __lock: Lock
+    __nodes: Dict[str, NodeExecutionStats]
+    __queue_wait: TimingStats
+    __session_save: TimingStats
+    __sessions: OrderedDict[str, SessionStats]
+
+    def __init__(self, get_model_cache_stats: Optional[Callable[[], ModelCacheStats]] = None):
+        """
+        :param get_model_cache_stats: returns the model cache timings, so that the time nodes spend
+        loading models can be told apart
+        """
+        self.__get_model_cache_stats = get_model_cache_stats
+        self.__process = psutil.Process()
+        self.__lock = Lock()
+        self.__nodes = dict()
+        self.__queue_wait = TimingStats()
+        self.__session_save = TimingStats()
+        self.__sessions = OrderedDict()
+
+    @contextmanager
+    def collect_stats(self, node_type: str, graph_execution_state_ids: List[str]) -> Iterator[None]:
+        has_cuda = torch.cuda.is_available()
+        if has_cuda:
+            torch.cuda.reset_peak_memory_stats()
+            vram_before = torch.cuda.memory_allocated()
+        load_seconds_before = self.__get_model_load_seconds()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            stats = NodeExecutionStats(
+                invocations=1,
+                seconds=seconds,
+                max_seconds=seconds,
+                model_load_seconds=self.__get_model_load_seconds() - load_seconds_before,
+                peak_rss_bytes=self.__process.memory_info().rss,
+            )
+            if has_cuda:
+                stats.peak_vram_bytes = torch.cuda.max_memory_allocated()
+                vram_delta = torch.cuda.memory_allocated() - vram_before
+                stats.vram_allocated_bytes = max(vram_delta, 0)
+                stats.vram_freed_bytes = max(-vram_delta, 0)
+
+            # a coalesced run is shared by its sessions
+            share = replace(
+                stats,
+                seconds=stats.seconds / len(graph_execution_state_ids),
+                model_load_seconds=stats.model_load_seconds / len(graph_execution_state_ids),
+                vram_allocated_bytes=stats.vram_allocated_bytes // len(graph_execution_state_ids),
+                vram_freed_bytes=stats.vram_freed_bytes // len(graph_execution_state_ids),
+            )
+            with self.__lock:
+                self.__add(self.__nodes, node_type, replace(stats, invocations=len(graph_execution_state_ids)))
+                for graph_execution_state_id in graph_execution_state_ids:
+                    self.__add(self.__get_session(graph_execution_state_id).nodes, node_type, share)
+
+    def record_queue_wait(self, graph_execution_state_id: str, seconds: float) -> None:
+        with self.__lock:
+            for timing in [self.__queue_wait, self.__get_session(graph_execution_state_id).queue_wait]:
+                timing.count += 1
+                timing.seconds += seconds
+
+    def record_session_save(self, graph_execution_state_id: str, seconds: float) -> None:
+        with self.__lock:
+            for timing in [self.__session_save, self.__get_session(graph_execution_state_id).session_save]:
+                timing.count += 1
+                timing.seconds += seconds
+
+    def get_node_stats(self) -> Dict[str, NodeExecutionStats]:
+        with self.__lock:
+            return {node_type: replace(stats) for node_type, stats in self.__nodes.items()}
+
+    def get_queue_wait_stats(self) -> TimingStats:
+        with self.__lock:
+            return replace(self.__queue_wait)
+
+    def get_session_save_stats(self) -> TimingStats:
+        with self.__lock:
+            return replace(self.__session_save)
+
+    def pop_session_stats(self, graph_execution_state_id: str) -> Optional[SessionStats]:
+        with self.__lock:
+            return self.__sessions.pop(graph_execution_state_id, None)
+
+    def __get_session(self, graph_execution_state_id: str) -> SessionStats:
+        session = self.__sessions.get(graph_execution_state_id)
+        if session is None:
+            session = self.__sessions[graph_execution_state_id] = SessionStats()
+            while len(self.__sessions) > MAX_TRACKED_SESSIONS:
+                self.__sessions.popitem(last=False)
+        return session
+
+    def __get_model_load_seconds(self) -> float:
+        return self.__get_model_cache_stats().load_seconds if self.__get_model_cache_stats is not None else 0.0
+
+    @staticmethod
+    def __add(nodes: Dict[str, NodeExecutionStats], node_type: str, stats: NodeExecutionStats) -> None:
+        total = nodes.setdefault(node_type, NodeExecutionStats())
+        total.invocations += stats.invocations
+        total.seconds += stats.seconds
+        total.max_seconds = max(total.max_seconds, stats.max_seconds)
+        total.model_load_seconds += stats.model_load_seconds
+        total.peak_rss_bytes = max(total.peak_rss_bytes, stats.peak_rss_bytes)
+        total.peak_vram_bytes = max(total.peak_vram_bytes, stats.peak_vram_bytes)
+        total.vram_allocated_bytes += stats.vram_allocated_bytes
+        total.vram_freed_bytes += stats.vram_freed_bytes
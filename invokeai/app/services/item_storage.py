@@ -13,9 +13,10 @@ class PaginatedResults(GenericModel, Generic[T]):
     # fmt: off
     items: list[T] = Field(description="Items")
     page: int = Field(description="Current Page")
-    pages: int = Field(description="Total number of pages")
+    pages: Optional[int] = Field(default=None, description="Total number of pages, None after a cursor")
     per_page: int = Field(description="Number of items per page")
-    total: int = Field(description="Total number of items in result")
+    total: Optional[int] = Field(default=None, description="Total number of items in result, None after a cursor")
+    next_cursor: Optional[str] = Field(default=None, description="The cursor of the next page, if there may be one")
     # fmt: on
 
 
@@ -45,12 +46,15 @@ class ItemStorageABC(ABC, Generic[T]):
         pass
 
     @abstractmethod
-    def list(self, page: int = 0, per_page: int = 10) -> PaginatedResults[T]:
-        """Gets a paginated list of items"""
+    def list(self, page: int = 0, per_page: int = 10, cursor: Optional[str] = None) -> PaginatedResults[T]:
+        """Gets a paginated list of items, in creation order. With a cursor, gets the page after it instead."""
         pass
 
     @abstractmethod
-    def search(self, query: str, page: int = 0, per_page: int = 10) -> PaginatedResults[T]:
+    def search(
+        self, query: str, page: int = 0, per_page: int = 10, cursor: Optional[str] = None
+    ) -> PaginatedResults[T]:
+        """Gets a paginated list of the items with every word of the query, see list()"""
         pass
 
     def on_changed(self, on_changed: Callable[[T], None]) -> None:
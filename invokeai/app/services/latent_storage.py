@@ -23,6 +23,10 @@ class LatentsStorageBase(ABC):
     def delete(self, name: str) -> None:
         pass
 
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        pass
+
 
 class ForwardCacheLatentsStorage(LatentsStorageBase):
     """Caches the latest N latents in memory, writing-thorugh to and reading from underlying storage"""
@@ -56,6 +60,9 @@ class ForwardCacheLatentsStorage(LatentsStorageBase):
         if name in self.__cache:
             del self.__cache[name]
 
+    def exists(self, name: str) -> bool:
+        return name in self.__cache or self.__underlying_storage.exists(name)
+
     def __get_cache(self, name: str) -> Optional[torch.Tensor]:
         return None if name not in self.__cache else self.__cache[name]
 
@@ -89,5 +96,8 @@ class DiskLatentsStorage(LatentsStorageBase):
         latent_path = self.get_path(name)
         latent_path.unlink()
 
+    def exists(self, name: str) -> bool:
+        return self.get_path(name).exists()
+
     def get_path(self, name: str) -> Path:
         return self.__output_folder / name
@@ -19,6 +19,8 @@ from invokeai.backend.model_management import (
     ModelMerger,
     MergeInterpolationMethod,
     ModelNotFoundException,
+    ModelCacheStats,
+    PrefetchStats,
 )
 from invokeai.backend.model_management.model_search import FindModels
 
@@ -63,6 +65,40 @@ class ModelManagerServiceBase(ABC):
         of a diffusers pipeline."""
         pass
 
+    @abstractmethod
+    def prefetch_model(
+        self,
+        model_name: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        submodel: Optional[SubModelType] = None,
+    ) -> bool:
+        """Load the indicated model into RAM ahead of time, if it fits
+        without evicting other models. Returns True if it is cached."""
+        pass
+
+    @abstractmethod
+    def get_model_hash(
+        self,
+        model_name: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        submodel: Optional[SubModelType] = None,
+    ) -> Optional[str]:
+        """Return the content hash of the model's weights without loading it,
+        or None while it is still being computed."""
+        pass
+
+    @abstractmethod
+    def get_prefetch_stats(self) -> PrefetchStats:
+        """Return the prefetch hits, wasted prefetches and bytes prefetched."""
+        pass
+
+    @abstractmethod
+    def get_cache_stats(self) -> ModelCacheStats:
+        """Return the number and total duration of model loads, moves into VRAM and offloads."""
+        pass
+
     @property
     @abstractmethod
     def logger(self):
@@ -247,6 +283,7 @@ class ModelManagerServiceBase(ABC):
         interp: Optional[MergeInterpolationMethod] = None,
         force: Optional[bool] = False,
         merge_dest_directory: Optional[Path] = None,
+        fp16: Optional[bool] = False,
     ) -> AddModelResult:
         """
         Merge two to three diffusrs pipeline models and save as a new model.
@@ -256,6 +293,7 @@ class ModelManagerServiceBase(ABC):
         :param alpha: Alpha strength to apply to 2d and 3d model
         :param interp: Interpolation method. None (default)
         :param merge_dest_directory: Save the merged model to the designated directory (with 'merged_model_name' appended)
+        :param fp16: Save the merged weights in half precision
         """
         pass
 
@@ -380,6 +418,54 @@ class ModelManagerService(ModelManagerServiceBase):
 
         return model_info
 
+    def prefetch_model(
+        self,
+        model_name: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        submodel: Optional[SubModelType] = None,
+    ) -> bool:
+        """
+        Load the indicated model into the RAM cache ahead of get_model(),
+        without evicting other models. Returns True if it is cached.
+        """
+        return self.mgr.prefetch_model(
+            model_name,
+            base_model,
+            model_type,
+            submodel,
+        )
+
+    def get_model_hash(
+        self,
+        model_name: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        submodel: Optional[SubModelType] = None,
+    ) -> Optional[str]:
+        """
+        Return the content hash of the model's weights without loading it,
+        or None while it is still being computed in the background.
+        """
+        return self.mgr.get_model_hash(
+            model_name,
+            base_model,
+            model_type,
+            submodel,
+        )
+
+    def get_prefetch_stats(self) -> PrefetchStats:
+        """
+        Return the prefetch hits, wasted prefetches and bytes prefetched.
+        """
+        return self.mgr.cache.get_prefetch_stats()
+
+    def get_cache_stats(self) -> ModelCacheStats:
+        """
+        Return the number and total duration of model loads, moves into VRAM and offloads.
+        """
+        return self.mgr.cache.get_stats()
+
     def model_exists(
         self,
         model_name: str,
@@ -579,6 +665,7 @@ class ModelManagerService(ModelManagerServiceBase):
         merge_dest_directory: Optional[Path] = Field(
             default=None, description="Optional directory location for merged model"
         ),
+        fp16: Optional[bool] = False,
     ) -> AddModelResult:
         """
         Merge two to three diffusrs pipeline models and save as a new model.
@@ -588,6 +675,7 @@ class ModelManagerService(ModelManagerServiceBase):
         :param alpha: Alpha strength to apply to 2d and 3d model
         :param interp: Interpolation method. None (default)
         :param merge_dest_directory: Save the merged model to the designated directory (with 'merged_model_name' appended)
+        :param fp16: Save the merged weights in half precision
         """
         merger = ModelMerger(self.mgr)
         try:
@@ -599,6 +687,7 @@ class ModelManagerService(ModelManagerServiceBase):
                 interp=interp,
                 force=force,
                 merge_dest_directory=merge_dest_directory,
+                fp16=fp16,
             )
         except AssertionError as e:
             raise ValueError(e)
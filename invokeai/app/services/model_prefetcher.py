@@ -0,0 +1,100 @@
+# Copyright (c) 2023 the InvokeAI Team
+
+from __future__ import annotations
+
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple
+
+import invokeai.backend.util.logging as logger
+
+if TYPE_CHECKING:
+    from invokeai.app.invocations.model import ModelInfo
+    from invokeai.app.services.invocation_services import InvocationServices
+
+
+class ModelPrefetcher:
+    """Loads the models that upcoming sessions will need into the RAM cache in a background thread,
+    so that the processor doesn't have to wait on the disk when it gets to them.
+
+    The processor hands over the ids of the running and queued sessions, in order, whenever it starts
+    a job. Only the latest request is kept; older ones are stale by then. Models are only prefetched
+    while they fit in the cache without evicting anything, see ModelCache.prefetch_model().
+    """
+
+    def __init__(self, services: InvocationServices):
+        self.__services = services
+        self.__lock = Lock()
+        self.__requested: Optional[List[str]] = None
+        self.__wake_event = Event()
+        self.__stop_event = Event()
+        self.__thread = Thread(name="model_prefetcher", target=self.__process, daemon=True)
+        self.__thread.start()
+
+    def request(self, graph_execution_state_ids: List[str]) -> None:
+        """Prefetches the models of these sessions, in order, replacing any request not yet served."""
+        with self.__lock:
+            self.__requested = list(graph_execution_state_ids)
+        self.__wake_event.set()
+
+    def stop(self) -> None:
+        self.__stop_event.set()
+        self.__wake_event.set()
+
+    def __process(self):
+        while not self.__stop_event.is_set():
+            self.__wake_event.wait()
+            self.__wake_event.clear()
+            with self.__lock:
+                requested, self.__requested = self.__requested, None
+            if not requested:
+                continue
+
+            try:
+                self.__prefetch(requested)
+            except Exception as e:
+                logger.debug(f"Model prefetch failed: {e}")
+
+    def __prefetch(self, graph_execution_state_ids: List[str]):
+        seen: Set[Tuple] = set()
+        for graph_execution_state_id in graph_execution_state_ids:
+            for model in self.__get_required_models(graph_execution_state_id):
+                key = (model.model_name, model.base_model, model.model_type, model.submodel)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                # a newer request takes over
+                if self.__stop_event.is_set() or self.__requested is not None:
+                    return
+                try:
+                    self.__services.model_manager.prefetch_model(
+                        model_name=model.model_name,
+                        base_model=model.base_model,
+                        model_type=model.model_type,
+                        submodel=model.submodel,
+                    )
+                except Exception as e:
+                    logger.debug(f"Could not prefetch {model.model_name} {model.submodel or model.model_type}: {e}")
+
+        stats = self.__services.model_manager.get_prefetch_stats()
+        logger.debug(f"Model prefetch: {stats.hits} hits, {stats.wasted} wasted, {stats.bytes} bytes loaded")
+
+    def __get_required_models(self, graph_execution_state_id: str) -> List[ModelInfo]:
+        try:
+            graph_execution_state = self.__services.graph_execution_manager.get(graph_execution_state_id)
+        except Exception:
+            return []
+        if graph_execution_state.is_complete():
+            return []
+
+        models: List[ModelInfo] = []
+        for node in graph_execution_state.graph.nodes.values():
+            get_required_models = getattr(node, "get_required_models", None)
+            if get_required_models is None:
+                continue
+            try:
+                models.extend(get_required_models())
+            except Exception:
+                # inputs that come from other nodes are not known until the node runs
+                continue
+        return models
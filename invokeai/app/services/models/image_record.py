@@ -28,6 +28,8 @@ class ImageRecord(BaseModel):
     """The deleted timestamp of the image."""
     is_intermediate: bool = Field(description="Whether this is an intermediate image.")
     """Whether this is an intermediate image."""
+    starred: bool = Field(default=False, description="Whether this image is starred.")
+    """Whether this image is starred."""
     session_id: Optional[str] = Field(
         default=None,
         description="The session ID that generated this image, if it is a generated image.",
@@ -47,6 +49,7 @@ class ImageRecordChanges(BaseModel, extra=Extra.forbid):
       - `image_category`: change the category of an image
       - `session_id`: change the session associated with an image
       - `is_intermediate`: change the image's `is_intermediate` flag
+      - `starred`: star or unstar the image
     """
 
     image_category: Optional[ImageCategory] = Field(description="The image's new category.")
@@ -58,6 +61,8 @@ class ImageRecordChanges(BaseModel, extra=Extra.forbid):
     """The image's new session ID."""
     is_intermediate: Optional[StrictBool] = Field(default=None, description="The image's new `is_intermediate` flag.")
     """The image's new `is_intermediate` flag."""
+    starred: Optional[StrictBool] = Field(default=None, description="The image's new `starred` flag.")
+    """The image's new `starred` flag."""
 
 
 class ImageUrlsDTO(BaseModel):
@@ -108,6 +113,7 @@ def deserialize_image_record(image_dict: dict) -> ImageRecord:
     updated_at = image_dict.get("updated_at", get_iso_timestamp())
     deleted_at = image_dict.get("deleted_at", get_iso_timestamp())
     is_intermediate = image_dict.get("is_intermediate", False)
+    starred = image_dict.get("starred", False)
 
     return ImageRecord(
         image_name=image_name,
@@ -121,4 +127,5 @@ def deserialize_image_record(image_dict: dict) -> ImageRecord:
         updated_at=updated_at,
         deleted_at=deleted_at,
         is_intermediate=is_intermediate,
+        starred=starred,
     )
@@ -1,26 +1,57 @@
 import time
 import traceback
+from collections import deque
+from dataclasses import asdict
+from queue import Empty
 from threading import Event, Thread, BoundedSemaphore
+from typing import Deque, List, Optional
 
-from ..invocations.baseinvocation import InvocationContext
+from ..invocations.baseinvocation import BaseInvocation, BaseInvocationOutput, InvocationContext
+from .graph import GraphExecutionState
+from .invocation_cache import references_images
 from .invocation_queue import InvocationQueueItem
 from .invoker import InvocationProcessorABC, Invoker
+from .model_prefetcher import ModelPrefetcher
 from ..models.exceptions import CanceledException
 
 import invokeai.backend.util.logging as logger
 
 
+class InvocationJob:
+    """A queued invocation, with the session it belongs to"""
+
+    queue_item: InvocationQueueItem
+    graph_execution_state: GraphExecutionState
+    invocation: BaseInvocation
+    source_node_id: str
+
+    def __init__(self, queue_item: InvocationQueueItem, graph_execution_state: GraphExecutionState):
+        self.queue_item = queue_item
+        self.graph_execution_state = graph_execution_state
+        self.invocation = graph_execution_state.execution_graph.get_node(queue_item.invocation_id)
+        # get the source node id to provide to clients (the prepared node id is not as useful)
+        self.source_node_id = graph_execution_state.prepared_source_mapping[self.invocation.id]
+
+
 class DefaultInvocationProcessor(InvocationProcessorABC):
     __invoker_thread: Thread
     __stop_event: Event
     __invoker: Invoker
     __threadLimit: BoundedSemaphore
+    __deferred: Deque[Optional[InvocationQueueItem]]
+    __prefetcher: Optional[ModelPrefetcher]
 
     def start(self, invoker) -> None:
         # if we do want multithreading at some point, we could make this configurable
         self.__threadLimit = BoundedSemaphore(1)
         self.__invoker = invoker
         self.__stop_event = Event()
+        # queue items that were taken off the queue while looking for invocations to coalesce
+        self.__deferred = deque()
+        configuration = invoker.services.configuration
+        self.__prefetcher = (
+            ModelPrefetcher(invoker.services) if configuration is not None and configuration.model_prefetch else None
+        )
         self.__invoker_thread = Thread(
             name="invoker_processor",
             target=self.__process,
@@ -31,13 +62,16 @@ class DefaultInvocationProcessor(InvocationProcessorABC):
 
     def stop(self, *args, **kwargs) -> None:
         self.__stop_event.set()
+        if self.__prefetcher is not None:
+            self.__prefetcher.stop()
 
     def __process(self, stop_event: Event):
         try:
             self.__threadLimit.acquire()
             while not stop_event.is_set():
+                queue_item = None
                 try:
-                    queue_item: InvocationQueueItem = self.__invoker.services.queue.get()
+                    queue_item = self.__get_queue_item()
                 except Exception as e:
                     self.__invoker.services.logger.error("Exception while getting from queue:\n%s" % e)
 
@@ -46,118 +80,278 @@ class DefaultInvocationProcessor(InvocationProcessorABC):
                     time.sleep(0.5)
                     continue
 
-                try:
-                    graph_execution_state = self.__invoker.services.graph_execution_manager.get(
-                        queue_item.graph_execution_state_id
-                    )
-                except Exception as e:
-                    self.__invoker.services.logger.error("Exception while retrieving session:\n%s" % e)
-                    self.__invoker.services.events.emit_session_retrieval_error(
-                        graph_execution_state_id=queue_item.graph_execution_state_id,
-                        error_type=e.__class__.__name__,
-                        error=traceback.format_exc(),
-                    )
+                job = self.__load_job(queue_item)
+                if job is None:
                     continue
 
-                try:
-                    invocation = graph_execution_state.execution_graph.get_node(queue_item.invocation_id)
-                except Exception as e:
-                    self.__invoker.services.logger.error("Exception while retrieving invocation:\n%s" % e)
-                    self.__invoker.services.events.emit_invocation_retrieval_error(
-                        graph_execution_state_id=queue_item.graph_execution_state_id,
-                        node_id=queue_item.invocation_id,
-                        error_type=e.__class__.__name__,
-                        error=traceback.format_exc(),
+                jobs = [job] + self.__coalesce(job)
+                self.__prefetch(jobs)
+                for job in jobs:
+                    self.__invoker.services.performance_statistics.record_queue_wait(
+                        job.graph_execution_state.id, time.time() - job.queue_item.timestamp
                     )
-                    continue
 
-                # get the source node id to provide to clients (the prepared node id is not as useful)
-                source_node_id = graph_execution_state.prepared_source_mapping[invocation.id]
+                    # Send starting event
+                    self.__invoker.services.events.emit_invocation_started(
+                        graph_execution_state_id=job.graph_execution_state.id,
+                        node=job.invocation.dict(),
+                        source_node_id=job.source_node_id,
+                    )
 
-                # Send starting event
-                self.__invoker.services.events.emit_invocation_started(
-                    graph_execution_state_id=graph_execution_state.id,
-                    node=invocation.dict(),
-                    source_node_id=source_node_id,
-                )
+                self.__run(jobs)
 
-                # Invoke
-                try:
-                    outputs = invocation.invoke(
-                        InvocationContext(
-                            services=self.__invoker.services,
-                            graph_execution_state_id=graph_execution_state.id,
-                        )
-                    )
+        except KeyboardInterrupt:
+            pass  # Log something? KeyboardInterrupt is probably not going to be seen by the processor
+        finally:
+            self.__threadLimit.release()
 
-                    # Check queue to see if this is canceled, and skip if so
-                    if self.__invoker.services.queue.is_canceled(graph_execution_state.id):
-                        continue
+    def __get_queue_item(self) -> Optional[InvocationQueueItem]:
+        while self.__deferred:
+            queue_item = self.__deferred.popleft()
+            # the queue skips canceled items, deferred ones have to be checked here
+            if queue_item is None or not self.__invoker.services.queue.is_canceled(queue_item.graph_execution_state_id):
+                return queue_item
+        return self.__invoker.services.queue.get()
 
-                    # Save outputs and history
-                    graph_execution_state.complete(invocation.id, outputs)
+    def __prefetch(self, jobs: List[InvocationJob]) -> None:
+        """Has the models of the running sessions and of the sessions waiting in the queue loaded ahead of time"""
+        if self.__prefetcher is None:
+            return
+        session_ids = [job.graph_execution_state.id for job in jobs]
+        for queue_item in list(self.__deferred) + self.__invoker.services.queue.peek():
+            if queue_item is not None and queue_item.graph_execution_state_id not in session_ids:
+                session_ids.append(queue_item.graph_execution_state_id)
+        self.__prefetcher.request(session_ids)
 
-                    # Save the state changes
-                    self.__invoker.services.graph_execution_manager.set(graph_execution_state)
+    def __load_job(self, queue_item: InvocationQueueItem) -> Optional[InvocationJob]:
+        try:
+            graph_execution_state = self.__invoker.services.graph_execution_manager.get(
+                queue_item.graph_execution_state_id
+            )
+        except Exception as e:
+            self.__invoker.services.logger.error("Exception while retrieving session:\n%s" % e)
+            self.__invoker.services.events.emit_session_retrieval_error(
+                graph_execution_state_id=queue_item.graph_execution_state_id,
+                error_type=e.__class__.__name__,
+                error=traceback.format_exc(),
+            )
+            return None
 
-                    # Send complete event
-                    self.__invoker.services.events.emit_invocation_complete(
-                        graph_execution_state_id=graph_execution_state.id,
-                        node=invocation.dict(),
-                        source_node_id=source_node_id,
-                        result=outputs.dict(),
-                    )
+        try:
+            return InvocationJob(queue_item, graph_execution_state)
+        except Exception as e:
+            self.__invoker.services.logger.error("Exception while retrieving invocation:\n%s" % e)
+            self.__invoker.services.events.emit_invocation_retrieval_error(
+                graph_execution_state_id=queue_item.graph_execution_state_id,
+                node_id=queue_item.invocation_id,
+                error_type=e.__class__.__name__,
+                error=traceback.format_exc(),
+            )
+            return None
 
-                except KeyboardInterrupt:
-                    pass
+    def __get_context(self, job: InvocationJob) -> InvocationContext:
+        return InvocationContext(
+            services=self.__invoker.services,
+            graph_execution_state_id=job.graph_execution_state.id,
+        )
 
-                except CanceledException:
-                    pass
+    def __get_cache_key(self, invocation: BaseInvocation) -> Optional[str]:
+        invocation_cache = self.__invoker.services.invocation_cache
+        return invocation_cache.create_key(invocation) if invocation_cache.enabled else None
 
-                except Exception as e:
-                    error = traceback.format_exc()
-                    logger.error(error)
-
-                    # Save error
-                    graph_execution_state.set_node_error(invocation.id, error)
-
-                    # Save the state changes
-                    self.__invoker.services.graph_execution_manager.set(graph_execution_state)
-
-                    self.__invoker.services.logger.error("Error while invoking:\n%s" % e)
-                    # Send error event
-                    self.__invoker.services.events.emit_invocation_error(
-                        graph_execution_state_id=graph_execution_state.id,
-                        node=invocation.dict(),
-                        source_node_id=source_node_id,
-                        error_type=e.__class__.__name__,
-                        error=error,
-                    )
+    def __get_coalesce_key(self, job: InvocationJob):
+        get_coalesce_key = getattr(job.invocation, "get_coalesce_key", None)
+        if get_coalesce_key is None:
+            return None
+        try:
+            return get_coalesce_key(self.__get_context(job))
+        except Exception as e:
+            logger.debug(f"Not coalescing {job.invocation.type} node {job.invocation.id}: {e}")
+            return None
 
-                    pass
+    def __coalesce(self, job: InvocationJob) -> List[InvocationJob]:
+        """Waits briefly for queued invocations that can be invoked together with the job's, and takes them
+        off the queue. Any other queue items that arrive in the meantime are deferred, in order."""
+        configuration = self.__invoker.services.configuration
+        if configuration is None or configuration.denoise_coalesce_window <= 0:
+            return []
 
-                # Check queue to see if this is canceled, and skip if so
-                if self.__invoker.services.queue.is_canceled(graph_execution_state.id):
-                    continue
+        key = self.__get_coalesce_key(job)
+        if key is None:
+            return []
+
+        coalesced: List[InvocationJob] = []
+        sessions = {job.graph_execution_state.id}
+        # items deferred earlier are waiting already, look at those first
+        backlog = list(self.__deferred)
+        self.__deferred.clear()
+        deadline = time.time() + configuration.denoise_coalesce_window
+        while len(coalesced) + 1 < configuration.denoise_coalesce_size:
+            if backlog:
+                queue_item = backlog.pop(0)
+            else:
+                try:
+                    queue_item = self.__invoker.services.queue.get(timeout=max(deadline - time.time(), 0))
+                except Empty:
+                    break
+
+            if not queue_item:  # Probably stopping
+                self.__deferred.append(queue_item)
+                break
 
-                # Queue any further commands if invoking all
-                is_complete = graph_execution_state.is_complete()
-                if queue_item.invoke_all and not is_complete:
-                    try:
-                        self.__invoker.invoke(graph_execution_state, invoke_all=True)
-                    except Exception as e:
-                        self.__invoker.services.logger.error("Error while invoking:\n%s" % e)
-                        self.__invoker.services.events.emit_invocation_error(
-                            graph_execution_state_id=graph_execution_state.id,
-                            node=invocation.dict(),
-                            source_node_id=source_node_id,
-                            error_type=e.__class__.__name__,
-                            error=traceback.format_exc(),
-                        )
-                elif is_complete:
-                    self.__invoker.services.events.emit_graph_execution_complete(graph_execution_state.id)
+            candidate = self.__load_job(queue_item)
+            if candidate is None:
+                continue  # already reported
+
+            # a session's state is only saved once per job, so take at most one job of each session
+            if (
+                candidate.graph_execution_state.id not in sessions
+                and type(candidate.invocation) is type(job.invocation)
+                and self.__get_coalesce_key(candidate) == key
+            ):
+                coalesced.append(candidate)
+                sessions.add(candidate.graph_execution_state.id)
+            else:
+                self.__deferred.append(queue_item)
+
+        self.__deferred.extend(backlog)
+        if coalesced:
+            logger.debug(f"Coalesced {len(coalesced) + 1} {job.invocation.type} invocations")
+        return coalesced
+
+    def __invoke(self, jobs: List[InvocationJob]) -> List[BaseInvocationOutput]:
+        invocation_cache = self.__invoker.services.invocation_cache
+        cache_keys = [self.__get_cache_key(job.invocation) for job in jobs]
+
+        # Reuse the outputs of identical invocations where we can
+        all_outputs: List[Optional[BaseInvocationOutput]] = [
+            invocation_cache.get(cache_key, self.__invoker.services) if cache_key is not None else None
+            for cache_key in cache_keys
+        ]
+        for job, outputs in zip(jobs, all_outputs):
+            if outputs is not None:
+                logger.debug(f"Reusing cached outputs for {job.invocation.type} node {job.invocation.id}")
+
+        # Invoke the rest, together if there is more than one of them
+        pending = [i for i, outputs in enumerate(all_outputs) if outputs is None]
+        if len(pending) == 1:
+            all_outputs[pending[0]] = jobs[pending[0]].invocation.invoke(self.__get_context(jobs[pending[0]]))
+        elif len(pending) > 1:
+            results = type(jobs[pending[0]].invocation).invoke_coalesced(
+                [(jobs[i].invocation, self.__get_context(jobs[i])) for i in pending]
+            )
+            for i, outputs in zip(pending, results):
+                all_outputs[i] = outputs
+
+        for i in pending:
+            # Final images are the user's results; a new run must produce a new image
+            invocation = jobs[i].invocation
+            if cache_keys[i] is not None and (invocation.is_intermediate or not references_images(all_outputs[i])):
+                invocation_cache.save(cache_keys[i], all_outputs[i])
+        return all_outputs
+
+    def __run(self, jobs: List[InvocationJob]) -> None:
+        statistics = self.__invoker.services.performance_statistics
+        try:
+            with statistics.collect_stats(jobs[0].invocation.type, [job.graph_execution_state.id for job in jobs]):
+                all_outputs = self.__invoke(jobs)
 
         except KeyboardInterrupt:
-            pass  # Log something? KeyboardInterrupt is probably not going to be seen by the processor
-        finally:
-            self.__threadLimit.release()
+            all_outputs = [None] * len(jobs)
+
+        except CanceledException:
+            all_outputs = [None] * len(jobs)
+
+        except Exception as e:
+            error = traceback.format_exc()
+            logger.error(error)
+            for job in jobs:
+                self.__fail(job, e, error)
+                self.__continue(job)
+            return
+
+        for job, outputs in zip(jobs, all_outputs):
+            # Check queue to see if this is canceled, and skip if so
+            if outputs is None or self.__invoker.services.queue.is_canceled(job.graph_execution_state.id):
+                self.__continue(job)
+                continue
+
+            try:
+                # Save outputs and history
+                job.graph_execution_state.complete(job.invocation.id, outputs)
+
+                # Save the state changes
+                start_time = time.perf_counter()
+                self.__invoker.services.graph_execution_manager.set(job.graph_execution_state)
+                statistics.record_session_save(job.graph_execution_state.id, time.perf_counter() - start_time)
+
+                # Send complete event
+                self.__invoker.services.events.emit_invocation_complete(
+                    graph_execution_state_id=job.graph_execution_state.id,
+                    node=job.invocation.dict(),
+                    source_node_id=job.source_node_id,
+                    result=outputs.dict(),
+                )
+
+            except Exception as e:
+                error = traceback.format_exc()
+                logger.error(error)
+                self.__fail(job, e, error)
+
+            self.__continue(job)
+
+    def __fail(self, job: InvocationJob, e: Exception, error: str) -> None:
+        # Save error
+        job.graph_execution_state.set_node_error(job.invocation.id, error)
+
+        # Save the state changes
+        self.__invoker.services.graph_execution_manager.set(job.graph_execution_state)
+
+        self.__invoker.services.logger.error("Error while invoking:\n%s" % e)
+        # Send error event
+        self.__invoker.services.events.emit_invocation_error(
+            graph_execution_state_id=job.graph_execution_state.id,
+            node=job.invocation.dict(),
+            source_node_id=job.source_node_id,
+            error_type=e.__class__.__name__,
+            error=error,
+        )
+
+    def __continue(self, job: InvocationJob) -> None:
+        graph_execution_state = job.graph_execution_state
+
+        # Check queue to see if this is canceled, and skip if so
+        if self.__invoker.services.queue.is_canceled(graph_execution_state.id):
+            return
+
+        # Queue any further commands if invoking all
+        is_complete = graph_execution_state.is_complete()
+        if job.queue_item.invoke_all and not is_complete:
+            try:
+                self.__invoker.invoke(graph_execution_state, invoke_all=True)
+            except Exception as e:
+                self.__invoker.services.logger.error("Error while invoking:\n%s" % e)
+                self.__invoker.services.events.emit_invocation_error(
+                    graph_execution_state_id=graph_execution_state.id,
+                    node=job.invocation.dict(),
+                    source_node_id=job.source_node_id,
+                    error_type=e.__class__.__name__,
+                    error=traceback.format_exc(),
+                )
+        elif is_complete:
+            self.__invoker.services.events.emit_graph_execution_complete(graph_execution_state.id)
+            self.__report_session_stats(graph_execution_state.id)
+
+    def __report_session_stats(self, graph_execution_state_id: str) -> None:
+        stats = self.__invoker.services.performance_statistics.pop_session_stats(graph_execution_state_id)
+        if stats is None:
+            return
+
+        total_seconds = sum(node.seconds for node in stats.nodes.values())
+        logger.debug(
+            f"Session {graph_execution_state_id} ran {sum(node.invocations for node in stats.nodes.values())} "
+            f"nodes in {total_seconds:.2f}s, waited {stats.queue_wait.seconds:.2f}s in the queue"
+        )
+        configuration = self.__invoker.services.configuration
+        if configuration is not None and configuration.session_stats_event:
+            self.__invoker.services.events.emit_session_stats(graph_execution_state_id, asdict(stats))
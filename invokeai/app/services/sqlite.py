@@ -1,6 +1,7 @@
+import json
 import sqlite3
 from threading import Lock
-from typing import Generic, Optional, TypeVar, get_args
+from typing import Generic, List, Optional, Tuple, TypeVar, get_args
 
 from pydantic import BaseModel, parse_raw_as
 
@@ -11,20 +12,54 @@ T = TypeVar("T", bound=BaseModel)
 sqlite_memory = ":memory:"
 
 
+def to_match_query(query: str) -> str:
+    """An FTS5 query for items with every word of the query at the start of one of their words"""
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in query.split())
+
+
+def to_sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def parse_cursor(cursor: str) -> Tuple[str, int]:
+    """Splits a cursor into the creation time and rowid of the last item of a page"""
+    created_at, _, rowid = cursor.rpartition("/")
+    if not created_at or not rowid.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return created_at, int(rowid)
+
+
 class SqliteItemStorage(ItemStorageABC, Generic[T]):
     _filename: str
     _table_name: str
     _conn: sqlite3.Connection
     _cursor: sqlite3.Cursor
     _id_field: str
+    _search_keys: Optional[List[str]]
+    _search_path: str
     _lock: Lock
 
-    def __init__(self, filename: str, table_name: str, id_field: str = "id"):
+    def __init__(
+        self,
+        filename: str,
+        table_name: str,
+        id_field: str = "id",
+        search_keys: Optional[List[str]] = None,
+        search_path: str = "$",
+    ):
+        """
+        :param search_keys: the keys of the JSON values search() looks at, anywhere in the items.
+        All string values are searched if None.
+        :param search_path: the JSON path of the part of the items search() looks in. Saving an item
+        only reindexes it if that part changed.
+        """
         super().__init__()
 
         self._filename = filename
         self._table_name = table_name
         self._id_field = id_field  # TODO: validate that T has this field
+        self._search_keys = search_keys
+        self._search_path = search_path
         self._lock = Lock()
         self._conn = sqlite3.connect(
             self._filename, check_same_thread=False
@@ -39,14 +74,102 @@ class SqliteItemStorage(ItemStorageABC, Generic[T]):
             self._cursor.execute(
                 f"""CREATE TABLE IF NOT EXISTS {self._table_name} (
                 item TEXT,
-                id TEXT GENERATED ALWAYS AS (json_extract(item, '$.{self._id_field}')) VIRTUAL NOT NULL);"""
+                id TEXT GENERATED ALWAYS AS (json_extract(item, '$.{self._id_field}')) VIRTUAL NOT NULL,
+                created_at TEXT);"""
             )
             self._cursor.execute(
                 f"""CREATE UNIQUE INDEX IF NOT EXISTS {self._table_name}_id ON {self._table_name}(id);"""
             )
+
+            # Tables created before items had a creation time list their existing items first, in rowid order
+            self._cursor.execute(f"""PRAGMA table_info({self._table_name});""")
+            if "created_at" not in [column[1] for column in self._cursor.fetchall()]:
+                self._cursor.execute(f"""ALTER TABLE {self._table_name} ADD COLUMN created_at TEXT;""")
+                self._cursor.execute(
+                    f"""UPDATE {self._table_name} SET created_at = STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW');"""
+                )
+            self._cursor.execute(
+                f"""CREATE INDEX IF NOT EXISTS {self._table_name}_created_at ON {self._table_name}(created_at);"""
+            )
+
+            self._create_search_table()
+            self._conn.commit()
+        except sqlite3.Error as e:
+            self._conn.rollback()
+            raise e
         finally:
             self._lock.release()
 
+    def _create_search_table(self):
+        """
+        Creates the full text index of the items, kept up to date by triggers. The search keys and path
+        it was built with are stored, the index is rebuilt from the existing items when they change.
+        """
+        search_table = f"{self._table_name}_search"
+        search_keys = json.dumps(dict(keys=self._search_keys, path=self._search_path))
+        self._cursor.execute(
+            """CREATE TABLE IF NOT EXISTS item_search_keys (
+            table_name TEXT NOT NULL PRIMARY KEY,
+            search_keys TEXT NOT NULL);"""
+        )
+        self._cursor.execute(
+            """SELECT search_keys FROM item_search_keys WHERE table_name = ?;""",
+            (self._table_name,),
+        )
+        stored_keys = self._cursor.fetchone()
+        rebuild = stored_keys is None or stored_keys[0] != search_keys
+
+        key_filter = ""
+        if self._search_keys is not None:
+            keys = ", ".join(to_sql_string(key) for key in self._search_keys)
+            key_filter = f" AND key IN ({keys})"
+        path = to_sql_string(self._search_path)
+
+        def search_text(item: str) -> str:
+            return f"(SELECT group_concat(value, ' ') FROM json_tree({item}, {path}) WHERE type = 'text'{key_filter})"
+
+        # the triggers embed the search keys, they are recreated in case those have changed
+        for event in ("insert", "update", "delete"):
+            self._cursor.execute(f"""DROP TRIGGER IF EXISTS tg_{search_table}_{event};""")
+        if rebuild:
+            self._cursor.execute(f"""DROP TABLE IF EXISTS {search_table};""")
+
+        self._cursor.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {search_table} USING fts5(text);""")
+        self._cursor.execute(
+            f"""CREATE TRIGGER tg_{search_table}_insert
+            AFTER INSERT ON {self._table_name}
+            BEGIN
+                INSERT INTO {search_table} (rowid, text) VALUES (new.rowid, {search_text("new.item")});
+            END;"""
+        )
+        # items are saved again on every change, they are only reindexed when the searched part changed;
+        # comparing that part is a lot cheaper than extracting the search text with json_tree
+        self._cursor.execute(
+            f"""CREATE TRIGGER tg_{search_table}_update
+            AFTER UPDATE OF item ON {self._table_name}
+            WHEN json_extract(old.item, {path}) IS NOT json_extract(new.item, {path})
+            BEGIN
+                UPDATE {search_table} SET text = {search_text("new.item")} WHERE rowid = new.rowid;
+            END;"""
+        )
+        self._cursor.execute(
+            f"""CREATE TRIGGER tg_{search_table}_delete
+            AFTER DELETE ON {self._table_name}
+            BEGIN
+                DELETE FROM {search_table} WHERE rowid = old.rowid;
+            END;"""
+        )
+
+        if rebuild:
+            self._cursor.execute(
+                f"""INSERT INTO {search_table} (rowid, text)
+                SELECT rowid, {search_text("item")} FROM {self._table_name};"""
+            )
+            self._cursor.execute(
+                """INSERT OR REPLACE INTO item_search_keys (table_name, search_keys) VALUES (?, ?);""",
+                (self._table_name, search_keys),
+            )
+
     def _parse_item(self, item: str) -> T:
         item_type = get_args(self.__orig_class__)[0]
         return parse_raw_as(item_type, item)
@@ -54,8 +177,11 @@ class SqliteItemStorage(ItemStorageABC, Generic[T]):
     def set(self, item: T):
         try:
             self._lock.acquire()
+            # an upsert rather than a replace, which would give the item a new rowid and creation time
             self._cursor.execute(
-                f"""INSERT OR REPLACE INTO {self._table_name} (item) VALUES (?);""",
+                f"""INSERT INTO {self._table_name} (item, created_at)
+                VALUES (?, STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW'))
+                ON CONFLICT(id) DO UPDATE SET item = excluded.item;""",
                 (item.json(),),
             )
             self._conn.commit()
@@ -98,45 +224,70 @@ class SqliteItemStorage(ItemStorageABC, Generic[T]):
             self._lock.release()
         self._on_deleted(id)
 
-    def list(self, page: int = 0, per_page: int = 10) -> PaginatedResults[T]:
+    def list(self, page: int = 0, per_page: int = 10, cursor: Optional[str] = None) -> PaginatedResults[T]:
         try:
             self._lock.acquire()
-            self._cursor.execute(
-                f"""SELECT item FROM {self._table_name} LIMIT ? OFFSET ?;""",
-                (per_page, page * per_page),
-            )
-            result = self._cursor.fetchall()
-
-            items = list(map(lambda r: self._parse_item(r[0]), result))
-
-            self._cursor.execute(f"""SELECT count(*) FROM {self._table_name};""")
-            count = self._cursor.fetchone()[0]
+            return self._get_page(self._table_name, "", (), page, per_page, cursor)
         finally:
             self._lock.release()
 
-        pageCount = int(count / per_page) + 1
-
-        return PaginatedResults[T](items=items, page=page, pages=pageCount, per_page=per_page, total=count)
+    def search(
+        self, query: str, page: int = 0, per_page: int = 10, cursor: Optional[str] = None
+    ) -> PaginatedResults[T]:
+        match_query = to_match_query(query)
+        if match_query == "":
+            return self.list(page, per_page, cursor)
 
-    def search(self, query: str, page: int = 0, per_page: int = 10) -> PaginatedResults[T]:
         try:
             self._lock.acquire()
-            self._cursor.execute(
-                f"""SELECT item FROM {self._table_name} WHERE item LIKE ? LIMIT ? OFFSET ?;""",
-                (f"%{query}%", per_page, page * per_page),
+            return self._get_page(
+                f"""{self._table_name} JOIN {self._table_name}_search AS search
+                ON search.rowid = {self._table_name}.rowid""",
+                "search.text MATCH ?",
+                (match_query,),
+                page,
+                per_page,
+                cursor,
             )
-            result = self._cursor.fetchall()
-
-            items = list(map(lambda r: self._parse_item(r[0]), result))
-
-            self._cursor.execute(
-                f"""SELECT count(*) FROM {self._table_name} WHERE item LIKE ?;""",
-                (f"%{query}%",),
-            )
-            count = self._cursor.fetchone()[0]
         finally:
             self._lock.release()
 
-        pageCount = int(count / per_page) + 1
+    def _get_page(
+        self, source: str, condition: str, params: tuple, page: int, per_page: int, cursor: Optional[str]
+    ) -> PaginatedResults[T]:
+        """
+        Gets a page of the items of the source in creation order, after the cursor if there is one.
+        The items are only counted for pages without a cursor, the first page already has the total.
+        """
+        where = f"WHERE {condition}" if condition else ""
+        count: Optional[int] = None
+        if cursor is None:
+            self._cursor.execute(f"""SELECT count(*) FROM {source} {where};""", params)
+            count = self._cursor.fetchone()[0]
+
+        if cursor is not None:
+            keyset_condition = f"({self._table_name}.created_at, {self._table_name}.rowid) > (?, ?)"
+            where = f"WHERE {condition} AND {keyset_condition}" if condition else f"WHERE {keyset_condition}"
+            params = (*params, *parse_cursor(cursor))
+            offset = 0
+        else:
+            offset = page * per_page
+
+        self._cursor.execute(
+            f"""SELECT {self._table_name}.item, {self._table_name}.created_at, {self._table_name}.rowid
+            FROM {source}
+            {where}
+            ORDER BY {self._table_name}.created_at, {self._table_name}.rowid
+            LIMIT ? OFFSET ?;""",
+            (*params, per_page, offset),
+        )
+        result = self._cursor.fetchall()
+
+        items = list(map(lambda r: self._parse_item(r[0]), result))
+        next_cursor = f"{result[-1][1]}/{result[-1][2]}" if len(result) == per_page else None
+
+        pageCount = int(count / per_page) + 1 if count is not None else None
 
-        return PaginatedResults[T](items=items, page=page, pages=pageCount, per_page=per_page, total=count)
+        return PaginatedResults[T](
+            items=items, page=page, pages=pageCount, per_page=per_page, total=count, next_cursor=next_cursor
+        )
@@ -1,11 +1,9 @@
 import torch
 import numpy as np
-import cv2
 from PIL import Image
 from diffusers.utils import PIL_INTERPOLATION
 
 from einops import rearrange
-from controlnet_aux.util import HWC3, resize_image
 
 ###################################################################
 # Copy of scripts/lvminthin.py from Mikubill/sd-webui-controlnet
@@ -40,6 +38,8 @@ lvmin_prunings += [np.rot90(x, k=3, axes=(0, 1)) for x in lvmin_prunings_raw]
 
 
 def remove_pattern(x, kernel):
+    import cv2
+
     objects = cv2.morphologyEx(x, cv2.MORPH_HITMISS, kernel)
     objects = np.where(objects > 127)
     x[objects] = 0
@@ -72,6 +72,8 @@ def nake_nms(x):
     f2 = np.array([[0, 1, 0], [0, 1, 0], [0, 1, 0]], dtype=np.uint8)
     f3 = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=np.uint8)
     f4 = np.array([[0, 0, 1], [0, 1, 0], [1, 0, 0]], dtype=np.uint8)
+    import cv2
+
     y = np.zeros_like(x)
     for f in [f1, f2, f3, f4]:
         np.putmask(y, cv2.dilate(x, kernel=f) == x, x)
@@ -143,6 +145,9 @@ def np_img_resize(np_img: np.ndarray, resize_mode: str, h: int, w: int, device:
     #     np_img = np_img.astype(np.float32)
     # else:
     #     np_img = HWC3(np_img)
+    import cv2
+    from controlnet_aux.util import HWC3
+
     np_img = HWC3(np_img)
 
     def safe_numpy(x):
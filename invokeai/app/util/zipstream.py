@@ -0,0 +1,54 @@
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple, Union
+
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipBuffer:
+    """
+    Write-only file object that collects what zipfile writes until it is taken. It has no tell() or
+    seek(), so zipfile writes a streamable archive, with the sizes of entries after their data.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> Iterator[bytes]:
+        """Yields what was written since the last call, if anything"""
+        if self._chunks:
+            data = b"".join(self._chunks)
+            self._chunks.clear()
+            yield data
+
+
+def stream_zip(files: Iterable[Tuple[str, Union[str, Path]]], chunk_size: int = ZIP_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yields a zip archive of the files, given as (name in the archive, path) pairs, as it is written.
+    Files are stored without compression, images are compressed already, and only one chunk of a
+    file is held in memory at a time.
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:  # type: ignore
+        for name, path in files:
+            stat = os.stat(path)
+            # zip dates start in 1980
+            date_time = max(time.localtime(stat.st_mtime)[:6], (1980, 1, 1, 0, 0, 0))
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            # the size is known ahead, so zipfile can decide whether the entry needs zip64
+            info.file_size = stat.st_size
+            with open(path, "rb") as source, archive.open(info, mode="w") as entry:
+                while chunk := source.read(chunk_size):
+                    entry.write(chunk)
+                    yield from buffer.take()
+            yield from buffer.take()
+    yield from buffer.take()
@@ -14,7 +14,6 @@ from abc import ABCMeta
 from argparse import Namespace
 from contextlib import nullcontext
 
-import cv2
 import numpy as np
 import torch
 from PIL import Image, ImageChops, ImageFilter
@@ -410,6 +409,8 @@ class Generator:
 
         # Blur the mask out (into init image) by specified amount
         if mask_blur_radius > 0:
+            import cv2
+
             nm = np.asarray(pil_init_mask, dtype=np.uint8)
             nmd = cv2.erode(
                 nm,
@@ -6,7 +6,6 @@ from __future__ import annotations
 import math
 from typing import Tuple, Union, Optional
 
-import cv2
 import numpy as np
 import torch
 from PIL import Image, ImageChops, ImageFilter, ImageOps
@@ -124,6 +123,8 @@ class Inpaint(Img2Img):
         return si
 
     def mask_edge(self, mask: Image.Image, edge_size: int, edge_blur: int) -> Image.Image:
+        import cv2
+
         npimg = np.asarray(mask, dtype=np.uint8)
 
         # Detect any partially transparent regions
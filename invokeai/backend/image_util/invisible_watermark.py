@@ -4,9 +4,7 @@ wraps the invisible watermark model. It respects the global "invisible_watermark
 configuration variable, that allows the watermarking to be supressed.
 """
 import numpy as np
-import cv2
 from PIL import Image
-from imwatermark import WatermarkEncoder
 from invokeai.app.services.config import InvokeAIAppConfig
 import invokeai.backend.util.logging as logger
 
@@ -27,6 +25,9 @@ class InvisibleWatermark:
         if not self.invisible_watermark_available():
             return image
         logger.debug(f'Applying invisible watermark "{watermark_text}"')
+        import cv2
+        from imwatermark import WatermarkEncoder
+
         bgr = cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
         encoder = WatermarkEncoder()
         encoder.set_watermark("bytes", watermark_text.encode("utf-8"))
@@ -2,7 +2,7 @@
 Initialization file for invokeai.backend.model_management
 """
 from .model_manager import ModelManager, ModelInfo, AddModelResult, SchedulerPredictionType
-from .model_cache import ModelCache
+from .model_cache import ModelCache, ModelCacheStats, PrefetchStats
 from .models import (
     BaseModelType,
     ModelType,
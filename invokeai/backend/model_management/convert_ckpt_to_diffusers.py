@@ -18,9 +18,10 @@
 """ Conversion script for the Stable Diffusion checkpoints."""
 
 import re
+from collections.abc import MutableMapping
 from contextlib import nullcontext
 from io import BytesIO
-from typing import Optional, Union
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
 from pathlib import Path
 
 import requests
@@ -66,7 +67,7 @@ from invokeai.backend.util.logging import InvokeAILogger
 from invokeai.app.services.config import InvokeAIAppConfig, MODEL_CORE
 
 from picklescan.scanner import scan_file_path
-from .models import BaseModelType, ModelVariantType
+from .models import BaseModelType, ModelVariantType, SubModelType
 
 try:
     from omegaconf import OmegaConf
@@ -83,6 +84,59 @@ if is_accelerate_available():
 logger = InvokeAILogger.getLogger(__name__)
 CONVERT_MODEL_ROOT = InvokeAIAppConfig.get_config().root_path / MODEL_CORE / "convert"
 
+# The text conditioning stage of each base model, as named by download_from_original_stable_diffusion_ckpt()
+MODEL_BASE_TO_MODEL_TYPE = {
+    BaseModelType.StableDiffusion1: "FrozenCLIPEmbedder",
+    BaseModelType.StableDiffusion2: "FrozenOpenCLIPEmbedder",
+    BaseModelType.StableDiffusionXL: "SDXL",
+    BaseModelType.StableDiffusionXLRefiner: "SDXL-Refiner",
+}
+
+
+class LazySafetensorsDict(MutableMapping):
+    """
+    A state dict backed by a memory-mapped safetensors file. Tensors are only read
+    when they are looked up, so converting one submodel doesn't touch the pages
+    of the others. Keys can be removed and replaced without changing the file.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        from safetensors import safe_open
+
+        self._file = safe_open(str(path), framework="pt", device="cpu")
+        self._keys = dict.fromkeys(self._file.keys())
+        self._replaced: Dict[str, Any] = dict()
+        # the conversion functions often look the same tensor up a few times in a row
+        self._last: Tuple[Optional[str], Any] = (None, None)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._replaced:
+            return self._replaced[key]
+        if key not in self._keys:
+            raise KeyError(key)
+        if self._last[0] != key:
+            self._last = (key, self._file.get_tensor(key))
+        return self._last[1]
+
+    def __setitem__(self, key: str, value: Any):
+        self._keys[key] = None
+        self._replaced[key] = value
+
+    def __delitem__(self, key: str):
+        del self._keys[key]
+        self._replaced.pop(key, None)
+        if self._last[0] == key:
+            self._last = (None, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
 
 def shave_segments(path, n_shave_prefix_segments=1):
     """
@@ -1112,6 +1166,169 @@ def convert_controlnet_checkpoint(
 
 
 # TO DO - PASS PRECISION
+def load_original_checkpoint(
+    checkpoint_path: Union[str, Path],
+    from_safetensors: bool = False,
+    scan_needed: bool = True,
+    device: Optional[str] = None,
+) -> Tuple[Any, Optional[int]]:
+    """
+    Returns the state dict of a CompVis-style checkpoint and its global step, if recorded.
+    Safetensors files are memory-mapped and their tensors read on demand, see LazySafetensorsDict.
+    """
+    if from_safetensors:
+        if not is_safetensors_available():
+            raise ValueError(BACKENDS_MAPPING["safetensors"][1])
+
+        checkpoint = LazySafetensorsDict(checkpoint_path)
+    else:
+        if scan_needed:
+            # scan model
+            scan_result = scan_file_path(checkpoint_path)
+            if scan_result.infected_files != 0:
+                raise "The model {checkpoint_path} is potentially infected by malware. Aborting import."
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            checkpoint = torch.load(checkpoint_path, map_location=device)
+        else:
+            checkpoint = torch.load(checkpoint_path, map_location=device)
+
+    # Sometimes models don't have the global_step item
+    if "global_step" in checkpoint:
+        global_step = checkpoint["global_step"]
+    else:
+        logger.debug("global_step key not found in model")
+        global_step = None
+
+    # NOTE: this while loop isn't great but this controlnet checkpoint has one additional
+    # "state_dict" key https://huggingface.co/thibaud/controlnet-canny-sd21
+    while "state_dict" in checkpoint:
+        checkpoint = checkpoint["state_dict"]
+
+    return checkpoint, global_step
+
+
+def _get_model_settings(original_config: DictConfig, model_version: BaseModelType) -> Tuple[str, bool, int]:
+    """Returns the prediction type, whether attention is upcast and the image size of a model."""
+    if (
+        model_version == BaseModelType.StableDiffusion2
+        and original_config["model"]["params"]["parameterization"] == "v"
+    ):
+        return "v_prediction", True, 768
+    else:
+        return "epsilon", False, 512
+
+
+def _create_scheduler(original_config: DictConfig, model_type: str, prediction_type: str, scheduler_type: str):
+    num_train_timesteps = getattr(original_config.model.params, "timesteps", None) or 1000
+
+    if model_type in ["SDXL", "SDXL-Refiner"]:
+        scheduler_dict = {
+            "beta_schedule": "scaled_linear",
+            "beta_start": 0.00085,
+            "beta_end": 0.012,
+            "interpolation_type": "linear",
+            "num_train_timesteps": num_train_timesteps,
+            "prediction_type": "epsilon",
+            "sample_max_value": 1.0,
+            "set_alpha_to_one": False,
+            "skip_prk_steps": True,
+            "steps_offset": 1,
+            "timestep_spacing": "leading",
+        }
+        scheduler = EulerDiscreteScheduler.from_config(scheduler_dict)
+        scheduler_type = "euler"
+    else:
+        beta_start = getattr(original_config.model.params, "linear_start", None) or 0.02
+        beta_end = getattr(original_config.model.params, "linear_end", None) or 0.085
+        scheduler = DDIMScheduler(
+            beta_end=beta_end,
+            beta_schedule="scaled_linear",
+            beta_start=beta_start,
+            num_train_timesteps=num_train_timesteps,
+            steps_offset=1,
+            clip_sample=False,
+            set_alpha_to_one=False,
+            prediction_type=prediction_type,
+        )
+    # make sure scheduler works correctly with DDIM
+    scheduler.register_to_config(clip_sample=False)
+
+    if scheduler_type == "pndm":
+        config = dict(scheduler.config)
+        config["skip_prk_steps"] = True
+        scheduler = PNDMScheduler.from_config(config)
+    elif scheduler_type == "lms":
+        scheduler = LMSDiscreteScheduler.from_config(scheduler.config)
+    elif scheduler_type == "heun":
+        scheduler = HeunDiscreteScheduler.from_config(scheduler.config)
+    elif scheduler_type == "euler":
+        scheduler = EulerDiscreteScheduler.from_config(scheduler.config)
+    elif scheduler_type == "euler-ancestral":
+        scheduler = EulerAncestralDiscreteScheduler.from_config(scheduler.config)
+    elif scheduler_type == "dpm":
+        scheduler = DPMSolverMultistepScheduler.from_config(scheduler.config)
+    elif scheduler_type == "ddim":
+        scheduler = scheduler
+    else:
+        raise ValueError(f"Scheduler of type {scheduler_type} doesn't exist!")
+
+    return scheduler
+
+
+def _convert_unet(
+    checkpoint,
+    original_config: DictConfig,
+    image_size: int,
+    upcast_attention: bool,
+    checkpoint_path: Optional[str] = None,
+    extract_ema: bool = False,
+) -> UNet2DConditionModel:
+    unet_config = create_unet_diffusers_config(original_config, image_size=image_size)
+    unet_config["upcast_attention"] = upcast_attention
+    converted_unet_checkpoint = convert_ldm_unet_checkpoint(
+        checkpoint, unet_config, path=checkpoint_path, extract_ema=extract_ema
+    )
+
+    ctx = init_empty_weights if is_accelerate_available() else nullcontext
+    with ctx():
+        unet = UNet2DConditionModel(**unet_config)
+
+    if is_accelerate_available():
+        for param_name, param in converted_unet_checkpoint.items():
+            set_module_tensor_to_device(unet, param_name, "cpu", value=param)
+    else:
+        unet.load_state_dict(converted_unet_checkpoint)
+    return unet
+
+
+def _convert_vae(checkpoint, original_config: DictConfig, image_size: int) -> AutoencoderKL:
+    vae_config = create_vae_diffusers_config(original_config, image_size=image_size)
+    converted_vae_checkpoint = convert_ldm_vae_checkpoint(checkpoint, vae_config)
+
+    if (
+        "model" in original_config
+        and "params" in original_config.model
+        and "scale_factor" in original_config.model.params
+    ):
+        vae_scaling_factor = original_config.model.params.scale_factor
+    else:
+        vae_scaling_factor = 0.18215  # default SD scaling factor
+
+    vae_config["scaling_factor"] = vae_scaling_factor
+
+    ctx = init_empty_weights if is_accelerate_available() else nullcontext
+    with ctx():
+        vae = AutoencoderKL(**vae_config)
+
+    if is_accelerate_available():
+        for param_name, param in converted_vae_checkpoint.items():
+            set_module_tensor_to_device(vae, param_name, "cpu", value=param)
+    else:
+        vae.load_state_dict(converted_vae_checkpoint)
+    return vae
+
+
 def download_from_original_stable_diffusion_ckpt(
     checkpoint_path: str,
     model_version: BaseModelType,
@@ -1219,36 +1436,9 @@ def download_from_original_stable_diffusion_ckpt(
     if not is_omegaconf_available():
         raise ValueError(BACKENDS_MAPPING["omegaconf"][1])
 
-    if from_safetensors:
-        if not is_safetensors_available():
-            raise ValueError(BACKENDS_MAPPING["safetensors"][1])
-
-        from safetensors.torch import load_file as safe_load
-
-        checkpoint = safe_load(checkpoint_path, device="cpu")
-    else:
-        if scan_needed:
-            # scan model
-            scan_result = scan_file_path(checkpoint_path)
-            if scan_result.infected_files != 0:
-                raise "The model {checkpoint_path} is potentially infected by malware. Aborting import."
-        if device is None:
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            checkpoint = torch.load(checkpoint_path, map_location=device)
-        else:
-            checkpoint = torch.load(checkpoint_path, map_location=device)
-
-    # Sometimes models don't have the global_step item
-    if "global_step" in checkpoint:
-        global_step = checkpoint["global_step"]
-    else:
-        logger.debug("global_step key not found in model")
-        global_step = None
-
-    # NOTE: this while loop isn't great but this controlnet checkpoint has one additional
-    # "state_dict" key https://huggingface.co/thibaud/controlnet-canny-sd21
-    while "state_dict" in checkpoint:
-        checkpoint = checkpoint["state_dict"]
+    checkpoint, global_step = load_original_checkpoint(
+        checkpoint_path, from_safetensors=from_safetensors, scan_needed=scan_needed, device=device
+    )
 
     logger.debug(f"model_type = {model_type}; original_config_file = {original_config_file}")
 
@@ -1279,17 +1469,7 @@ def download_from_original_stable_diffusion_ckpt(
         original_config_file = BytesIO(requests.get(config_url).content)
 
     original_config = OmegaConf.load(original_config_file)
-    if (
-        model_version == BaseModelType.StableDiffusion2
-        and original_config["model"]["params"]["parameterization"] == "v"
-    ):
-        prediction_type = "v_prediction"
-        upcast_attention = True
-        image_size = 768
-    else:
-        prediction_type = "epsilon"
-        upcast_attention = False
-        image_size = 512
+    prediction_type, upcast_attention, image_size = _get_model_settings(original_config, model_version)
 
     # Convert the text model.
     if (
@@ -1338,101 +1518,14 @@ def download_from_original_stable_diffusion_ckpt(
             checkpoint, original_config, checkpoint_path, image_size, upcast_attention, extract_ema
         )
 
-    num_train_timesteps = getattr(original_config.model.params, "timesteps", None) or 1000
-
-    if model_type in ["SDXL", "SDXL-Refiner"]:
-        scheduler_dict = {
-            "beta_schedule": "scaled_linear",
-            "beta_start": 0.00085,
-            "beta_end": 0.012,
-            "interpolation_type": "linear",
-            "num_train_timesteps": num_train_timesteps,
-            "prediction_type": "epsilon",
-            "sample_max_value": 1.0,
-            "set_alpha_to_one": False,
-            "skip_prk_steps": True,
-            "steps_offset": 1,
-            "timestep_spacing": "leading",
-        }
-        scheduler = EulerDiscreteScheduler.from_config(scheduler_dict)
-        scheduler_type = "euler"
-    else:
-        beta_start = getattr(original_config.model.params, "linear_start", None) or 0.02
-        beta_end = getattr(original_config.model.params, "linear_end", None) or 0.085
-        scheduler = DDIMScheduler(
-            beta_end=beta_end,
-            beta_schedule="scaled_linear",
-            beta_start=beta_start,
-            num_train_timesteps=num_train_timesteps,
-            steps_offset=1,
-            clip_sample=False,
-            set_alpha_to_one=False,
-            prediction_type=prediction_type,
-        )
-    # make sure scheduler works correctly with DDIM
-    scheduler.register_to_config(clip_sample=False)
-
-    if scheduler_type == "pndm":
-        config = dict(scheduler.config)
-        config["skip_prk_steps"] = True
-        scheduler = PNDMScheduler.from_config(config)
-    elif scheduler_type == "lms":
-        scheduler = LMSDiscreteScheduler.from_config(scheduler.config)
-    elif scheduler_type == "heun":
-        scheduler = HeunDiscreteScheduler.from_config(scheduler.config)
-    elif scheduler_type == "euler":
-        scheduler = EulerDiscreteScheduler.from_config(scheduler.config)
-    elif scheduler_type == "euler-ancestral":
-        scheduler = EulerAncestralDiscreteScheduler.from_config(scheduler.config)
-    elif scheduler_type == "dpm":
-        scheduler = DPMSolverMultistepScheduler.from_config(scheduler.config)
-    elif scheduler_type == "ddim":
-        scheduler = scheduler
-    else:
-        raise ValueError(f"Scheduler of type {scheduler_type} doesn't exist!")
+    scheduler = _create_scheduler(original_config, model_type, prediction_type, scheduler_type)
 
     # Convert the UNet2DConditionModel model.
-    unet_config = create_unet_diffusers_config(original_config, image_size=image_size)
-    unet_config["upcast_attention"] = upcast_attention
-    converted_unet_checkpoint = convert_ldm_unet_checkpoint(
-        checkpoint, unet_config, path=checkpoint_path, extract_ema=extract_ema
-    )
-
-    ctx = init_empty_weights if is_accelerate_available() else nullcontext
-    with ctx():
-        unet = UNet2DConditionModel(**unet_config)
-
-    if is_accelerate_available():
-        for param_name, param in converted_unet_checkpoint.items():
-            set_module_tensor_to_device(unet, param_name, "cpu", value=param)
-    else:
-        unet.load_state_dict(converted_unet_checkpoint)
+    unet = _convert_unet(checkpoint, original_config, image_size, upcast_attention, checkpoint_path, extract_ema)
 
     # Convert the VAE model.
     if vae_path is None:
-        vae_config = create_vae_diffusers_config(original_config, image_size=image_size)
-        converted_vae_checkpoint = convert_ldm_vae_checkpoint(checkpoint, vae_config)
-
-        if (
-            "model" in original_config
-            and "params" in original_config.model
-            and "scale_factor" in original_config.model.params
-        ):
-            vae_scaling_factor = original_config.model.params.scale_factor
-        else:
-            vae_scaling_factor = 0.18215  # default SD scaling factor
-
-        vae_config["scaling_factor"] = vae_scaling_factor
-
-        ctx = init_empty_weights if is_accelerate_available() else nullcontext
-        with ctx():
-            vae = AutoencoderKL(**vae_config)
-
-        if is_accelerate_available():
-            for param_name, param in converted_vae_checkpoint.items():
-                set_module_tensor_to_device(vae, param_name, "cpu", value=param)
-        else:
-            vae.load_state_dict(converted_vae_checkpoint)
+        vae = _convert_vae(checkpoint, original_config, image_size)
     else:
         vae = AutoencoderKL.from_pretrained(vae_path)
 
@@ -1634,6 +1727,73 @@ def download_from_original_stable_diffusion_ckpt(
     return pipe
 
 
+def load_submodel_from_original_ckpt(
+    checkpoint_path: Union[str, Path],
+    submodel_type: SubModelType,
+    model_version: BaseModelType,
+    original_config_file: Union[str, Path],
+    precision: torch.dtype = torch.float32,
+    scheduler_type: str = "pndm",
+    extract_ema: bool = True,
+    scan_needed: bool = True,
+) -> Any:
+    """
+    Builds one submodel of a pipeline straight from a CompVis-style checkpoint, without
+    converting the checkpoint to a diffusers folder first. The keys are remapped in memory
+    by the same functions download_from_original_stable_diffusion_ckpt() uses, and only
+    the tensors of the requested submodel are read from a safetensors file.
+
+    Returns None for the submodels that the checkpoint doesn't have, such as the safety checker.
+    """
+    checkpoint_path = Path(checkpoint_path)
+    model_type = MODEL_BASE_TO_MODEL_TYPE[model_version]
+    original_config = OmegaConf.load(original_config_file)
+    prediction_type, upcast_attention, image_size = _get_model_settings(original_config, model_version)
+
+    # these don't come from the weights
+    if submodel_type == SubModelType.Scheduler:
+        return _create_scheduler(original_config, model_type, prediction_type, scheduler_type)
+    elif submodel_type == SubModelType.Tokenizer:
+        if model_type == "FrozenOpenCLIPEmbedder":
+            return CLIPTokenizer.from_pretrained(CONVERT_MODEL_ROOT / "stable-diffusion-2-clip", subfolder="tokenizer")
+        elif model_type in ["FrozenCLIPEmbedder", "SDXL"]:
+            return CLIPTokenizer.from_pretrained(CONVERT_MODEL_ROOT / "clip-vit-large-patch14")
+        return None
+    elif submodel_type == SubModelType.Tokenizer2:
+        if model_type in ["SDXL", "SDXL-Refiner"]:
+            tokenizer_name = CONVERT_MODEL_ROOT / "CLIP-ViT-bigG-14-laion2B-39B-b160k"
+            return CLIPTokenizer.from_pretrained(tokenizer_name, pad_token="!")
+        return None
+
+    checkpoint, _ = load_original_checkpoint(
+        checkpoint_path,
+        from_safetensors=checkpoint_path.suffix == ".safetensors",
+        scan_needed=scan_needed,
+        device="cpu",
+    )
+
+    if submodel_type == SubModelType.UNet:
+        model = _convert_unet(checkpoint, original_config, image_size, upcast_attention, checkpoint_path, extract_ema)
+    elif submodel_type == SubModelType.Vae:
+        model = _convert_vae(checkpoint, original_config, image_size)
+    elif submodel_type == SubModelType.TextEncoder and model_type == "FrozenOpenCLIPEmbedder":
+        model = convert_open_clip_checkpoint(checkpoint, "stabilityai/stable-diffusion-2", subfolder="text_encoder")
+    elif submodel_type == SubModelType.TextEncoder and model_type in ["FrozenCLIPEmbedder", "SDXL"]:
+        model = convert_ldm_clip_checkpoint(checkpoint)
+    elif submodel_type == SubModelType.TextEncoder2 and model_type in ["SDXL", "SDXL-Refiner"]:
+        model = convert_open_clip_checkpoint(
+            checkpoint,
+            CONVERT_MODEL_ROOT / "CLIP-ViT-bigG-14-laion2B-39B-b160k",
+            prefix="conditioner.embedders.1.model." if model_type == "SDXL" else "conditioner.embedders.0.model.",
+            has_projection=True,
+            projection_dim=1280,
+        )
+    else:
+        return None
+
+    return model.to(precision)
+
+
 def download_controlnet_from_original_ckpt(
     checkpoint_path: str,
     original_config_file: str,
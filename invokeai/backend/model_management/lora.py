@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import copy
+import weakref
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import Optional, Dict, Tuple, Any, Union, List
+from typing import Optional, Dict, Tuple, Any, Union, List, Collection, Type
 from pathlib import Path
 
 import torch
@@ -361,6 +363,43 @@ class LoRAModel:  # (torch.nn.Module):
             model_size += layer.calc_size()
         return model_size
 
+    # keys that only appear in lora checkpoints
+    KEY_PREFIXES = ("lora_te_", "lora_unet_")
+    KEY_SUFFIXES = ("to_k_lora.up.weight", "to_q_lora.down.weight")
+
+    @classmethod
+    def is_lora_key(cls, key: str) -> bool:
+        return key.startswith(cls.KEY_PREFIXES) or key.endswith(cls.KEY_SUFFIXES)
+
+    @staticmethod
+    def get_layer_type(values: Collection[str]) -> Optional[Type[LoRALayerBase]]:
+        """Returns the layer class for the tensors of one layer, given their names without the layer key"""
+        # lora and locon
+        if "lora_down.weight" in values:
+            return LoRALayer
+
+        # loha
+        elif "hada_w1_b" in values:
+            return LoHALayer
+
+        # lokr
+        elif "lokr_w1_b" in values or "lokr_w1" in values:
+            return LoKRLayer
+
+        # TODO: diff/ia3/... format
+        return None
+
+    @staticmethod
+    def get_token_vector_length(shapes: Dict[str, Tuple[int, ...]]) -> Optional[int]:
+        """Returns the width of the text encoder the lora was trained for, if its tensor shapes tell"""
+        key1 = "lora_te_text_model_encoder_layers_0_mlp_fc1.lora_down.weight"
+        key2 = "lora_te_text_model_encoder_layers_0_self_attn_k_proj.hada_w1_a"
+        if key1 in shapes:
+            return shapes[key1][1]
+        elif key2 in shapes:
+            return shapes[key2][0]
+        return None
+
     @classmethod
     def from_checkpoint(
         cls,
@@ -389,22 +428,11 @@ class LoRAModel:  # (torch.nn.Module):
         state_dict = cls._group_state(state_dict)
 
         for layer_key, values in state_dict.items():
-            # lora and locon
-            if "lora_down.weight" in values:
-                layer = LoRALayer(layer_key, values)
-
-            # loha
-            elif "hada_w1_b" in values:
-                layer = LoHALayer(layer_key, values)
-
-            # lokr
-            elif "lokr_w1_b" in values or "lokr_w1" in values:
-                layer = LoKRLayer(layer_key, values)
-
-            else:
-                # TODO: diff/ia3/... format
+            layer_type = cls.get_layer_type(values)
+            if layer_type is None:
                 print(f">> Encountered unknown lora layer module in {model.name}: {layer_key}")
                 return
+            layer = layer_type(layer_key, values)
 
             # lower memory consumption by removing already parsed layer values
             state_dict[layer_key].clear()
@@ -439,6 +467,117 @@ with LoRAHelper.apply_lora_unet(unet, loras):
 """
 
 
+class TextualInversionEmbedding(torch.nn.Module):
+    """
+    Token embedding table extended with textual inversion rows. Token ids below
+    the size of the wrapped table are looked up in it, the rest in the TI rows,
+    so the (large) original table never has to be resized or copied.
+    """
+
+    def __init__(self, base: torch.nn.Embedding, ti_embeddings: torch.Tensor):
+        super().__init__()
+        self.base = base
+        self.register_buffer("ti_embeddings", ti_embeddings, persistent=False)
+
+    @property
+    def num_embeddings(self) -> int:
+        return self.base.num_embeddings + self.ti_embeddings.shape[0]
+
+    @property
+    def embedding_dim(self) -> int:
+        return self.base.embedding_dim
+
+    def forward(self, input_ids: torch.Tensor) -> torch.Tensor:
+        base_count = self.base.num_embeddings
+        ti_mask = input_ids >= base_count
+        embeds = self.base(input_ids.clamp(max=base_count - 1))
+        ti_embeds = self.ti_embeddings[(input_ids - base_count).clamp(min=0)].to(dtype=embeds.dtype)
+        return torch.where(ti_mask.unsqueeze(-1), ti_embeds, embeds)
+
+
+class _TICacheEntry:
+    """TI-augmented tokenizer and embedding table for one text encoder and one set of TI models."""
+
+    tokenizer: CLIPTokenizer
+    manager: TextualInversionManager
+    embeddings: TextualInversionEmbedding
+
+    def __init__(self, source_tokenizer, base_embeddings, ti_list, tokenizer, manager, embeddings):
+        # weak references only, so that the model cache is still able to evict these
+        self._source_tokenizer = weakref.ref(source_tokenizer)
+        self._base_embeddings = weakref.ref(base_embeddings)
+        self._ti_refs = [weakref.ref(ti) for ti in ti_list]
+        self.tokenizer = tokenizer
+        self.manager = manager
+        self.embeddings = embeddings
+
+    def is_valid(self, tokenizer: CLIPTokenizer, base_embeddings: torch.nn.Module, ti_list: List[Any]) -> bool:
+        return (
+            self._source_tokenizer() is tokenizer
+            and self._base_embeddings() is base_embeddings
+            and len(self._ti_refs) == len(ti_list)
+            and all(ref() is ti for ref, ti in zip(self._ti_refs, ti_list))
+        )
+
+    @classmethod
+    def build(cls, tokenizer: CLIPTokenizer, base_embeddings: torch.nn.Embedding, ti_list: List[Any]) -> _TICacheEntry:
+        ti_tokenizer = copy.deepcopy(tokenizer)
+        ti_manager = TextualInversionManager(ti_tokenizer)
+        init_tokens_count = base_embeddings.num_embeddings
+
+        def _get_trigger(ti, index):
+            trigger = ti.name
+            if index > 0:
+                trigger += f"-!pad-{index}"
+            return f"<{trigger}>"
+
+        # modify tokenizer
+        for ti in ti_list:
+            for i in range(ti.embedding.shape[0]):
+                ti_tokenizer.add_tokens(_get_trigger(ti, i))
+
+        # collect embedding rows for the new tokens
+        ti_rows: Dict[int, torch.Tensor] = dict()
+        for ti in ti_list:
+            ti_tokens = []
+            for i in range(ti.embedding.shape[0]):
+                embedding = ti.embedding[i]
+                trigger = _get_trigger(ti, i)
+
+                token_id = ti_tokenizer.convert_tokens_to_ids(trigger)
+                if token_id == ti_tokenizer.unk_token_id:
+                    raise RuntimeError(f"Unable to find token id for token '{trigger}'")
+                if token_id < init_tokens_count:
+                    raise RuntimeError(f"Token '{trigger}' collides with an existing token of the text encoder")
+
+                if base_embeddings.embedding_dim != embedding.shape[0]:
+                    raise ValueError(
+                        f"Cannot load embedding for {trigger}. It was trained on a model with token dimension {embedding.shape[0]}, but the current model has token dimension {base_embeddings.embedding_dim}."
+                    )
+
+                ti_rows[token_id - init_tokens_count] = embedding
+                ti_tokens.append(token_id)
+
+            if len(ti_tokens) > 1:
+                ti_manager.pad_tokens[ti_tokens[0]] = ti_tokens[1:]
+
+        weight = base_embeddings.weight
+        ti_embeddings = torch.zeros(
+            (max(ti_rows.keys()) + 1, base_embeddings.embedding_dim), device=weight.device, dtype=weight.dtype
+        )
+        for index, embedding in ti_rows.items():
+            ti_embeddings[index] = embedding.to(device=weight.device, dtype=weight.dtype)
+
+        return cls(
+            tokenizer,
+            base_embeddings,
+            ti_list,
+            ti_tokenizer,
+            ti_manager,
+            TextualInversionEmbedding(base_embeddings, ti_embeddings),
+        )
+
+
 # TODO: rename smth like ModelPatcher and add TI method?
 class ModelPatcher:
     @staticmethod
@@ -545,6 +684,10 @@ class ModelPatcher:
                 for module_key, weight in original_weights.items():
                     model.get_submodule(module_key).weight.copy_(weight)
 
+    # text_encoder -> OrderedDict[ti key -> _TICacheEntry]; weak so cached models can still be evicted
+    _ti_cache: "weakref.WeakKeyDictionary[torch.nn.Module, OrderedDict]" = weakref.WeakKeyDictionary()
+    _ti_cache_size: int = 8
+
     @classmethod
     @contextmanager
     def apply_ti(
@@ -553,58 +696,43 @@ class ModelPatcher:
         text_encoder: CLIPTextModel,
         ti_list: List[Any],
     ) -> Tuple[CLIPTokenizer, TextualInversionManager]:
-        init_tokens_count = None
-        new_tokens_added = None
+        if len(ti_list) == 0:
+            yield tokenizer, TextualInversionManager(tokenizer)
+            return
 
+        entry = cls._get_ti_entry(tokenizer, text_encoder, ti_list)
+        original_embeddings = text_encoder.get_input_embeddings()
         try:
-            ti_tokenizer = copy.deepcopy(tokenizer)
-            ti_manager = TextualInversionManager(ti_tokenizer)
-            init_tokens_count = text_encoder.resize_token_embeddings(None).num_embeddings
-
-            def _get_trigger(ti, index):
-                trigger = ti.name
-                if index > 0:
-                    trigger += f"-!pad-{i}"
-                return f"<{trigger}>"
-
-            # modify tokenizer
-            new_tokens_added = 0
-            for ti in ti_list:
-                for i in range(ti.embedding.shape[0]):
-                    new_tokens_added += ti_tokenizer.add_tokens(_get_trigger(ti, i))
-
-            # modify text_encoder
-            text_encoder.resize_token_embeddings(init_tokens_count + new_tokens_added)
-            model_embeddings = text_encoder.get_input_embeddings()
-
-            for ti in ti_list:
-                ti_tokens = []
-                for i in range(ti.embedding.shape[0]):
-                    embedding = ti.embedding[i]
-                    trigger = _get_trigger(ti, i)
-
-                    token_id = ti_tokenizer.convert_tokens_to_ids(trigger)
-                    if token_id == ti_tokenizer.unk_token_id:
-                        raise RuntimeError(f"Unable to find token id for token '{trigger}'")
-
-                    if model_embeddings.weight.data[token_id].shape != embedding.shape:
-                        raise ValueError(
-                            f"Cannot load embedding for {trigger}. It was trained on a model with token dimension {embedding.shape[0]}, but the current model has token dimension {model_embeddings.weight.data[token_id].shape[0]}."
-                        )
-
-                    model_embeddings.weight.data[token_id] = embedding.to(
-                        device=text_encoder.device, dtype=text_encoder.dtype
-                    )
-                    ti_tokens.append(token_id)
+            # the extra rows are tiny, so just make sure they follow the (possibly already loaded) text encoder
+            entry.embeddings.to(device=original_embeddings.weight.device, dtype=original_embeddings.weight.dtype)
+            text_encoder.set_input_embeddings(entry.embeddings)
 
-                if len(ti_tokens) > 1:
-                    ti_manager.pad_tokens[ti_tokens[0]] = ti_tokens[1:]
-
-            yield ti_tokenizer, ti_manager
+            yield entry.tokenizer, entry.manager
 
         finally:
-            if init_tokens_count and new_tokens_added:
-                text_encoder.resize_token_embeddings(init_tokens_count)
+            text_encoder.set_input_embeddings(original_embeddings)
+
+    @classmethod
+    def _get_ti_entry(
+        cls,
+        tokenizer: CLIPTokenizer,
+        text_encoder: CLIPTextModel,
+        ti_list: List[Any],
+    ) -> _TICacheEntry:
+        model_embeddings = text_encoder.get_input_embeddings()
+        ti_key = tuple(id(ti) for ti in ti_list)
+
+        text_encoder_cache = cls._ti_cache.setdefault(text_encoder, OrderedDict())
+        entry = text_encoder_cache.get(ti_key, None)
+        if entry is not None and entry.is_valid(tokenizer, model_embeddings, ti_list):
+            text_encoder_cache.move_to_end(ti_key)
+            return entry
+
+        entry = _TICacheEntry.build(tokenizer, model_embeddings, ti_list)
+        text_encoder_cache[ti_key] = entry
+        while len(text_encoder_cache) > cls._ti_cache_size:
+            text_encoder_cache.popitem(last=False)
+        return entry
 
     @classmethod
     @contextmanager
@@ -629,6 +757,23 @@ class TextualInversionModel:
     name: str
     embedding: torch.Tensor  # [n, 768]|[n, 1280]
 
+    # the keys of the embedding in the v1/v2 and v3 (easynegative) formats
+    EMBEDDING_KEYS = ("string_to_param", "emb_params")
+
+    @classmethod
+    def get_embedding_key(cls, keys: Collection[str]) -> Optional[str]:
+        """Returns the key that holds the embedding, or None for diffusers embeddings"""
+        return next((key for key in cls.EMBEDDING_KEYS if key in keys), None)
+
+    @classmethod
+    def get_token_dim(cls, shapes: Dict[str, Tuple[int, ...]]) -> Optional[int]:
+        """Returns the width of the embedding, given the tensor shapes of the (flattened) checkpoint"""
+        embedding_key = cls.get_embedding_key({key.split(".", 1)[0] for key in shapes})
+        for key, shape in shapes.items():
+            if embedding_key is None or key.split(".", 1)[0] == embedding_key:
+                return shape[-1]
+        return None
+
     @classmethod
     def from_checkpoint(
         cls,
@@ -647,9 +792,11 @@ class TextualInversionModel:
         else:
             state_dict = torch.load(file_path, map_location="cpu")
 
+        embedding_key = cls.get_embedding_key(state_dict.keys())
+
         # both v1 and v2 format embeddings
         # difference mostly in metadata
-        if "string_to_param" in state_dict:
+        if embedding_key == "string_to_param":
             if len(state_dict["string_to_param"]) > 1:
                 print(
                     f'Warn: Embedding "{file_path.name}" contains multiple tokens, which is not supported. The first token will be used.'
@@ -658,7 +805,7 @@ class TextualInversionModel:
             result.embedding = next(iter(state_dict["string_to_param"].values()))
 
         # v3 (easynegative)
-        elif "emb_params" in state_dict:
+        elif embedding_key == "emb_params":
             result.embedding = state_dict["emb_params"]
 
         # v4(diffusers bin files)
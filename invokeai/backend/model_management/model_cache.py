@@ -13,14 +13,19 @@ context. Use like this:
           cache.get_model('stabilityai/stable-diffusion-2') as SD2:
        do_something_in_GPU(SD1,SD2)
 
-
+Models that will be needed soon can be loaded into RAM ahead of time
+from another thread with prefetch_model(). A prefetch never evicts a
+cached model; it is skipped when the model doesn't fit in the free
+space of the cache.
 """
 
 import gc
 import os
 import sys
-import hashlib
+import threading
+import time
 from contextlib import suppress
+from dataclasses import dataclass, replace
 from pathlib import Path
 from typing import Dict, Union, types, Optional, Type, Any
 
@@ -30,6 +35,7 @@ import logging
 import invokeai.backend.util.logging as logger
 from invokeai.app.services.config import get_invokeai_config
 from .lora import LoRAModel, TextualInversionModel
+from .model_hash import get_model_hash_index
 from .models import BaseModelType, ModelType, SubModelType, ModelBase
 
 # Maximum size of the cache, in gigs
@@ -53,6 +59,29 @@ class ModelCache(object):
     pass
 
 
+@dataclass
+class PrefetchStats:
+    """Counts prefetched models that were used (hits), that were evicted before they were used (wasted),
+    and the total size of the prefetched models in bytes"""
+
+    hits: int = 0
+    wasted: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class ModelCacheStats:
+    """Counts and total durations, in seconds, of the model loads from disk done by get_model(), and of the
+    moves of models into the execution device and back out to the storage device"""
+
+    loads: int = 0
+    load_seconds: float = 0.0
+    moves_to_gpu: int = 0
+    move_to_gpu_seconds: float = 0.0
+    offloads: int = 0
+    offload_seconds: float = 0.0
+
+
 class _CacheRecord:
     size: int
     model: Any
@@ -94,7 +123,6 @@ class ModelCache(object):
         precision: torch.dtype = torch.float16,
         sequential_offload: bool = False,
         lazy_offloading: bool = True,
-        sha_chunksize: int = 16777216,
         logger: types.ModuleType = logger,
     ):
         """
@@ -104,7 +132,6 @@ class ModelCache(object):
         :param precision: Precision for loaded models [torch.float16]
         :param lazy_offloading: Keep model in VRAM until another model needs to be loaded
         :param sequential_offload: Conserve VRAM by loading and unloading each stage of the pipeline sequentially
-        :param sha_chunksize: Chunksize to use when calculating sha256 model hash
         """
         self.model_infos: Dict[str, ModelBase] = dict()
         # allow lazy offloading only when vram cache enabled
@@ -114,12 +141,20 @@ class ModelCache(object):
         self.max_vram_cache_size: float = max_vram_cache_size
         self.execution_device: torch.device = execution_device
         self.storage_device: torch.device = storage_device
-        self.sha_chunksize = sha_chunksize
         self.logger = logger
 
         self._cached_models = dict()
         self._cache_stack = list()
 
+        # models may be prefetched from another thread: the structural lock guards the bookkeeping,
+        # the per-key locks keep a model from being loaded twice at the same time
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = dict()
+        # keys of prefetched models that haven't been asked for yet, with their sizes
+        self._prefetched: Dict[str, int] = dict()
+        self._prefetch_stats = PrefetchStats()
+        self._stats = ModelCacheStats()
+
     def get_key(
         self,
         model_path: str,
@@ -138,6 +173,7 @@ class ModelCache(object):
         model_class: Type[ModelBase],
         base_model: BaseModelType,
         model_type: ModelType,
+        checkpoint_config: Optional[str] = None,
     ):
         model_info_key = self.get_key(
             model_path=model_path,
@@ -146,14 +182,22 @@ class ModelCache(object):
             submodel_type=None,
         )
 
-        if model_info_key not in self.model_infos:
-            self.model_infos[model_info_key] = model_class(
-                model_path,
-                base_model,
-                model_type,
-            )
+        with self._lock:
+            if model_info_key not in self.model_infos:
+                # only the main models built straight from a checkpoint take its original config
+                kwargs = dict(checkpoint_config=checkpoint_config) if checkpoint_config is not None else dict()
+                self.model_infos[model_info_key] = model_class(
+                    model_path,
+                    base_model,
+                    model_type,
+                    **kwargs,
+                )
 
-        return self.model_infos[model_info_key]
+            return self.model_infos[model_info_key]
+
+    def _get_load_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
 
     # TODO: args
     def get_model(
@@ -164,6 +208,7 @@ class ModelCache(object):
         model_type: ModelType,
         submodel: Optional[SubModelType] = None,
         gpu_load: bool = True,
+        checkpoint_config: Optional[str] = None,
     ) -> Any:
         if not isinstance(model_path, Path):
             model_path = Path(model_path)
@@ -176,6 +221,7 @@ class ModelCache(object):
             model_class=model_class,
             base_model=base_model,
             model_type=model_type,
+            checkpoint_config=checkpoint_config,
         )
         key = self.get_key(
             model_path=model_path,
@@ -184,29 +230,115 @@ class ModelCache(object):
             submodel_type=submodel,
         )
 
-        # TODO: lock for no copies on simultaneous calls?
-        cache_entry = self._cached_models.get(key, None)
-        if cache_entry is None:
-            self.logger.info(f"Loading model {model_path}, type {base_model}:{model_type}:{submodel}")
+        with self._get_load_lock(key):
+            with self._lock:
+                cache_entry = self._cached_models.get(key, None)
+                if self._prefetched.pop(key, None) is not None:
+                    self._prefetch_stats.hits += 1
+
+            if cache_entry is None:
+                self.logger.info(f"Loading model {model_path}, type {base_model}:{model_type}:{submodel}")
+
+                # this will remove older cached models until
+                # there is sufficient room to load the requested model
+                with self._lock:
+                    self._make_cache_room(model_info.get_size(submodel))
+
+                # clean memory to make MemoryUsage() more accurate
+                gc.collect()
+                start_time = time.perf_counter()
+                model = model_info.get_model(child_type=submodel, torch_dtype=self.precision)
+                with self._lock:
+                    self._stats.loads += 1
+                    self._stats.load_seconds += time.perf_counter() - start_time
+                if mem_used := model_info.get_size(submodel):
+                    self.logger.debug(f"CPU RAM used for load: {(mem_used/GIG):.2f} GB")
+
+                cache_entry = _CacheRecord(self, model, mem_used)
+                with self._lock:
+                    self._cached_models[key] = cache_entry
+
+            with self._lock:
+                with suppress(Exception):
+                    self._cache_stack.remove(key)
+                self._cache_stack.append(key)
 
-            # this will remove older cached models until
-            # there is sufficient room to load the requested model
-            self._make_cache_room(model_info.get_size(submodel))
+        return self.ModelLocker(self, key, cache_entry.model, gpu_load, cache_entry.size)
 
-            # clean memory to make MemoryUsage() more accurate
-            gc.collect()
+    def prefetch_model(
+        self,
+        model_path: Union[str, Path],
+        model_class: Type[ModelBase],
+        base_model: BaseModelType,
+        model_type: ModelType,
+        submodel: Optional[SubModelType] = None,
+        checkpoint_config: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Loads a model into RAM ahead of a get_model() call, without evicting any cached model.
+        Returns the cache key of the model if it is in the cache afterwards, or None if it
+        didn't fit. Meant to be called from a background thread.
+        """
+        model_path = Path(model_path)
+        if not model_path.exists():
+            return None
+
+        model_info = self._get_model_info(
+            model_path=model_path,
+            model_class=model_class,
+            base_model=base_model,
+            model_type=model_type,
+            checkpoint_config=checkpoint_config,
+        )
+        key = self.get_key(
+            model_path=model_path,
+            base_model=base_model,
+            model_type=model_type,
+            submodel_type=submodel,
+        )
+
+        with self._get_load_lock(key):
+            size = model_info.get_size(submodel)
+            with self._lock:
+                if key in self._cached_models:
+                    return key
+                if not self._has_room_for(size):
+                    self.logger.debug(f"Not prefetching {key}, it needs {(size/GIG):.2f} GB more than is free")
+                    return None
+
+            self.logger.debug(f"Prefetching model {model_path}, type {base_model}:{model_type}:{submodel}")
             model = model_info.get_model(child_type=submodel, torch_dtype=self.precision)
-            if mem_used := model_info.get_size(submodel):
-                self.logger.debug(f"CPU RAM used for load: {(mem_used/GIG):.2f} GB")
 
-            cache_entry = _CacheRecord(self, model, mem_used)
-            self._cached_models[key] = cache_entry
+            with self._lock:
+                # models loaded in the meantime take precedence
+                if not self._has_room_for(size):
+                    self.logger.debug(f"Dropping prefetched {key}, the cache filled up while loading it")
+                    return None
+                self._cached_models[key] = _CacheRecord(self, model, size)
+                # most recently used, it is about to be
+                self._cache_stack.append(key)
+                self._prefetched[key] = size
+                self._prefetch_stats.bytes += size
 
-        with suppress(Exception):
-            self._cache_stack.remove(key)
-        self._cache_stack.append(key)
+        return key
 
-        return self.ModelLocker(self, key, cache_entry.model, gpu_load, cache_entry.size)
+    def get_prefetch_stats(self) -> PrefetchStats:
+        """Returns a copy of the prefetch counters"""
+        with self._lock:
+            return replace(self._prefetch_stats)
+
+    def get_stats(self) -> ModelCacheStats:
+        """Returns a copy of the load and offload timings"""
+        with self._lock:
+            return replace(self._stats)
+
+    def _has_room_for(self, size: int) -> bool:
+        current_size = sum([m.size for m in self._cached_models.values()])
+        return current_size + size <= self.max_cache_size * GIG
+
+    def _forget_prefetched(self, key: str):
+        if self._prefetched.pop(key, None) is not None:
+            self._prefetch_stats.wasted += 1
 
     class ModelLocker(object):
         def __init__(self, cache, key, model, gpu_load, size_needed):
@@ -230,31 +362,35 @@ class ModelCache(object):
 
             # NOTE that the model has to have the to() method in order for this
             # code to move it into GPU!
-            if self.gpu_load:
-                self.cache_entry.lock()
-
-                try:
-                    if self.cache.lazy_offloading:
-                        self.cache._offload_unlocked_models(self.size_needed)
-
-                    if self.model.device != self.cache.execution_device:
-                        self.cache.logger.debug(f"Moving {self.key} into {self.cache.execution_device}")
-                        with VRAMUsage() as mem:
-                            self.model.to(self.cache.execution_device)  # move into GPU
-                        self.cache.logger.debug(f"GPU VRAM used for load: {(mem.vram_used/GIG):.2f} GB")
-
-                    self.cache.logger.debug(f"Locking {self.key} in {self.cache.execution_device}")
-                    self.cache._print_cuda_stats()
-
-                except:
-                    self.cache_entry.unlock()
-                    raise
-
-            # TODO: not fully understand
-            # in the event that the caller wants the model in RAM, we
-            # move it into CPU if it is in GPU and not locked
-            elif self.cache_entry.loaded and not self.cache_entry.locked:
-                self.model.to(self.cache.storage_device)
+            with self.cache._lock:
+                if self.gpu_load:
+                    self.cache_entry.lock()
+
+                    try:
+                        if self.cache.lazy_offloading:
+                            self.cache._offload_unlocked_models(self.size_needed)
+
+                        if self.model.device != self.cache.execution_device:
+                            self.cache.logger.debug(f"Moving {self.key} into {self.cache.execution_device}")
+                            start_time = time.perf_counter()
+                            with VRAMUsage() as mem:
+                                self.model.to(self.cache.execution_device)  # move into GPU
+                            self.cache._stats.moves_to_gpu += 1
+                            self.cache._stats.move_to_gpu_seconds += time.perf_counter() - start_time
+                            self.cache.logger.debug(f"GPU VRAM used for load: {(mem.vram_used/GIG):.2f} GB")
+
+                        self.cache.logger.debug(f"Locking {self.key} in {self.cache.execution_device}")
+                        self.cache._print_cuda_stats()
+
+                    except:
+                        self.cache_entry.unlock()
+                        raise
+
+                # TODO: not fully understand
+                # in the event that the caller wants the model in RAM, we
+                # move it into CPU if it is in GPU and not locked
+                elif self.cache_entry.loaded and not self.cache_entry.locked:
+                    self.model.to(self.cache.storage_device)
 
             return self.model
 
@@ -262,31 +398,36 @@ class ModelCache(object):
             if not hasattr(self.model, "to"):
                 return
 
-            self.cache_entry.unlock()
-            if not self.cache.lazy_offloading:
-                self.cache._offload_unlocked_models()
-                self.cache._print_cuda_stats()
+            with self.cache._lock:
+                self.cache_entry.unlock()
+                if not self.cache.lazy_offloading:
+                    self.cache._offload_unlocked_models()
+                    self.cache._print_cuda_stats()
 
     # TODO: should it be called untrack_model?
     def uncache_model(self, cache_id: str):
-        with suppress(ValueError):
-            self._cache_stack.remove(cache_id)
-        self._cached_models.pop(cache_id, None)
+        with self._lock:
+            with suppress(ValueError):
+                self._cache_stack.remove(cache_id)
+            self._cached_models.pop(cache_id, None)
+            self._forget_prefetched(cache_id)
 
     def model_hash(
         self,
         model_path: Union[str, Path],
-    ) -> str:
+    ) -> Optional[str]:
         """
-        Given the HF repo id or path to a model on disk, returns a unique
-        hash. Works for legacy checkpoint files, HF models on disk, and HF repo IDs
+        Given the path to a model on disk, returns a unique hash of its
+        weights. Works for legacy checkpoint files and HF models on disk.
+        Unchanged files are not read again, see ModelHashIndex.
         :param model_path: Path to model file/directory on disk.
         """
-        return self._local_model_hash(model_path)
+        return get_model_hash_index().get_hash(model_path, wait=True)
 
     def cache_size(self) -> float:
         "Return the current size of the cache, in GB"
-        current_cache_size = sum([m.size for m in self._cached_models.values()])
+        with self._lock:
+            current_cache_size = sum([m.size for m in self._cached_models.values()])
         return current_cache_size / GIG
 
     def _has_cuda(self) -> bool:
@@ -299,12 +440,13 @@ class ModelCache(object):
         cached_models = 0
         loaded_models = 0
         locked_models = 0
-        for model_info in self._cached_models.values():
-            cached_models += 1
-            if model_info.loaded:
-                loaded_models += 1
-            if model_info.locked:
-                locked_models += 1
+        with self._lock:
+            for model_info in list(self._cached_models.values()):
+                cached_models += 1
+                if model_info.loaded:
+                    loaded_models += 1
+                if model_info.locked:
+                    locked_models += 1
 
         self.logger.debug(
             f"Current VRAM/RAM usage: {vram}/{ram}; cached_models/loaded_models/locked_models/ = {cached_models}/{loaded_models}/{locked_models}"
@@ -365,6 +507,7 @@ class ModelCache(object):
                 current_size -= cache_entry.size
                 del self._cache_stack[pos]
                 del self._cached_models[model_key]
+                self._forget_prefetched(model_key)
                 del cache_entry
 
             else:
@@ -384,8 +527,11 @@ class ModelCache(object):
                 break
             if not cache_entry.locked and cache_entry.loaded:
                 self.logger.debug(f"Offloading {model_key} from {self.execution_device} into {self.storage_device}")
+                start_time = time.perf_counter()
                 with VRAMUsage() as mem:
                     cache_entry.model.to(self.storage_device)
+                self._stats.offloads += 1
+                self._stats.offload_seconds += time.perf_counter() - start_time
                 self.logger.debug(f"GPU VRAM freed: {(mem.vram_used/GIG):.2f} GB")
                 vram_in_use += mem.vram_used  # note vram_used is negative
                 self.logger.debug(f"{(vram_in_use/GIG):.2f}GB VRAM used for models; max allowed={(reserved/GIG):.2f}GB")
@@ -393,26 +539,6 @@ class ModelCache(object):
         gc.collect()
         torch.cuda.empty_cache()
 
-    def _local_model_hash(self, model_path: Union[str, Path]) -> str:
-        sha = hashlib.sha256()
-        path = Path(model_path)
-
-        hashpath = path / "checksum.sha256"
-        if hashpath.exists() and path.stat().st_mtime <= hashpath.stat().st_mtime:
-            with open(hashpath) as f:
-                hash = f.read()
-            return hash
-
-        self.logger.debug(f"computing hash of model {path.name}")
-        for file in list(path.rglob("*.ckpt")) + list(path.rglob("*.safetensors")) + list(path.rglob("*.pth")):
-            with open(file, "rb") as f:
-                while chunk := f.read(self.sha_chunksize):
-                    sha.update(chunk)
-        hash = sha.hexdigest()
-        with open(hashpath, "w") as f:
-            f.write(hash)
-        return hash
-
 
 class VRAMUsage(object):
     def __init__(self):
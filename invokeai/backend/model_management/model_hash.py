@@ -0,0 +1,253 @@
+"""
+Persistent index of model content hashes.
+
+Hashing a multi-GB checkpoint means reading every byte of it, so hashes
+are kept in a small SQLite database and keyed on each weights file's
+fingerprint (path, size, mtime and inode). A hash is only recomputed
+when the fingerprint of the file changes. Hashes of models that haven't
+been seen before are computed in a background thread:
+
+   index = ModelHashIndex(Path('databases/model_hashes.db'))
+   index.get_hash(path)             # None until the background thread is done
+   index.get_hash(path, wait=True)  # hashes now if needed
+
+The index also remembers the content hashes of checkpoints that have
+passed the pickle malware scan, so that the same contents are not scanned
+again, and a summary of each file's contents for probing, so that unchanged
+files are not loaded again.
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+from queue import Queue
+from threading import Lock, Thread
+from typing import Dict, List, NamedTuple, Optional, Set, Union
+
+import invokeai.backend.util.logging as logger
+
+try:
+    from blake3 import blake3 as _hasher
+
+    HASH_ALGORITHM = "blake3"
+except ImportError:
+    _hasher = hashlib.blake2b
+    HASH_ALGORITHM = "blake2b"
+
+# Files that hold the weights of a model; a folder model is hashed over these
+WEIGHTS_SUFFIXES = {".ckpt", ".safetensors", ".pth", ".pt", ".bin"}
+
+HASH_CHUNKSIZE = 16777216
+
+
+class FileFingerprint(NamedTuple):
+    size: int
+    mtime: float
+    inode: int
+
+    @classmethod
+    def of(cls, path: Path) -> "FileFingerprint":
+        stat = path.stat()
+        return cls(size=stat.st_size, mtime=stat.st_mtime, inode=stat.st_ino)
+
+
+def fast_file_hash(path: Path, chunksize: int = HASH_CHUNKSIZE) -> str:
+    """Streams the file through a fast hash and returns the hex digest, prefixed with the algorithm."""
+    hasher = _hasher()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunksize):
+            hasher.update(chunk)
+    return f"{HASH_ALGORITHM}:{hasher.hexdigest()}"
+
+
+def weights_files(model_path: Path) -> List[Path]:
+    """The weights files of a model, in a stable order. A checkpoint is its own weights file."""
+    if model_path.is_file():
+        return [model_path]
+    return sorted(p for p in model_path.rglob("*") if p.is_file() and p.suffix in WEIGHTS_SUFFIXES)
+
+
+class ModelHashIndex(object):
+    """
+    Maps weights files to their content hashes, persisted in SQLite.
+    """
+
+    def __init__(self, db_path: Union[str, Path], chunksize: int = HASH_CHUNKSIZE):
+        """
+        :param db_path: Path to the SQLite database, created if missing
+        :param chunksize: Size of the chunks the files are read in
+        """
+        self.chunksize = chunksize
+        self._lock = Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._cursor = self._conn.cursor()
+        self._create_table()
+
+        self._pending: Set[Path] = set()
+        self._queue: Queue = Queue()
+        self._worker = Thread(name="model_hasher", target=self._process, daemon=True)
+        self._worker.start()
+
+    def _create_table(self):
+        with self._lock:
+            self._cursor.execute(
+                """--sql
+                CREATE TABLE IF NOT EXISTS model_hashes (
+                    path TEXT NOT NULL PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    inode INTEGER NOT NULL,
+                    hash TEXT,
+                    summary TEXT
+                );
+                """
+            )
+            self._cursor.execute(
+                """--sql
+                CREATE TABLE IF NOT EXISTS scanned_hashes (
+                    hash TEXT NOT NULL PRIMARY KEY
+                );
+                """
+            )
+            self._conn.commit()
+
+    def get_hash(self, model_path: Union[str, Path], wait: bool = False) -> Optional[str]:
+        """
+        Returns the content hash of a checkpoint file or a model folder. A folder's
+        hash combines the hashes of its weights files. If any of them isn't hashed yet,
+        the hashing is queued in the background and None is returned, unless `wait` is
+        set, in which case the missing hashes are computed first.
+        :param model_path: Path to the model file or folder
+        :param wait: Compute missing hashes in the calling thread
+        """
+        model_path = Path(model_path)
+        files = weights_files(model_path)
+        if not files:
+            return None
+
+        # look every file up, so that all the missing ones get queued
+        hashes = [self._get_file_hash(file, wait) for file in files]
+        if None in hashes:
+            return None
+        if model_path.is_file():
+            return hashes[0]
+        hasher = _hasher()
+        for file, hash in zip(files, hashes):
+            hasher.update(f"{file.relative_to(model_path).as_posix()}:{hash}\n".encode("utf-8"))
+        return f"{HASH_ALGORITHM}:{hasher.hexdigest()}"
+
+    def queue_hash(self, model_path: Union[str, Path]):
+        """Hash the model's weights files in the background, if they aren't indexed yet."""
+        for file in weights_files(Path(model_path)):
+            self._get_file_hash(file, wait=False)
+
+    def is_scanned(self, path: Union[str, Path]) -> bool:
+        """Whether the file's contents have passed the malware scan before. The file is only
+        hashed if it isn't indexed yet or has changed since."""
+        hash = self._get_file_hash(Path(path).resolve(), wait=True)
+        with self._lock:
+            self._cursor.execute("SELECT 1 FROM scanned_hashes WHERE hash = ?;", (hash,))
+            return self._cursor.fetchone() is not None
+
+    def set_scanned(self, path: Union[str, Path]):
+        """Records that the file's contents passed the malware scan."""
+        hash = self._get_file_hash(Path(path).resolve(), wait=True)
+        with self._lock:
+            self._cursor.execute("INSERT OR IGNORE INTO scanned_hashes (hash) VALUES (?);", (hash,))
+            self._conn.commit()
+
+    def get_summary(self, path: Union[str, Path]) -> Optional[str]:
+        """Returns the summary recorded for this version of the file, see `set_summary`."""
+        row = self._get_row(Path(path).resolve())
+        return None if row is None else row["summary"]
+
+    def set_summary(self, path: Union[str, Path], summary: str):
+        """Records a summary of the file's contents, such as its tensor names and shapes.
+        It is dropped as soon as the file changes."""
+        self._set(Path(path).resolve(), "summary", summary)
+
+    def _get_row(self, path: Path) -> Optional[Dict]:
+        fingerprint = FileFingerprint.of(path)
+        with self._lock:
+            self._cursor.execute(
+                """--sql
+                SELECT hash, summary FROM model_hashes
+                WHERE path = ? AND size = ? AND mtime = ? AND inode = ?;
+                """,
+                (str(path), *fingerprint),
+            )
+            row = self._cursor.fetchone()
+        return None if row is None else dict(hash=row[0], summary=row[1])
+
+    def _set(self, path: Path, column: str, value, fingerprint: Optional[FileFingerprint] = None):
+        fingerprint = fingerprint or FileFingerprint.of(path)
+        with self._lock:
+            # whatever was recorded for another version of the file no longer applies
+            self._cursor.execute(
+                """--sql
+                DELETE FROM model_hashes
+                WHERE path = ? AND NOT (size = ? AND mtime = ? AND inode = ?);
+                """,
+                (str(path), *fingerprint),
+            )
+            self._cursor.execute(
+                """--sql
+                INSERT OR IGNORE INTO model_hashes (path, size, mtime, inode) VALUES (?, ?, ?, ?);
+                """,
+                (str(path), *fingerprint),
+            )
+            self._cursor.execute(f"UPDATE model_hashes SET {column} = ? WHERE path = ?;", (value, str(path)))
+            self._conn.commit()
+
+    def _get_file_hash(self, path: Path, wait: bool) -> Optional[str]:
+        path = path.resolve()
+        row = self._get_row(path)
+        if row is not None and row["hash"] is not None:
+            return row["hash"]
+        if wait:
+            return self._hash_file(path)
+
+        with self._lock:
+            if path in self._pending:
+                return None
+            self._pending.add(path)
+        self._queue.put(path)
+        return None
+
+    def _hash_file(self, path: Path) -> str:
+        # the fingerprint is taken first, a file modified while hashing is hashed again next time
+        fingerprint = FileFingerprint.of(path)
+        logger.debug(f"Computing hash of {path}")
+        hash = fast_file_hash(path, self.chunksize)
+        self._set(path, "hash", hash, fingerprint)
+        return hash
+
+    def _process(self):
+        while True:
+            path = self._queue.get()
+            try:
+                row = self._get_row(path)
+                if row is None or row["hash"] is None:
+                    self._hash_file(path)
+            except Exception as e:
+                logger.warning(f"Could not hash {path}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+
+
+_model_hash_index: Optional[ModelHashIndex] = None
+_model_hash_index_lock = Lock()
+
+
+def get_model_hash_index() -> ModelHashIndex:
+    """Returns the hash index of the current InvokeAI root, stored next to the other databases."""
+    global _model_hash_index
+    with _model_hash_index_lock:
+        if _model_hash_index is None:
+            from invokeai.app.services.config import InvokeAIAppConfig
+
+            db_path = InvokeAIAppConfig.get_config().db_path.parent / "model_hashes.db"
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            _model_hash_index = ModelHashIndex(db_path)
+        return _model_hash_index
@@ -231,7 +231,9 @@ from __future__ import annotations
 import os
 import hashlib
 import textwrap
+import threading
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional, List, Tuple, Union, Dict, Set, Callable, types
@@ -247,6 +249,8 @@ import invokeai.backend.util.logging as logger
 from invokeai.app.services.config import InvokeAIAppConfig
 from invokeai.backend.util import CUDA_DEVICE, Chdir
 from .model_cache import ModelCache, ModelLocker
+from .model_hash import get_model_hash_index
+from .model_probe import ModelProbe, ModelProbeInfo
 from .model_search import ModelSearch
 from .models import (
     BaseModelType,
@@ -260,6 +264,7 @@ from .models import (
     InvalidModelException,
     DuplicateModelException,
 )
+from .models.stable_diffusion import convert_checkpoint_model
 
 # We are only starting to number the config file with release 3.
 # The config file version doesn't have to start at release version, but it will help
@@ -346,6 +351,12 @@ class ModelManager(object):
             sequential_offload=sequential_offload,
             logger=logger,
         )
+        self.hash_index = get_model_hash_index()
+        self._autoimport_scanner: Optional[ModelSearch] = None
+        self._invalid_models: Dict[Path, int] = dict()
+        # models are located and converted from the prefetch thread too
+        self._model_locks: Dict[str, threading.Lock] = dict()
+        self._model_locks_lock = threading.Lock()
 
         self._read_models(config)
 
@@ -446,7 +457,6 @@ class ModelManager(object):
         :param submode_typel: an ModelType enum indicating the portion of
                the model to retrieve (e.g. ModelType.Vae)
         """
-        model_class = MODEL_CLASSES[base_model][model_type]
         model_key = self.create_key(model_name, base_model, model_type)
 
         # if model not found try to find it (maybe file just pasted)
@@ -455,6 +465,112 @@ class ModelManager(object):
             if model_key not in self.models:
                 raise ModelNotFoundException(f"Model not found - {model_key}")
 
+        model_path, model_class, model_type, submodel_type, model_hash, checkpoint_config = self._locate_model(
+            model_key, base_model, model_type, submodel_type
+        )
+
+        model_context = self.cache.get_model(
+            model_path=model_path,
+            model_class=model_class,
+            base_model=base_model,
+            model_type=model_type,
+            submodel=submodel_type,
+            checkpoint_config=checkpoint_config,
+        )
+
+        self._add_cache_key(model_key, model_context.key)
+
+        return ModelInfo(
+            context=model_context,
+            name=model_name,
+            base_model=base_model,
+            type=submodel_type or model_type,
+            hash=model_hash,
+            location=model_path,  # TODO:
+            precision=self.cache.precision,
+            _cache=self.cache,
+        )
+
+    def prefetch_model(
+        self,
+        model_name: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        submodel_type: Optional[SubModelType] = None,
+    ) -> bool:
+        """Loads a model into the RAM cache ahead of get_model(), if it fits
+        without evicting other models. Returns True if the model is cached.
+        Models that are not in models.yaml yet are not looked for.
+        """
+        model_key = self.create_key(model_name, base_model, model_type)
+        if model_key not in self.models:
+            return False
+
+        # converting a checkpoint is too much work to do on speculation
+        location = self._locate_model(model_key, base_model, model_type, submodel_type, convert=False)
+        if location is None:
+            return False
+
+        model_path, model_class, model_type, submodel_type, _, checkpoint_config = location
+        cache_key = self.cache.prefetch_model(
+            model_path=model_path,
+            model_class=model_class,
+            base_model=base_model,
+            model_type=model_type,
+            submodel=submodel_type,
+            checkpoint_config=checkpoint_config,
+        )
+        if cache_key is None:
+            return False
+
+        self._add_cache_key(model_key, cache_key)
+        return True
+
+    def get_model_hash(
+        self,
+        model_name: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        submodel_type: Optional[SubModelType] = None,
+    ) -> Optional[str]:
+        """Returns the content hash of the model's weights as installed, without loading or
+        converting it. None while the hash is still being computed in the background.
+        Raises ModelNotFoundException like get_model() does.
+        """
+        model_key = self.create_key(model_name, base_model, model_type)
+        if model_key not in self.models:
+            self.scan_models_directory(base_model=base_model, model_type=model_type)
+            if model_key not in self.models:
+                raise ModelNotFoundException(f"Model not found - {model_key}")
+
+        model_config = self.models[model_key]
+        model_path = self.app_config.root_path / model_config.path
+        if submodel_type is not None and getattr(model_config, submodel_type, None):
+            model_path = self.app_config.root_path / getattr(model_config, submodel_type)
+        if not model_path.exists():
+            raise ModelNotFoundException(f"Files for model {model_key} not found")
+        return self.hash_index.get_hash(model_path)
+
+    def _add_cache_key(self, model_key: str, cache_key: str):
+        with self._model_locks_lock:
+            if model_key not in self.cache_keys:
+                self.cache_keys[model_key] = set()
+            self.cache_keys[model_key].add(cache_key)
+
+    def _locate_model(
+        self,
+        model_key: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        submodel_type: Optional[SubModelType] = None,
+        convert: bool = True,
+    ) -> Optional[Tuple[str, type, ModelType, Optional[SubModelType], str, Optional[str]]]:
+        """Resolves a configured model to the path the cache loads it from, converting it first
+        if required. Returns the path, the model class, the model and submodel types to load
+        (a submodel with an override path is loaded as a model of its own), the hash and the
+        original config file of a checkpoint that is loaded without conversion.
+        Returns None instead of converting the model if `convert` is not set."""
+        model_class = MODEL_CLASSES[base_model][model_type]
         model_config = self.models[model_key]
         model_path = self.app_config.root_path / model_config.path
 
@@ -477,41 +593,34 @@ class ModelManager(object):
                 submodel_type = None
                 model_class = MODEL_CLASSES[base_model][model_type]
 
+        # hash the weights as installed, not the converted copy; the first request queues
+        # the hashing in the background, after that the index answers from its records
+        model_hash = self.hash_index.get_hash(model_path) or "<NO_HASH>"
+
         # TODO: path
         # TODO: is it accurate to use path as id
         dst_convert_path = self._get_model_cache_path(model_path)
 
-        model_path = model_class.convert_if_required(
-            base_model=base_model,
-            model_path=str(model_path),  # TODO: refactor str/Path types logic
-            output_path=dst_convert_path,
-            config=model_config,
-        )
-
-        model_context = self.cache.get_model(
-            model_path=model_path,
-            model_class=model_class,
-            base_model=base_model,
-            model_type=model_type,
-            submodel=submodel_type,
-        )
-
-        if model_key not in self.cache_keys:
-            self.cache_keys[model_key] = set()
-        self.cache_keys[model_key].add(model_context.key)
+        # a checkpoint must not be converted by two threads at once
+        with self._model_locks_lock:
+            model_lock = self._model_locks.setdefault(model_key, threading.Lock())
+        with model_lock:
+            if not convert and model_class.needs_conversion(
+                base_model=base_model,
+                model_path=str(model_path),
+                output_path=dst_convert_path,
+                config=model_config,
+            ):
+                return None
+            model_path = model_class.convert_if_required(
+                base_model=base_model,
+                model_path=str(model_path),  # TODO: refactor str/Path types logic
+                output_path=dst_convert_path,
+                config=model_config,
+            )
+        checkpoint_config = model_class.get_checkpoint_config(model_path, model_config)
 
-        model_hash = "<NO_HASH>"  # TODO:
-
-        return ModelInfo(
-            context=model_context,
-            name=model_name,
-            base_model=base_model,
-            type=submodel_type or model_type,
-            hash=model_hash,
-            location=model_path,  # TODO:
-            precision=self.cache.precision,
-            _cache=self.cache,
-        )
+        return model_path, model_class, model_type, submodel_type, model_hash, checkpoint_config
 
     def model_info(
         self,
@@ -771,18 +880,18 @@ class ModelManager(object):
         if info["model_format"] != "checkpoint":
             raise ValueError(f"not a checkpoint format model: {model_name}")
 
-        # We are taking advantage of a side effect of get_model() that converts check points
-        # into cached diffusers directories stored at `location`. It doesn't matter
-        # what submodeltype we request here, so we get the smallest.
-        submodel = {"submodel_type": SubModelType.Scheduler} if model_type == ModelType.Main else {}
-        model = self.get_model(
-            model_name,
-            base_model,
-            model_type,
-            **submodel,
-        )
         checkpoint_path = self.app_config.root_path / info["path"]
-        old_diffusers_path = self.app_config.models_path / model.location
+        if model_type == ModelType.Main:
+            # main models are loaded straight from their checkpoints where possible, so convert explicitly
+            model_key = self.create_key(model_name, base_model, model_type)
+            old_diffusers_path = convert_checkpoint_model(
+                base_model, self.models[model_key], self._get_model_cache_path(checkpoint_path)
+            )
+        else:
+            # We are taking advantage of a side effect of get_model() that converts check points
+            # into cached diffusers directories stored at `location`.
+            model = self.get_model(model_name, base_model, model_type)
+            old_diffusers_path = self.app_config.models_path / model.location
         new_diffusers_path = (
             dest_directory or self.app_config.models_path / base_model.value / model_type.value
         ) / model_name
@@ -911,6 +1020,9 @@ class ModelManager(object):
                         continue  # TODO: or create all folders?
 
                     for model_path in models_dir.iterdir():
+                        # don't probe files that weren't models the last time either
+                        if self._invalid_models.get(model_path) == model_path.stat().st_mtime_ns:
+                            continue
                         if model_path not in loaded_files:  # TODO: check
                             model_name = model_path.name if model_path.is_dir() else model_path.stem
                             model_key = self.create_key(model_name, cur_base_model, cur_model_type)
@@ -929,6 +1041,9 @@ class ModelManager(object):
                                 self.logger.warning(e)
                             except InvalidModelException:
                                 self.logger.warning(f"Not a valid model: {model_path}")
+                                self._invalid_models[self.app_config.root_path / model_path] = (
+                                    (self.app_config.root_path / model_path).stat().st_mtime_ns
+                                )
                             except NotImplementedError as e:
                                 self.logger.warning(e)
 
@@ -947,7 +1062,7 @@ class ModelManager(object):
 
         class ScanAndImport(ModelSearch):
             def __init__(self, directories, logger, ignore: Set[Path], installer: ModelInstall):
-                super().__init__(directories, logger)
+                super().__init__(directories, logger, incremental=True)
                 self.installer = installer
                 self.ignore = ignore
 
@@ -958,6 +1073,44 @@ class ModelManager(object):
                 if model not in self.ignore:
                     self.new_models_found.update(self.installer.heuristic_import(model))
 
+            def on_models_found(self, models: List[Path]):
+                for model in models:
+                    if model in self.ignore:
+                        self.mark_handled(model)
+                models = [x for x in models if x not in self.ignore]
+                if not models:
+                    return
+
+                # probing reads the files, so do it in parallel; the prediction type helper may
+                # ask the user, one question at a time
+                helper = self.installer.prediction_helper
+                helper_lock = threading.Lock()
+
+                def locked_helper(path: Path) -> SchedulerPredictionType:
+                    with helper_lock:
+                        return helper(path)
+
+                def probe(model: Path) -> Optional[ModelProbeInfo]:
+                    try:
+                        return ModelProbe.heuristic_probe(model, locked_helper if helper else None)
+                    except Exception as e:
+                        self.logger.warning(f"Not a valid model: {model}: {e}")
+                        return None
+
+                with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model_probe") as executor:
+                    infos = list(executor.map(probe, models))
+
+                # installing changes the model manager's state, do that one model at a time
+                for model, info in zip(models, infos):
+                    if info is None:
+                        continue
+                    try:
+                        self.new_models_found[str(model)] = self.installer._install_path(model, info)
+                        self._models_found += 1
+                        self.mark_handled(model)
+                    except Exception as e:
+                        self.logger.warning(str(e))
+
             def on_search_completed(self):
                 self.logger.info(
                     f"Scanned {self._items_scanned} files and directories, imported {len(self.new_models_found)} models"
@@ -991,7 +1144,13 @@ class ModelManager(object):
             ]
             if x
         }
-        scanner = ScanAndImport(directories, self.logger, ignore=known_paths, installer=installer)
+        # the scanner remembers what it has seen, so that syncing an unchanged tree is cheap
+        scanner = self._autoimport_scanner
+        if scanner is None or scanner.directories != directories:
+            scanner = ScanAndImport(directories, self.logger, ignore=known_paths, installer=installer)
+            self._autoimport_scanner = scanner
+        scanner.ignore = known_paths
+        scanner.installer = installer
         scanner.search()
 
         return scanner.models_found()
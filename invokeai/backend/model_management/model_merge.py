@@ -1,21 +1,37 @@
 """
 invokeai.backend.model_management.model_merge exports:
 merge_diffusion_models() -- combine multiple models by location and return a pipeline object
-merge_diffusion_models_and_commit() -- combine multiple models by ModelManager ID and write to models.yaml
+merge_diffusion_models_to_path() -- combine multiple models by location and write a diffusers folder
+merge_diffusion_models_and_save() -- combine multiple models by ModelManager ID and write to models.yaml
+
+Models are merged one tensor at a time, straight from their weights files, so
+that no more than about one tensor of each model is held in RAM. Merging
+doesn't need a network connection.
 
 Copyright (c) 2023 Lincoln Stein and the InvokeAI Development Team
 """
 
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
 import warnings
 from enum import Enum
 from pathlib import Path
 from diffusers import DiffusionPipeline
 from diffusers import logging as dlogging
-from typing import List, Union, Optional
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+import torch
+from safetensors import safe_open
 
 import invokeai.backend.util.logging as logger
 
 from ...backend.model_management import ModelManager, ModelType, BaseModelType, ModelVariantType, AddModelResult
+from .model_hash import WEIGHTS_SUFFIXES
+from .models.base import read_safetensors_header
 
 
 class MergeInterpolationMethod(str, Enum):
@@ -25,6 +41,127 @@ class MergeInterpolationMethod(str, Enum):
     AddDifference = "add_difference"
 
 
+SAFETENSORS_DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+TORCH_DTYPES = {name: dtype for dtype, name in SAFETENSORS_DTYPES.items()}
+
+# sharded weights are listed in an index, such as diffusion_pytorch_model.safetensors.index.json
+INDEX_PATTERN = re.compile(r"\.index(\.\w+)?\.json$")
+SHARD_PATTERN = re.compile(r"-\d{5}-of-\d{5}$")
+
+
+class _ComponentWeights(object):
+    """
+    The weights of one component of a diffusers folder, such as the unet, read one
+    tensor at a time. Safetensors files are memory-mapped; .bin files can't be, and
+    are loaded whole.
+    """
+
+    def __init__(self, files: List[Path]):
+        self.files = files
+        # name of the weights files without shard number, variant or suffix, such as "diffusion_pytorch_model"
+        self.stem = SHARD_PATTERN.sub("", files[0].name.split(".")[0])
+        self.layout: Dict[str, Tuple[torch.dtype, Tuple[int, ...]]] = dict()
+        self._sources: Dict[str, Any] = dict()
+
+        for file in files:
+            if file.suffix == ".safetensors":
+                source = safe_open(str(file), framework="pt", device="cpu")
+                for key, info in read_safetensors_header(file).items():
+                    self.layout[key] = (TORCH_DTYPES[info["dtype"]], tuple(info["shape"]))
+                    self._sources[key] = source
+            else:
+                state_dict = torch.load(file, map_location="cpu")
+                for key, tensor in state_dict.items():
+                    self.layout[key] = (tensor.dtype, tuple(tensor.shape))
+                    self._sources[key] = state_dict
+
+    @classmethod
+    def find(cls, folder: Path) -> Optional["_ComponentWeights"]:
+        """Returns the weights in the folder, or None if there are none. Safetensors files are preferred,
+        as are files without a variant such as fp16."""
+        if not folder.is_dir():
+            return None
+        for suffix in [".safetensors", ".bin"]:
+            for index in sorted(folder.glob(f"*{suffix}.index*.json")):
+                weight_map = json.loads(index.read_text())["weight_map"]
+                return cls(sorted({folder / name for name in weight_map.values()}))
+            files = sorted(folder.glob(f"*{suffix}"), key=lambda file: file.name.count("."))
+            if files:
+                return cls(files[:1])
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.layout
+
+    def get(self, key: str) -> torch.Tensor:
+        source = self._sources[key]
+        return source[key] if isinstance(source, dict) else source.get_tensor(key)
+
+
+class _SafetensorsWriter(object):
+    """
+    Writes a safetensors file one tensor at a time. The header goes first, so the dtypes and
+    shapes of all the tensors have to be known up front, and the tensors written in that order.
+    """
+
+    def __init__(self, path: Path, layout: List[Tuple[str, torch.dtype, Tuple[int, ...]]]):
+        header: Dict[str, Any] = {"__metadata__": {"format": "pt"}}
+        offset = 0
+        for key, dtype, shape in layout:
+            size = math.prod(shape) * torch.empty((), dtype=dtype).element_size()
+            header[key] = {
+                "dtype": SAFETENSORS_DTYPES[dtype],
+                "shape": list(shape),
+                "data_offsets": [offset, offset + size],
+            }
+            offset += size
+
+        data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        data += b" " * (-len(data) % 8)  # the tensor data is 8-byte aligned
+        self._layout = iter(layout)
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(len(data).to_bytes(8, "little"))
+        self._file.write(data)
+
+    def write(self, key: str, tensor: torch.Tensor):
+        expected_key, dtype, shape = next(self._layout)
+        assert (key, tensor.dtype, tuple(tensor.shape)) == (expected_key, dtype, shape), f"unexpected tensor {key}"
+        self._file.write(tensor.contiguous().reshape(-1).view(torch.uint8).numpy())
+
+    def close(self):
+        self._file.close()
+
+
+def merge_tensors(
+    thetas: List[torch.Tensor],
+    alpha: float,
+    interp: MergeInterpolationMethod,
+) -> torch.Tensor:
+    """
+    Merges the same tensor of two or three models, with the interpolations of the
+    diffusers checkpoint_merger pipeline. Computed in float32.
+    """
+    theta_0, theta_1 = thetas[0].float(), thetas[1].float()
+    if interp == MergeInterpolationMethod.AddDifference:
+        return theta_0 + (theta_1 - thetas[2].float()) * (1.0 - alpha)
+    if interp == MergeInterpolationMethod.Sigmoid:
+        alpha = alpha * alpha * (3 - (2 * alpha))
+    elif interp == MergeInterpolationMethod.InvSigmoid:
+        alpha = 0.5 - math.sin(math.asin(1.0 - 2.0 * alpha) / 3.0)
+    return theta_0 * (1 - alpha) + theta_1 * alpha
+
+
 class ModelMerger(object):
     def __init__(self, manager: ModelManager):
         self.manager = manager
@@ -38,35 +175,114 @@ class ModelMerger(object):
         **kwargs,
     ) -> DiffusionPipeline:
         """
-        :param model_paths:  up to three models, designated by their local paths or HuggingFace repo_ids
+        :param model_paths:  up to three models, designated by their local paths
         :param alpha: The interpolation parameter. Ranges from 0 to 1.  It affects the ratio in which the checkpoints are merged. A 0.8 alpha
                    would mean that the first model checkpoints would affect the final result far less than an alpha of 0.2
         :param interp: The interpolation method to use for the merging. Supports "sigmoid", "inv_sigmoid", "add_difference" and None.
                    Passing None uses the default interpolation which is weighted sum interpolation. For merging three checkpoints, only "add_difference" is supported.
         :param force:  Whether to ignore mismatch in model_config.json for the current models. Defaults to False.
 
-        **kwargs - the default DiffusionPipeline.get_config_dict kwargs:
-             cache_dir, resume_download, force_download, proxies, local_files_only, use_auth_token, revision, torch_dtype, device_map
+        **kwargs - the default DiffusionPipeline.from_pretrained kwargs used to load the merged pipeline, such as torch_dtype
         """
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            verbosity = dlogging.get_verbosity()
-            dlogging.set_verbosity_error()
-
-            pipe = DiffusionPipeline.from_pretrained(
-                model_paths[0],
-                custom_pipeline="checkpoint_merger",
-            )
-            merged_pipe = pipe.merge(
-                pretrained_model_name_or_path_list=model_paths,
-                alpha=alpha,
-                interp=interp.value if interp else None,  # diffusers API treats None as "weighted sum"
-                force=force,
-                **kwargs,
+        with tempfile.TemporaryDirectory() as tmpdir:
+            merged_path = self.merge_diffusion_models_to_path(
+                model_paths, Path(tmpdir) / "merged", alpha, interp, force
             )
-            dlogging.set_verbosity(verbosity)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                verbosity = dlogging.get_verbosity()
+                dlogging.set_verbosity_error()
+                merged_pipe = DiffusionPipeline.from_pretrained(merged_path, local_files_only=True, **kwargs)
+                dlogging.set_verbosity(verbosity)
         return merged_pipe
 
+    def merge_diffusion_models_to_path(
+        self,
+        model_paths: List[Path],
+        dump_path: Path,
+        alpha: float = 0.5,
+        interp: MergeInterpolationMethod = None,
+        force: bool = False,
+        fp16: bool = False,
+    ) -> Path:
+        """
+        Merges diffusers models into a new diffusers folder. The configs, tokenizers and
+        schedulers are those of the first model. The weights are merged and written one
+        tensor at a time, so the models don't have to fit in RAM.
+        :param model_paths: two or three diffusers folders
+        :param dump_path: the folder to write the merged model to
+        :param alpha: see merge_diffusion_models()
+        :param interp: see merge_diffusion_models()
+        :param force: merge models with mismatched model_index.json files
+        :param fp16: store the merged weights in half precision
+        """
+        model_paths = [Path(p) for p in model_paths]
+        interp = MergeInterpolationMethod(interp or MergeInterpolationMethod.WeightedSum)
+        if len(model_paths) not in [2, 3]:
+            raise ValueError("Two or three models can be merged")
+        if (len(model_paths) == 3) != (interp == MergeInterpolationMethod.AddDifference):
+            raise ValueError("The 'add_difference' merge method takes three models, the others two")
+        if not force:
+            self._check_compatible(model_paths)
+
+        dump_path = Path(dump_path)
+        shutil.copytree(
+            model_paths[0],
+            dump_path,
+            ignore=lambda _, names: [n for n in names if Path(n).suffix in WEIGHTS_SUFFIXES or INDEX_PATTERN.search(n)],
+            dirs_exist_ok=True,
+        )
+
+        for component in sorted(p.name for p in model_paths[0].iterdir() if p.is_dir()):
+            weights = [_ComponentWeights.find(path / component) for path in model_paths]
+            if weights[0] is None:
+                continue
+            if None in weights:
+                logger.warning(f"Not all the models have {component} weights, keeping those of the first model")
+                weights = weights[:1]
+            logger.info(f"Merging {component}")
+            merged_weights = dump_path / component / f"{weights[0].stem}.safetensors"
+            self._merge_component(weights, merged_weights, alpha, interp, fp16)
+
+        return dump_path
+
+    def _merge_component(
+        self,
+        weights: List[_ComponentWeights],
+        path: Path,
+        alpha: float,
+        interp: MergeInterpolationMethod,
+        fp16: bool,
+    ):
+        layout = list()
+        for key, (dtype, shape) in sorted(weights[0].layout.items()):
+            if fp16 and dtype.is_floating_point:
+                dtype = torch.float16
+            layout.append((key, dtype, shape))
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        writer = _SafetensorsWriter(tmp_path, layout)
+        try:
+            for key, dtype, shape in layout:
+                thetas = [weights[0].get(key)]
+                # tensors the other models don't have, or that have another shape, are kept as they are
+                if dtype.is_floating_point and all(key in w and w.layout[key][1] == shape for w in weights[1:]):
+                    thetas.extend(w.get(key) for w in weights[1:])
+                merged = merge_tensors(thetas, alpha, interp) if len(thetas) > 1 else thetas[0]
+                writer.write(key, merged.to(dtype))
+        finally:
+            writer.close()
+        os.replace(tmp_path, path)
+
+    def _check_compatible(self, model_paths: List[Path]):
+        configs = list()
+        for path in model_paths:
+            config = json.loads((path / "model_index.json").read_text())
+            configs.append({k: v for k, v in config.items() if not k.startswith("_")})
+        for path, config in zip(model_paths[1:], configs[1:]):
+            if config != configs[0]:
+                raise ValueError(f"{path} is not compatible with {model_paths[0]}; use force to merge them anyway")
+
     def merge_diffusion_models_and_save(
         self,
         model_names: List[str],
@@ -76,6 +292,7 @@ class ModelMerger(object):
         interp: MergeInterpolationMethod = None,
         force: bool = False,
         merge_dest_directory: Optional[Path] = None,
+        fp16: bool = False,
         **kwargs,
     ) -> AddModelResult:
         """
@@ -88,8 +305,8 @@ class ModelMerger(object):
                    Passing None uses the default interpolation which is weighted sum interpolation. For merging three checkpoints, only "add_difference" is supported. Add_difference is A+(B-C).
         :param force:  Whether to ignore mismatch in model_config.json for the current models. Defaults to False.
         :param merge_dest_directory: Save the merged model to the designated directory (with 'merged_model_name' appended)
-        **kwargs - the default DiffusionPipeline.get_config_dict kwargs:
-             cache_dir, resume_download, force_download, proxies, local_files_only, use_auth_token, revision, torch_dtype, device_map
+        :param fp16: Save the merged weights in half precision
+        **kwargs - ignored, so that command line arguments can be passed through
         """
         model_paths = list()
         config = self.manager.app_config
@@ -111,9 +328,8 @@ class ModelMerger(object):
                 vae = info.get("vae")
             model_paths.extend([config.root_path / info["path"]])
 
-        merge_method = None if interp == "weighted_sum" else MergeInterpolationMethod(interp)
+        merge_method = MergeInterpolationMethod(interp or MergeInterpolationMethod.WeightedSum)
         logger.debug(f"interp = {interp}, merge_method={merge_method}")
-        merged_pipe = self.merge_diffusion_models(model_paths, alpha, merge_method, force, **kwargs)
         dump_path = (
             Path(merge_dest_directory)
             if merge_dest_directory
@@ -122,7 +338,7 @@ class ModelMerger(object):
         dump_path.mkdir(parents=True, exist_ok=True)
         dump_path = dump_path / merged_model_name
 
-        merged_pipe.save_pretrained(dump_path, safe_serialization=1)
+        self.merge_diffusion_models_to_path(model_paths, dump_path, alpha, merge_method, force, fp16=fp16)
         attributes = dict(
             path=str(dump_path),
             description=f"Merge of models {', '.join(model_names)}",
@@ -1,13 +1,10 @@
 import json
-import torch
-import safetensors.torch
 
 from dataclasses import dataclass
 
 from diffusers import ModelMixin, ConfigMixin
 from pathlib import Path
 from typing import Callable, Literal, Union, Dict, Optional
-from picklescan.scanner import scan_file_path
 
 from .models import (
     BaseModelType,
@@ -17,7 +14,8 @@ from .models import (
     SilenceWarnings,
     InvalidModelException,
 )
-from .models.base import read_checkpoint_meta
+from .models.base import CheckpointSummary, read_checkpoint_summary
+from .lora import LoRAModel, TextualInversionModel
 
 
 @dataclass
@@ -128,33 +126,31 @@ class ModelProbe(object):
         return model_info
 
     @classmethod
-    def get_model_type_from_checkpoint(cls, model_path: Path, checkpoint: dict) -> ModelType:
-        if model_path.suffix not in (".bin", ".pt", ".ckpt", ".safetensors", ".pth"):
+    def get_model_type_from_checkpoint(
+        cls, model_path: Path, checkpoint: Optional[Union[dict, CheckpointSummary]]
+    ) -> ModelType:
+        if model_path and model_path.suffix not in (".bin", ".pt", ".ckpt", ".safetensors", ".pth"):
             return None
 
-        if model_path.name == "learned_embeds.bin":
+        if model_path and model_path.name == "learned_embeds.bin":
             return ModelType.TextualInversion
 
-        ckpt = checkpoint if checkpoint else read_checkpoint_meta(model_path, scan=True)
-        ckpt = ckpt.get("state_dict", ckpt)
-
-        for key in ckpt.keys():
+        summary = cls._get_checkpoint_summary(model_path, checkpoint)
+        for key in summary.shapes.keys():
             if any(key.startswith(v) for v in {"cond_stage_model.", "first_stage_model.", "model.diffusion_model."}):
                 return ModelType.Main
             elif any(key.startswith(v) for v in {"encoder.conv_in", "decoder.conv_in"}):
                 return ModelType.Vae
-            elif any(key.startswith(v) for v in {"lora_te_", "lora_unet_"}):
-                return ModelType.Lora
-            elif any(key.endswith(v) for v in {"to_k_lora.up.weight", "to_q_lora.down.weight"}):
+            elif LoRAModel.is_lora_key(key):
                 return ModelType.Lora
             elif any(key.startswith(v) for v in {"control_model", "input_blocks"}):
                 return ModelType.ControlNet
-            elif key in {"emb_params", "string_to_param"}:
+            elif key.split(".", 1)[0] in TextualInversionModel.EMBEDDING_KEYS:
                 return ModelType.TextualInversion
 
         else:
             # diffusers-ti
-            if len(ckpt) < 10 and all(isinstance(v, torch.Tensor) for v in ckpt.values()):
+            if 0 < len(summary.shapes) < 10:
                 return ModelType.TextualInversion
 
         raise InvalidModelException(f"Unable to determine model type for {model_path}")
@@ -190,24 +186,16 @@ class ModelProbe(object):
         raise InvalidModelException(f"Unable to determine model type for {folder_path}")
 
     @classmethod
-    def _scan_and_load_checkpoint(cls, model_path: Path) -> dict:
+    def _get_checkpoint_summary(
+        cls, model_path: Path, checkpoint: Optional[Union[dict, CheckpointSummary]] = None
+    ) -> CheckpointSummary:
+        """Summarizes the checkpoint if it was passed in already loaded, and reads the summary otherwise"""
+        if isinstance(checkpoint, CheckpointSummary):
+            return checkpoint
+        if checkpoint:
+            return CheckpointSummary.from_state_dict(checkpoint)
         with SilenceWarnings():
-            if model_path.suffix.endswith((".ckpt", ".pt", ".bin")):
-                cls._scan_model(model_path, model_path)
-                return torch.load(model_path)
-            else:
-                return safetensors.torch.load_file(model_path)
-
-    @classmethod
-    def _scan_model(cls, model_name, checkpoint):
-        """
-        Apply picklescanner to the indicated checkpoint and issue a warning
-        and option to exit if an infected file is identified.
-        """
-        # scan model
-        scan_result = scan_file_path(checkpoint)
-        if scan_result.infected_files != 0:
-            raise "The model {model_name} is potentially infected by malware. Aborting import."
+            return read_checkpoint_summary(model_path, scan=True)
 
 
 ###################################################3
@@ -229,9 +217,12 @@ class ProbeBase(object):
 
 class CheckpointProbeBase(ProbeBase):
     def __init__(
-        self, checkpoint_path: Path, checkpoint: dict, helper: Callable[[Path], SchedulerPredictionType] = None
+        self,
+        checkpoint_path: Path,
+        checkpoint: Optional[Union[dict, CheckpointSummary]],
+        helper: Callable[[Path], SchedulerPredictionType] = None,
     ) -> BaseModelType:
-        self.checkpoint = checkpoint or ModelProbe._scan_and_load_checkpoint(checkpoint_path)
+        self.summary = ModelProbe._get_checkpoint_summary(checkpoint_path, checkpoint)
         self.checkpoint_path = checkpoint_path
         self.helper = helper
 
@@ -242,11 +233,10 @@ class CheckpointProbeBase(ProbeBase):
         return "checkpoint"
 
     def get_variant_type(self) -> ModelVariantType:
-        model_type = ModelProbe.get_model_type_from_checkpoint(self.checkpoint_path, self.checkpoint)
+        model_type = ModelProbe.get_model_type_from_checkpoint(self.checkpoint_path, self.summary)
         if model_type != ModelType.Main:
             return ModelVariantType.Normal
-        state_dict = self.checkpoint.get("state_dict") or self.checkpoint
-        in_channels = state_dict["model.diffusion_model.input_blocks.0.0.weight"].shape[1]
+        in_channels = self.summary.shapes["model.diffusion_model.input_blocks.0.0.weight"][1]
         if in_channels == 9:
             return ModelVariantType.Inpaint
         elif in_channels == 5:
@@ -261,17 +251,16 @@ class CheckpointProbeBase(ProbeBase):
 
 class PipelineCheckpointProbe(CheckpointProbeBase):
     def get_base_type(self) -> BaseModelType:
-        checkpoint = self.checkpoint
-        state_dict = self.checkpoint.get("state_dict") or checkpoint
+        shapes = self.summary.shapes
         key_name = "model.diffusion_model.input_blocks.2.1.transformer_blocks.0.attn2.to_k.weight"
-        if key_name in state_dict and state_dict[key_name].shape[-1] == 768:
+        if key_name in shapes and shapes[key_name][-1] == 768:
             return BaseModelType.StableDiffusion1
-        if key_name in state_dict and state_dict[key_name].shape[-1] == 1024:
+        if key_name in shapes and shapes[key_name][-1] == 1024:
             return BaseModelType.StableDiffusion2
         key_name = "model.diffusion_model.input_blocks.4.1.transformer_blocks.0.attn2.to_k.weight"
-        if key_name in state_dict and state_dict[key_name].shape[-1] == 2048:
+        if key_name in shapes and shapes[key_name][-1] == 2048:
             return BaseModelType.StableDiffusionXL
-        elif key_name in state_dict and state_dict[key_name].shape[-1] == 1280:
+        elif key_name in shapes and shapes[key_name][-1] == 1280:
             return BaseModelType.StableDiffusionXLRefiner
         else:
             raise InvalidModelException("Cannot determine base type")
@@ -280,15 +269,13 @@ class PipelineCheckpointProbe(CheckpointProbeBase):
         type = self.get_base_type()
         if type == BaseModelType.StableDiffusion1:
             return SchedulerPredictionType.Epsilon
-        checkpoint = self.checkpoint
-        state_dict = self.checkpoint.get("state_dict") or checkpoint
+        shapes = self.summary.shapes
         key_name = "model.diffusion_model.input_blocks.2.1.transformer_blocks.0.attn2.to_k.weight"
-        if key_name in state_dict and state_dict[key_name].shape[-1] == 1024:
-            if "global_step" in checkpoint:
-                if checkpoint["global_step"] == 220000:
-                    return SchedulerPredictionType.Epsilon
-                elif checkpoint["global_step"] == 110000:
-                    return SchedulerPredictionType.VPrediction
+        if key_name in shapes and shapes[key_name][-1] == 1024:
+            if self.summary.global_step == 220000:
+                return SchedulerPredictionType.Epsilon
+            elif self.summary.global_step == 110000:
+                return SchedulerPredictionType.VPrediction
             if (
                 self.checkpoint_path and self.helper and not self.checkpoint_path.with_suffix(".yaml").exists()
             ):  # if a .yaml config file exists, then this step not needed
@@ -308,16 +295,7 @@ class LoRACheckpointProbe(CheckpointProbeBase):
         return "lycoris"
 
     def get_base_type(self) -> BaseModelType:
-        checkpoint = self.checkpoint
-        key1 = "lora_te_text_model_encoder_layers_0_mlp_fc1.lora_down.weight"
-        key2 = "lora_te_text_model_encoder_layers_0_self_attn_k_proj.hada_w1_a"
-        lora_token_vector_length = (
-            checkpoint[key1].shape[1]
-            if key1 in checkpoint
-            else checkpoint[key2].shape[0]
-            if key2 in checkpoint
-            else 768
-        )
+        lora_token_vector_length = LoRAModel.get_token_vector_length(self.summary.shapes) or 768
         if lora_token_vector_length == 768:
             return BaseModelType.StableDiffusion1
         elif lora_token_vector_length == 1024:
@@ -331,13 +309,7 @@ class TextualInversionCheckpointProbe(CheckpointProbeBase):
         return None
 
     def get_base_type(self) -> BaseModelType:
-        checkpoint = self.checkpoint
-        if "string_to_token" in checkpoint:
-            token_dim = list(checkpoint["string_to_param"].values())[0].shape[-1]
-        elif "emb_params" in checkpoint:
-            token_dim = checkpoint["emb_params"].shape[-1]
-        else:
-            token_dim = list(checkpoint.values())[0].shape[0]
+        token_dim = TextualInversionModel.get_token_dim(self.summary.shapes)
         if token_dim == 768:
             return BaseModelType.StableDiffusion1
         elif token_dim == 1024:
@@ -348,16 +320,16 @@ class TextualInversionCheckpointProbe(CheckpointProbeBase):
 
 class ControlNetCheckpointProbe(CheckpointProbeBase):
     def get_base_type(self) -> BaseModelType:
-        checkpoint = self.checkpoint
+        shapes = self.summary.shapes
         for key_name in (
             "control_model.input_blocks.2.1.transformer_blocks.0.attn2.to_k.weight",
             "input_blocks.2.1.transformer_blocks.0.attn2.to_k.weight",
         ):
-            if key_name not in checkpoint:
+            if key_name not in shapes:
                 continue
-            if checkpoint[key_name].shape[-1] == 768:
+            if shapes[key_name][-1] == 768:
                 return BaseModelType.StableDiffusion1
-            elif checkpoint[key_name].shape[-1] == 1024:
+            elif shapes[key_name][-1] == 1024:
                 return BaseModelType.StableDiffusion2
             elif self.checkpoint_path and self.helper:
                 return self.helper(self.checkpoint_path)
@@ -456,8 +428,7 @@ class TextualInversionFolderProbe(FolderProbeBase):
         path = self.folder_path / "learned_embeds.bin"
         if not path.exists():
             return None
-        checkpoint = ModelProbe._scan_and_load_checkpoint(path)
-        return TextualInversionCheckpointProbe(None, checkpoint=checkpoint).get_base_type()
+        return TextualInversionCheckpointProbe(path, checkpoint=None).get_base_type()
 
 
 class ControlNetFolderProbe(FolderProbeBase):
@@ -5,26 +5,52 @@ Abstract base class for recursive directory search for models.
 
 import os
 from abc import ABC, abstractmethod
-from typing import List, Set, types
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple, types
 from pathlib import Path
 
 import invokeai.backend.util.logging as logger
 
+# files that mark a folder as a model in diffusers or similar layout
+MODEL_FOLDER_MARKERS = {"config.json", "model_index.json", "learned_embeds.bin", "pytorch_lora_weights.bin"}
+MODEL_FILE_SUFFIXES = {".ckpt", ".bin", ".pth", ".safetensors", ".pt"}
+
+
+@dataclass
+class _DirectoryEntry:
+    mtime: int
+    is_model: bool
+    models: List[Path] = field(default_factory=list)
+    subdirectories: List[Path] = field(default_factory=list)
+    items: int = 0
+
 
 class ModelSearch(ABC):
-    def __init__(self, directories: List[Path], logger: types.ModuleType = logger):
+    def __init__(
+        self,
+        directories: List[Path],
+        logger: types.ModuleType = logger,
+        max_workers: int = 8,
+        incremental: bool = False,
+    ):
         """
         Initialize a recursive model directory search.
         :param directories: List of directory Paths to recurse through
         :param logger: Logger to use
+        :param max_workers: Number of threads listing directories in parallel
+        :param incremental: Only report models that an earlier search() of this object did not handle
         """
         self.directories = directories
         self.logger = logger
+        self.max_workers = max_workers
+        self.incremental = incremental
         self._items_scanned = 0
         self._models_found = 0
-        self._scanned_dirs = set()
-        self._scanned_paths = set()
-        self._pruned_paths = set()
+        # the listing of each directory, reused for as long as its mtime stays the same
+        self._directories: Dict[Path, _DirectoryEntry] = dict()
+        # the models that were handled without errors, an incremental search leaves them out
+        self._known_models: Set[Path] = set()
 
     @abstractmethod
     def on_search_started(self):
@@ -49,48 +75,88 @@ class ModelSearch(ABC):
         """
         pass
 
+    def on_models_found(self, models: List[Path]):
+        """
+        Process all the models found by a search. Calls on_model_found() for
+        each of them; override to process them together.
+        :param models: Models to process, in a stable order
+        """
+        for model in models:
+            try:
+                self.on_model_found(model)
+                self._models_found += 1
+                self.mark_handled(model)
+            except Exception as e:
+                self.logger.warning(str(e))
+
+    def mark_handled(self, model: Path):
+        """Records that a model was handled, an incremental search doesn't report it again. Models that
+        failed, such as a file caught while it was still being copied, are reported again next time."""
+        self._known_models.add(model)
+
     def search(self):
         self.on_search_started()
-        for dir in self.directories:
-            self.walk_directory(dir)
+        self._items_scanned = 0
+        self._models_found = 0
+        models = self.walk_directories(self.directories)
+        # a model that went away is reported again if it comes back
+        self._known_models &= models
+        new_models = models - self._known_models if self.incremental else models
+        self.on_models_found(sorted(new_models))
         self.on_search_completed()
 
-    def walk_directory(self, path: Path):
-        for root, dirs, files in os.walk(path):
-            if str(Path(root).name).startswith("."):
-                self._pruned_paths.add(root)
-            if any([Path(root).is_relative_to(x) for x in self._pruned_paths]):
-                continue
-
-            self._items_scanned += len(dirs) + len(files)
-            for d in dirs:
-                path = Path(root) / d
-                if path in self._scanned_paths or path.parent in self._scanned_dirs:
-                    self._scanned_dirs.add(path)
-                    continue
-                if any(
-                    [
-                        (path / x).exists()
-                        for x in {"config.json", "model_index.json", "learned_embeds.bin", "pytorch_lora_weights.bin"}
-                    ]
-                ):
-                    try:
-                        self.on_model_found(path)
-                        self._models_found += 1
-                        self._scanned_dirs.add(path)
-                    except Exception as e:
-                        self.logger.warning(str(e))
-
-            for f in files:
-                path = Path(root) / f
-                if path.parent in self._scanned_dirs:
-                    continue
-                if path.suffix in {".ckpt", ".bin", ".pth", ".safetensors", ".pt"}:
-                    try:
-                        self.on_model_found(path)
-                        self._models_found += 1
-                    except Exception as e:
-                        self.logger.warning(str(e))
+    def walk_directories(self, directories: List[Path]) -> Set[Path]:
+        """
+        Returns the model files and folders under the directories. Directories are
+        listed in parallel, and only the ones that changed since the last walk are
+        listed again; the others cost a single stat().
+        """
+        models = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model_search") as executor:
+            pending = {executor.submit(self._scan_directory, Path(dir)) for dir in directories}
+            roots = {Path(dir) for dir in directories}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, entry = future.result()
+                    if entry is None:
+                        continue
+                    self._items_scanned += entry.items
+                    if entry.is_model and path not in roots:
+                        models.add(path)
+                        continue
+                    models.update(entry.models)
+                    pending.update(executor.submit(self._scan_directory, dir) for dir in entry.subdirectories)
+        return models
+
+    def _scan_directory(self, path: Path) -> Tuple[Path, Optional[_DirectoryEntry]]:
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            self._directories.pop(path, None)
+            return path, None
+
+        entry = self._directories.get(path)
+        if entry is not None and entry.mtime == mtime:
+            return path, entry
+
+        entry = _DirectoryEntry(mtime=mtime, is_model=False)
+        try:
+            with os.scandir(path) as children:
+                for child in children:
+                    entry.items += 1
+                    entry.is_model = entry.is_model or child.name in MODEL_FOLDER_MARKERS
+                    if child.is_dir():
+                        if not child.name.startswith("."):
+                            entry.subdirectories.append(Path(child.path))
+                    elif Path(child.name).suffix in MODEL_FILE_SUFFIXES:
+                        entry.models.append(Path(child.path))
+        except OSError as e:
+            self.logger.warning(f"Could not scan {path}: {e}")
+            return path, None
+
+        self._directories[path] = entry
+        return path, entry
 
 
 class FindModels(ModelSearch):
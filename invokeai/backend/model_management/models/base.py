@@ -3,6 +3,7 @@ import os
 import sys
 import typing
 import inspect
+from dataclasses import dataclass
 from enum import Enum
 from abc import ABCMeta, abstractmethod
 from pathlib import Path
@@ -13,7 +14,9 @@ from diffusers import DiffusionPipeline, ConfigMixin
 
 from contextlib import suppress
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Type, Literal, TypeVar, Generic, Callable, Any, Union
+from typing import List, Dict, Optional, Type, Literal, TypeVar, Generic, Callable, Any, Tuple, Union
+from invokeai.app.services.config import InvokeAIAppConfig
+from ..model_hash import get_model_hash_index
 
 
 class DuplicateModelException(Exception):
@@ -200,6 +203,24 @@ class ModelBase(metaclass=ABCMeta):
     def detect_format(cls, path: str) -> str:
         raise NotImplementedError()
 
+    @classmethod
+    def needs_conversion(
+        cls,
+        model_path: str,
+        output_path: str,
+        config: ModelConfigBase,
+        base_model: BaseModelType,
+    ) -> bool:
+        """Whether convert_if_required() would have to convert the model first, rather than
+        return where it can be loaded from as it is."""
+        return False
+
+    @classmethod
+    def get_checkpoint_config(cls, model_path: str, config: ModelConfigBase) -> Optional[str]:
+        """The original config file to build the model with, if model_path, as returned by
+        convert_if_required(), is a checkpoint that is loaded without conversion."""
+        return None
+
     @classproperty
     @abstractmethod
     def save_to_config(cls) -> bool:
@@ -218,15 +239,63 @@ class ModelBase(metaclass=ABCMeta):
         raise NotImplementedError()
 
 
+# Where the weights of each submodel are kept in an original (CompVis) checkpoint. The submodels
+# without a prefix, such as the tokenizer, don't come from the weights.
+CHECKPOINT_SUBMODEL_PREFIXES: Dict[BaseModelType, Dict[SubModelType, Optional[str]]] = {
+    BaseModelType.StableDiffusion1: {
+        SubModelType.UNet: "model.diffusion_model.",
+        SubModelType.Vae: "first_stage_model.",
+        SubModelType.TextEncoder: "cond_stage_model.",
+        SubModelType.Tokenizer: None,
+        SubModelType.Scheduler: None,
+    },
+    BaseModelType.StableDiffusion2: {
+        SubModelType.UNet: "model.diffusion_model.",
+        SubModelType.Vae: "first_stage_model.",
+        SubModelType.TextEncoder: "cond_stage_model.",
+        SubModelType.Tokenizer: None,
+        SubModelType.Scheduler: None,
+    },
+    BaseModelType.StableDiffusionXL: {
+        SubModelType.UNet: "model.diffusion_model.",
+        SubModelType.Vae: "first_stage_model.",
+        SubModelType.TextEncoder: "conditioner.embedders.0.",
+        SubModelType.TextEncoder2: "conditioner.embedders.1.",
+        SubModelType.Tokenizer: None,
+        SubModelType.Tokenizer2: None,
+        SubModelType.Scheduler: None,
+    },
+    BaseModelType.StableDiffusionXLRefiner: {
+        SubModelType.UNet: "model.diffusion_model.",
+        SubModelType.Vae: "first_stage_model.",
+        SubModelType.TextEncoder2: "conditioner.embedders.0.",
+        SubModelType.Tokenizer2: None,
+        SubModelType.Scheduler: None,
+    },
+}
+
+
 class DiffusersModel(ModelBase):
     # child_types: Dict[str, Type]
     # child_sizes: Dict[str, int]
 
-    def __init__(self, model_path: str, base_model: BaseModelType, model_type: ModelType):
+    def __init__(
+        self,
+        model_path: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        checkpoint_config: Optional[str] = None,
+    ):
         super().__init__(model_path, base_model, model_type)
 
         self.child_types: Dict[str, Type] = dict()
         self.child_sizes: Dict[str, int] = dict()
+        self.checkpoint_config = checkpoint_config
+
+        if checkpoint_config is not None:
+            # an original checkpoint, the submodels are built straight from its weights
+            self._init_from_checkpoint()
+            return
 
         try:
             config_data = DiffusionPipeline.load_config(self.model_path)
@@ -244,6 +313,22 @@ class DiffusersModel(ModelBase):
             self.child_types[child_name] = child_type
             self.child_sizes[child_name] = calc_model_size_by_fs(self.model_path, subfolder=child_name)
 
+    def _init_from_checkpoint(self):
+        # sized from the header, in the dtype of the checkpoint; corrected once loaded
+        header = read_safetensors_header(self.model_path)
+        for child_type, prefix in CHECKPOINT_SUBMODEL_PREFIXES[self.base_model].items():
+            self.child_sizes[child_type] = sum(
+                info["data_offsets"][1] - info["data_offsets"][0]
+                for key, info in header.items()
+                if prefix is not None and key.startswith(prefix)
+            )
+
+    @classmethod
+    def get_checkpoint_config(cls, model_path: str, config: ModelConfigBase) -> Optional[str]:
+        if not os.path.isfile(model_path) or not getattr(config, "config", None):
+            return None
+        return str(InvokeAIAppConfig.get_config().root_path / config.config)
+
     def get_size(self, child_type: Optional[SubModelType] = None):
         if child_type is None:
             return sum(self.child_sizes.values())
@@ -258,6 +343,8 @@ class DiffusersModel(ModelBase):
         # return pipeline in different function to pass more arguments
         if child_type is None:
             raise Exception("Child model type can't be null on diffusers model")
+        if self.checkpoint_config is not None:
+            return self._get_checkpoint_submodel(torch_dtype, child_type)
         if child_type not in self.child_types:
             return None  # TODO: or raise
 
@@ -289,6 +376,28 @@ class DiffusersModel(ModelBase):
         self.child_sizes[child_type] = calc_model_size_by_data(model)
         return model
 
+    def _get_checkpoint_submodel(self, torch_dtype: Optional[torch.dtype], child_type: SubModelType):
+        if child_type not in self.child_sizes:
+            return None
+
+        # to avoid circular import errors
+        from ..convert_ckpt_to_diffusers import load_submodel_from_original_ckpt
+
+        with SilenceWarnings():
+            model = load_submodel_from_original_ckpt(
+                self.model_path,
+                child_type,
+                model_version=self.base_model,
+                original_config_file=self.checkpoint_config,
+                precision=torch_dtype or torch.float32,
+                scan_needed=False,  # safetensors only
+            )
+        if model is None:
+            raise Exception(f"Failed to load {self.base_model}:{self.model_type}:{child_type} model")
+
+        self.child_sizes[child_type] = calc_model_size_by_data(model)
+        return model
+
     # def convert_if_required(model_path: str, cache_path: str, config: Optional[dict]) -> str:
 
 
@@ -382,34 +491,39 @@ def _calc_model_by_data(model) -> int:
     return mem
 
 
-def _fast_safetensors_reader(path: str):
-    checkpoint = dict()
-    device = torch.device("meta")
+def read_safetensors_header(path: Union[str, Path]) -> Dict[str, dict]:
+    """Returns the dtype, shape and data offsets of each tensor in a safetensors file, reading only its header."""
     with open(path, "rb") as f:
         definition_len = int.from_bytes(f.read(8), "little")
         definition_json = f.read(definition_len)
         definition = json.loads(definition_json)
 
-        if "__metadata__" in definition and definition["__metadata__"].get("format", "pt") not in {
-            "pt",
-            "torch",
-            "pytorch",
-        }:
-            raise Exception("Supported only pytorch safetensors files")
-        definition.pop("__metadata__", None)
-
-        for key, info in definition.items():
-            dtype = {
-                "I8": torch.int8,
-                "I16": torch.int16,
-                "I32": torch.int32,
-                "I64": torch.int64,
-                "F16": torch.float16,
-                "F32": torch.float32,
-                "F64": torch.float64,
-            }[info["dtype"]]
-
-            checkpoint[key] = torch.empty(info["shape"], dtype=dtype, device=device)
+    if "__metadata__" in definition and definition["__metadata__"].get("format", "pt") not in {
+        "pt",
+        "torch",
+        "pytorch",
+    }:
+        raise Exception("Supported only pytorch safetensors files")
+    definition.pop("__metadata__", None)
+    return definition
+
+
+def _fast_safetensors_reader(path: str):
+    checkpoint = dict()
+    device = torch.device("meta")
+    for key, info in read_safetensors_header(path).items():
+        dtype = {
+            "I8": torch.int8,
+            "I16": torch.int16,
+            "I32": torch.int32,
+            "I64": torch.int64,
+            "F16": torch.float16,
+            "BF16": torch.bfloat16,
+            "F32": torch.float32,
+            "F64": torch.float64,
+        }[info["dtype"]]
+
+        checkpoint[key] = torch.empty(info["shape"], dtype=dtype, device=device)
 
     return checkpoint
 
@@ -423,13 +537,79 @@ def read_checkpoint_meta(path: Union[str, Path], scan: bool = False):
             checkpoint = safetensors.torch.load_file(path, device="cpu")
     else:
         if scan:
-            scan_result = scan_file_path(path)
-            if scan_result.infected_files != 0:
-                raise Exception(f'The model file "{path}" is potentially infected by malware. Aborting import.')
+            # contents that passed before are not scanned again
+            hash_index = get_model_hash_index()
+            if not hash_index.is_scanned(path):
+                scan_result = scan_file_path(path)
+                if scan_result.infected_files != 0:
+                    raise Exception(f'The model file "{path}" is potentially infected by malware. Aborting import.')
+                hash_index.set_scanned(path)
         checkpoint = torch.load(path, map_location=torch.device("meta"))
     return checkpoint
 
 
+@dataclass
+class CheckpointSummary:
+    """
+    The names and shapes of the tensors in a checkpoint, which is all that
+    probing needs. Nested dicts, like the `string_to_param` of embeddings,
+    are flattened into dotted keys.
+    """
+
+    shapes: Dict[str, Tuple[int, ...]]
+    global_step: Optional[int] = None
+
+    @classmethod
+    def from_state_dict(cls, checkpoint: dict) -> "CheckpointSummary":
+        shapes = dict()
+
+        def _add(prefix: str, values: dict):
+            for key, value in values.items():
+                if isinstance(value, torch.Tensor):
+                    shapes[f"{prefix}{key}"] = tuple(value.shape)
+                elif isinstance(value, dict):
+                    _add(f"{prefix}{key}.", value)
+
+        _add("", checkpoint.get("state_dict") or checkpoint)
+        global_step = checkpoint.get("global_step")
+        return cls(shapes=shapes, global_step=global_step if isinstance(global_step, int) else None)
+
+    @classmethod
+    def from_json(cls, summary: str) -> "CheckpointSummary":
+        summary = json.loads(summary)
+        return cls(
+            shapes={key: tuple(shape) for key, shape in summary["shapes"].items()},
+            global_step=summary.get("global_step"),
+        )
+
+    def json(self) -> str:
+        return json.dumps(dict(shapes=self.shapes, global_step=self.global_step))
+
+
+def read_checkpoint_summary(path: Union[str, Path], scan: bool = False) -> CheckpointSummary:
+    """
+    Reads the tensor names and shapes of a checkpoint without loading it.
+    Only the header of a safetensors file is read. Pickled checkpoints have
+    to be loaded (onto the meta device); what they contained is recorded in
+    the model hash index, so an unchanged file is not loaded again.
+    """
+    path = Path(path)
+    if path.suffix == ".safetensors":
+        try:
+            header = read_safetensors_header(path)
+            return CheckpointSummary(shapes={key: tuple(info["shape"]) for key, info in header.items()})
+        except Exception:
+            return CheckpointSummary.from_state_dict(safetensors.torch.load_file(path, device="cpu"))
+
+    hash_index = get_model_hash_index()
+    if (summary := hash_index.get_summary(path)) is not None:
+        return CheckpointSummary.from_json(summary)
+
+    summary = CheckpointSummary.from_state_dict(read_checkpoint_meta(path, scan=scan))
+    hash_index.set_summary(path, summary.json())
+    return summary
+
+
 import warnings
 from diffusers import logging as diffusers_logging
 from transformers import logging as transformers_logging
@@ -123,6 +123,16 @@ class ControlNetModel(ModelBase):
         else:
             return model_path
 
+    @classmethod
+    def needs_conversion(
+        cls,
+        model_path: str,
+        output_path: str,
+        config: ModelConfigBase,
+        base_model: BaseModelType,
+    ) -> bool:
+        return cls.detect_format(model_path) == ControlNetModelFormat.Checkpoint and not os.path.exists(output_path)
+
 
 @classmethod
 def _convert_controlnet_ckpt_and_cache(
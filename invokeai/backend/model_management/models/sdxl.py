@@ -10,7 +10,7 @@ from .base import (
     ModelType,
     ModelVariantType,
     DiffusersModel,
-    read_checkpoint_meta,
+    read_checkpoint_summary,
     classproperty,
 )
 from omegaconf import OmegaConf
@@ -34,13 +34,20 @@ class StableDiffusionXLModel(DiffusersModel):
         config: str
         variant: ModelVariantType
 
-    def __init__(self, model_path: str, base_model: BaseModelType, model_type: ModelType):
+    def __init__(
+        self,
+        model_path: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        checkpoint_config: Optional[str] = None,
+    ):
         assert base_model in {BaseModelType.StableDiffusionXL, BaseModelType.StableDiffusionXLRefiner}
         assert model_type == ModelType.Main
         super().__init__(
             model_path=model_path,
             base_model=BaseModelType.StableDiffusionXL,
             model_type=ModelType.Main,
+            checkpoint_config=checkpoint_config,
         )
 
     @classmethod
@@ -53,9 +60,8 @@ class StableDiffusionXLModel(DiffusersModel):
                 in_channels = ckpt_config["model"]["params"]["unet_config"]["params"]["in_channels"]
 
             else:
-                checkpoint = read_checkpoint_meta(path)
-                checkpoint = checkpoint.get("state_dict", checkpoint)
-                in_channels = checkpoint["model.diffusion_model.input_blocks.0.0.weight"].shape[1]
+                summary = read_checkpoint_summary(path)
+                in_channels = summary.shapes["model.diffusion_model.input_blocks.0.0.weight"][1]
 
         elif model_format == StableDiffusionXLModelFormat.Diffusers:
             unet_config_path = os.path.join(path, "unet", "config.json")
@@ -113,9 +119,9 @@ class StableDiffusionXLModel(DiffusersModel):
         # strings for the base model type. To avoid making too many
         # source code changes, we simply translate here
         if isinstance(config, cls.CheckpointConfig):
-            from invokeai.backend.model_management.models.stable_diffusion import _convert_ckpt_and_cache
+            from invokeai.backend.model_management.models.stable_diffusion import _get_checkpoint_location
 
-            return _convert_ckpt_and_cache(
+            return _get_checkpoint_location(
                 version=base_model,
                 model_config=config,
                 output_path=output_path,
@@ -123,3 +129,17 @@ class StableDiffusionXLModel(DiffusersModel):
             )
         else:
             return model_path
+
+    @classmethod
+    def needs_conversion(
+        cls,
+        model_path: str,
+        output_path: str,
+        config: ModelConfigBase,
+        base_model: BaseModelType,
+    ) -> bool:
+        if not isinstance(config, cls.CheckpointConfig):
+            return False
+        from invokeai.backend.model_management.models.stable_diffusion import _checkpoint_needs_conversion
+
+        return _checkpoint_needs_conversion(config, output_path)
@@ -3,6 +3,7 @@ import json
 from enum import Enum
 from pydantic import Field
 from pathlib import Path
+from shutil import rmtree
 from typing import Literal, Optional, Union
 from .base import (
     ModelConfigBase,
@@ -11,12 +12,13 @@ from .base import (
     ModelVariantType,
     DiffusersModel,
     SilenceWarnings,
-    read_checkpoint_meta,
+    read_checkpoint_summary,
     classproperty,
     InvalidModelException,
     ModelNotFoundException,
 )
 from .sdxl import StableDiffusionXLModel
+from ..model_hash import FileFingerprint, get_model_hash_index
 import invokeai.backend.util.logging as logger
 from invokeai.app.services.config import InvokeAIAppConfig
 from omegaconf import OmegaConf
@@ -39,13 +41,20 @@ class StableDiffusion1Model(DiffusersModel):
         config: str
         variant: ModelVariantType
 
-    def __init__(self, model_path: str, base_model: BaseModelType, model_type: ModelType):
+    def __init__(
+        self,
+        model_path: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        checkpoint_config: Optional[str] = None,
+    ):
         assert base_model == BaseModelType.StableDiffusion1
         assert model_type == ModelType.Main
         super().__init__(
             model_path=model_path,
             base_model=BaseModelType.StableDiffusion1,
             model_type=ModelType.Main,
+            checkpoint_config=checkpoint_config,
         )
 
     @classmethod
@@ -58,9 +67,8 @@ class StableDiffusion1Model(DiffusersModel):
                 ckpt_config["model"]["params"]["unet_config"]["params"]["in_channels"]
 
             else:
-                checkpoint = read_checkpoint_meta(path)
-                checkpoint = checkpoint.get("state_dict", checkpoint)
-                in_channels = checkpoint["model.diffusion_model.input_blocks.0.0.weight"].shape[1]
+                summary = read_checkpoint_summary(path)
+                in_channels = summary.shapes["model.diffusion_model.input_blocks.0.0.weight"][1]
 
         elif model_format == StableDiffusion1ModelFormat.Diffusers:
             unet_config_path = os.path.join(path, "unet", "config.json")
@@ -120,7 +128,7 @@ class StableDiffusion1Model(DiffusersModel):
         base_model: BaseModelType,
     ) -> str:
         if isinstance(config, cls.CheckpointConfig):
-            return _convert_ckpt_and_cache(
+            return _get_checkpoint_location(
                 version=BaseModelType.StableDiffusion1,
                 model_config=config,
                 output_path=output_path,
@@ -128,6 +136,16 @@ class StableDiffusion1Model(DiffusersModel):
         else:
             return model_path
 
+    @classmethod
+    def needs_conversion(
+        cls,
+        model_path: str,
+        output_path: str,
+        config: ModelConfigBase,
+        base_model: BaseModelType,
+    ) -> bool:
+        return isinstance(config, cls.CheckpointConfig) and _checkpoint_needs_conversion(config, output_path)
+
 
 class StableDiffusion2ModelFormat(str, Enum):
     Checkpoint = "checkpoint"
@@ -147,13 +165,20 @@ class StableDiffusion2Model(DiffusersModel):
         config: str
         variant: ModelVariantType
 
-    def __init__(self, model_path: str, base_model: BaseModelType, model_type: ModelType):
+    def __init__(
+        self,
+        model_path: str,
+        base_model: BaseModelType,
+        model_type: ModelType,
+        checkpoint_config: Optional[str] = None,
+    ):
         assert base_model == BaseModelType.StableDiffusion2
         assert model_type == ModelType.Main
         super().__init__(
             model_path=model_path,
             base_model=BaseModelType.StableDiffusion2,
             model_type=ModelType.Main,
+            checkpoint_config=checkpoint_config,
         )
 
     @classmethod
@@ -166,9 +191,8 @@ class StableDiffusion2Model(DiffusersModel):
                 ckpt_config["model"]["params"]["unet_config"]["params"]["in_channels"]
 
             else:
-                checkpoint = read_checkpoint_meta(path)
-                checkpoint = checkpoint.get("state_dict", checkpoint)
-                in_channels = checkpoint["model.diffusion_model.input_blocks.0.0.weight"].shape[1]
+                summary = read_checkpoint_summary(path)
+                in_channels = summary.shapes["model.diffusion_model.input_blocks.0.0.weight"][1]
 
         elif model_format == StableDiffusion2ModelFormat.Diffusers:
             unet_config_path = os.path.join(path, "unet", "config.json")
@@ -230,7 +254,7 @@ class StableDiffusion2Model(DiffusersModel):
         base_model: BaseModelType,
     ) -> str:
         if isinstance(config, cls.CheckpointConfig):
-            return _convert_ckpt_and_cache(
+            return _get_checkpoint_location(
                 version=BaseModelType.StableDiffusion2,
                 model_config=config,
                 output_path=output_path,
@@ -238,6 +262,86 @@ class StableDiffusion2Model(DiffusersModel):
         else:
             return model_path
 
+    @classmethod
+    def needs_conversion(
+        cls,
+        model_path: str,
+        output_path: str,
+        config: ModelConfigBase,
+        base_model: BaseModelType,
+    ) -> bool:
+        return isinstance(config, cls.CheckpointConfig) and _checkpoint_needs_conversion(config, output_path)
+
+
+def _get_checkpoint_location(
+    version: BaseModelType,
+    model_config: Union[
+        StableDiffusion1Model.CheckpointConfig,
+        StableDiffusion2Model.CheckpointConfig,
+        StableDiffusionXLModel.CheckpointConfig,
+    ],
+    output_path: str,
+    **kwargs,
+) -> str:
+    """
+    Returns where to load a checkpoint model from. That is an up to date diffusers
+    conversion of it if there is one, or else the checkpoint itself: the submodels of
+    a safetensors checkpoint are built straight from its memory-mapped weights. Pickled
+    checkpoints can't be mapped, so they are still converted and cached on first use.
+    Converting is otherwise left to ModelManager.convert_model().
+    """
+    app_config = InvokeAIAppConfig.get_config()
+    weights = app_config.root_path / model_config.path
+
+    if weights.suffix != ".safetensors" or _is_converted(weights, Path(output_path)):
+        return _convert_ckpt_and_cache(version, model_config, output_path, **kwargs)
+
+    return str(weights)
+
+
+def _checkpoint_needs_conversion(
+    model_config: Union[
+        StableDiffusion1Model.CheckpointConfig,
+        StableDiffusion2Model.CheckpointConfig,
+        StableDiffusionXLModel.CheckpointConfig,
+    ],
+    output_path: str,
+) -> bool:
+    """Whether _get_checkpoint_location() would convert the checkpoint before returning it."""
+    weights = InvokeAIAppConfig.get_config().root_path / model_config.path
+    return weights.suffix != ".safetensors" and not _is_converted(weights, Path(output_path))
+
+
+def convert_checkpoint_model(
+    version: BaseModelType,
+    model_config: Union[
+        StableDiffusion1Model.CheckpointConfig,
+        StableDiffusion2Model.CheckpointConfig,
+        StableDiffusionXLModel.CheckpointConfig,
+    ],
+    output_path: str,
+) -> Path:
+    """
+    Converts a checkpoint model to a diffusers folder at output_path, unless it
+    already is, whether or not it could be loaded without conversion.
+    """
+    kwargs = dict()
+    if version in [BaseModelType.StableDiffusionXL, BaseModelType.StableDiffusionXLRefiner]:
+        kwargs.update(use_safetensors=False)  # corrupts sdxl models for some reason
+    return Path(_convert_ckpt_and_cache(version, model_config, output_path, **kwargs))
+
+
+def _is_converted(weights: Path, output_path: Path) -> bool:
+    """Whether output_path holds a diffusers conversion of the weights as they are now."""
+    if not output_path.exists():
+        return False
+    source_fingerprint = json.dumps(FileFingerprint.of(weights))
+    source_fingerprint_path = output_path / "source_fingerprint.json"
+    if not source_fingerprint_path.exists():
+        # converted before fingerprints were recorded; trust it
+        source_fingerprint_path.write_text(source_fingerprint)
+    return source_fingerprint_path.read_text() == source_fingerprint
+
 
 # TODO: rework
 # pass precision - currently defaulting to fp16
@@ -263,35 +367,37 @@ def _convert_ckpt_and_cache(
     config_file = app_config.root_path / model_config.config
     output_path = Path(output_path)
 
-    # return cached version if it exists
-    if output_path.exists():
+    # return cached version if it exists, and was converted from the weights as they are now
+    hash_index = get_model_hash_index()
+    source_fingerprint = json.dumps(FileFingerprint.of(weights))
+    if _is_converted(weights, output_path):
         return output_path
+    if output_path.exists():
+        logger.info(f"{weights} has changed since it was converted, converting it again")
+        rmtree(output_path)
 
     # to avoid circular import errors
-    from ..convert_ckpt_to_diffusers import convert_ckpt_to_diffusers
+    from ..convert_ckpt_to_diffusers import MODEL_BASE_TO_MODEL_TYPE, convert_ckpt_to_diffusers
     from ...util.devices import choose_torch_device, torch_dtype
 
-    model_base_to_model_type = {
-        BaseModelType.StableDiffusion1: "FrozenCLIPEmbedder",
-        BaseModelType.StableDiffusion2: "FrozenOpenCLIPEmbedder",
-        BaseModelType.StableDiffusionXL: "SDXL",
-        BaseModelType.StableDiffusionXLRefiner: "SDXL-Refiner",
-    }
     logger.info(f"Converting {weights} to diffusers format")
     with SilenceWarnings():
         convert_ckpt_to_diffusers(
             weights,
             output_path,
-            model_type=model_base_to_model_type[version],
+            model_type=MODEL_BASE_TO_MODEL_TYPE[version],
             model_version=version,
             model_variant=model_config.variant,
             original_config_file=config_file,
             extract_ema=True,
-            scan_needed=True,
+            scan_needed=not hash_index.is_scanned(weights),
             from_safetensors=weights.suffix == ".safetensors",
             precision=torch_dtype(choose_torch_device()),
             **kwargs,
         )
+    if weights.suffix != ".safetensors":
+        hash_index.set_scanned(weights)
+    (output_path / "source_fingerprint.json").write_text(source_fingerprint)
     return output_path
 
 
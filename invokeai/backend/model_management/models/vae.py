@@ -110,6 +110,16 @@ class VaeModel(ModelBase):
         else:
             return model_path
 
+    @classmethod
+    def needs_conversion(
+        cls,
+        model_path: str,
+        output_path: str,
+        config: ModelConfigBase,
+        base_model: BaseModelType,
+    ) -> bool:
+        return cls.detect_format(model_path) == VaeModelFormat.Checkpoint and not os.path.exists(output_path)
+
 
 # TODO: rework
 def _convert_vae_ckpt_and_cache(
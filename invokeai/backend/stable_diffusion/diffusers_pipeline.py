@@ -434,6 +434,16 @@ class StableDiffusionGeneratorPipeline(StableDiffusionPipeline):
             )
             return self.check_for_safety(output, dtype=conditioning_data.dtype)
 
+    def set_scheduler_timesteps(self, num_inference_steps: int, device: torch.device):
+        """
+        Sets the timesteps of the scheduler, which also resets its state. A scheduler fresh from the
+        SchedulerCache already has them for these steps and device, and is used as is the first time.
+        """
+        if getattr(self.scheduler, "prepared_timesteps", None) == (num_inference_steps, torch.device(device)):
+            self.scheduler.prepared_timesteps = None
+            return
+        self.scheduler.set_timesteps(num_inference_steps, device=device)
+
     def latents_from_embeddings(
         self,
         latents: torch.Tensor,
@@ -453,7 +463,7 @@ class StableDiffusionGeneratorPipeline(StableDiffusionPipeline):
             scheduler_device = self._model_group.device_for(self.unet)
 
         if timesteps is None:
-            self.scheduler.set_timesteps(num_inference_steps, device=scheduler_device)
+            self.set_scheduler_timesteps(num_inference_steps, device=scheduler_device)
             timesteps = self.scheduler.timesteps
         infer_latents_from_embeddings = GeneratorToCallbackinator(
             self.generate_latents_from_embeddings, PipelineIntermediateState
@@ -573,6 +583,7 @@ class StableDiffusionGeneratorPipeline(StableDiffusionPipeline):
 
         # default is no controlnet, so set controlnet processing output to None
         down_block_res_samples, mid_block_res_sample = None, None
+        batch_size = latents.shape[0]
 
         if control_data is not None:
             # control_data should be type List[ControlNetData]
@@ -601,16 +612,22 @@ class StableDiffusionGeneratorPipeline(StableDiffusionPipeline):
                         #     classifier_free_guidance is <= 1.0 ?)
                         control_latent_input = torch.cat([unet_latent_input] * 2)
 
+                    unconditioned_embeddings = self.invokeai_diffuser._expand_conditioning_to_batch(
+                        conditioning_data.unconditioned_embeddings, batch_size
+                    )
+                    text_embeddings = self.invokeai_diffuser._expand_conditioning_to_batch(
+                        conditioning_data.text_embeddings, batch_size
+                    )
                     if cfg_injection:  # only applying ControlNet to conditional instead of in unconditioned
-                        encoder_hidden_states = conditioning_data.text_embeddings
+                        encoder_hidden_states = text_embeddings
                         encoder_attention_mask = None
                     else:
                         (
                             encoder_hidden_states,
                             encoder_attention_mask,
                         ) = self.invokeai_diffuser._concat_conditionings_for_batch(
-                            conditioning_data.unconditioned_embeddings,
-                            conditioning_data.text_embeddings,
+                            unconditioned_embeddings,
+                            text_embeddings,
                         )
                     if isinstance(control_datum.weight, list):
                         # if controlnet has multiple weights, use the weight for the current step
@@ -624,7 +641,8 @@ class StableDiffusionGeneratorPipeline(StableDiffusionPipeline):
                         sample=control_latent_input,
                         timestep=timestep,
                         encoder_hidden_states=encoder_hidden_states,
-                        controlnet_cond=control_datum.image_tensor,
+                        # the control image is [uncond, cond] (or just cond), repeat it for every latent in the batch
+                        controlnet_cond=control_datum.image_tensor.repeat_interleave(batch_size, dim=0),
                         conditioning_scale=controlnet_weight,  # controlnet specific, NOT the guidance scale
                         encoder_attention_mask=encoder_attention_mask,
                         guess_mode=soft_injection,  # this is still called guess_mode in diffusers ControlNetModel
@@ -782,7 +800,7 @@ class StableDiffusionGeneratorPipeline(StableDiffusionPipeline):
         else:
             scheduler_device = self._model_group.device_for(self.unet)
 
-        img2img_pipeline.scheduler.set_timesteps(num_inference_steps, device=scheduler_device)
+        self.set_scheduler_timesteps(num_inference_steps, device=scheduler_device)
         timesteps, adjusted_steps = img2img_pipeline.get_timesteps(
             num_inference_steps, strength, device=scheduler_device
         )
@@ -232,6 +232,13 @@ class InvokeAIDiffuserComponent:
             latents = self.apply_symmetry(postprocessing_settings, latents, percent_through)
         return latents
 
+    @staticmethod
+    def _expand_conditioning_to_batch(conditioning: torch.Tensor, batch_size: int) -> torch.Tensor:
+        # a single conditioning is shared by every latent when denoising a batch of variations
+        if conditioning.shape[0] == batch_size:
+            return conditioning
+        return conditioning.expand(batch_size, *conditioning.shape[1:])
+
     def _concat_conditionings_for_batch(self, unconditioning, conditioning):
         def _pad_conditioning(cond, target_len, encoder_attention_mask):
             conditioning_attention_mask = torch.ones(
@@ -283,6 +290,8 @@ class InvokeAIDiffuserComponent:
 
     def _apply_standard_conditioning(self, x, sigma, unconditioning, conditioning, **kwargs):
         # fast batched path
+        unconditioning = self._expand_conditioning_to_batch(unconditioning, x.shape[0])
+        conditioning = self._expand_conditioning_to_batch(conditioning, x.shape[0])
         x_twice = torch.cat([x] * 2)
         sigma_twice = torch.cat([sigma] * 2)
 
@@ -306,6 +315,8 @@ class InvokeAIDiffuserComponent:
         **kwargs,
     ):
         # low-memory sequential path
+        unconditioning = self._expand_conditioning_to_batch(unconditioning, x.shape[0])
+        conditioning = self._expand_conditioning_to_batch(conditioning, x.shape[0])
         uncond_down_block, cond_down_block = None, None
         down_block_additional_residuals = kwargs.pop("down_block_additional_residuals", None)
         if down_block_additional_residuals is not None:
@@ -370,6 +381,8 @@ class InvokeAIDiffuserComponent:
         **kwargs,
     ):
         context: Context = self.cross_attention_control_context
+        unconditioning = self._expand_conditioning_to_batch(unconditioning, x.shape[0])
+        conditioning = self._expand_conditioning_to_batch(conditioning, x.shape[0])
 
         uncond_down_block, cond_down_block = None, None
         down_block_additional_residuals = kwargs.pop("down_block_additional_residuals", None)
@@ -1 +1,2 @@
 from .schedulers import SCHEDULER_MAP
+from .scheduler_cache import SchedulerCache
@@ -0,0 +1,72 @@
+"""
+Cache of prepared schedulers.
+
+Building a scheduler from its config and calling set_timesteps() is repeated on
+every denoising node, and some schedulers (DPM++, UniPC, the Karras variants)
+compute their sigma and timestep tables in set_timesteps(). The cache keeps one
+template per scheduler class, config and step count, and hands out copies of it.
+"""
+
+import copy
+import json
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple, Type, Union
+
+import torch
+from diffusers.schedulers import SchedulerMixin as Scheduler
+
+DEFAULT_MAX_SCHEDULERS = 32
+
+
+def freeze_config(config: Dict[str, Any]) -> str:
+    """A hashable form of a scheduler config"""
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+class SchedulerCache:
+    """
+    An LRU cache of scheduler templates. The copies it returns are independent of each other,
+    so they can keep their own state between steps.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SCHEDULERS):
+        self._max_size = max_size
+        self._templates: OrderedDict[Tuple, Scheduler] = OrderedDict()
+        self._lock = Lock()
+
+    def get(
+        self,
+        scheduler_class: Type[Scheduler],
+        config: Dict[str, Any],
+        steps: Optional[int] = None,
+        device: Union[torch.device, str, None] = None,
+    ) -> Scheduler:
+        """
+        Returns a new scheduler of the class, built from the config. If steps are given, its timesteps
+        are already set for that number of steps on the device, and its `prepared_timesteps` attribute
+        is (steps, device), see StableDiffusionGeneratorPipeline.set_scheduler_timesteps().
+        """
+        device = torch.device(device) if device is not None else None
+        key = (scheduler_class, freeze_config(config), steps, device)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+
+        if template is None:
+            template = scheduler_class.from_config(config)
+            if steps is not None:
+                template.set_timesteps(steps, device=device)
+            with self._lock:
+                self._templates[key] = template
+                while len(self._templates) > self._max_size:
+                    self._templates.popitem(last=False)
+
+        scheduler = copy.deepcopy(template)
+        scheduler.prepared_timesteps = (steps, device) if steps is not None else None
+        return scheduler
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
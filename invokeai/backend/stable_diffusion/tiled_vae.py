@@ -0,0 +1,150 @@
+"""
+Tiled VAE decoding and encoding with bounded memory.
+
+diffusers' AutoencoderKL.enable_tiling() decodes tile by tile, but still builds
+the whole output in float on the device and then on the CPU. The decoder here
+decodes one row of overlapping latent tiles at a time, blends the seams with
+linear ramps, and writes rows as soon as no later tile touches them into a
+preallocated uint8 image, so besides that image only about two tile rows are
+held in float. The encoder reads the image tile by tile in the same way.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+import PIL.Image
+import torch
+from diffusers.models import AutoencoderKL
+from diffusers.models.vae import DiagonalGaussianDistribution
+
+# in latent pixels; the decoded tiles are 8 times larger
+DEFAULT_TILE_SIZE = 64
+DEFAULT_TILE_OVERLAP = 16
+
+VAE_SCALE_FACTOR = 8
+
+
+def _tile_starts(length: int, tile_size: int, overlap: int) -> List[int]:
+    """Start offsets of tiles covering the length, the last one flush with the end"""
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def _blend_ramp(size: int, overlap: int, first: bool, last: bool) -> np.ndarray:
+    """Weights of a tile along one axis: ramping up over the overlap with the previous tile, down over the next"""
+    weights = np.ones(size, dtype=np.float32)
+    overlap = min(overlap, size // 2)
+    if overlap > 0:
+        ramp = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+        if not first:
+            weights[:overlap] = ramp
+        if not last:
+            weights[-overlap:] = ramp[::-1]
+    return weights
+
+
+def tiled_decode(
+    vae: AutoencoderKL,
+    latents: torch.Tensor,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    overlap: int = DEFAULT_TILE_OVERLAP,
+) -> PIL.Image.Image:
+    """
+    Decodes the first latents of the batch into an image, one tile at a time.
+    :param vae: the VAE, with its own tiling disabled
+    :param latents: latents already divided by the VAE scaling factor
+    :param tile_size: size of the latent tiles
+    :param overlap: overlap of neighboring latent tiles
+    """
+    latents = latents[:1]
+    _, _, height, width = latents.shape
+    ys = _tile_starts(height, tile_size, overlap)
+    xs = _tile_starts(width, tile_size, overlap)
+    scale = VAE_SCALE_FACTOR
+    image = np.empty((height * scale, width * scale, 3), dtype=np.uint8)
+
+    # blended rows not yet written to the image, starting at pending_start
+    pending_start = 0
+    pending: Optional[np.ndarray] = None
+    pending_weights: Optional[np.ndarray] = None
+
+    for row, y in enumerate(ys):
+        tile_height = min(tile_size, height - y)
+        band_end = (y + tile_height) * scale
+        # grow the pending rows to the bottom of this row of tiles
+        band = np.zeros((band_end - pending_start, width * scale, 3), dtype=np.float32)
+        band_weights = np.zeros((band_end - pending_start, width * scale, 1), dtype=np.float32)
+        if pending is not None:
+            band[: len(pending)] = pending
+            band_weights[: len(pending)] = pending_weights
+
+        y_weights = _blend_ramp(tile_height * scale, overlap * scale, row == 0, row == len(ys) - 1)
+        for column, x in enumerate(xs):
+            tile_width = min(tile_size, width - x)
+            tile = vae.decode(latents[:, :, y : y + tile_height, x : x + tile_width], return_dict=False)[0]
+            tile = (tile[0] / 2 + 0.5).clamp(0, 1).permute(1, 2, 0).float().cpu().numpy()
+            x_weights = _blend_ramp(tile_width * scale, overlap * scale, column == 0, column == len(xs) - 1)
+            weights = (y_weights[:, None] * x_weights[None, :])[:, :, None]
+
+            top = y * scale - pending_start
+            left = x * scale
+            band[top:, left : left + tile_width * scale] += tile * weights
+            band_weights[top:, left : left + tile_width * scale] += weights
+
+        # rows above the next row of tiles are final
+        done = (ys[row + 1] * scale if row + 1 < len(ys) else band_end) - pending_start
+        image[pending_start : pending_start + done] = (band[:done] / band_weights[:done] * 255).round().astype(np.uint8)
+        pending, pending_weights = band[done:], band_weights[done:]
+        pending_start += done
+
+    return PIL.Image.fromarray(image)
+
+
+def tiled_encode(
+    vae: AutoencoderKL,
+    image: PIL.Image.Image,
+    tile_size: int = DEFAULT_TILE_SIZE * VAE_SCALE_FACTOR,
+    overlap: int = DEFAULT_TILE_OVERLAP * VAE_SCALE_FACTOR,
+) -> torch.Tensor:
+    """
+    Encodes an RGB image into a latent distribution sample, one tile at a time. Image sizes should
+    be multiples of 8, extra pixels are cropped. Tiles are converted to tensors only as they are encoded.
+    Returns latents that are not yet multiplied by the VAE scaling factor.
+    :param vae: the VAE, with its own tiling disabled
+    :param image: the image
+    :param tile_size: size of the image tiles, a multiple of 8
+    :param overlap: overlap of neighboring image tiles, a multiple of 8
+    """
+    pixels = np.asarray(image.convert("RGB"))
+    scale = VAE_SCALE_FACTOR
+    height, width = pixels.shape[0] // scale, pixels.shape[1] // scale
+    tile_size, overlap = tile_size // scale, overlap // scale
+    ys = _tile_starts(height, tile_size, overlap)
+    xs = _tile_starts(width, tile_size, overlap)
+
+    # the blended mean and log variance of the latent distribution; latents are small, unlike the image
+    moments: Optional[torch.Tensor] = None
+    total_weights = torch.zeros((1, 1, height, width), dtype=torch.float32)
+    for row, y in enumerate(ys):
+        tile_height = min(tile_size, height - y)
+        y_weights = _blend_ramp(tile_height, overlap, row == 0, row == len(ys) - 1)
+        for column, x in enumerate(xs):
+            tile_width = min(tile_size, width - x)
+            tile = pixels[y * scale : (y + tile_height) * scale, x * scale : (x + tile_width) * scale]
+            tile_tensor = torch.from_numpy(np.ascontiguousarray(tile)).permute(2, 0, 1)[None]
+            tile_tensor = (tile_tensor.to(device=vae.device, dtype=vae.dtype) / 255.0) * 2.0 - 1.0
+            tile_moments = vae.quant_conv(vae.encoder(tile_tensor)).float().cpu()
+            if moments is None:
+                moments = torch.zeros((1, tile_moments.shape[1], height, width), dtype=torch.float32)
+
+            x_weights = _blend_ramp(tile_width, overlap, column == 0, column == len(xs) - 1)
+            weights = torch.from_numpy(y_weights[:, None] * x_weights[None, :])[None, None]
+            moments[:, :, y : y + tile_height, x : x + tile_width] += tile_moments * weights
+            total_weights[:, :, y : y + tile_height, x : x + tile_width] += weights
+
+    moments = (moments / total_weights).to(device=vae.device, dtype=vae.dtype)
+    return DiagonalGaussianDistribution(moments).sample()
@@ -7,12 +7,13 @@
 This is the backend to "textual_inversion.py"
 """
 
+import hashlib
 import logging
 import math
 import os
 import random
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 import datasets
 import diffusers
@@ -31,6 +32,7 @@ from diffusers import (
     StableDiffusionPipeline,
     UNet2DConditionModel,
 )
+from diffusers.models.vae import DiagonalGaussianDistribution
 from diffusers.optimization import get_scheduler
 from diffusers.utils import check_min_version
 from diffusers.utils.import_utils import is_xformers_available
@@ -40,7 +42,6 @@ from huggingface_hub import HfFolder, Repository, whoami
 from packaging import version
 from PIL import Image
 from torch.utils.data import Dataset
-from torchvision import transforms
 from tqdm.auto import tqdm
 from transformers import CLIPTextModel, CLIPTokenizer
 
@@ -303,6 +304,21 @@ def parse_args():
             " https://pytorch.org/docs/stable/notes/cuda.html#tensorfloat-32-tf32-on-ampere-devices"
         ),
     )
+    training_group.add_argument(
+        "--dataloader_num_workers",
+        type=int,
+        default=2,
+        help="Number of worker processes that assemble the training batches (0 assembles them in the main process)",
+    )
+    training_group.add_argument(
+        "--latents_cache_dir",
+        type=Path,
+        default=None,
+        help=(
+            "Save the VAE encodings of the training images in this folder, so that later runs on the same images"
+            " don't encode them again"
+        ),
+    )
     training_group.add_argument(
         "--local_rank",
         type=int,
@@ -439,6 +455,7 @@ class TextualInversionDataset(Dataset):
         if set == "train":
             self._length = self.num_images * repeats
 
+        self.interpolation_name = interpolation
         self.interpolation = {
             "linear": PIL_INTERPOLATION["linear"],
             "bilinear": PIL_INTERPOLATION["bilinear"],
@@ -447,51 +464,95 @@ class TextualInversionDataset(Dataset):
         }[interpolation]
 
         self.templates = imagenet_style_templates_small if learnable_property == "style" else imagenet_templates_small
-        self.flip_transform = transforms.RandomHorizontalFlip(p=self.flip_p)
+
+        # Prompts and images are prepared once; each repeat only picks a template and whether to flip the image
+        self.template_input_ids = self.tokenizer(
+            [template.format(self.placeholder_token) for template in self.templates],
+            padding="max_length",
+            truncation=True,
+            max_length=self.tokenizer.model_max_length,
+            return_tensors="pt",
+        ).input_ids
+        self.images = [self._load_image(image_path) for image_path in self.image_paths]
+        # the parameters of the latent distributions of each image and of its mirror image, see cache_latents()
+        self.latent_parameters: Optional[List[torch.Tensor]] = None
 
     def __len__(self):
         return self._length
 
-    def __getitem__(self, i):
-        example = {}
-        image = Image.open(self.image_paths[i % self.num_images])
+    def _load_image(self, image_path: Path) -> np.ndarray:
+        image = Image.open(image_path)
 
         if not image.mode == "RGB":
             image = image.convert("RGB")
 
-        placeholder_string = self.placeholder_token
-        text = random.choice(self.templates).format(placeholder_string)
-
-        example["input_ids"] = self.tokenizer(
-            text,
-            padding="max_length",
-            truncation=True,
-            max_length=self.tokenizer.model_max_length,
-            return_tensors="pt",
-        ).input_ids[0]
-
         # default to score-sde preprocessing
         img = np.array(image).astype(np.uint8)
 
         if self.center_crop:
             crop = min(img.shape[0], img.shape[1])
-            (
-                h,
-                w,
-            ) = (
-                img.shape[0],
-                img.shape[1],
-            )
+            h, w = img.shape[0], img.shape[1]
             img = img[(h - crop) // 2 : (h + crop) // 2, (w - crop) // 2 : (w + crop) // 2]
 
         image = Image.fromarray(img)
         image = image.resize((self.size, self.size), resample=self.interpolation)
+        return np.array(image).astype(np.uint8)
+
+    def cache_latents(self, vae: AutoencoderKL, cache_dir: Optional[Path] = None, vae_name: str = ""):
+        """
+        Encodes each image and its mirror image once, so that training only has to sample their latent
+        distributions. With a cache_dir, the encodings are also saved there, and reused by later runs on
+        unchanged images with the same VAE (identified by vae_name) and preprocessing.
+        """
+        latent_parameters = []
+        for image_path, image in zip(self.image_paths, self.images):
+            cache_file = None
+            if cache_dir is not None:
+                stat = image_path.stat()
+                key = ":".join(
+                    str(part)
+                    for part in [
+                        vae_name,
+                        image_path.resolve(),
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                        self.size,
+                        self.center_crop,
+                        self.interpolation_name,
+                    ]
+                )
+                cache_file = Path(cache_dir) / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.pt"
+                if cache_file.exists():
+                    latent_parameters.append(torch.load(cache_file))
+                    continue
+
+            pixels = (np.stack([image, image[:, ::-1]]) / 127.5 - 1.0).astype(np.float32)
+            pixel_values = torch.from_numpy(pixels).permute(0, 3, 1, 2).to(device=vae.device, dtype=vae.dtype)
+            with torch.no_grad():
+                parameters = vae.encode(pixel_values).latent_dist.parameters.float().cpu()
+
+            if cache_file is not None:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                # several training processes may write the same file
+                tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+                torch.save(parameters, tmp_file)
+                os.replace(tmp_file, cache_file)
+            latent_parameters.append(parameters)
+        self.latent_parameters = latent_parameters
 
-        image = self.flip_transform(image)
-        image = np.array(image).astype(np.uint8)
-        image = (image / 127.5 - 1.0).astype(np.float32)
+    def __getitem__(self, i):
+        example = {}
+        index = i % self.num_images
+        flip = random.random() < self.flip_p
 
-        example["pixel_values"] = torch.from_numpy(image).permute(2, 0, 1)
+        example["input_ids"] = self.template_input_ids[random.randrange(len(self.templates))]
+
+        if self.latent_parameters is not None:
+            example["latent_parameters"] = self.latent_parameters[index][int(flip)]
+        else:
+            image = self.images[index][:, ::-1] if flip else self.images[index]
+            image = (image / 127.5 - 1.0).astype(np.float32)
+            example["pixel_values"] = torch.from_numpy(image).permute(2, 0, 1)
         return example
 
 
@@ -545,6 +606,8 @@ def do_textual_inversion_training(
     resume_from_checkpoint: Path = None,
     enable_xformers_memory_efficient_attention: bool = False,
     hub_model_id: str = None,
+    dataloader_num_workers: int = 2,
+    latents_cache_dir: Path = None,
     **kwargs,
 ):
     assert model, "Please specify a base model with --model"
@@ -724,7 +787,14 @@ def do_textual_inversion_training(
         center_crop=center_crop,
         set="train",
     )
-    train_dataloader = torch.utils.data.DataLoader(train_dataset, batch_size=train_batch_size, shuffle=True)
+    train_dataloader = torch.utils.data.DataLoader(
+        train_dataset,
+        batch_size=train_batch_size,
+        shuffle=True,
+        num_workers=dataloader_num_workers,
+        persistent_workers=dataloader_num_workers > 0,
+        pin_memory=True,
+    )
 
     # Scheduler and math around the number of training steps.
     overrode_max_train_steps = False
@@ -757,6 +827,12 @@ def do_textual_inversion_training(
     unet.to(accelerator.device, dtype=weight_dtype)
     vae.to(accelerator.device, dtype=weight_dtype)
 
+    # Encode the training images once, rather than on every step. Training doesn't use the VAE otherwise.
+    logger.info("Encoding the training images")
+    train_dataset.cache_latents(vae, cache_dir=latents_cache_dir, vae_name=str(vae_info.location))
+    vae.to("cpu")
+    torch.cuda.empty_cache()
+
     # We need to recalculate our total training steps as the size of the training dataloader may have changed.
     num_update_steps_per_epoch = math.ceil(len(train_dataloader) / gradient_accumulation_steps)
     if overrode_max_train_steps:
@@ -830,7 +906,11 @@ def do_textual_inversion_training(
 
             with accelerator.accumulate(text_encoder):
                 # Convert images to latent space
-                latents = vae.encode(batch["pixel_values"].to(dtype=weight_dtype)).latent_dist.sample().detach()
+                if "latent_parameters" in batch:
+                    latent_dist = DiagonalGaussianDistribution(batch["latent_parameters"].to(dtype=weight_dtype))
+                else:
+                    latent_dist = vae.encode(batch["pixel_values"].to(dtype=weight_dtype)).latent_dist
+                latents = latent_dist.sample().detach()
                 latents = latents * 0.18215
 
                 # Sample noise that we'll add to the latents
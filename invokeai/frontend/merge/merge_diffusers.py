@@ -86,6 +86,11 @@ def _parse_args() -> Namespace:
         action="store_true",
         help="Try to merge models even if they are incompatible with each other",
     )
+    parser.add_argument(
+        "--fp16",
+        action="store_true",
+        help="Save the merged weights in half precision",
+    )
     parser.add_argument(
         "--clobber",
         "--overwrite",
@@ -5,6 +5,7 @@ from .test_nodes import (
     PromptTestInvocation,
     PromptCollectionTestInvocation,
 )
+from invokeai.app.services.invocation_cache import MemoryInvocationCache
 from invokeai.app.services.invocation_queue import MemoryInvocationQueue
 from invokeai.app.services.processor import DefaultInvocationProcessor
 from invokeai.app.services.sqlite import SqliteItemStorage, sqlite_memory
@@ -16,6 +17,7 @@ from invokeai.app.invocations.baseinvocation import (
 from invokeai.app.invocations.collections import RangeInvocation
 from invokeai.app.invocations.math import AddInvocation, MultiplyInvocation
 from invokeai.app.services.invocation_services import InvocationServices
+from invokeai.app.services.invocation_stats import InvocationStatsService
 from invokeai.app.services.graph import (
     Graph,
     CollectInvocation,
@@ -46,6 +48,7 @@ def mock_services() -> InvocationServices:
         events=TestEventService(),
         logger=None,  # type: ignore
         images=None,  # type: ignore
+        invocation_cache=MemoryInvocationCache(max_size=0),
         latents=None,  # type: ignore
         boards=None,  # type: ignore
         board_images=None,  # type: ignore
@@ -55,6 +58,7 @@ def mock_services() -> InvocationServices:
             filename=sqlite_memory, table_name="graph_executions"
         ),
         processor=DefaultInvocationProcessor(),
+        performance_statistics=InvocationStatsService(),
         configuration=None,  # type: ignore
     )
 
@@ -0,0 +1,62 @@
+import pytest
+
+from invokeai.app.invocations.math import AddInvocation
+from invokeai.app.services.graph import Edge, EdgeConnection, Graph, InvalidEdgeError
+
+
+def create_edge(from_id: str, from_field: str, to_id: str, to_field: str) -> Edge:
+    return Edge(
+        source=EdgeConnection(node_id=from_id, field=from_field),
+        destination=EdgeConnection(node_id=to_id, field=to_field),
+    )
+
+
+def build_graph(node_count: int) -> Graph:
+    """A chain of add nodes, each also feeding the node two steps further down"""
+    g = Graph()
+    for i in range(node_count):
+        g.add_node(AddInvocation(id=str(i)))
+    for i in range(1, node_count):
+        g.add_edge(create_edge(str(i - 1), "a", str(i), "a"))
+        if i > 1:
+            g.add_edge(create_edge(str(i - 2), "a", str(i), "b"))
+    return g
+
+
+@pytest.mark.parametrize("node_count", [50, 200, 500])
+def test_graph_validation(node_count):
+    g = build_graph(node_count)
+
+    assert g.is_valid()
+    assert len(g.edges) == 2 * node_count - 3
+    # closing the chain into a loop must still be caught by the incrementally updated index
+    with pytest.raises(InvalidEdgeError):
+        g.add_edge(create_edge(str(node_count - 1), "a", "0", "a"))
+
+
+def test_graph_index_follows_same_length_edits():
+    g = build_graph(10)
+
+    # swap an edge for another one, the number of edges stays the same
+    g.delete_edge(create_edge("8", "a", "9", "a"))
+    g.add_edge(create_edge("0", "a", "9", "a"))
+    with pytest.raises(InvalidEdgeError):
+        g.add_edge(create_edge("8", "a", "9", "a"))
+
+    # replace the edge list with another one of the same length
+    edges = list(g.edges)
+    edges[edges.index(create_edge("7", "a", "9", "b"))] = create_edge("0", "a", "1", "b")
+    g.edges = edges
+    with pytest.raises(InvalidEdgeError):
+        g.add_edge(create_edge("0", "a", "1", "b"))
+    g.add_edge(create_edge("7", "a", "9", "b"))
+    assert g.is_valid()
+
+
+def test_is_valid_catches_in_place_edits():
+    g = build_graph(10)
+    assert g.is_valid()
+
+    # bypass the graph's methods, the index doesn't know about this edge
+    g.edges[-1] = create_edge("9", "a", "0", "a")
+    assert not g.is_valid()
@@ -1,21 +1,32 @@
 from .test_nodes import (
+    CoalescingTestInvocation,
     TestEventService,
     ErrorInvocation,
     TextToImageTestInvocation,
     PromptTestInvocation,
+    RandomPromptTestInvocation,
     create_edge,
     wait_until,
 )
-from invokeai.app.services.invocation_queue import MemoryInvocationQueue
+from invokeai.app.invocations.image import ShowImageInvocation
+from invokeai.app.invocations.latent import ImageToLatentsInvocation, LatentsToImageInvocation
+from invokeai.app.invocations.math import RandomIntInvocation
+from invokeai.app.invocations.prompt import DynamicPromptInvocation
+from invokeai.app.services.invocation_cache import InvocationCacheBase, MemoryInvocationCache
+from invokeai.app.services.invocation_queue import InvocationQueueItem, MemoryInvocationQueue
 from invokeai.app.services.processor import DefaultInvocationProcessor
 from invokeai.app.services.sqlite import SqliteItemStorage, sqlite_memory
 from invokeai.app.services.invoker import Invoker
 from invokeai.app.services.invocation_services import InvocationServices
+from invokeai.app.services.invocation_stats import InvocationStatsService
 from invokeai.app.services.graph import (
     Graph,
     GraphExecutionState,
     LibraryGraph,
 )
+from queue import Empty
+from types import SimpleNamespace
+
 import pytest
 
 
@@ -39,6 +50,7 @@ def mock_services() -> InvocationServices:
         events=TestEventService(),
         logger=None,  # type: ignore
         images=None,  # type: ignore
+        invocation_cache=MemoryInvocationCache(max_size=0),
         latents=None,  # type: ignore
         boards=None,  # type: ignore
         board_images=None,  # type: ignore
@@ -48,6 +60,7 @@ def mock_services() -> InvocationServices:
             filename=sqlite_memory, table_name="graph_executions"
         ),
         processor=DefaultInvocationProcessor(),
+        performance_statistics=InvocationStatsService(),
         configuration=None,  # type: ignore
     )
 
@@ -127,3 +140,128 @@ def test_handles_errors(mock_invoker: Invoker):
     assert g.is_complete()
 
     assert all((i in g.errors for i in g.source_prepared_mapping["1"]))
+
+
+def test_reuses_cached_outputs(mock_invoker: Invoker):
+    mock_invoker.services.invocation_cache = MemoryInvocationCache(max_size=10)
+
+    def invoke_prompt() -> GraphExecutionState:
+        g = mock_invoker.create_execution_state()
+        g.graph.add_node(PromptTestInvocation(id="1", prompt="Banana sushi"))
+        mock_invoker.invoke(g, invoke_all=True)
+        wait_until(lambda: mock_invoker.services.graph_execution_manager.get(g.id).is_complete(), timeout=5, interval=1)
+        return mock_invoker.services.graph_execution_manager.get(g.id)
+
+    first = invoke_prompt()
+    second = invoke_prompt()
+    mock_invoker.stop()
+
+    stats = mock_invoker.services.invocation_cache.get_stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+    assert list(second.results.values()) == list(first.results.values())
+
+
+def test_does_not_cache_invocations_that_do_not_opt_in(mock_invoker: Invoker):
+    mock_invoker.services.invocation_cache = MemoryInvocationCache(max_size=10)
+
+    def invoke_random_prompt() -> GraphExecutionState:
+        g = mock_invoker.create_execution_state()
+        g.graph.add_node(RandomPromptTestInvocation(id="1", prompt="Banana sushi"))
+        mock_invoker.invoke(g, invoke_all=True)
+        wait_until(lambda: mock_invoker.services.graph_execution_manager.get(g.id).is_complete(), timeout=5, interval=1)
+        return mock_invoker.services.graph_execution_manager.get(g.id)
+
+    first = invoke_random_prompt()
+    second = invoke_random_prompt()
+    mock_invoker.stop()
+
+    stats = mock_invoker.services.invocation_cache.get_stats()
+    assert (stats.hits, stats.misses, stats.size) == (0, 0, 0)
+    assert list(second.results.values()) != list(first.results.values())
+
+
+@pytest.mark.parametrize(
+    "invocation_type",
+    [
+        ImageToLatentsInvocation,
+        LatentsToImageInvocation,
+        RandomIntInvocation,
+        DynamicPromptInvocation,
+        ShowImageInvocation,
+    ],
+)
+def test_random_and_side_effecting_invocations_are_not_cacheable(invocation_type):
+    assert not invocation_type.cacheable
+    assert InvocationCacheBase.create_key(invocation_type.construct(id="1")) is None
+
+
+@pytest.fixture
+def coalescing_invoker(mock_invoker: Invoker) -> Invoker:
+    mock_invoker.services.configuration = SimpleNamespace(  # type: ignore
+        denoise_coalesce_window=0.2, denoise_coalesce_size=4, session_stats_event=False
+    )
+    CoalescingTestInvocation.batches = []
+    return mock_invoker
+
+
+def invoke_coalescing(invoker: Invoker, keys: list[str], invoke_all: bool = False) -> GraphExecutionState:
+    g = invoker.create_execution_state()
+    for i, key in enumerate(keys):
+        g.graph.add_node(CoalescingTestInvocation(id=str(i), key=key))
+    invoker.invoke(g, invoke_all=invoke_all)
+    return g
+
+
+def wait_until_complete(invoker: Invoker, sessions: list[GraphExecutionState]):
+    wait_until(
+        lambda: all(invoker.services.graph_execution_manager.get(g.id).is_complete() for g in sessions),
+        timeout=10,
+        interval=0.1,
+    )
+    invoker.stop()
+
+
+def test_coalesces_invocations_of_sessions(coalescing_invoker: Invoker):
+    sessions = [invoke_coalescing(coalescing_invoker, ["a"]) for _ in range(2)]
+    wait_until_complete(coalescing_invoker, sessions)
+
+    assert CoalescingTestInvocation.batches == [[g.id for g in sessions]]
+
+
+def test_deferred_invocations_keep_their_order(coalescing_invoker: Invoker):
+    sessions = [invoke_coalescing(coalescing_invoker, [key]) for key in ["a", "b", "c", "a"]]
+    wait_until_complete(coalescing_invoker, sessions)
+
+    first, second, third, fourth = [g.id for g in sessions]
+    assert CoalescingTestInvocation.batches == [[first, fourth], [second], [third]]
+
+
+def test_sessions_take_turns(coalescing_invoker: Invoker):
+    first = invoke_coalescing(coalescing_invoker, ["a", "a", "a"], invoke_all=True)
+    second = invoke_coalescing(coalescing_invoker, ["a", "a", "a"], invoke_all=True)
+    other = invoke_coalescing(coalescing_invoker, ["c"])
+    wait_until_complete(coalescing_invoker, [first, second, other])
+
+    # a session has at most one invocation in a batch, so neither of them can crowd out the other,
+    # and the invocation that couldn't join them runs before their next ones
+    assert CoalescingTestInvocation.batches == [[first.id, second.id], [other.id]] + [[first.id, second.id]] * 2
+
+
+def test_queue_get_times_out_past_canceled_items():
+    queue = MemoryInvocationQueue()
+    queue.put(InvocationQueueItem(graph_execution_state_id="1", invocation_id="1"))
+    queue.cancel("1")
+
+    with pytest.raises(Empty):
+        queue.get(timeout=0.1)
+
+
+def test_queue_peek_leaves_items_queued():
+    queue = MemoryInvocationQueue()
+    queue.put(InvocationQueueItem(graph_execution_state_id="1", invocation_id="1"))
+    queue.put(InvocationQueueItem(graph_execution_state_id="2", invocation_id="1"))
+    queue.put(InvocationQueueItem(graph_execution_state_id="3", invocation_id="1"))
+    queue.cancel("2")
+
+    assert [item.graph_execution_state_id for item in queue.peek()] == ["1", "3"]
+    assert queue.get(timeout=0.1).graph_execution_state_id == "1"
@@ -3,7 +3,9 @@ from .test_nodes import (
     TextToImageTestInvocation,
     ListPassThroughInvocation,
     PromptTestInvocation,
+    PromptTestInvocationOutput,
 )
+from invokeai.app.invocations.baseinvocation import BaseInvocation, BaseInvocationOutput
 from invokeai.app.services.graph import (
     Edge,
     Graph,
@@ -613,3 +615,13 @@ def test_graph_can_generate_schema():
     # Not throwing on this line is sufficient
     # NOTE: if this test fails, it's PROBABLY because a new invocation type is breaking schema generation
     schema = Graph.schema_json(indent=2)
+
+
+def test_invocations_are_registered_on_definition():
+    invocations_map = BaseInvocation.get_invocations_map()
+    assert invocations_map["test_prompt"] is PromptTestInvocation
+    assert invocations_map["esrgan"] is ESRGANInvocation
+    assert GraphInvocation in BaseInvocation.get_invocations()
+    assert PromptTestInvocation.get_type() == "test_prompt"
+    assert PromptTestInvocation.get_output_type() is PromptTestInvocationOutput
+    assert PromptTestInvocationOutput in BaseInvocationOutput.get_all_subclasses_tuple()
@@ -1,9 +1,10 @@
-from typing import Any, Callable, Literal, Union
+from typing import Any, Callable, ClassVar, List, Literal, Tuple, Union
 from invokeai.app.invocations.baseinvocation import BaseInvocation, BaseInvocationOutput, InvocationContext
 from invokeai.app.invocations.image import ImageField
 from invokeai.app.services.invocation_services import InvocationServices
 from pydantic import Field
 import pytest
+import random
 
 
 # Define test invocations before importing anything that uses invocations
@@ -30,6 +31,7 @@ class PromptTestInvocationOutput(BaseInvocationOutput):
 
 class PromptTestInvocation(BaseInvocation):
     type: Literal["test_prompt"] = "test_prompt"
+    cacheable = True
 
     prompt: str = Field(default="")
 
@@ -37,6 +39,39 @@ class PromptTestInvocation(BaseInvocation):
         return PromptTestInvocationOutput(prompt=self.prompt)
 
 
+class RandomPromptTestInvocation(BaseInvocation):
+    type: Literal["test_random_prompt"] = "test_random_prompt"
+
+    prompt: str = Field(default="")
+
+    def invoke(self, context: InvocationContext) -> PromptTestInvocationOutput:
+        return PromptTestInvocationOutput(prompt=f"{self.prompt} {random.random()}")
+
+
+class CoalescingTestInvocation(BaseInvocation):
+    """Invoked together with the invocations of other sessions that have the same key"""
+
+    type: Literal["test_coalescing"] = "test_coalescing"
+
+    key: str = Field(default="")
+
+    # the sessions of each call, in order
+    batches: ClassVar[List[List[str]]] = []
+
+    def get_coalesce_key(self, context: InvocationContext) -> str:
+        return self.key
+
+    def invoke(self, context: InvocationContext) -> PromptTestInvocationOutput:
+        return self.invoke_coalesced([(self, context)])[0]
+
+    @classmethod
+    def invoke_coalesced(
+        cls, invocations: List[Tuple["CoalescingTestInvocation", InvocationContext]]
+    ) -> List[PromptTestInvocationOutput]:
+        cls.batches.append([context.graph_execution_state_id for _, context in invocations])
+        return [PromptTestInvocationOutput(prompt=invocation.key) for invocation, _ in invocations]
+
+
 class ErrorInvocation(BaseInvocation):
     type: Literal["test_error"] = "test_error"
 
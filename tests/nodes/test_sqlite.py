@@ -131,3 +131,59 @@ def test_sqlite_service_can_search_with_pagination_and_offset():
     assert results.per_page == 2
     assert results.total == 3
     assert results.items == [TestModel(id="3", name="Test")]
+
+
+def test_sqlite_service_can_list_with_cursor():
+    db = SqliteItemStorage[TestModel](sqlite_memory, "test", "id")
+    db.set(TestModel(id="1", name="Test"))
+    db.set(TestModel(id="2", name="Test"))
+    db.set(TestModel(id="3", name="Test"))
+    db.set(TestModel(id="1", name="Updated"))
+    results = db.list(per_page=2)
+    assert results.items == [TestModel(id="1", name="Updated"), TestModel(id="2", name="Test")]
+    assert results.total == 3
+    results = db.list(per_page=2, cursor=results.next_cursor)
+    # the first page has the total, it isn't counted again
+    assert results.total is None
+    assert results.items == [TestModel(id="3", name="Test")]
+    assert results.next_cursor is None
+
+
+def test_sqlite_service_searches_only_search_keys():
+    db = SqliteItemStorage[TestModel](sqlite_memory, "test", "id", search_keys=["name"])
+    db.set(TestModel(id="fox", name="A red fox"))
+    db.set(TestModel(id="2", name="A blue whale"))
+    results = db.search(query="fo")
+    assert results.total == 1
+    assert results.items == [TestModel(id="fox", name="A red fox")]
+    db.delete("fox")
+    assert db.search(query="fox").total == 0
+
+
+def test_sqlite_service_searches_only_search_path():
+    db = SqliteItemStorage[TestModel](sqlite_memory, "test", "id", search_path="$.name")
+    db.set(TestModel(id="fox", name="A red fox"))
+    db.set(TestModel(id="whale", name="A blue fox"))
+    assert db.search(query="whale").total == 0
+    db.set(TestModel(id="whale", name="A blue whale"))
+    assert db.search(query="whale").items == [TestModel(id="whale", name="A blue whale")]
+    assert db.search(query="fox").items == [TestModel(id="fox", name="A red fox")]
+
+
+def test_sqlite_service_reindexes_updated_items():
+    db = SqliteItemStorage[TestModel](sqlite_memory, "test", "id", search_keys=["name"])
+    db.set(TestModel(id="1", name="A red fox"))
+    db.set(TestModel(id="1", name="A blue whale"))
+    assert db.search(query="fox").total == 0
+    assert db.search(query="whale").items == [TestModel(id="1", name="A blue whale")]
+
+
+def test_sqlite_service_rebuilds_index_when_search_keys_change(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    db = SqliteItemStorage[TestModel](db_path, "test", "id", search_keys=["name"])
+    db.set(TestModel(id="whale", name="A red fox"))
+    assert db.search(query="whale").total == 0
+
+    db = SqliteItemStorage[TestModel](db_path, "test", "id", search_keys=["id"])
+    assert db.search(query="whale").items == [TestModel(id="whale", name="A red fox")]
+    assert db.search(query="fox").total == 0
@@ -0,0 +1,78 @@
+import pytest
+import torch
+from diffusers import AutoencoderKL, DDIMScheduler, UNet2DConditionModel
+
+from invokeai.backend.stable_diffusion.diffusers_pipeline import ConditioningData, StableDiffusionGeneratorPipeline
+
+EMBEDDING_DIM = 32
+STEPS = 5
+
+
+@pytest.fixture
+def pipeline() -> StableDiffusionGeneratorPipeline:
+    torch.manual_seed(0)
+    unet = UNet2DConditionModel(
+        sample_size=8,
+        layers_per_block=1,
+        block_out_channels=(32, 64),
+        down_block_types=("CrossAttnDownBlock2D", "DownBlock2D"),
+        up_block_types=("UpBlock2D", "CrossAttnUpBlock2D"),
+        cross_attention_dim=EMBEDDING_DIM,
+    ).eval()
+    return StableDiffusionGeneratorPipeline(
+        vae=AutoencoderKL(),
+        text_encoder=None,
+        tokenizer=None,
+        unet=unet,
+        scheduler=DDIMScheduler(),
+        safety_checker=None,
+        feature_extractor=None,
+    )
+
+
+@pytest.fixture
+def conditioning_data() -> ConditioningData:
+    return ConditioningData(
+        unconditioned_embeddings=torch.randn(1, 77, EMBEDDING_DIM),
+        text_embeddings=torch.randn(1, 77, EMBEDDING_DIM),
+        guidance_scale=7.5,
+    )
+
+
+def denoise(pipeline, conditioning_data, noise: torch.Tensor) -> torch.Tensor:
+    latents, _ = pipeline.latents_from_embeddings(
+        latents=torch.zeros_like(noise),
+        num_inference_steps=STEPS,
+        conditioning_data=conditioning_data,
+        noise=noise,
+    )
+    return latents
+
+
+def test_batched_denoise_matches_single(pipeline, conditioning_data):
+    noise = torch.randn(4, 4, 8, 8)
+
+    batched = denoise(pipeline, conditioning_data, noise)
+    single = torch.cat([denoise(pipeline, conditioning_data, n) for n in noise.split(1)])
+
+    assert batched.shape == noise.shape
+    assert torch.allclose(batched, single, atol=1e-4)
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_denoise_runs_the_unet_once_per_step_for_each_batch(pipeline, conditioning_data, batch_size, monkeypatch):
+    images = 8
+    unet_batches = list()
+    forward = pipeline.unet.forward
+
+    def counting_forward(sample, *args, **kwargs):
+        unet_batches.append(sample.shape[0])
+        return forward(sample, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline.unet, "forward", counting_forward)
+
+    for noise_batch in torch.randn(images, 4, 8, 8).split(batch_size):
+        denoise(pipeline, conditioning_data, noise_batch)
+
+    # the unconditioned and conditioned latents of the whole batch go through the unet together
+    assert unet_batches == [2 * batch_size] * (images // batch_size * STEPS)
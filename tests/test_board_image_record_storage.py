@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+from invokeai.app.models.image import ImageCategory, ResourceOrigin
+from invokeai.app.services.board_image_record_storage import BoardImageSummary, SqliteBoardImageRecordStorage
+from invokeai.app.services.board_record_storage import SqliteBoardRecordStorage
+from invokeai.app.services.image_record_storage import SqliteImageRecordStorage
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    return str(tmp_path / "invokeai.db")
+
+
+@pytest.fixture
+def images(db_path) -> SqliteImageRecordStorage:
+    storage = SqliteImageRecordStorage(db_path)
+    for image_name in ["a.png", "b.png", "c.png", "d.png"]:
+        storage.save(image_name, ResourceOrigin.INTERNAL, ImageCategory.GENERAL, None, 64, 64, None, None)
+    return storage
+
+
+@pytest.fixture
+def boards(db_path, images) -> list[str]:
+    storage = SqliteBoardRecordStorage(db_path)
+    return [storage.save(name).board_id for name in ["first", "second", "empty"]]
+
+
+@pytest.fixture
+def board_images(db_path, boards) -> SqliteBoardImageRecordStorage:
+    return SqliteBoardImageRecordStorage(db_path)
+
+
+def set_created_at(db_path: str, image_name: str, created_at: str):
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE images SET created_at = ? WHERE image_name = ?;", (created_at, image_name))
+    conn.commit()
+    conn.close()
+
+
+def get_counts(board_images: SqliteBoardImageRecordStorage, boards: list[str]) -> list[int]:
+    counts = [board_images.get_image_count_for_board(board_id) for board_id in boards]
+    summaries = board_images.get_board_summaries(boards)
+    assert [summaries[b].image_count if b in summaries else 0 for b in boards] == counts
+    return counts
+
+
+def test_image_counts_follow_adds_removes_moves_and_deletes(images, boards, board_images):
+    first, second, _ = boards
+
+    board_images.add_image_to_board(first, "a.png")
+    board_images.add_images_to_board(first, ["b.png", "c.png"])
+    assert get_counts(board_images, boards) == [3, 0, 0]
+
+    # adding an image to the board it is already on changes nothing
+    board_images.add_image_to_board(first, "a.png")
+    assert get_counts(board_images, boards) == [3, 0, 0]
+
+    board_images.remove_image_from_board(first, "c.png")
+    assert get_counts(board_images, boards) == [2, 0, 0]
+
+    # moving an image to another board
+    board_images.add_image_to_board(second, "b.png")
+    assert get_counts(board_images, boards) == [1, 1, 0]
+
+    images.delete_many(["a.png"])
+    assert get_counts(board_images, boards) == [0, 1, 0]
+    images.restore_many(["a.png"])
+    assert get_counts(board_images, boards) == [1, 1, 0]
+
+    # a deleted image that is moved or removed is not counted out twice
+    images.delete_many(["b.png"])
+    board_images.add_image_to_board(first, "b.png")
+    assert get_counts(board_images, boards) == [1, 0, 0]
+    images.purge(["b.png"])
+    assert get_counts(board_images, boards) == [1, 0, 0]
+
+    board_images.remove_images_from_board(["a.png"])
+    assert get_counts(board_images, boards) == [0, 0, 0]
+
+
+def test_summaries_have_the_latest_image_of_each_board_as_cover(db_path, images, boards, board_images):
+    first, second, empty = boards
+    for i, image_name in enumerate(["a.png", "b.png", "c.png", "d.png"]):
+        set_created_at(db_path, image_name, f"2023-01-0{i + 1} 00:00:00.000")
+    board_images.add_images_to_board(first, ["b.png", "a.png"])
+    board_images.add_images_to_board(second, ["c.png", "d.png"])
+
+    assert board_images.get_board_summaries() == {
+        first: BoardImageSummary(cover_image_name="b.png", image_count=2),
+        second: BoardImageSummary(cover_image_name="d.png", image_count=2),
+    }
+    assert board_images.get_board_summaries([second, empty]) == {
+        second: BoardImageSummary(cover_image_name="d.png", image_count=2),
+    }
+
+    # a deleted image is not the cover, a board without images has no summary
+    images.delete_many(["b.png", "c.png", "d.png"])
+    assert board_images.get_board_summaries() == {
+        first: BoardImageSummary(cover_image_name="a.png", image_count=1),
+    }
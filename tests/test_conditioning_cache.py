@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from invokeai.app.invocations.compel import CompelInvocation, get_conditioning_cache_name
+from invokeai.app.invocations.model import ClipField, ModelInfo
+from invokeai.backend.model_management import BaseModelType, ModelType, SubModelType
+from invokeai.backend.model_management.models import ModelNotFoundException
+
+
+class FakeModelManager:
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def get_model_hash(self, model_name, base_model, model_type, submodel=None):
+        if model_name not in self.hashes:
+            raise ModelNotFoundException(model_name)
+        return self.hashes[model_name]
+
+
+def get_name(hashes):
+    clip = ClipField(
+        tokenizer=ModelInfo(
+            model_name="sd-1",
+            base_model=BaseModelType.StableDiffusion1,
+            model_type=ModelType.Main,
+            submodel=SubModelType.Tokenizer,
+        ),
+        text_encoder=ModelInfo(
+            model_name="sd-1",
+            base_model=BaseModelType.StableDiffusion1,
+            model_type=ModelType.Main,
+            submodel=SubModelType.TextEncoder,
+        ),
+        skipped_layers=0,
+        loras=[],
+    )
+    invocation = CompelInvocation(id="1", prompt="a photo of <my-ti>", clip=clip)
+    context = SimpleNamespace(
+        services=SimpleNamespace(model_manager=FakeModelManager(hashes)), graph_execution_state_id="session"
+    )
+    return get_conditioning_cache_name(context, invocation, [(invocation.clip, invocation.prompt)])
+
+
+def test_conditioning_cache_name_covers_model_contents():
+    name = get_name({"sd-1": "blake3:a"})
+
+    assert name.startswith("conditioning_")
+    assert get_name({"sd-1": "blake3:a"}) == name
+    # installing the textual inversion the prompt triggers, or replacing it or the model
+    assert get_name({"sd-1": "blake3:a", "my-ti": "blake3:b"}) != name
+    assert get_name({"sd-1": "blake3:a", "my-ti": "blake3:c"}) != get_name({"sd-1": "blake3:a", "my-ti": "blake3:b"})
+    assert get_name({"sd-1": "blake3:d"}) != name
+    # models still being hashed are not cached across sessions
+    assert get_name({"sd-1": None}) == "session_1_conditioning"
@@ -0,0 +1,26 @@
+import torch
+from safetensors.torch import save_file
+
+from invokeai.backend.model_management.convert_ckpt_to_diffusers import LazySafetensorsDict
+
+
+def test_lazy_state_dict_reads_tensors_on_lookup(tmp_path):
+    path = tmp_path / "model.safetensors"
+    save_file(
+        {
+            "model.diffusion_model.time_embed.0.weight": torch.ones(2, 2),
+            "first_stage_model.encoder.conv_in.weight": torch.zeros(3),
+        },
+        str(path),
+    )
+
+    checkpoint = LazySafetensorsDict(path)
+    assert "first_stage_model.encoder.conv_in.weight" in checkpoint
+    assert len(checkpoint) == 2
+
+    unet_weight = checkpoint.pop("model.diffusion_model.time_embed.0.weight")
+    assert torch.equal(unet_weight, torch.ones(2, 2))
+    assert list(checkpoint.keys()) == ["first_stage_model.encoder.conv_in.weight"]
+
+    checkpoint["first_stage_model.encoder.conv_in.weight"] = torch.ones(3)
+    assert torch.equal(checkpoint["first_stage_model.encoder.conv_in.weight"], torch.ones(3))
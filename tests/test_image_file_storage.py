@@ -0,0 +1,33 @@
+import io
+
+from PIL import Image
+
+from invokeai.app.services.image_file_storage import DiskImageFileStorage
+
+
+def test_save_file_stores_png_as_is(tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 320), "red").save(buffer, "PNG")
+    buffer.seek(0)
+
+    storage = DiskImageFileStorage(tmp_path)
+    storage.save_file(buffer, "image.png")
+
+    assert (tmp_path / "image.png").read_bytes() == buffer.getvalue()
+    with Image.open(storage.get_path("image.png", thumbnail=True)) as thumbnail:
+        assert max(thumbnail.size) == 256
+
+
+def test_sized_thumbnails_are_made_once_and_evicted(tmp_path):
+    storage = DiskImageFileStorage(tmp_path, max_sized_thumbnails_size=1)
+    for image_name in ["a.png", "b.png"]:
+        Image.new("RGB", (640, 320), "blue").save(tmp_path / image_name, "PNG")
+
+    path = storage.get_sized_thumbnail_path("a.png", 64)
+    with Image.open(path) as thumbnail:
+        assert thumbnail.size == (64, 32)
+    assert storage.get_sized_thumbnail_path("a.png", 64) == path
+
+    other_path = storage.get_sized_thumbnail_path("b.png", 64)
+    assert other_path.exists()
+    assert not path.exists()
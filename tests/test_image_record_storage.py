@@ -0,0 +1,30 @@
+import pytest
+
+from invokeai.app.models.image import ImageCategory, ResourceOrigin
+from invokeai.app.services.board_image_record_storage import SqliteBoardImageRecordStorage
+from invokeai.app.services.board_record_storage import SqliteBoardRecordStorage
+from invokeai.app.services.image_record_storage import ImageRecordNotFoundException, SqliteImageRecordStorage
+
+
+def test_deleted_images_are_hidden_until_restored_or_purged(tmp_path):
+    db_path = str(tmp_path / "invokeai.db")
+    storage = SqliteImageRecordStorage(db_path)
+    # the images are listed and purged along with their board images, set up as the app does
+    SqliteBoardRecordStorage(db_path)
+    SqliteBoardImageRecordStorage(db_path)
+    for image_name in ["a.png", "b.png", "c.png"]:
+        storage.save(image_name, ResourceOrigin.INTERNAL, ImageCategory.GENERAL, None, 64, 64, None, None)
+
+    storage.delete_many(["a.png", "b.png"])
+
+    with pytest.raises(ImageRecordNotFoundException):
+        storage.get("a.png")
+    assert [r.image_name for r in storage.get_many(0, 10).items] == ["c.png"]
+    assert storage.get_deleted(3600, 10) == []
+
+    assert storage.restore_many(["a.png", "c.png"]) == ["a.png"]
+    assert storage.get_deleted(0, 10) == ["b.png"]
+
+    assert storage.purge(["a.png", "b.png"]) == ["b.png"]
+    assert storage.restore_many(["b.png"]) == []
+    assert sorted(r.image_name for r in storage.get_many(0, 10).items) == ["a.png", "c.png"]
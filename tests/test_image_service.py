@@ -0,0 +1,93 @@
+import io
+import logging
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from invokeai.app.models.image import ImageCategory, InvalidImageException, ResourceOrigin
+from invokeai.app.services.board_image_record_storage import SqliteBoardImageRecordStorage
+from invokeai.app.services.board_record_storage import SqliteBoardRecordStorage
+from invokeai.app.services.image_file_storage import DiskImageFileStorage, ImageFileSaveException
+from invokeai.app.services.image_record_storage import SqliteImageRecordStorage
+from invokeai.app.services.images import ImageService, ImageServiceDependencies
+from invokeai.app.services.resource_name import SimpleNameService
+from invokeai.app.services.urls import LocalUrlService
+
+
+@pytest.fixture
+def image_service(tmp_path) -> ImageService:
+    db_path = str(tmp_path / "invokeai.db")
+    image_records = SqliteImageRecordStorage(db_path)
+    SqliteBoardRecordStorage(db_path)
+    return ImageService(
+        ImageServiceDependencies(
+            image_record_storage=image_records,
+            image_file_storage=DiskImageFileStorage(tmp_path / "outputs"),
+            board_image_record_storage=SqliteBoardImageRecordStorage(db_path),
+            url=LocalUrlService(),
+            logger=logging.getLogger(__name__),
+            names=SimpleNameService(),
+            graph_execution_manager=None,  # type: ignore
+        )
+    )
+
+
+def png_with_corrupt_data() -> io.BytesIO:
+    """A PNG whose chunks are all well formed, but whose image data does not decompress"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buffer, "PNG")
+    data = buffer.getvalue()
+    start = data.index(b"IDAT") - 4
+    (length,) = struct.unpack(">I", data[start : start + 4])
+    garbage = bytes(i % 251 for i in range(length))
+    chunk = struct.pack(">I", length) + b"IDAT" + garbage + struct.pack(">I", zlib.crc32(b"IDAT" + garbage))
+    return io.BytesIO(data[:start] + chunk + data[start + 12 + length :])
+
+
+def count_records(image_service: ImageService) -> int:
+    return image_service._services.image_records.get_many(0, 10).total
+
+
+def test_corrupt_png_upload_is_rejected_before_it_is_stored(image_service):
+    with pytest.raises(InvalidImageException):
+        image_service.create_from_file(png_with_corrupt_data(), ResourceOrigin.EXTERNAL, ImageCategory.USER)
+    assert count_records(image_service) == 0
+
+
+def test_record_is_removed_when_the_file_cannot_be_saved(image_service, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ImageFileSaveException
+
+    monkeypatch.setattr(image_service._services.image_files, "save_file", fail)
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buffer, "PNG")
+    buffer.seek(0)
+
+    with pytest.raises(ImageFileSaveException):
+        image_service.create_from_file(buffer, ResourceOrigin.EXTERNAL, ImageCategory.USER)
+    assert count_records(image_service) == 0
+    assert image_service._services.image_records.get_deleted(0, 10) == []
+
+
+def test_image_restored_during_purge_keeps_its_file(image_service, monkeypatch):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buffer, "PNG")
+    buffer.seek(0)
+    image_name = image_service.create_from_file(buffer, ResourceOrigin.EXTERNAL, ImageCategory.USER).image_name
+    image_service.delete(image_name)
+
+    image_records = image_service._services.image_records
+    get_deleted = image_records.get_deleted
+
+    def get_deleted_then_restore(*args, **kwargs):
+        image_names = get_deleted(*args, **kwargs)
+        image_service.restore_many(image_names)
+        return image_names
+
+    monkeypatch.setattr(image_records, "get_deleted", get_deleted_then_restore)
+
+    assert image_service.purge_deleted(0, 10) == 0
+    assert image_records.get(image_name).image_name == image_name
+    assert image_service.validate_path(image_service.get_path(image_name))
@@ -0,0 +1,50 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Packages that are only needed while a node actually runs. Importing the invocations
+# (as the API and the CLI do at startup) must not pull any of them in.
+DEFERRED_MODULES = [
+    "basicsr",
+    "controlnet_aux",
+    "cv2",
+    "dynamicprompts",
+    "imwatermark",
+    "matplotlib",
+    "mediapipe",
+    "realesrgan",
+]
+
+# The model stack, which takes most of the startup time
+HEAVY_MODULES = ["torch", "diffusers", "transformers"]
+
+# Modules that don't need the model stack, e.g. to read the configuration or the database
+LIGHTWEIGHT_MODULES = [
+    "invokeai.version",
+    "invokeai.app.services.config",
+    "invokeai.app.services.item_storage",
+    "invokeai.app.services.sqlite",
+]
+
+
+def loaded_after_import(statement: str, modules: list[str]) -> list[str]:
+    """Runs the import statement in a fresh interpreter, returns which of the modules it loaded"""
+    script = f"import json, sys\n{statement}\nprint(json.dumps([m for m in {modules!r} if m in sys.modules]))"
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_invocations_do_not_import_deferred_modules():
+    assert loaded_after_import("from invokeai.app.invocations import *", DEFERRED_MODULES) == []
+
+
+@pytest.mark.parametrize("module", LIGHTWEIGHT_MODULES)
+def test_lightweight_modules_do_not_import_the_model_stack(module):
+    assert loaded_after_import(f"import {module}", HEAVY_MODULES) == []
@@ -0,0 +1,22 @@
+from invokeai.app.services.invocation_stats import InvocationStatsService
+
+
+def test_coalesced_run_is_shared_by_its_sessions():
+    stats = InvocationStatsService()
+    with stats.collect_stats("denoise_latents", ["a", "b"]):
+        pass
+    with stats.collect_stats("compel", ["a"]):
+        pass
+    stats.record_queue_wait("a", 2.0)
+
+    node_stats = stats.get_node_stats()
+    assert node_stats["denoise_latents"].invocations == 2
+    assert node_stats["compel"].invocations == 1
+    assert node_stats["compel"].peak_rss_bytes > 0
+
+    session_stats = stats.pop_session_stats("a")
+    assert session_stats.nodes["denoise_latents"].invocations == 1
+    assert session_stats.nodes["denoise_latents"].seconds * 2 == node_stats["denoise_latents"].seconds
+    assert session_stats.queue_wait.seconds == 2.0
+    assert stats.pop_session_stats("a") is None
+    assert stats.get_queue_wait_stats().count == 1
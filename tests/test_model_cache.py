@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from invokeai.backend.model_management.model_cache import GIG, ModelCache
+from invokeai.backend.model_management.models import BaseModelType, ModelBase, ModelType
+from invokeai.backend.model_management.models.base import classproperty
+
+
+class FakeModel(ModelBase):
+    """A model as large as its file"""
+
+    loads = []
+
+    @classmethod
+    def detect_format(cls, path: str) -> str:
+        return "fake"
+
+    @classproperty
+    def save_to_config(cls) -> bool:
+        return False
+
+    def get_size(self, child_type=None) -> int:
+        return os.path.getsize(self.model_path)
+
+    def get_model(self, torch_dtype, child_type=None):
+        FakeModel.loads.append(self.model_path)
+        return object()
+
+
+@pytest.fixture
+def cache() -> ModelCache:
+    FakeModel.loads = []
+    # room for three of the models
+    return ModelCache(max_cache_size=3000 / GIG, lazy_offloading=False)
+
+
+@pytest.fixture
+def model_paths(tmp_path):
+    paths = []
+    for name in ["a", "b", "c", "d"]:
+        path = tmp_path / f"{name}.bin"
+        path.write_bytes(bytes(1000))
+        paths.append(path)
+    return paths
+
+
+def get_model(cache: ModelCache, path):
+    cache.get_model(path, FakeModel, BaseModelType.StableDiffusion1, ModelType.Main)
+
+
+def prefetch_model(cache: ModelCache, path):
+    return cache.prefetch_model(path, FakeModel, BaseModelType.StableDiffusion1, ModelType.Main)
+
+
+def test_prefetched_model_is_used_by_get_model(cache, model_paths):
+    assert prefetch_model(cache, model_paths[0]) is not None
+    get_model(cache, model_paths[0])
+
+    assert FakeModel.loads == [model_paths[0]]
+    stats = cache.get_prefetch_stats()
+    assert (stats.hits, stats.wasted, stats.bytes) == (1, 0, 1000)
+
+
+def test_prefetch_only_loads_models_that_fit(cache, model_paths):
+    for path in model_paths[:3]:
+        get_model(cache, path)
+
+    assert prefetch_model(cache, model_paths[3]) is None
+    assert FakeModel.loads == model_paths[:3]
+    # nothing was evicted to make room
+    for path in model_paths[:3]:
+        get_model(cache, path)
+    assert FakeModel.loads == model_paths[:3]
+    assert cache.get_prefetch_stats().bytes == 0
+
+
+def test_prefetch_of_cached_model_loads_nothing(cache, model_paths):
+    get_model(cache, model_paths[0])
+
+    assert prefetch_model(cache, model_paths[0]) is not None
+    assert FakeModel.loads == [model_paths[0]]
+    assert cache.get_prefetch_stats().bytes == 0
+
+
+def test_prefetched_model_evicted_before_use_is_wasted(cache, model_paths):
+    prefetch_model(cache, model_paths[0])
+    for path in model_paths[1:]:
+        get_model(cache, path)
+
+    stats = cache.get_prefetch_stats()
+    assert (stats.hits, stats.wasted) == (0, 1)
+
+
+class FakeCheckpointModel(FakeModel):
+    """A model built from a checkpoint and its original config"""
+
+    def __init__(self, model_path, base_model, model_type, checkpoint_config=None):
+        super().__init__(model_path, base_model, model_type)
+        self.checkpoint_config = checkpoint_config
+
+    def get_model(self, torch_dtype, child_type=None):
+        return self.checkpoint_config
+
+
+def test_checkpoint_config_is_passed_to_the_model(cache, model_paths):
+    with cache.get_model(
+        model_paths[0],
+        FakeCheckpointModel,
+        BaseModelType.StableDiffusion1,
+        ModelType.Main,
+        checkpoint_config="v1-inference.yaml",
+    ) as model:
+        assert model == "v1-inference.yaml"
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from invokeai.backend.model_management import model_hash
+from invokeai.backend.model_management.model_hash import ModelHashIndex
+
+
+@pytest.fixture
+def index(tmp_path) -> ModelHashIndex:
+    return ModelHashIndex(tmp_path / "model_hashes.db")
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(os.urandom(1024))
+    return path
+
+
+def count_hashes(monkeypatch) -> list:
+    calls = []
+    fast_file_hash = model_hash.fast_file_hash
+
+    def counting_hash(path, *args, **kwargs):
+        calls.append(path)
+        return fast_file_hash(path, *args, **kwargs)
+
+    monkeypatch.setattr(model_hash, "fast_file_hash", counting_hash)
+    return calls
+
+
+def test_unchanged_file_is_hashed_once(tmp_path, checkpoint, monkeypatch):
+    calls = count_hashes(monkeypatch)
+
+    first = ModelHashIndex(tmp_path / "model_hashes.db").get_hash(checkpoint, wait=True)
+    # a new index on the same database, as after a restart
+    second = ModelHashIndex(tmp_path / "model_hashes.db").get_hash(checkpoint, wait=True)
+
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_changed_file_is_hashed_again(index, checkpoint):
+    first = index.get_hash(checkpoint, wait=True)
+    checkpoint.write_bytes(os.urandom(2048))
+
+    assert index.get_hash(checkpoint, wait=True) != first
+
+
+def test_folder_hash_covers_weights_files(index, tmp_path):
+    folder = tmp_path / "pipeline"
+    (folder / "unet").mkdir(parents=True)
+    (folder / "unet" / "diffusion_pytorch_model.safetensors").write_bytes(os.urandom(1024))
+    (folder / "model_index.json").write_text("{}")
+    first = index.get_hash(folder, wait=True)
+
+    (folder / "model_index.json").write_text('{"changed": true}')
+    assert index.get_hash(folder, wait=True) == first
+
+    (folder / "unet" / "diffusion_pytorch_model.safetensors").write_bytes(os.urandom(2048))
+    assert index.get_hash(folder, wait=True) != first
+
+
+def test_scan_result_is_dropped_when_file_changes(index, checkpoint):
+    index.set_scanned(checkpoint)
+    assert index.is_scanned(checkpoint)
+
+    checkpoint.write_bytes(os.urandom(2048))
+    assert not index.is_scanned(checkpoint)
+
+
+def test_scan_result_follows_the_contents(index, checkpoint, tmp_path):
+    index.set_scanned(checkpoint)
+    copy = tmp_path / "copy.safetensors"
+    copy.write_bytes(checkpoint.read_bytes())
+    assert index.is_scanned(copy)
+
+
+def test_unchanged_scanned_file_is_not_hashed_again(index, checkpoint, monkeypatch):
+    index.set_scanned(checkpoint)
+    calls = count_hashes(monkeypatch)
+
+    assert index.is_scanned(checkpoint)
+    assert index.is_scanned(checkpoint)
+    assert calls == []
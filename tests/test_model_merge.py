@@ -0,0 +1,38 @@
+import json
+
+import torch
+from safetensors.torch import load_file, save_file
+
+from invokeai.backend.model_management.model_merge import MergeInterpolationMethod, ModelMerger
+
+
+def make_model(path, weight: float):
+    (path / "unet").mkdir(parents=True)
+    (path / "model_index.json").write_text(json.dumps({"_diffusers_version": "0.19.0", "unet": ["diffusers", "UNet"]}))
+    (path / "unet" / "config.json").write_text("{}")
+    save_file(
+        {
+            "conv_in.weight": torch.full((2, 3), weight),
+            "position_ids": torch.arange(4),
+        },
+        str(path / "unet" / "diffusion_pytorch_model.safetensors"),
+    )
+
+
+def test_merges_one_tensor_at_a_time(tmp_path):
+    make_model(tmp_path / "a", 1.0)
+    make_model(tmp_path / "b", 3.0)
+
+    merged = ModelMerger(None).merge_diffusion_models_to_path(
+        [tmp_path / "a", tmp_path / "b"],
+        tmp_path / "merged",
+        alpha=0.25,
+        interp=MergeInterpolationMethod.WeightedSum,
+        fp16=True,
+    )
+
+    assert (merged / "unet" / "config.json").exists()
+    assert sorted(p.name for p in (merged / "unet").iterdir()) == ["config.json", "diffusion_pytorch_model.safetensors"]
+    weights = load_file(str(merged / "unet" / "diffusion_pytorch_model.safetensors"))
+    assert torch.equal(weights["conv_in.weight"], torch.full((2, 3), 1.5, dtype=torch.float16))
+    assert torch.equal(weights["position_ids"], torch.arange(4))
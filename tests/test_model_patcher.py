@@ -0,0 +1,117 @@
+import json
+
+import pytest
+import torch
+from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+from invokeai.backend.model_management import lora
+from invokeai.backend.model_management.lora import ModelPatcher, TextualInversionModel
+
+EMBEDDING_DIM = 32
+
+
+@pytest.fixture
+def tokenizer(tmp_path) -> CLIPTokenizer:
+    words = ["a", "photo", "of", "cat", "dog", "in", "style"]
+    vocab = dict()
+    for word in words:
+        vocab[word] = len(vocab)
+        vocab[word + "</w>"] = len(vocab)
+    for special in ["<|startoftext|>", "<|endoftext|>"]:
+        vocab[special] = len(vocab)
+
+    vocab_file = tmp_path / "vocab.json"
+    merges_file = tmp_path / "merges.txt"
+    vocab_file.write_text(json.dumps(vocab))
+    merges_file.write_text("#version: 0.2\n")
+    return CLIPTokenizer(vocab_file.as_posix(), merges_file.as_posix())
+
+
+@pytest.fixture
+def text_encoder(tokenizer) -> CLIPTextModel:
+    config = CLIPTextConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=EMBEDDING_DIM,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        max_position_embeddings=77,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.eos_token_id,
+    )
+    return CLIPTextModel(config).eval()
+
+
+def make_ti(name: str, vectors: int = 1) -> TextualInversionModel:
+    ti = TextualInversionModel()
+    ti.name = name
+    ti.embedding = torch.randn(vectors, EMBEDDING_DIM)
+    return ti
+
+
+def encode(tokenizer, text_encoder, prompt: str) -> torch.Tensor:
+    input_ids = tokenizer(prompt, padding="max_length", max_length=16, truncation=True, return_tensors="pt").input_ids
+    with torch.no_grad():
+        return text_encoder(input_ids).last_hidden_state
+
+
+def test_apply_ti_embeds_trigger(tokenizer, text_encoder):
+    ti = make_ti("sks", vectors=2)
+    original_embeddings = text_encoder.get_input_embeddings()
+
+    with ModelPatcher.apply_ti(tokenizer, text_encoder, [ti]) as (ti_tokenizer, ti_manager):
+        assert len(tokenizer) == original_embeddings.num_embeddings
+        token_id = ti_tokenizer.convert_tokens_to_ids("<sks>")
+        pad_id = ti_tokenizer.convert_tokens_to_ids("<sks-!pad-1>")
+        assert ti_manager.pad_tokens[token_id] == [pad_id]
+
+        embeds = text_encoder.get_input_embeddings()(torch.tensor([[0, token_id, pad_id]]))
+        assert torch.equal(embeds[0, 0], original_embeddings.weight[0])
+        assert torch.equal(embeds[0, 1], ti.embedding[0])
+        assert torch.equal(embeds[0, 2], ti.embedding[1])
+
+    assert text_encoder.get_input_embeddings() is original_embeddings
+
+
+def test_apply_ti_reuses_cached_tokenizer(tokenizer, text_encoder):
+    ti_list = [make_ti(f"ti{i}") for i in range(3)]
+
+    with ModelPatcher.apply_ti(tokenizer, text_encoder, ti_list) as (first_tokenizer, _):
+        pass
+    with ModelPatcher.apply_ti(tokenizer, text_encoder, ti_list) as (second_tokenizer, _):
+        pass
+    with ModelPatcher.apply_ti(tokenizer, text_encoder, ti_list[:2]) as (other_tokenizer, _):
+        pass
+
+    assert first_tokenizer is second_tokenizer
+    assert other_tokenizer is not first_tokenizer
+    assert len(other_tokenizer) == len(tokenizer) + 2
+
+
+@pytest.mark.parametrize("embeddings_count", [0, 5, 50])
+def test_repeated_prompt_encode_patches_once(tokenizer, text_encoder, embeddings_count, monkeypatch):
+    ti_list = [make_ti(f"ti{i}") for i in range(embeddings_count)]
+    prompt = "a photo of cat " + " ".join(f"<{ti.name}>" for ti in ti_list[:5])
+    original_weight = text_encoder.get_input_embeddings().weight
+
+    builds = list()
+    build = lora._TICacheEntry.build
+
+    def counting_build(*args, **kwargs):
+        builds.append(args)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(lora._TICacheEntry, "build", counting_build)
+
+    results = list()
+    for _ in range(5):
+        with ModelPatcher.apply_ti(tokenizer, text_encoder, ti_list) as (ti_tokenizer, _):
+            results.append(encode(ti_tokenizer, text_encoder, prompt))
+
+    # the tokenizer and embedding table are built on the first encode and reused after that,
+    # prompts without textual inversions aren't patched at all
+    assert len(builds) == (1 if embeddings_count else 0)
+    assert all(torch.equal(result, results[0]) for result in results)
+    assert text_encoder.get_input_embeddings().weight is original_weight
+    assert original_weight.shape[0] == len(tokenizer)
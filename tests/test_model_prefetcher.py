@@ -0,0 +1,57 @@
+from threading import Event
+from types import SimpleNamespace
+
+from invokeai.app.invocations.model import ModelInfo
+from invokeai.app.services.model_prefetcher import ModelPrefetcher
+from invokeai.backend.model_management.model_cache import PrefetchStats
+from invokeai.backend.model_management.models import BaseModelType, ModelType, SubModelType
+
+
+def model_info(name: str, submodel: SubModelType) -> ModelInfo:
+    return ModelInfo(
+        model_name=name, base_model=BaseModelType.StableDiffusion1, model_type=ModelType.Main, submodel=submodel
+    )
+
+
+class FakeModelManager:
+    def __init__(self, expected_calls: int):
+        self.prefetched = []
+        self.expected_calls = expected_calls
+        self.done = Event()
+
+    def prefetch_model(self, model_name, base_model, model_type, submodel=None):
+        self.prefetched.append((model_name, submodel))
+        return True
+
+    def get_prefetch_stats(self) -> PrefetchStats:
+        if len(self.prefetched) >= self.expected_calls:
+            self.done.set()
+        return PrefetchStats()
+
+
+def session(models, complete=False):
+    node = SimpleNamespace(get_required_models=lambda: models)
+    return SimpleNamespace(is_complete=lambda: complete, graph=SimpleNamespace(nodes={"1": node}))
+
+
+def test_prefetches_models_of_sessions_in_order():
+    sessions = {
+        "first": session([model_info("a", SubModelType.UNet), model_info("a", SubModelType.TextEncoder)]),
+        "done": session([model_info("c", SubModelType.UNet)], complete=True),
+        "second": session([model_info("b", SubModelType.UNet), model_info("a", SubModelType.UNet)]),
+    }
+    model_manager = FakeModelManager(expected_calls=3)
+    services = SimpleNamespace(
+        model_manager=model_manager, graph_execution_manager=SimpleNamespace(get=lambda id: sessions[id])
+    )
+    prefetcher = ModelPrefetcher(services)  # type: ignore
+    prefetcher.request(["first", "done", "second"])
+    assert model_manager.done.wait(timeout=5)
+    prefetcher.stop()
+
+    # a model needed by more than one session is only prefetched once, completed sessions are skipped
+    assert model_manager.prefetched == [
+        ("a", SubModelType.UNet),
+        ("a", SubModelType.TextEncoder),
+        ("b", SubModelType.UNet),
+    ]
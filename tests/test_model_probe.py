@@ -0,0 +1,53 @@
+import pytest
+import torch
+from safetensors.torch import save_file
+
+from invokeai.backend.model_management import model_hash
+from invokeai.backend.model_management.model_hash import ModelHashIndex
+from invokeai.backend.model_management.model_probe import ModelProbe
+from invokeai.backend.model_management.models import BaseModelType, ModelType
+
+
+@pytest.fixture(autouse=True)
+def hash_index(tmp_path, monkeypatch) -> ModelHashIndex:
+    index = ModelHashIndex(tmp_path / "model_hashes.db")
+    monkeypatch.setattr(model_hash, "_model_hash_index", index)
+    return index
+
+
+@pytest.fixture
+def no_torch_load(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("the checkpoint should not have been loaded")
+
+    monkeypatch.setattr(torch, "load", fail)
+
+
+def test_probes_safetensors_lora_from_header(tmp_path, no_torch_load):
+    path = tmp_path / "lora.safetensors"
+    save_file(
+        {
+            "lora_te_text_model_encoder_layers_0_mlp_fc1.lora_down.weight": torch.zeros(4, 1024),
+            "lora_te_text_model_encoder_layers_0_mlp_fc1.lora_up.weight": torch.zeros(3072, 4),
+        },
+        str(path),
+    )
+
+    info = ModelProbe.probe(path)
+    assert info.model_type == ModelType.Lora
+    assert info.base_type == BaseModelType.StableDiffusion2
+
+
+def test_pickled_embedding_is_loaded_once(tmp_path, monkeypatch):
+    path = tmp_path / "embedding.pt"
+    torch.save({"string_to_token": {"*": torch.tensor(265)}, "string_to_param": {"*": torch.zeros(2, 768)}}, path)
+
+    info = ModelProbe.probe(path)
+    assert info.model_type == ModelType.TextualInversion
+    assert info.base_type == BaseModelType.StableDiffusion1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("an unchanged checkpoint should not be loaded again")
+
+    monkeypatch.setattr(torch, "load", fail)
+    assert ModelProbe.probe(path) == info
@@ -0,0 +1,91 @@
+import os
+from pathlib import Path
+from typing import List
+
+from invokeai.backend.model_management import model_search
+from invokeai.backend.model_management.model_search import ModelSearch
+
+
+class RecordModels(ModelSearch):
+    def on_search_started(self):
+        self.found: List[Path] = list()
+
+    def on_model_found(self, model: Path):
+        self.found.append(model)
+
+    def on_search_completed(self):
+        pass
+
+
+def make_tree(root: Path):
+    (root / "loras" / "nested").mkdir(parents=True)
+    (root / "loras" / "a.safetensors").touch()
+    (root / "loras" / "nested" / "b.pt").touch()
+    (root / "loras" / "notes.txt").touch()
+    (root / "pipeline" / "unet").mkdir(parents=True)
+    (root / "pipeline" / "model_index.json").touch()
+    (root / "pipeline" / "unet" / "diffusion_pytorch_model.bin").touch()
+    (root / ".hidden").mkdir()
+    (root / ".hidden" / "c.ckpt").touch()
+
+
+def test_finds_models(tmp_path):
+    make_tree(tmp_path)
+    search = RecordModels([tmp_path])
+    search.search()
+
+    assert search.found == sorted(
+        [
+            tmp_path / "loras" / "a.safetensors",
+            tmp_path / "loras" / "nested" / "b.pt",
+            tmp_path / "pipeline",
+        ]
+    )
+
+
+def test_rescan_lists_only_changed_directories(tmp_path, monkeypatch):
+    make_tree(tmp_path)
+    search = RecordModels([tmp_path], incremental=True)
+    search.search()
+
+    listed = list()
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        listed.append(Path(path))
+        return scandir(path)
+
+    monkeypatch.setattr(model_search.os, "scandir", counting_scandir)
+
+    search.search()
+    assert listed == []
+    assert search.found == []
+
+    (tmp_path / "loras" / "nested" / "d.ckpt").touch()
+    search.search()
+    assert listed == [tmp_path / "loras" / "nested"]
+    assert search.found == [tmp_path / "loras" / "nested" / "d.ckpt"]
+
+
+def test_rescan_retries_models_that_failed(tmp_path):
+    make_tree(tmp_path)
+    failing = tmp_path / "loras" / "a.safetensors"
+
+    class FailOnce(RecordModels):
+        failed = False
+
+        def on_model_found(self, model: Path):
+            if model == failing and not self.failed:
+                self.failed = True
+                raise Exception(f"{model} is still being copied")
+            super().on_model_found(model)
+
+    search = FailOnce([tmp_path], incremental=True)
+    search.search()
+    assert failing not in search.found
+
+    search.search()
+    assert search.found == [failing]
+
+    search.search()
+    assert search.found == []
@@ -0,0 +1,32 @@
+import torch
+
+from invokeai.app.invocations.latent import LatentsField, NoiseDescriptor, get_noise_batch
+from invokeai.app.invocations.noise import counter_randn, get_noise, get_noise_from_descriptor, get_seeded_noise
+
+
+def test_counter_noise_is_seeded_and_normal():
+    noise = counter_randn([1, 2, 1], [4, 64, 64], torch.device("cpu"))
+
+    assert noise.shape == (3, 4, 64, 64)
+    assert torch.equal(noise[0], noise[2])
+    assert not torch.equal(noise[0], noise[1])
+    assert abs(noise.mean().item()) < 0.02
+    assert abs(noise.std().item() - 1.0) < 0.02
+
+
+def test_cpu_noise_is_unchanged():
+    batch = get_seeded_noise([7, 8], 4, 8, 8, device=torch.device("cpu"), dtype=torch.float32)
+
+    expected = torch.randn([1, 4, 8, 8], generator=torch.Generator(device="cpu").manual_seed(8))
+    assert torch.equal(batch[1:], expected)
+    assert torch.equal(get_noise(64, 64, torch.device("cpu"), seed=7), batch[:1])
+
+
+def test_seeded_batch_is_generated_like_its_noise_input():
+    for use_cpu in (True, False):
+        descriptor = NoiseDescriptor(seed=3, height=8, width=8, dtype="float32", use_cpu=use_cpu)
+
+        batch = get_noise_batch(None, LatentsField(noise=descriptor), seeds=[3, 4])
+
+        assert batch.dtype == torch.float32
+        assert torch.equal(batch[:1], get_noise_from_descriptor(descriptor, batch.device))
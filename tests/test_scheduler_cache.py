@@ -0,0 +1,22 @@
+import torch
+from diffusers import DPMSolverMultistepScheduler
+
+from invokeai.backend.stable_diffusion.schedulers import SchedulerCache
+
+
+def test_cached_schedulers_are_independent_copies():
+    cache = SchedulerCache(max_size=1)
+    config = dict(DPMSolverMultistepScheduler().config, use_karras_sigmas=True)
+
+    first = cache.get(DPMSolverMultistepScheduler, config, steps=20, device="cpu")
+    second = cache.get(DPMSolverMultistepScheduler, config, steps=20, device="cpu")
+
+    assert first is not second
+    assert first.prepared_timesteps == (20, torch.device("cpu"))
+    assert torch.equal(first.timesteps, second.timesteps)
+    first.model_outputs[0] = torch.zeros(1)
+    assert second.model_outputs[0] is None
+
+    unprepared = cache.get(DPMSolverMultistepScheduler, config)
+    assert unprepared.prepared_timesteps is None
+    assert len(unprepared.timesteps) == unprepared.config.num_train_timesteps
@@ -0,0 +1,22 @@
+import numpy as np
+import torch
+
+from invokeai.backend.stable_diffusion.tiled_vae import tiled_decode
+
+
+class UpsamplingVae:
+    """Decodes by upsampling, which doesn't depend on the tiling"""
+
+    def decode(self, latents, return_dict=False):
+        return (torch.nn.functional.interpolate(latents[:, :3], scale_factor=8, mode="nearest"),)
+
+
+def test_tiled_decode_matches_whole_decode():
+    latents = torch.rand((1, 4, 100, 70)) * 2 - 1
+
+    image = tiled_decode(UpsamplingVae(), latents, tile_size=32, overlap=8)
+
+    whole = UpsamplingVae().decode(latents)[0]
+    expected = ((whole[0] / 2 + 0.5).clamp(0, 1).permute(1, 2, 0).numpy() * 255).round().astype(np.uint8)
+    assert image.size == (560, 800)
+    assert np.abs(np.asarray(image).astype(int) - expected.astype(int)).max() <= 1
@@ -0,0 +1,20 @@
+import io
+import zipfile
+
+from invokeai.app.util.zipstream import stream_zip
+
+
+def test_stream_zip_writes_a_readable_archive(tmp_path):
+    contents = {"a.png": b"\x89PNG" + bytes(range(256)) * 50, "b.png": b"", "c.png": b"tiny"}
+    for name, data in contents.items():
+        (tmp_path / name).write_bytes(data)
+
+    chunks = list(stream_zip([(name, tmp_path / name) for name in contents], chunk_size=1000))
+
+    assert len(chunks) > len(contents)
+    assert all(chunks)
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(contents)
+        for name, data in contents.items():
+            assert archive.read(name) == data